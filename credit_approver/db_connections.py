@@ -0,0 +1,50 @@
+"""
+Connection handling modes for the PostgreSQL database , picked per process type through the environment.
+
+    none        a new connection for every request or task (Django's default)
+    persistent  connections are kept for DB_CONN_MAX_AGE seconds and health checked before reuse
+    pool        a psycopg 3 connection pool of DB_POOL_MIN_SIZE..DB_POOL_MAX_SIZE connections per process ,
+                requests wait at most DB_POOL_TIMEOUT seconds for a free one (psycopg[binary,pool] from requirements.txt)
+"""
+from django.core.exceptions import ImproperlyConfigured
+
+CONNECTION_MODES = ('none', 'persistent', 'pool')
+
+
+def connection_mode_settings(mode : str, environ) -> dict:
+    """
+    Returns the keys to merge into a DATABASES entry for the given mode.
+
+    Raises:
+        ImproperlyConfigured: If the mode is unknown.
+    """
+    if mode not in CONNECTION_MODES:
+        raise ImproperlyConfigured(f"DB_CONNECTION_MODE must be one of {', '.join(CONNECTION_MODES)} , got {mode!r}")
+
+    if mode == 'persistent':
+        return {
+            'CONN_MAX_AGE': int(environ.get('DB_CONN_MAX_AGE', 600)),
+            'CONN_HEALTH_CHECKS': True,
+        }
+    if mode == 'pool':
+        return {
+            # the pool owns the connections , Django hands them back after every request
+            'CONN_MAX_AGE': 0,
+            'CONN_HEALTH_CHECKS': True,
+            'OPTIONS': {
+                'pool': {
+                    'min_size': int(environ.get('DB_POOL_MIN_SIZE', 2)),
+                    'max_size': int(environ.get('DB_POOL_MAX_SIZE', 10)),
+                    'timeout': float(environ.get('DB_POOL_TIMEOUT', 10)),
+                },
+            },
+        }
+    return {'CONN_MAX_AGE': 0, 'CONN_HEALTH_CHECKS': False}
+
+
+def apply_connection_mode(database : dict, mode_settings : dict) -> dict:
+    """
+    Merges the settings of a connection mode into a DATABASES entry , keeping its own OPTIONS.
+    """
+    options = {**database.get('OPTIONS', {}), **mode_settings.get('OPTIONS', {})}
+    return {**database, **mode_settings, 'OPTIONS': options}
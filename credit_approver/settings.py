@@ -11,9 +11,14 @@ https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
 from pathlib import Path
+import os
 import sys
 
 import dj_database_url
+from celery.schedules import crontab
+
+from credit_approver.db_connections import apply_connection_mode, connection_mode_settings
+
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -44,6 +49,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # first , so the latency it records covers the other middleware too
+    'loan_credit.metrics.MetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -51,6 +58,7 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'loan_credit.db_router.ReplicaStickinessMiddleware',
 ]
 
 ROOT_URLCONF = 'credit_approver.urls'
@@ -89,11 +97,75 @@ else :
         default="postgres://postgres:postgres@db:5432/postgres",
     )
 
+# Connection handling per process type , set DB_CONNECTION_MODE on each service (see credit_approver/db_connections.py)
+DB_CONNECTION_MODE = os.environ.get('DB_CONNECTION_MODE', 'none')
+if 'test' not in sys.argv:
+    defaults = apply_connection_mode(defaults, connection_mode_settings(DB_CONNECTION_MODE, os.environ))
+
 
 DATABASES = {
     'default': defaults
 }
 
+# Read replicas , reads are routed to them and writes to `default` (see loan_credit/db_router.py)
+if 'test' in sys.argv:
+    # a second database standing in for a replica , only used by tests that enable it
+    DATABASES['replica'] = {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': ':memory:',
+        'TEST': {},
+    }
+    DATABASE_REPLICAS = []
+else :
+    replica_urls = [url for url in os.environ.get('DATABASE_REPLICA_URLS', '').split(',') if url.strip()]
+    for index, url in enumerate(replica_urls, start=1):
+        DATABASES[f'replica_{index}'] = apply_connection_mode(dj_database_url.parse(url.strip()), connection_mode_settings(DB_CONNECTION_MODE, os.environ))
+    DATABASE_REPLICAS = [f'replica_{index}' for index in range(1, len(replica_urls) + 1)]
+
+DATABASE_ROUTERS = ['loan_credit.db_router.PrimaryReplicaRouter']
+
+# Seconds a client's reads stay on the primary after one of its requests wrote
+REPLICA_STICKY_SECONDS = 5
+
+
+# Cache
+# https://docs.djangoproject.com/en/5.2/topics/cache/
+
+# for testing we are using the local memory cache
+if 'test' in sys.argv:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
+    }
+# else the docker redis , on another database than celery
+else :
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.environ.get('REDIS_CACHE_URL', 'redis://redis:6379/1'),
+            'KEY_PREFIX': 'loan_credit',
+        }
+    }
+
+# Seconds a serialized view-loan / view-loans response stays cached , saves and deletes evict it earlier
+LOAN_VIEW_CACHE_TIMEOUT = 10 * 60
+
+# Most seconds a /check-eligibility/ decision stays cached , changes to the customer or its loans and midnight evict it earlier
+ELIGIBILITY_CACHE_TIMEOUT = 60 * 60
+
+# Idempotency-Key support of /create-loan/ : how long a stored response is replayed (cache and database) ,
+# how long a request holds its key , and how long a duplicate waits for the first request to finish
+IDEMPOTENCY_TTL_SECONDS = 24 * 60 * 60
+IDEMPOTENCY_LOCK_SECONDS = 30
+IDEMPOTENCY_WAIT_SECONDS = 10
+IDEMPOTENCY_POLL_SECONDS = 0.05
+
+# Async mode of /create-loan/ (Prefer: respond-async) : applications decided per Celery task , and the seconds
+# queued applications wait for their batch to fill before the first task runs
+LOAN_DECISION_BATCH_SIZE = 500
+LOAN_DECISION_BATCH_WINDOW = 0.2
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -142,9 +214,94 @@ REST_FRAMEWORK = {
     'EXCEPTION_HANDLER': 'loan_credit.exceptions.main_exception_handler'
 }
 
+# Loan ids each process reserves from the database at a time
+LOAN_ID_BLOCK_SIZE = 50
+# How often an allocator checks the id generation (moved by a reseed) while handing out a block , in seconds
+LOAN_ID_GENERATION_CHECK_SECONDS = 1
+
+# Largest number of applicants accepted by /check-eligibility/batch/
+ELIGIBILITY_BATCH_MAX_ITEMS = 10000
+
+# Largest number of customers accepted by /register/bulk/
+REGISTRATION_BULK_MAX_ITEMS = 10000
+
+# Seconds a computed repayment schedule stays cached
+LOAN_SCHEDULE_CACHE_TIMEOUT = 24 * 60 * 60
+
+# /view-loans/ pages : default and largest `limit` , rows fetched per round trip when streaming
+LOAN_PAGE_SIZE = 100
+LOAN_PAGE_MAX_SIZE = 1000
+LOAN_STREAM_CHUNK_SIZE = 2000
+
+# Workbook ingestion: rows read per chunk , rows per INSERT when COPY is not used
+INGESTION_CHUNK_SIZE = 5000
+INGESTION_BATCH_SIZE = 1000
+INGESTION_USE_COPY = True
+# Partitions per workbook that injest_data fans out across the celery workers , and where it writes them.
+# Every worker reads the partition files , so the directory has to be on storage they share (the /app volume)
+INGESTION_PARTITIONS = 8
+INGESTION_PARTITION_DIR = os.environ.get('INGESTION_PARTITION_DIR', os.path.join(BASE_DIR, 'data', 'ingestion'))
+
+# EMI payment events : largest batch accepted by /emi-payments/ , and the Redis stream the payment processor
+# writes to , read by consume_emi_payments in batches for about a minute per run
+EMI_PAYMENT_BATCH_MAX_ITEMS = 50000
+EMI_PAYMENT_STREAM_URL = os.environ.get('EMI_PAYMENT_STREAM_URL', 'redis://redis:6379/2')
+EMI_PAYMENT_STREAM = 'emi-payments'
+EMI_PAYMENT_CONSUMER_GROUP = 'loan-credit'
+EMI_PAYMENT_STREAM_BATCH_SIZE = 5000
+EMI_PAYMENT_CONSUMER_SECONDS = 55
+# messages read by a consumer that died unacknowledged are taken over after this many milliseconds
+EMI_PAYMENT_CLAIM_IDLE_MS = 60000
+# shared secret of the payment processor , every /emi-payments/ batch carries an HMAC-SHA256 of its body signed
+# with it in X-Payment-Signature . Unset , the endpoint refuses every batch
+EMI_PAYMENT_SIGNING_KEY = os.environ.get('EMI_PAYMENT_SIGNING_KEY', '')
+
+# Nightly portfolio rescoring: loan and customer rows read per chunk
+RESCORING_CHUNK_SIZE = 100000
+
+# Loan archive : fully paid loans that ended more than this many days ago (and were approved before the current
+# year) are moved out of the live loan table , this many per transaction
+LOAN_ARCHIVE_AFTER_DAYS = 365
+LOAN_ARCHIVE_BATCH_SIZE = 5000
+
+# Analytics export : rows per server side cursor fetch , CSV batch and Parquet row group
+EXPORT_CHUNK_SIZE = 20000
+EXPORT_PARQUET_COMPRESSION = 'zstd'
+
 # --- Celery Configuration ---
 CELERY_BROKER_URL = 'redis://redis:6379/0'
 CELERY_RESULT_BACKEND = 'redis://redis:6379/0'
 CELERY_ACCEPT_CONTENT = ['json']
 CELERY_TASK_SERIALIZER = 'json'
 CELERY_RESULT_SERIALIZER = 'json'
+
+# periodic tasks , run by the `beat` service of docker-compose
+CELERY_BEAT_SCHEDULE = {
+    'purge-idempotency-records': {
+        'task': 'loan_credit.tasks.purge_idempotency_records',
+        'schedule': 60 * 60,
+    },
+    # picks up queued loan applications whose task message was lost
+    'decide-loan-applications': {
+        'task': 'loan_credit.tasks.decide_loan_applications',
+        'schedule': 60,
+    },
+    # one consumer run per minute , each reads the payment stream for EMI_PAYMENT_CONSUMER_SECONDS
+    'consume-emi-payments': {
+        'task': 'loan_credit.tasks.consume_emi_payments',
+        'schedule': 60,
+    },
+    'rescore-portfolio': {
+        'task': 'loan_credit.tasks.rescore_portfolio',
+        'schedule': crontab(hour=2, minute=0),
+    },
+    # writes the rows of the workbooks that changed since the previous run
+    'refresh-workbooks': {
+        'task': 'loan_credit.tasks.injest_delta_data',
+        'schedule': crontab(hour=1, minute=0),
+    },
+    'archive-matured-loans': {
+        'task': 'loan_credit.tasks.archive_matured_loans',
+        'schedule': crontab(hour=3, minute=0),
+    },
+}
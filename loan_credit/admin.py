@@ -1,6 +1,7 @@
 from django.contrib import admin
-from loan_credit.models import Customer, LoanAppllication
+from loan_credit.models import Customer, CustomerCreditSummary, LoanAppllication
 
 # Register your models here.
 admin.site.register(Customer)
-admin.site.register(LoanAppllication)
\ No newline at end of file
+admin.site.register(LoanAppllication)
+admin.site.register(CustomerCreditSummary)
@@ -0,0 +1,141 @@
+"""
+Repayment schedules for equal monthly installment loans.
+
+Every figure comes from the closed form of the amortized balance, so schedules for
+many loans are built with array operations instead of a month by month loop:
+
+    balance_k = P * (1 + r)^k - EMI * ((1 + r)^k - 1) / r
+
+where P is the principal , r the monthly interest rate and k the number of installments paid.
+
+A stored loan keeps the installment it was approved with , which may differ from the one its terms give
+today (a rounded or imported figure). Schedules of stored loans use that installment , the last one
+settles whatever balance it leaves.
+"""
+import numpy as np
+from django.conf import settings
+from django.core.cache import cache
+
+from loan_credit.utils import calculate_monthly_installments
+
+
+def _balances(principal, monthly_rate, installment, months):
+    """
+    Balance left after `months` installments , for arrays that broadcast together.
+    """
+    growth = np.power(1 + monthly_rate, months)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        amortized = principal * growth - installment * (growth - 1) / monthly_rate
+    balance = np.where(monthly_rate == 0, principal - installment * months, amortized)
+    # the last installment leaves a rounding residue of a fraction of a cent
+    return np.clip(balance, 0, None)
+
+
+def _installments(principal, annual_rate, tenure, installments=None):
+    """
+    The given installment of each loan , or the one computed from its terms where it is missing or not positive.
+    """
+    computed = calculate_monthly_installments(principal, annual_rate, tenure)
+    if installments is None:
+        return computed
+    # None becomes NaN
+    given = np.asarray(installments, dtype=np.float64)
+    return np.where(np.isnan(given) | (given <= 0), computed, given)
+
+
+def build_schedules(loan_amounts, annual_interest_rates, tenures, installments=None) -> dict:
+    """
+    Builds the repayment schedules of many loans at once.
+
+    Args:
+        loan_amounts (array-like): Principal of each loan.
+        annual_interest_rates (array-like): Annual interest rate of each loan as a percentage.
+        tenures (array-like): Tenure of each loan in months.
+        installments (array-like, optional): Stored installment of each loan , None where there is none.
+
+    Returns:
+        dict: `installment` (one per loan) and `payment`, `principal`, `interest`, `balance` arrays
+        of shape (loans, longest tenure). Months past a loan's tenure are NaN.
+    """
+    principal = np.asarray(loan_amounts, dtype=np.float64)
+    annual_rate = np.asarray(annual_interest_rates, dtype=np.float64)
+    tenure = np.asarray(tenures, dtype=np.int64)
+    monthly_rate = annual_rate / (12 * 100)
+    installment = _installments(principal, annual_rate, tenure, installments)
+
+    longest = int(tenure.max()) if tenure.size else 0
+    months = np.arange(1, longest + 1)
+
+    # column vectors so every loan is broadcast across the months
+    principal_col = principal[:, None]
+    rate_col = monthly_rate[:, None]
+    installment_col = installment[:, None]
+
+    balance = _balances(principal_col, rate_col, installment_col, months)
+    previous_balance = _balances(principal_col, rate_col, installment_col, months - 1)
+    # the last installment pays off what is left
+    balance[months >= tenure[:, None]] = 0
+    interest = previous_balance * rate_col
+    principal_paid = previous_balance - balance
+    payment = interest + principal_paid
+
+    outside = months > tenure[:, None]
+    for values in (payment, principal_paid, interest, balance):
+        values[outside] = np.nan
+
+    return {
+        'installment': installment,
+        'payment': payment,
+        'principal': principal_paid,
+        'interest': interest,
+        'balance': balance,
+    }
+
+
+def build_schedule(loan_amount, annual_interest_rate, tenure, installment=None) -> list:
+    """
+    Repayment schedule of a single loan as one dict per month , amounts rounded to 2 decimal places.
+    """
+    schedules = build_schedules([loan_amount], [annual_interest_rate], [tenure], [installment])
+    columns = [
+        np.round(schedules[name][0, :tenure], 2).tolist()
+        for name in ('payment', 'principal', 'interest', 'balance')
+    ]
+    return [
+        {'month': month, 'payment': payment, 'principal': principal, 'interest': interest, 'balance': balance}
+        for month, (payment, principal, interest, balance) in enumerate(zip(*columns), start=1)
+    ]
+
+
+def outstanding_principal(loan_amounts, annual_interest_rates, tenures, installments_paid, installments=None) -> np.ndarray:
+    """
+    Principal still owed on each loan after the given number of installments , rounded to 2 decimal places.
+    `installments` are the stored installments , as for build_schedules.
+    """
+    principal = np.asarray(loan_amounts, dtype=np.float64)
+    annual_rate = np.asarray(annual_interest_rates, dtype=np.float64)
+    tenure = np.asarray(tenures, dtype=np.int64)
+    paid = np.nan_to_num(np.asarray(installments_paid, dtype=np.float64))
+
+    installment = _installments(principal, annual_rate, tenure, installments)
+    months = np.clip(paid, 0, tenure)
+    balance = np.where(months >= tenure, 0, _balances(principal, annual_rate / (12 * 100), installment, months))
+    return np.round(balance, 2)
+
+
+def get_loan_schedule(loan) -> dict:
+    """
+    Installment and schedule of a stored loan , on the installment stored with it when there is one.
+    The schedule only depends on the loan terms , which never change once a loan is approved ,
+    so it is cached under a key built from them.
+    """
+    cache_key = f"loan-schedule:{loan.loan_id}:{loan.loan_amount}:{loan.interest_rate}:{loan.tenure}:{loan.monthly_installment}"
+    cached = cache.get(cache_key)
+    if cached is not None:
+        return cached
+
+    installment = _installments([loan.loan_amount], [loan.interest_rate], [loan.tenure], [loan.monthly_installment]).tolist()[0]
+    schedule = build_schedule(loan.loan_amount, loan.interest_rate, loan.tenure, installment)
+    data = {'monthly_installment': round(installment, 2), 'schedule': schedule}
+    cache.set(cache_key, data, settings.LOAN_SCHEDULE_CACHE_TIMEOUT)
+    return data
@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class LoanCreditConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'loan_credit'
+
+    def ready(self):
+        # connect the model signal handlers
+        from loan_credit import signals  # noqa: F401
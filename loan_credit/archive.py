@@ -0,0 +1,141 @@
+"""
+Archival of matured loans out of the live LoanAppllication table.
+
+Every credit summary rebuild and every /view-loans/ read scans all of a customer's loans , so loans that
+ended long ago are moved to ArchivedLoan batch by batch. A loan is archived when it is:
+- approved and fully paid (emis_paid_on_time >= tenure) ,
+- ended more than LOAN_ARCHIVE_AFTER_DAYS ago ,
+- approved before the current year , so it no longer counts towards loan_activity_current_year.
+
+Such a loan only contributes to the lifetime figures of its customer. These are added to the customer's
+CustomerLoanHistory row in the same transaction that moves the loan , and compute_summaries and the
+portfolio rescoring add the history to the live loans , so no summary or score changes.
+"""
+import datetime as dt
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from loan_credit.metrics import span
+from loan_credit.models import ArchivedLoan, CustomerCreditSummary, CustomerLoanHistory, LoanAppllication
+from loan_credit.response_cache import invalidate_loan_views
+from loan_credit.summaries import HISTORY_FIELDS
+
+ARCHIVED_COLUMNS = ['loan_id', 'customer_id', 'loan_amount', 'tenure', 'interest_rate', 'monthly_installment', 'emis_paid_on_time', 'date_of_approval', 'end_date']
+
+_archiving = ContextVar('loan_credit_archiving', default=False)
+
+
+@contextmanager
+def archiving():
+    """
+    Marks the loan deletes of the archival , the loan signals leave the summaries alone while it is active.
+    """
+    token = _archiving.set(True)
+    try:
+        yield
+    finally:
+        _archiving.reset(token)
+
+
+def is_archiving() -> bool:
+    return _archiving.get()
+
+
+def archivable_loans(today=None):
+    """
+    The live loans that can be moved to the archive.
+    """
+    today = today or dt.date.today()
+    cutoff = today - dt.timedelta(days=settings.LOAN_ARCHIVE_AFTER_DAYS)
+    return LoanAppllication.objects.filter(
+        loan_approved=True,
+        end_date__lt=cutoff,
+        date_of_approval__lt=dt.date(today.year, 1, 1),
+        emis_paid_on_time__gte=F('tenure'),
+    )
+
+
+def add_to_history(histories : dict, loan : dict) -> None:
+    history = histories.get(loan['customer_id'])
+    if history is None:
+        history = histories[loan['customer_id']] = CustomerLoanHistory(customer_id=loan['customer_id'])
+    history.num_loans_taken += 1
+    # only fully paid loans are archived
+    history.num_loans_fully_paid += 1
+    history.total_emis_paid += loan['emis_paid_on_time']
+    history.total_tenure_months += loan['tenure']
+    history.loan_approved_volume += loan['loan_amount']
+
+
+def archive_loan_batch(batch_size : int, today=None) -> int:
+    """
+    Moves up to `batch_size` archivable loans in one transaction. Loans locked by another writer are skipped
+    and picked up by the next run.
+
+    Returns:
+        int: The number of loans archived.
+    """
+    with transaction.atomic():
+        loans = list(
+            archivable_loans(today)
+            .select_for_update(skip_locked=True)
+            .order_by('loan_id')
+            .values(*ARCHIVED_COLUMNS)[:batch_size]
+        )
+        if not loans:
+            return 0
+        customer_ids = sorted({loan['customer_id'] for loan in loans})
+        loan_ids = [loan['loan_id'] for loan in loans]
+
+        # the summary rows first , like refresh_summaries , so a rebuild sees the loans either live or in the history
+        list(CustomerCreditSummary.objects.select_for_update().filter(customer_id__in=customer_ids).values_list('pk', flat=True))
+        histories = {history.customer_id: history for history in CustomerLoanHistory.objects.select_for_update().filter(customer_id__in=customer_ids)}
+        for loan in loans:
+            add_to_history(histories, loan)
+
+        archived_at = timezone.now()
+        ArchivedLoan.objects.bulk_create([ArchivedLoan(archived_at=archived_at, **loan) for loan in loans])
+        CustomerLoanHistory.objects.bulk_create(
+            histories.values(),
+            update_conflicts=True,
+            unique_fields=['customer'],
+            update_fields=HISTORY_FIELDS + ['updated_at'],
+        )
+        # a normal delete , so the LoanDecision rows pointing at the loans are cleared
+        with archiving():
+            LoanAppllication.objects.filter(loan_id__in=loan_ids).delete()
+        invalidate_loan_views(loan_ids=loan_ids, customer_ids=customer_ids)
+    return len(loans)
+
+
+def archive_matured_loans(batch_size=None, today=None) -> dict:
+    """
+    Archives every archivable loan , one transaction per batch so locks are held briefly.
+
+    Returns:
+        dict: loans archived , batches and seconds taken.
+    """
+    batch_size = batch_size or settings.LOAN_ARCHIVE_BATCH_SIZE
+    started = time.perf_counter()
+    archived = 0
+    batches = 0
+    while True:
+        with span('loan_archive_batch'):
+            moved = archive_loan_batch(batch_size, today)
+        if not moved:
+            break
+        archived += moved
+        batches += 1
+        if moved < batch_size:
+            break
+    return {
+        'archived': archived,
+        'batches': batches,
+        'seconds': round(time.perf_counter() - started, 3),
+    }
@@ -0,0 +1,185 @@
+"""
+Async versions of the eligibility , create-loan and view endpoints for ASGI servers.
+
+DRF's APIView is synchronous , so these are plain Django async views. The request and response
+serializers are reused for validation and rendering (neither touches the database) and every
+read awaits the async ORM , so a worker keeps serving other requests while Postgres answers.
+"""
+import json
+from types import SimpleNamespace
+
+from asgiref.sync import sync_to_async
+from django.db import transaction
+from django.http import JsonResponse
+from django.views import View
+from rest_framework import status
+from rest_framework.exceptions import ValidationError
+from rest_framework.utils.encoders import JSONEncoder
+
+from loan_credit.fast_serializers import loan_detail_rows, loan_list_rows, render_loan_detail, render_loan_list
+from loan_credit.idempotency import aidempotent, record_idempotent_response
+from loan_credit.models import ArchivedLoan, LoanAppllication
+from loan_credit.response_cache import acached_eligibility, acached_view, customer_loans_view_key, loan_view_key
+from loan_credit.serializers import CUSTOMER_NOT_FOUND_MESSAGE, LoanCreationResponseSerailizer, LoanEligibilityResponseSerializer, LoanTermsSerializer
+from loan_credit.summaries import aget_customer_summary
+from loan_credit.utils import AsyncLoanEligibilityChecker, build_loan_application
+
+
+def json_response(data, status_code=status.HTTP_200_OK, headers=None) :
+    # DRF's encoder , so decimals and dates render the same as on the sync endpoints
+    return JsonResponse(data, status=status_code, safe=False, encoder=JSONEncoder, headers=headers)
+
+
+class AsyncLoanRequestView(View) :
+    """
+    Validates a loan request body and loads the customer's credit summary.
+    """
+
+    @staticmethod
+    def validated_terms(request) :
+        """
+        Returns:
+            tuple: The validated loan terms , or (None, error response).
+        """
+        try :
+            body = json.loads(request.body or b"{}")
+        except ValueError :
+            return None, json_response({"error" : "Request body is not valid JSON"}, status.HTTP_400_BAD_REQUEST)
+
+        # validate incoming request data
+        try :
+            return LoanTermsSerializer().run_validation(body), None
+        except ValidationError as exc :
+            return None, json_response(exc.detail, status.HTTP_400_BAD_REQUEST)
+
+    @staticmethod
+    async def customer_summary(validated_data) :
+        """
+        Returns:
+            tuple: The customer summary , or (None, error response).
+        """
+        # customer and credit summary in one read
+        customer_summary = await aget_customer_summary(validated_data["customer_id"])
+        if customer_summary is None :
+            return None, json_response({"customer_id" : [CUSTOMER_NOT_FOUND_MESSAGE]}, status.HTTP_400_BAD_REQUEST)
+        return customer_summary, None
+
+    async def validated_request(self, request) :
+        """
+        Returns:
+            tuple: The validated data and the customer summary , or (None, error response).
+        """
+        validated_data, error = self.validated_terms(request)
+        if error :
+            return None, error
+        customer_summary, error = await self.customer_summary(validated_data)
+        if error :
+            return None, error
+        return (validated_data, customer_summary), None
+
+
+class AsyncCheckLoanEligibility(AsyncLoanRequestView) :
+    async def post(self , request , *args, **kwargs) :
+        validated_data, error = self.validated_terms(request)
+        if error :
+            return error
+
+        errors = []
+
+        async def check() :
+            customer_summary, error = await self.customer_summary(validated_data)
+            if error :
+                errors.append(error)
+                return None
+
+            # main buisness logic for checking loan eligibility
+            main_data = AsyncLoanEligibilityChecker(validated_data , customer_summary)
+            response_data = await main_data.check_loan_eligibility()
+
+            # validate / serialize response data
+            return dict(LoanEligibilityResponseSerializer(SimpleNamespace(**response_data)).data)
+
+        # a repeated quote is answered from the cache without reading the customer
+        response_data = await acached_eligibility(validated_data, check)
+        if errors :
+            return errors[0]
+        return json_response(response_data)
+
+
+class AsyncCreateLoanApplications(AsyncLoanRequestView) :
+    # retries sent with the same Idempotency-Key get the first response back instead of a second loan ,
+    # the same scope as /create-loan/ so a retry may land on either route
+    @aidempotent("create_loan" , json_response)
+    async def post(self , request , *args, **kwargs) :
+        validated, error = await self.validated_request(request)
+        if error :
+            return error
+        validated_data, customer_summary = validated
+
+        # main buisness logic for checking loan eligibility
+        main_data = AsyncLoanEligibilityChecker(validated_data , customer_summary)
+        response_data = await main_data.check_loan_eligibility()
+
+        # the loan row , the customer's credit summary and the idempotency record are written together ,
+        # the async ORM has no transactions
+        response_data = await sync_to_async(self.save_loan)(request , validated_data , customer_summary.customer , response_data)
+
+        return json_response(response_data, status.HTTP_201_CREATED)
+
+    @staticmethod
+    def save_loan(request , validated_data , customer , response_data) :
+        # save the application even though user is not eligble , built here since a new loan id may need a query
+        loan_application = build_loan_application(validated_data , customer , response_data)
+        with transaction.atomic() :
+            loan_application.save(force_insert=True)
+
+            if not response_data["approval"] :
+                loan_application.loan_id = None
+
+            response_data = LoanCreationResponseSerailizer(loan_application).data
+            record_idempotent_response(request , status.HTTP_201_CREATED , response_data)
+        return response_data
+
+
+class AsyncViewLoanApplications(View) :
+    async def get(self, request , *args, **kwargs) :
+        loan_id = kwargs.get("loan_id" , None)
+        if not loan_id :
+            return json_response({"error" : "loan_id is required"} , status.HTTP_400_BAD_REQUEST)
+
+        response_data = await acached_view("view_loan" , loan_view_key(loan_id) , lambda : self.serialize_loan(loan_id))
+        if response_data is None :
+            return json_response({"error" : "No Loan Application Found with this ID"} , status.HTTP_404_NOT_FOUND)
+        return json_response(response_data)
+
+    @staticmethod
+    async def serialize_loan(loan_id) :
+        loan_application = await loan_detail_rows(LoanAppllication.objects.filter(loan_id = loan_id , loan_approved = True)).afirst()
+        if not loan_application :
+            loan_application = await loan_detail_rows(ArchivedLoan.objects.filter(loan_id = loan_id)).afirst()
+        if not loan_application :
+            return None
+        return render_loan_detail(loan_application)
+
+
+class AsyncViewAllLoanApplications(View) :
+    async def get(self, request , *args, **kwargs) :
+        customer_id = kwargs.get("customer_id" , None)
+        if not customer_id :
+            return json_response({"error" : "customer_id is required"} , status.HTTP_400_BAD_REQUEST)
+
+        include_archived = request.GET.get("include_archived") in ("1" , "true")
+        response_data = await acached_view("view_loans" , customer_loans_view_key(customer_id , include_archived) , lambda : self.serialize_loans(customer_id , include_archived))
+        if response_data is None :
+            return json_response({"error" : "No Loan Applications Found for this Customer ID"} , status.HTTP_404_NOT_FOUND)
+        return json_response(response_data)
+
+    @staticmethod
+    async def serialize_loans(customer_id , include_archived=False) :
+        loan_applications = loan_list_rows(LoanAppllication.objects.filter(customer_id = customer_id , loan_approved = True))
+        if include_archived :
+            loan_applications = loan_applications.union(loan_list_rows(ArchivedLoan.objects.filter(customer_id = customer_id)) , all=True)
+        loan_applications = [loan async for loan in loan_applications]
+        if not loan_applications :
+            return None
+        return render_loan_list(loan_applications)
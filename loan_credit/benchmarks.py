@@ -0,0 +1,312 @@
+"""
+Helpers shared by the benchmark management commands.
+"""
+import asyncio
+import datetime as dt
+import json
+import math
+import random
+import time
+import uuid
+from contextlib import contextmanager
+from types import SimpleNamespace
+from urllib.parse import urlsplit
+from urllib.request import Request, urlopen
+
+from django.conf import settings
+from django.db import transaction
+from django.test import Client
+from django.urls import reverse
+
+from loan_credit.models import Customer, LoanAppllication, LoanDecision
+from loan_credit.sequences import reserve_loan_ids
+
+
+class _Rollback(Exception):
+    pass
+
+
+@contextmanager
+def rolled_back():
+    """
+    Runs the block in a transaction that is always rolled back , so benchmark data never persists.
+    """
+    try:
+        with transaction.atomic():
+            yield
+            raise _Rollback
+    except _Rollback:
+        pass
+
+
+@contextmanager
+def timer():
+    """
+    Measures the wall clock time of the block , read `elapsed` after it ends.
+    """
+    result = SimpleNamespace(elapsed=0.0)
+    started = time.perf_counter()
+    try:
+        yield result
+    finally:
+        result.elapsed = time.perf_counter() - started
+
+
+def api_client() -> Client:
+    """
+    In-process client for driving the API from a management command.
+    """
+    allowed_hosts = [host for host in settings.ALLOWED_HOSTS if host not in ('*',) and not host.startswith('.')]
+    return Client(HTTP_HOST=allowed_hosts[0] if allowed_hosts else 'localhost')
+
+
+def percentile(samples : list, pct : float) -> float:
+    """
+    Nearest-rank percentile of a list of samples.
+    """
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    rank = max(0, min(len(ordered) - 1, math.ceil(pct / 100 * len(ordered)) - 1))
+    return ordered[rank]
+
+
+def latency_summary(samples : list) -> dict:
+    """
+    Summarizes latency samples (seconds) into milliseconds.
+    """
+    return {
+        'count': len(samples),
+        'mean_ms': round(1000 * sum(samples) / len(samples), 3) if samples else 0.0,
+        'p50_ms': round(1000 * percentile(samples, 50), 3),
+        'p95_ms': round(1000 * percentile(samples, 95), 3),
+        'p99_ms': round(1000 * percentile(samples, 99), 3),
+    }
+
+
+def seed_customers(count : int, loans_per_customer : int = 3, seed : int = 42) -> list:
+    """
+    Creates customers with a small loan history each and returns their ids.
+    """
+    rng = random.Random(seed)
+    today = dt.date.today()
+    customers = []
+    for i in range(count):
+        monthly_income = rng.randrange(20000, 200000, 1000)
+        customers.append(Customer(
+            first_name=f"Bench{i}",
+            last_name="Customer",
+            phone_number=f"{7000000000 + i}"[:10],
+            age=rng.randint(21, 65),
+            monthly_income=monthly_income,
+            approved_limit=36 * monthly_income,
+        ))
+    customers = Customer.objects.bulk_create(customers, batch_size=1000)
+    if loans_per_customer:
+        loan_ids = iter(reserve_loan_ids(count * loans_per_customer))
+        loans = []
+        for customer in customers:
+            for _ in range(loans_per_customer):
+                tenure = rng.choice([6, 12, 24, 36, 60])
+                approved_on = today - dt.timedelta(days=rng.randint(0, 5 * 365))
+                loans.append(LoanAppllication(
+                    loan_id=next(loan_ids),
+                    customer_id=customer,
+                    loan_amount=rng.randrange(10000, 500000, 1000),
+                    tenure=tenure,
+                    interest_rate=rng.choice([8.0, 10.5, 12.0, 14.0]),
+                    monthly_installment=rng.randrange(1000, 20000, 100),
+                    emis_paid_on_time=rng.randint(0, tenure),
+                    date_of_approval=approved_on,
+                    end_date=approved_on + dt.timedelta(days=30 * tenure),
+                    loan_approved=True,
+                ))
+        LoanAppllication.objects.bulk_create(loans, batch_size=1000)
+    return [customer.pk for customer in customers]
+
+
+async def http_request(url : str, method : str = 'GET', payload=None) -> int:
+    """
+    Sends one HTTP/1.1 request on a fresh connection and returns the status code. Stdlib only , so the
+    load generator runs anywhere the project does.
+    """
+    parts = urlsplit(url)
+    body = json.dumps(payload).encode() if payload is not None else b''
+    reader, writer = await asyncio.open_connection(parts.hostname, parts.port or 80)
+    try:
+        head = (
+            f"{method} {parts.path or '/'}{'?' + parts.query if parts.query else ''} HTTP/1.1\r\n"
+            f"Host: {parts.netloc}\r\n"
+            "Content-Type: application/json\r\n"
+            f"Content-Length: {len(body)}\r\n"
+            "Connection: close\r\n\r\n"
+        )
+        writer.write(head.encode() + body)
+        await writer.drain()
+        status_line = await reader.readline()
+        # drain the rest so the server is not cut off mid response
+        await reader.read()
+        return int(status_line.split()[1]) if status_line else 0
+    finally:
+        writer.close()
+
+
+def fetch_json(url : str, headers : dict = None):
+    with urlopen(Request(url, headers=headers or {}), timeout=30) as response:
+        return json.loads(response.read())
+
+
+async def run_requests(requests : list, concurrency : int, total : int) -> dict:
+    """
+    Sends `total` requests from `concurrency` clients in parallel , each client waiting for its response
+    before sending the next one. `requests` holds (method, url, payload) tuples and is cycled through.
+
+    Returns:
+        dict: requests per second , the latency summary and the number of failed requests.
+    """
+    samples = []
+    errors = 0
+    issued = 0
+
+    async def client():
+        nonlocal errors, issued
+        while issued < total:
+            method, url, payload = requests[issued % len(requests)]
+            issued += 1
+            started = time.perf_counter()
+            try:
+                status_code = await http_request(url, method, payload)
+            except OSError:
+                status_code = 0
+            samples.append(time.perf_counter() - started)
+            if not 200 <= status_code < 300:
+                errors += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(client() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    return {
+        'requests_per_second': round(len(samples) / elapsed, 1) if elapsed else 0.0,
+        'errors': errors,
+        **latency_summary(samples),
+    }
+
+
+async def run_load(url : str, payloads : list, concurrency : int, total : int, method : str = 'POST') -> dict:
+    """
+    run_requests against a single URL with a rotating set of payloads.
+    """
+    return await run_requests([(method, url, payload) for payload in payloads], concurrency, total)
+
+
+def _loan_request(sample, rng) -> dict:
+    return {
+        "customer_id": rng.choice(sample.customer_ids),
+        "loan_amount": rng.randrange(10000, 300000, 1000),
+        "interest_rate": rng.choice([8.0, 10.0, 12.5]),
+        "tenure": rng.choice([6, 12, 24, 36]),
+    }
+
+
+def _registration(sample, rng) -> dict:
+    monthly_income = rng.randrange(20000, 200000, 1000)
+    return {
+        "first_name": "Load",
+        "last_name": "Test",
+        "age": rng.randint(21, 65),
+        "monthly_income": monthly_income,
+        "phone_number": str(rng.randrange(6000000000, 9999999999)),
+    }
+
+
+def _payments(sample, rng, count : int = 100) -> list:
+    return [
+        {"payment_id": f"load-{rng.getrandbits(64):016x}", "loan_id": rng.choice(sample.loan_ids), "paid_on_time": rng.random() < 0.9}
+        for _ in range(count)
+    ]
+
+
+# how to build one request for every named endpoint of loan_credit/urls.py , as (method, path, payload)
+API_REQUESTS = {
+    'register': lambda sample, rng: ('POST', reverse('register'), _registration(sample, rng)),
+    'register_bulk': lambda sample, rng: ('POST', reverse('register_bulk'), [_registration(sample, rng) for _ in range(10)]),
+    'check_eligibility': lambda sample, rng: ('POST', reverse('check_eligibility'), _loan_request(sample, rng)),
+    'check_eligibility_batch': lambda sample, rng: ('POST', reverse('check_eligibility_batch'), [_loan_request(sample, rng) for _ in range(10)]),
+    'create_loan_application': lambda sample, rng: ('POST', reverse('create_loan_application'), _loan_request(sample, rng)),
+    # signed by the payment processor , so 403 from the load client
+    'emi_payments': lambda sample, rng: ('POST', reverse('emi_payments'), _payments(sample, rng)),
+    'loan_decision': lambda sample, rng: ('GET', reverse('loan_decision', args=[rng.choice(sample.decision_ids)]), None),
+    'view_loan_application': lambda sample, rng: ('GET', reverse('view_loan_application', args=[rng.choice(sample.loan_ids)]), None),
+    'view_all_loan_application': lambda sample, rng: ('GET', reverse('view_all_loan_application', args=[rng.choice(sample.borrower_ids)]), None),
+    'view_loan_schedule': lambda sample, rng: ('GET', reverse('view_loan_schedule', args=[rng.choice(sample.loan_ids)]), None),
+    # staff only , so 403 unless the load client logs in as a staff user
+    'export_table': lambda sample, rng: ('GET', f"{reverse('export_table', args=['loans'])}?customer_id={rng.choice(sample.borrower_ids)}", None),
+    # staff only as well
+    'db_pool_stats': lambda sample, rng: ('GET', reverse('db_pool_stats'), None),
+    'async_check_eligibility': lambda sample, rng: ('POST', reverse('async_check_eligibility'), _loan_request(sample, rng)),
+    'async_create_loan_application': lambda sample, rng: ('POST', reverse('async_create_loan_application'), _loan_request(sample, rng)),
+    'async_view_loan_application': lambda sample, rng: ('GET', reverse('async_view_loan_application', args=[rng.choice(sample.loan_ids)]), None),
+    'async_view_all_loan_application': lambda sample, rng: ('GET', reverse('async_view_all_loan_application', args=[rng.choice(sample.borrower_ids)]), None),
+}
+
+
+def api_endpoint_names() -> list:
+    """
+    Names of the endpoints in loan_credit/urls.py , in declaration order.
+    """
+    from loan_credit.urls import urlpatterns
+    return [pattern.name for pattern in urlpatterns if getattr(pattern, 'name', None)]
+
+
+def sample_api_data(size : int = 1000):
+    """
+    Random existing customers and approved loans to build requests from.
+    """
+    loans = list(
+        LoanAppllication.objects.filter(loan_approved=True).order_by('?').values_list('loan_id', 'customer_id')[:size]
+    )
+    return SimpleNamespace(
+        customer_ids=list(Customer.objects.order_by('?').values_list('pk', flat=True)[:size]),
+        loan_ids=[loan_id for loan_id, _ in loans],
+        borrower_ids=sorted({customer_id for _, customer_id in loans}),
+        # unknown ids (404) until some applications were queued in async mode
+        decision_ids=list(LoanDecision.objects.order_by('-created_at').values_list('pk', flat=True)[:size]) or [uuid.uuid4()],
+    )
+
+
+BASELINE_METRICS = (
+    # (metric , True when a higher value is better)
+    ('requests_per_second', True),
+    ('p50_ms', False),
+    ('p95_ms', False),
+    ('p99_ms', False),
+    ('queries_per_request', False),
+)
+
+
+def compare_to_baseline(results : dict, baseline : dict, threshold : float) -> list:
+    """
+    Compares the per endpoint results of a run with a stored baseline.
+
+    Returns:
+        list: One message per endpoint metric that is worse than the baseline by more than `threshold`
+        (a fraction , 0.2 is 20%) and per endpoint that started failing requests.
+    """
+    regressions = []
+    for name, current in results.items():
+        previous = baseline.get(name)
+        if previous is None:
+            continue
+        for metric, higher_is_better in BASELINE_METRICS:
+            if metric not in current or metric not in previous:
+                continue
+            old, new = previous[metric], current[metric]
+            if higher_is_better:
+                worse = new < old * (1 - threshold)
+            else:
+                worse = new > old * (1 + threshold)
+            if worse:
+                regressions.append(f"{name} {metric}: {old} -> {new}")
+        if current.get('errors') and not previous.get('errors'):
+            regressions.append(f"{name} errors: {previous.get('errors', 0)} -> {current['errors']}")
+    return regressions
@@ -0,0 +1,81 @@
+"""
+Connection usage of this process , for the connection modes in credit_approver/db_connections.py.
+
+Every request or Celery task counts as one checkout. Without a pool every newly opened connection is
+counted through Django's connection_created signal , so checkouts minus connections is the number of
+requests that reused a persistent connection. With a psycopg pool the pool's own statistics are reported.
+"""
+import os
+import threading
+
+from django.conf import settings
+from django.db import connections
+
+
+class ConnectionStats:
+    """
+    Checkout and connect counters , local to this process.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.checkouts = 0
+        self.connections_opened = 0
+
+    def record_checkout(self, **kwargs) -> None:
+        with self._lock:
+            self.checkouts += 1
+
+    def record_connection(self, **kwargs) -> None:
+        with self._lock:
+            self.connections_opened += 1
+
+    def counts(self) -> tuple:
+        with self._lock:
+            return self.checkouts, self.connections_opened
+
+    def reset(self) -> None:
+        with self._lock:
+            self.checkouts = 0
+            self.connections_opened = 0
+
+    def snapshot(self, alias='default') -> dict:
+        database = connections[alias]
+        with self._lock:
+            data = {
+                'mode': settings.DB_CONNECTION_MODE,
+                'pid': os.getpid(),
+                'conn_max_age': database.settings_dict.get('CONN_MAX_AGE'),
+                'health_checks': database.settings_dict.get('CONN_HEALTH_CHECKS'),
+                'checkouts': self.checkouts,
+                'connections_opened': self.connections_opened,
+                'reused': max(0, self.checkouts - self.connections_opened),
+                'pool': None,
+            }
+        data['pool'] = pool_stats(database)
+        return data
+
+
+def pool_stats(database) -> dict:
+    """
+    Size , wait time and checkout counts of the psycopg pool behind a connection , None without a pool.
+    """
+    pool = getattr(database, 'pool', None) if database.vendor == 'postgresql' else None
+    if pool is None:
+        return None
+    stats = pool.get_stats()
+    return {
+        'min_size': stats.get('pool_min'),
+        'max_size': stats.get('pool_max'),
+        'size': stats.get('pool_size'),
+        'available': stats.get('pool_available'),
+        'checkouts': stats.get('requests_num', 0),
+        'waiting': stats.get('requests_waiting', 0),
+        'wait_ms': stats.get('requests_wait_ms', 0),
+        'checkout_errors': stats.get('requests_errors', 0),
+        'connections_opened': stats.get('connections_num', 0),
+        'connect_ms': stats.get('connections_ms', 0),
+    }
+
+
+connection_stats = ConnectionStats()
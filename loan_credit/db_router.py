@@ -0,0 +1,105 @@
+"""
+Routes reads to the read replicas in DATABASE_REPLICAS and every write to the primary (`default`).
+
+Reads stay on the primary while a transaction is open on it , for the rest of a request or task once
+it has written , and for REPLICA_STICKY_SECONDS after that through a cookie set by
+ReplicaStickinessMiddleware , so a client always reads its own writes even while the replicas lag.
+
+The responses in the shared view cache are built from the replicas too. A key whose rows changed in the last
+REPLICA_STICKY_SECONDS is built inside primary_reads() instead , and a response read from a replica while a
+write committed is not cached , see loan_credit.response_cache.
+"""
+import random
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.utils.deprecation import MiddlewareMixin
+
+PRIMARY_COOKIE = 'db_primary_until'
+
+# per request / task , contextvars follow both threads and async views
+_pinned_to_primary = ContextVar('pinned_to_primary', default=False)
+_wrote_to_primary = ContextVar('wrote_to_primary', default=False)
+
+
+def pin_to_primary() -> None:
+    _pinned_to_primary.set(True)
+
+
+def reset_routing(**kwargs) -> None:
+    """
+    Forgets the pin and the write of the previous request or task handled by this thread.
+    """
+    _pinned_to_primary.set(False)
+    _wrote_to_primary.set(False)
+
+
+def wrote_to_primary() -> bool:
+    return _wrote_to_primary.get()
+
+
+@contextmanager
+def primary_reads():
+    """
+    Sends the reads of the block to the primary , whatever the pin of the request.
+    """
+    token = _pinned_to_primary.set(True)
+    try:
+        yield
+    finally:
+        # a write inside the block keeps the request pinned
+        if not _wrote_to_primary.get():
+            _pinned_to_primary.reset(token)
+
+
+def in_transaction(alias=DEFAULT_DB_ALIAS) -> bool:
+    """
+    Whether a transaction is open on the database.
+    """
+    return connections[alias].in_atomic_block
+
+
+class PrimaryReplicaRouter:
+    """
+    Database router , see the module docstring.
+    """
+
+    def db_for_read(self, model, **hints):
+        replicas = settings.DATABASE_REPLICAS
+        if not replicas or _pinned_to_primary.get() or in_transaction():
+            return DEFAULT_DB_ALIAS
+        return random.choice(replicas)
+
+    def db_for_write(self, model, **hints):
+        # reads after a write must see it , the replicas may not have it yet
+        _wrote_to_primary.set(True)
+        _pinned_to_primary.set(True)
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # the replicas hold the same data as the primary
+        return True
+
+
+class ReplicaStickinessMiddleware(MiddlewareMixin):
+    """
+    Keeps a client's reads on the primary for REPLICA_STICKY_SECONDS after a request of it wrote.
+    """
+
+    def process_request(self, request):
+        reset_routing()
+        try:
+            primary_until = float(request.COOKIES.get(PRIMARY_COOKIE, 0))
+        except ValueError:
+            primary_until = 0
+        if primary_until > time.time():
+            pin_to_primary()
+
+    def process_response(self, request, response):
+        if settings.DATABASE_REPLICAS and wrote_to_primary():
+            sticky_seconds = settings.REPLICA_STICKY_SECONDS
+            response.set_cookie(PRIMARY_COOKIE, f"{time.time() + sticky_seconds:.3f}", max_age=sticky_seconds, httponly=True, samesite='Lax')
+        return response
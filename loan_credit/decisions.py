@@ -0,0 +1,154 @@
+"""
+Asynchronous loan decisions for /create-loan/.
+
+With a `Prefer: respond-async` header the view only validates the payload and queues it as a LoanDecision row,
+then answers 202 with a decision id to poll. Celery workers drain the queue in micro-batches.
+- Every batch reads the customer metrics of all its applications with one grouped query.
+- The installments are computed as one array operation.
+- The loans are written with bulk_create.
+- The touched credit summaries are rebuilt with one grouped aggregate.
+
+Workers claim batches with SKIP LOCKED, so decision throughput grows with the number of workers. The customer rows
+of a batch are locked before it is decided , so two workers never decide applications of the same customer at once.
+"""
+import datetime as dt
+import math
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.utils import timezone
+
+from loan_credit.ingestion import evict_cached_views
+from loan_credit.models import Customer, LoanAppllication, LoanDecision
+from loan_credit.sequences import reserve_loan_ids
+from loan_credit.serializers import CUSTOMER_NOT_FOUND_MESSAGE, LoanCreationResponseSerailizer
+from loan_credit.summaries import get_customer_summaries, refresh_summaries
+from loan_credit.utils import build_loan_application, check_loan_eligibility_batch
+
+PREFER_ASYNC = 'respond-async'
+SCHEDULED_KEY = 'loan-decisions-scheduled'
+
+
+def prefers_async(request) -> bool:
+    """
+    True when the request carries `Prefer: respond-async` (RFC 7240).
+    """
+    preferences = request.headers.get('Prefer', '')
+    return any(preference.split(';')[0].strip().lower() == PREFER_ASYNC for preference in preferences.split(','))
+
+
+def schedule_loan_decisions() -> None:
+    """
+    Queues a decision task to run after the batch window. Applications queued inside the window share that
+    task , so a spike of requests sends one Celery message per window instead of one per request.
+    """
+    from loan_credit.tasks import decide_loan_applications
+
+    window = settings.LOAN_DECISION_BATCH_WINDOW
+    try:
+        # the Redis backend stores timeouts in whole seconds , a fraction would round down to 0 and store nothing.
+        # The key is dropped by the task when it starts , so it only outlives the window when the task is lost
+        first_in_window = cache.add(SCHEDULED_KEY, 1, max(1, math.ceil(window)))
+    except Exception:
+        # without the cache every request queues its own task , they drain the same queue
+        first_in_window = True
+    if first_in_window:
+        decide_loan_applications.apply_async(countdown=window)
+
+
+def close_batch_window() -> None:
+    """
+    Lets the next queued application schedule a new task , called when a decision task starts.
+    """
+    try:
+        cache.delete(SCHEDULED_KEY)
+    except Exception:
+        pass
+
+
+def decision_response(decision) -> dict:
+    """
+    Body of the polling endpoint (and of the 202 that queued the application).
+    """
+    data = {"decision_id": str(decision.decision_id), "status": decision.status}
+    if decision.status == LoanDecision.COMPLETED:
+        data["result"] = decision.response
+    elif decision.status == LoanDecision.FAILED:
+        data["errors"] = decision.response
+    return data
+
+
+def decide_pending_loans(batch_size=None, today=None, on_full_batch=None) -> dict:
+    """
+    Claims the oldest pending applications and decides them in one transaction. A customer with more than one
+    application in the batch gets the first one decided , the others stay queued so their check sees that loan.
+    The customers are locked for the transaction , a worker holding a later application of one of them waits
+    for this batch to commit and then sees its loans.
+    `on_full_batch` is called before deciding when the batch is full , to start another worker on the next one.
+
+    Returns:
+        dict: `claimed` , `decided` and `deferred` applications.
+    """
+    batch_size = batch_size or settings.LOAN_DECISION_BATCH_SIZE
+    today = today or dt.date.today()
+
+    with transaction.atomic():
+        claimed = list(
+            LoanDecision.objects.select_for_update(skip_locked=True).filter(status=LoanDecision.PENDING).order_by('created_at')[:batch_size]
+        )
+        if len(claimed) == batch_size and on_full_batch is not None:
+            on_full_batch()
+
+        batch = []
+        customer_ids = set()
+        for decision in claimed:
+            if decision.customer_id not in customer_ids:
+                customer_ids.add(decision.customer_id)
+                batch.append(decision)
+        if batch:
+            # in primary key order , so workers locking overlapping customers cannot deadlock
+            list(Customer.objects.select_for_update().filter(pk__in=customer_ids).order_by('pk').values_list('pk', flat=True))
+            decide_loan_batch(batch, today)
+
+    return {'claimed': len(claimed), 'decided': len(batch), 'deferred': len(claimed) - len(batch)}
+
+
+def decide_loan_batch(decisions : list, today : dt.date) -> None:
+    """
+    Decides applications of distinct customers and stores their loans and responses.
+    """
+    summaries = get_customer_summaries({decision.customer_id for decision in decisions}, today)
+    requests = [
+        {'customer_id': decision.customer_id, 'loan_amount': decision.loan_amount, 'interest_rate': decision.interest_rate, 'tenure': decision.tenure}
+        for decision in decisions
+    ]
+    responses = check_loan_eligibility_batch(requests, today, summaries=summaries)
+
+    loan_ids = iter(reserve_loan_ids(sum(1 for response in responses if response is not None)))
+    decided_at = timezone.now()
+    loans = []
+    for decision, data, response_data in zip(decisions, requests, responses):
+        decision.decided_at = decided_at
+        if response_data is None:
+            decision.status = LoanDecision.FAILED
+            decision.response = {"customer_id": [CUSTOMER_NOT_FOUND_MESSAGE]}
+            continue
+
+        # the application is kept even when it is not approved , like the inline path
+        loan_application = build_loan_application(data, summaries[decision.customer_id].customer, response_data, loan_id=next(loan_ids))
+        loans.append(loan_application)
+        result = dict(LoanCreationResponseSerailizer(loan_application).data)
+        if not response_data["approval"]:
+            result["loan_id"] = None
+        decision.status = LoanDecision.COMPLETED
+        decision.loan = loan_application
+        decision.response = result
+
+    LoanAppllication.objects.bulk_create(loans)
+    # bulk_create skips the model signals , the summaries and cached views are refreshed for the whole batch
+    approved_customers = {loan.customer_id_id for loan in loans if loan.loan_approved}
+    if approved_customers:
+        refresh_summaries(approved_customers, today)
+    evict_cached_views(LoanAppllication, loans)
+    LoanDecision.objects.bulk_update(decisions, ['status', 'loan', 'response', 'decided_at'])
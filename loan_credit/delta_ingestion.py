@@ -0,0 +1,240 @@
+"""
+Incremental , resumable ingestion of the customer and loan workbooks.
+
+The full ingestion rewrites every row of both workbooks. A delta run only writes what changed:
+- The workbook file is hashed first. A file that was already ingested to the end is skipped without opening it.
+- Every row is hashed (its cell values in column order) and compared with the hash stored in IngestedRow for its
+  Customer ID / Loan ID. Only new and changed rows are upserted.
+- Every chunk is committed together with its row hashes and the checkpoint of the file (IngestionCheckpoint.rows_done) ,
+  so a run that fails half way resumes after its last committed chunk.
+- A Customer ID / Loan ID repeated in a workbook keeps its first row , as in the full ingestion. The keys of the file
+  are kept in a KeySet for the run , one bit per key of the id range , a resumed run reads the keys of the rows
+  before its checkpoint first.
+- Ids are handed out past the imported ones , so a workbook may later bring an id the API already gave to a
+  customer or loan of its own. A key that was never ingested (it has no IngestedRow , the full ingestion records
+  its rows too) but already has a row belongs to the API , the workbook row is left out and counted in `taken`.
+
+Rows removed from a workbook are left in the tables , as with the full ingestion.
+"""
+import hashlib
+import os
+import time
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from loan_credit.ingestion import (
+    CUSTOMER_COLUMNS, LOAN_COLUMNS, KeySet, build_customer, build_loan, drop_taken_phone_numbers, evict_cached_views,
+    insert_chunk, iter_sheet_rows, keep_loans, peak_rss_mb, reset_customer_id_sequence,
+)
+from loan_credit.models import Customer, IngestedRow, IngestionCheckpoint, LoanAppllication
+from loan_credit.response_cache import invalidate_loan_views
+from loan_credit.sequences import reseed_loan_ids
+from loan_credit.summaries import invalidate_summaries
+
+FILE_HASH_BLOCK_SIZE = 1024 * 1024
+# ids of API rows listed in the stats of a run , the rest are only counted
+TAKEN_KEYS_REPORTED = 20
+
+# kind -> (columns , key field , builder , model , filter of the built rows as in the full ingestion)
+SOURCES = {
+    'customers': (CUSTOMER_COLUMNS, 'customer_id', build_customer, Customer, drop_taken_phone_numbers),
+    'loans': (LOAN_COLUMNS, 'loan_id', build_loan, LoanAppllication, keep_loans),
+}
+
+
+def file_hash(path) -> str:
+    digest = hashlib.sha256()
+    with open(path, 'rb') as workbook:
+        for block in iter(lambda: workbook.read(FILE_HASH_BLOCK_SIZE), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def row_hash(row : dict) -> str:
+    # the cell values as openpyxl reads them , in column order
+    return hashlib.blake2b(repr(tuple(row.values())).encode(), digest_size=16).hexdigest()
+
+
+def numbered_chunks(rows, chunk_size : int):
+    """
+    Groups (row number , row) pairs into lists of up to `chunk_size`.
+    """
+    chunk = []
+    for numbered_row in rows:
+        chunk.append(numbered_row)
+        if len(chunk) >= chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def changed_rows(kind : str, chunk : list, seen : KeySet) -> list:
+    """
+    The rows of a chunk that are new or changed since they were last ingested , as (key , row , hash , whether
+    the key was ingested before). Rows whose key is in `seen` , the keys of the earlier rows of the file , are left
+    out so a repeated key keeps its first row like the full ingestion. The keys of the chunk are added to `seen`.
+    """
+    key_field = SOURCES[kind][1]
+    hashed = {}
+    for _, row in chunk:
+        key = int(row[key_field])
+        if seen.add(key):
+            hashed[f"{kind}:{key}"] = (row, row_hash(row))
+
+    stored = dict(IngestedRow.objects.filter(key__in=list(hashed)).values_list('key', 'row_hash'))
+    return [(key, row, digest, key in stored) for key, (row, digest) in hashed.items() if stored.get(key) != digest]
+
+
+def current_owners(model, pks : list) -> dict:
+    """
+    pk -> customer_id of the rows that already exist , for customers the customer_id is the pk.
+    """
+    if not pks:
+        return {}
+    owner = 'customer_id' if model is LoanAppllication else 'pk'
+    return dict(model.objects.filter(pk__in=pks).values_list('pk', owner))
+
+
+def seen_keys(path, columns : dict, key_field : str, rows_done : int) -> KeySet:
+    """
+    The keys of the first `rows_done` rows , committed by an earlier run of the same file.
+    """
+    seen = KeySet()
+    if rows_done:
+        for _, row in iter_sheet_rows(path, columns, max_row=rows_done):
+            seen.add(int(row[key_field]))
+    return seen
+
+
+def ingest_delta(kind : str, path, chunk_size=None, use_copy=None) -> dict:
+    """
+    Writes the new and changed rows of one workbook , starting after the last committed chunk when an earlier
+    run on the same file did not finish.
+
+    Returns:
+        dict: rows read , rows written , rows unchanged , the row the run resumed after , whether the file was
+        skipped as already ingested , rows left out for a repeated key , rows left out because the API owns their
+        key (with the first TAKEN_KEYS_REPORTED of those keys) , rows left out by the filter of the full ingestion
+        (taken phone numbers , archived loans , loans of customers not stored) , seconds taken , rows per second ,
+        the peak RSS of the process in MB and the KB taken by the keys seen.
+    """
+    columns, key_field, build, model, keep = SOURCES[kind]
+    chunk_size = chunk_size or settings.INGESTION_CHUNK_SIZE
+    started = time.perf_counter()
+
+    source = f"{kind}:{os.path.abspath(path)}"
+    digest = file_hash(path)
+    checkpoint, _ = IngestionCheckpoint.objects.get_or_create(source=source, defaults={'file_hash': digest})
+    if checkpoint.file_hash != digest:
+        # a new version of the workbook , every row is compared against its stored hash from the start
+        checkpoint.file_hash = digest
+        checkpoint.rows_done = 0
+        checkpoint.completed_at = None
+        checkpoint.save()
+
+    stats = {
+        'rows': 0, 'written': 0, 'unchanged': 0, 'repeated': 0, 'taken': 0, 'taken_keys': [], 'left_out': 0, 'key_set_kb': 0.0,
+        'resumed_after': checkpoint.rows_done, 'skipped': checkpoint.completed_at is not None,
+    }
+    if not stats['skipped']:
+        seen = seen_keys(path, columns, key_field, checkpoint.rows_done)
+        rows = iter_sheet_rows(path, columns, min_row=checkpoint.rows_done + 1)
+        for chunk in numbered_chunks(rows, chunk_size):
+            keys_before = len(seen)
+            changed = changed_rows(kind, chunk, seen)
+            repeated = len(chunk) - (len(seen) - keys_before)
+
+            # a key the workbook never brought before but with a row already is an API row , it is not overwritten
+            owners = current_owners(model, [int(row[key_field]) for _, row, _, _ in changed])
+            taken = [int(row[key_field]) for _, row, _, ingested in changed if not ingested and int(row[key_field]) in owners]
+            if taken:
+                taken_set = set(taken)
+                changed = [change for change in changed if int(change[1][key_field]) not in taken_set]
+
+            objects = [build(row) for _, row, _, _ in changed]
+            if objects:
+                objects = keep(objects)
+            if len(objects) < len(changed):
+                # rows left out keep their old hash , so a later run tries them again
+                written = {obj.pk for obj in objects}
+                left_out = len(changed) - len(objects)
+                changed = [change for change in changed if int(change[1][key_field]) in written]
+            else:
+                left_out = 0
+            # loans moving to another customer , the previous owner's summary and views count them too
+            previous_owners = set()
+            if objects and model is LoanAppllication:
+                previous_owners = {
+                    owners[loan.pk] for loan in objects if loan.pk in owners and owners[loan.pk] != loan.customer_id_id
+                }
+
+            # the rows , their hashes and the checkpoint commit together
+            with transaction.atomic():
+                if objects:
+                    insert_chunk(model, objects, use_copy, upsert=True)
+                    if model is LoanAppllication:
+                        # bulk writes skip the model signals
+                        invalidate_summaries({loan.customer_id_id for loan in objects} | previous_owners)
+                if changed:
+                    insert_chunk(IngestedRow, [IngestedRow(key=key, row_hash=digest) for key, _, digest, _ in changed], use_copy, upsert=True)
+                IngestionCheckpoint.objects.filter(pk=source).update(rows_done=chunk[-1][0], updated_at=timezone.now())
+            if objects:
+                evict_cached_views(model, objects)
+            if previous_owners:
+                invalidate_loan_views(customer_ids=previous_owners)
+
+            stats['rows'] += len(chunk)
+            stats['written'] += len(objects)
+            stats['unchanged'] += len(chunk) - repeated - len(changed) - len(taken) - left_out
+            stats['repeated'] += repeated
+            stats['taken'] += len(taken)
+            stats['left_out'] += left_out
+            stats['taken_keys'] += taken[:TAKEN_KEYS_REPORTED - len(stats['taken_keys'])]
+        stats['key_set_kb'] = round(seen.nbytes / 1024, 1)
+        IngestionCheckpoint.objects.filter(pk=source).update(completed_at=timezone.now(), updated_at=timezone.now())
+
+    seconds = time.perf_counter() - started
+    stats.update({
+        'seconds': round(seconds, 3),
+        'rows_per_second': round(stats['rows'] / seconds, 1) if seconds else 0.0,
+        'peak_rss_mb': round(peak_rss_mb(), 1),
+    })
+    return stats
+
+
+def ingest_delta_workbooks(customers_path, loans_path, **options) -> dict:
+    """
+    Delta run over both workbooks , customers first since the loans reference them. The id sources are moved
+    past any imported ids afterwards.
+
+    Returns:
+        dict: The stats of ingest_delta per workbook.
+    """
+    report = {
+        'customers': ingest_delta('customers', customers_path, **options),
+        'loans': ingest_delta('loans', loans_path, **options),
+    }
+    if report['customers']['written']:
+        reset_customer_id_sequence()
+    if report['loans']['written']:
+        reseed_loan_ids()
+    return report
+
+
+def format_delta_stats(label : str, stats : dict) -> str:
+    if stats['skipped']:
+        return f"{label}: unchanged file , skipped in {stats['seconds']}s"
+    resumed = f" , resumed after row {stats['resumed_after']}" if stats['resumed_after'] else ""
+    repeated = f" , {stats['repeated']} repeated" if stats['repeated'] else ""
+    if stats['taken']:
+        repeated += f" , {stats['taken']} left out as their ids belong to API rows ({', '.join(map(str, stats['taken_keys']))})"
+    if stats['left_out']:
+        repeated += f" , {stats['left_out']} left out for a taken phone number , an archived loan or a missing customer"
+    return (
+        f"{label}: {stats['rows']} rows read , {stats['written']} written , {stats['unchanged']} unchanged{repeated} "
+        f"in {stats['seconds']}s ({stats['rows_per_second']} rows/s){resumed} , "
+        f"peak RSS {stats['peak_rss_mb']} MB , repeated key check {stats['key_set_kb']} KB"
+    )
@@ -3,10 +3,14 @@ from rest_framework.views import exception_handler
 from django.db import IntegrityError, DatabaseError
 from rest_framework.response import Response
 from rest_framework import status
+from loan_credit.metrics import exceptions_handled
 
 
 def main_exception_handler(exc, context):
 
+    # counted per exception class for /metrics
+    exceptions_handled.inc(type(exc).__name__)
+
         # it handle DRF standare exceptions first
     response = exception_handler(exc, context)
 
@@ -0,0 +1,202 @@
+"""
+Streaming export of the loan and customer tables for analytics.
+
+Rows are read in primary key order with `.iterator(chunk_size=...)` , a server side cursor on PostgreSQL , and
+written out batch by batch as CSV or Parquet. Only one batch is in memory at a time however large the table is.
+Reads go through the database router like every other read , so they land on a replica when there is one.
+
+Used by the export_data command and the /export/<table>/ endpoint.
+"""
+import csv
+import io
+import time
+from itertools import chain
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+from django.conf import settings
+from django.db.models import BooleanField, Value
+
+from loan_credit.ingestion import current_rss_mb
+from loan_credit.models import ArchivedLoan, Customer, LoanAppllication
+from loan_credit.pagination import iter_batches
+
+EXPORT_COLUMNS = {
+    'loans': {
+        'loan_id': pa.int64(),
+        'customer_id': pa.int64(),
+        'loan_amount': pa.float64(),
+        'tenure': pa.int64(),
+        'interest_rate': pa.float64(),
+        'monthly_installment': pa.float64(),
+        'emis_paid_on_time': pa.int64(),
+        'date_of_approval': pa.date32(),
+        'end_date': pa.date32(),
+        'loan_approved': pa.bool_(),
+    },
+    'customers': {
+        'customer_id': pa.int64(),
+        'first_name': pa.string(),
+        'last_name': pa.string(),
+        'age': pa.int64(),
+        'phone_number': pa.string(),
+        'monthly_income': pa.int64(),
+        'approved_limit': pa.int64(),
+    },
+}
+
+CONTENT_TYPES = {
+    'csv': 'text/csv',
+    'parquet': 'application/vnd.apache.parquet',
+}
+
+
+def export_querysets(table : str, approved_from=None, approved_to=None, customer_id=None, include_archived=False) -> list:
+    """
+    The querysets whose rows make up an export , each a values_list in EXPORT_COLUMNS order sorted by primary key.
+    Archived loans follow the live ones.
+    """
+    columns = list(EXPORT_COLUMNS[table])
+    if table == 'customers':
+        customers = Customer.objects.order_by('customer_id')
+        if customer_id is not None:
+            customers = customers.filter(customer_id=customer_id)
+        return [customers.values_list(*columns)]
+
+    filters = {}
+    if approved_from is not None:
+        filters['date_of_approval__gte'] = approved_from
+    if approved_to is not None:
+        filters['date_of_approval__lte'] = approved_to
+    if customer_id is not None:
+        filters['customer_id'] = customer_id
+
+    querysets = [LoanAppllication.objects.filter(**filters).order_by('loan_id').values_list(*columns)]
+    if include_archived:
+        # every archived loan was approved
+        archived = ArchivedLoan.objects.filter(**filters).order_by('loan_id').annotate(loan_approved=Value(True, output_field=BooleanField()))
+        querysets.append(archived.values_list(*columns))
+    return querysets
+
+
+def iter_export_batches(table : str, chunk_size=None, stats=None, **filters):
+    """
+    Lists of up to `chunk_size` row tuples. `stats` , when given , is updated in place with the rows and batches
+    read and the smallest and largest RSS seen between batches.
+    """
+    chunk_size = chunk_size or settings.EXPORT_CHUNK_SIZE
+    rows = chain.from_iterable(queryset.iterator(chunk_size=chunk_size) for queryset in export_querysets(table, **filters))
+    for batch in iter_batches(rows, chunk_size):
+        if stats is not None:
+            rss = current_rss_mb()
+            stats['rows'] = stats.get('rows', 0) + len(batch)
+            stats['batches'] = stats.get('batches', 0) + 1
+            stats['min_rss_mb'] = min(stats.get('min_rss_mb', rss), rss)
+            stats['max_rss_mb'] = max(stats.get('max_rss_mb', rss), rss)
+        yield batch
+
+
+def csv_chunks(columns : list, batches):
+    """
+    Yields a CSV document as one string per batch , after a header row.
+    """
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(columns)
+    yield buffer.getvalue()
+    for batch in batches:
+        buffer.seek(0)
+        buffer.truncate()
+        writer.writerows(batch)
+        yield buffer.getvalue()
+
+
+class _ChunkSink(io.RawIOBase):
+    """
+    A write-only file that keeps what was written until it is drained , so the Parquet writer's output
+    can be streamed out row group by row group.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.parts = []
+        self.position = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        data = bytes(data)
+        self.parts.append(data)
+        self.position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self.position
+
+    def drain(self) -> bytes:
+        data = b''.join(self.parts)
+        self.parts = []
+        return data
+
+
+def parquet_chunks(schema : pa.Schema, batches):
+    """
+    Yields a Parquet file as bytes , one row group per batch.
+    """
+    sink = _ChunkSink()
+    writer = pq.ParquetWriter(sink, schema, compression=settings.EXPORT_PARQUET_COMPRESSION)
+    try:
+        for batch in batches:
+            columns = zip(*batch)
+            writer.write_table(pa.Table.from_arrays([pa.array(column, type=field.type) for column, field in zip(columns, schema)], schema=schema))
+            yield sink.drain()
+    finally:
+        # the footer , written even when the table is empty
+        writer.close()
+    yield sink.drain()
+
+
+def export_chunks(table : str, output='csv', chunk_size=None, stats=None, **filters):
+    """
+    Yields the export of a table in the given output format , as str for CSV and bytes for Parquet.
+    """
+    batches = iter_export_batches(table, chunk_size, stats, **filters)
+    if output == 'parquet':
+        return parquet_chunks(pa.schema(list(EXPORT_COLUMNS[table].items())), batches)
+    return csv_chunks(list(EXPORT_COLUMNS[table]), batches)
+
+
+def write_export(table : str, stream, output='csv', chunk_size=None, **filters) -> dict:
+    """
+    Writes an export to an open file , a text stream for CSV and a binary one for Parquet.
+
+    Returns:
+        dict: rows and batches written , bytes , seconds , rows per second and the RSS range across the batches in MB.
+    """
+    stats = {}
+    written = 0
+    started = time.perf_counter()
+    for chunk in export_chunks(table, output, chunk_size, stats, **filters):
+        stream.write(chunk)
+        written += len(chunk)
+    seconds = time.perf_counter() - started
+
+    rows = stats.get('rows', 0)
+    return {
+        'rows': rows,
+        'batches': stats.get('batches', 0),
+        # characters for CSV , the same as bytes for ASCII data
+        'bytes': written,
+        'seconds': round(seconds, 3),
+        'rows_per_second': round(rows / seconds, 1) if seconds else 0.0,
+        'min_rss_mb': round(stats.get('min_rss_mb', 0.0), 1),
+        'max_rss_mb': round(stats.get('max_rss_mb', 0.0), 1),
+    }
+
+
+def format_export_stats(label : str, stats : dict) -> str:
+    return (
+        f"{label}: {stats['rows']} rows , {stats['bytes'] / (1024 * 1024):.1f} MB in {stats['seconds']}s "
+        f"({stats['rows_per_second']} rows/s) , RSS {stats['min_rss_mb']} - {stats['max_rss_mb']} MB across {stats['batches']} batches"
+    )
@@ -0,0 +1,134 @@
+"""
+Model-free serialization for the read endpoints.
+
+The view-loan and view-loans responses are rendered from `.values()` rows instead of model instances.
+Only the response columns are selected, the customer columns come through the join and
+`repayments_left` is computed in SQL. A RowSerializer compiles its field list into one
+(name, getter, converter) tuple per field, once at import time. Rendering a row is then a single loop
+over that tuple, without DRF's per-field lookups. The output is identical to ViewLoanApplicationResponse
+and ViewAllLoanApplicationsResponse.
+"""
+from operator import itemgetter
+
+from django.db.models import F, IntegerField, Value
+from django.db.models.functions import Coalesce
+
+from loan_credit.amortization import outstanding_principal
+from loan_credit.metrics import serializer_timer
+from loan_credit.models import ArchivedLoan
+
+
+class RowSerializer:
+    """
+    Renders dict rows with a fixed field list. Each field is `name=(source, converter)` , where a None
+    converter keeps the value as it is , or `name=RowSerializer(...)` for an object nested from the same row.
+    None values are rendered as None like DRF does.
+    """
+
+    def __init__(self, **fields):
+        compiled = []
+        for name, spec in fields.items():
+            if isinstance(spec, RowSerializer):
+                compiled.append((name, None, spec.to_representation))
+            else:
+                source, convert = spec
+                compiled.append((name, itemgetter(source), convert))
+        self.fields = tuple(compiled)
+
+    def to_representation(self, row : dict) -> dict:
+        data = {}
+        for name, getter, convert in self.fields:
+            if getter is None:
+                data[name] = convert(row)
+                continue
+            value = getter(row)
+            data[name] = value if value is None or convert is None else convert(value)
+        return data
+
+    def render(self, rows : list) -> list:
+        with serializer_timer():
+            to_representation = self.to_representation
+            return [to_representation(row) for row in rows]
+
+
+def customer_columns(relation : str) -> dict:
+    return {
+        'customer_pk': F(f'{relation}__customer_id'),
+        'customer_first_name': F(f'{relation}__first_name'),
+        'customer_last_name': F(f'{relation}__last_name'),
+        'customer_phone_number': F(f'{relation}__phone_number'),
+        'customer_age': F(f'{relation}__age'),
+    }
+
+
+LOAN_DETAIL_COLUMNS = customer_columns('customer_id')
+# ArchivedLoan names its customer relation `customer`
+ARCHIVED_LOAN_DETAIL_COLUMNS = customer_columns('customer')
+
+LOAN_DETAIL = RowSerializer(
+    loan_id=('loan_id', int),
+    customer=RowSerializer(
+        customer_id=('customer_pk', int),
+        first_name=('customer_first_name', str),
+        last_name=('customer_last_name', str),
+        phone_number=('customer_phone_number', str),
+        age=('customer_age', int),
+    ),
+    loan_amount=('loan_amount', float),
+    interest_rate=('interest_rate', float),
+    monthly_installment=('monthly_installment', float),
+    tenure=('tenure', int),
+    outstanding_principal=('outstanding_principal', None),
+)
+
+LOAN_LIST = RowSerializer(
+    loan_id=('loan_id', int),
+    loan_amount=('loan_amount', float),
+    interest_rate=('interest_rate', float),
+    monthly_installment=('monthly_installment', float),
+    repayments_left=('repayments_left', int),
+    outstanding_principal=('outstanding_principal', None),
+)
+
+
+def loan_detail_rows(queryset):
+    """
+    The columns of a view-loan response , the customer's through the join. Takes LoanAppllication
+    and ArchivedLoan querysets.
+    """
+    columns = ARCHIVED_LOAN_DETAIL_COLUMNS if queryset.model is ArchivedLoan else LOAN_DETAIL_COLUMNS
+    return queryset.values('loan_id', 'loan_amount', 'interest_rate', 'monthly_installment', 'tenure', 'emis_paid_on_time', **columns)
+
+
+def loan_list_rows(queryset):
+    """
+    The columns of a view-loans row , with the installments left computed by the database.
+    """
+    return queryset.values('loan_id', 'loan_amount', 'interest_rate', 'monthly_installment', 'tenure', 'emis_paid_on_time').annotate(
+        repayments_left=F('tenure') - Coalesce('emis_paid_on_time', Value(0), output_field=IntegerField()),
+    )
+
+
+def with_outstanding_principal(rows : list) -> list:
+    """
+    Adds the principal still owed to every row , computed for all rows in one array operation.
+    """
+    if rows:
+        balances = outstanding_principal(
+            [row['loan_amount'] for row in rows],
+            [row['interest_rate'] for row in rows],
+            [row['tenure'] for row in rows],
+            [row['emis_paid_on_time'] or 0 for row in rows],
+            [row['monthly_installment'] for row in rows],
+        )
+        for row, balance in zip(rows, balances.tolist()):
+            row['outstanding_principal'] = balance
+    return rows
+
+
+def render_loan_detail(row : dict) -> dict:
+    return LOAN_DETAIL.render(with_outstanding_principal([row]))[0]
+
+
+def render_loan_list(rows) -> list:
+    return LOAN_LIST.render(with_outstanding_principal(list(rows)))
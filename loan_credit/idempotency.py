@@ -0,0 +1,237 @@
+"""
+Idempotency-Key support for POST endpoints.
+
+A client sends the same `Idempotency-Key` header with every retry of one logical request.
+- The first request holds a short lock in the cache (Redis) while it runs.
+- It stores its response in IdempotencyRecord, in the same transaction as its own rows, and then in the cache.
+- A repeat of a completed request gets the stored response back without running the view.
+- A duplicate that arrives while the first request is still running waits for that response.
+
+The database is the fallback when the cache is flushed or unreachable. A response missing from the cache is read
+from IdempotencyRecord. Without a lock, the record's primary key still lets only one racing request commit, and the
+others replay its response.
+
+`idempotent` wraps DRF handlers , `aidempotent` the async Django views with the same flow.
+"""
+import asyncio
+import hashlib
+import time
+import uuid
+from functools import wraps
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.db import IntegrityError
+from rest_framework import status
+from rest_framework.response import Response
+
+from loan_credit.models import IdempotencyRecord
+
+IDEMPOTENCY_HEADER = 'Idempotency-Key'
+REPLAYED_HEADER = 'Idempotent-Replayed'
+MAX_KEY_LENGTH = 255
+
+RESPONSE_KEY = 'idempotency:{}'
+LOCK_KEY = 'idempotency-lock:{}'
+
+
+class IdempotencyConflict(Exception):
+    """
+    Another request with the same key committed first , the transaction of this one has to roll back.
+    """
+
+
+def _cache_call(method, *args, default=None, **kwargs):
+    # an unreachable cache only costs the fast path , the database keeps the guarantee
+    try:
+        return method(*args, **kwargs)
+    except Exception:
+        return default
+
+
+def _drf_response(data, status_code : int, headers=None) -> Response:
+    return Response(data, status=status_code, headers=headers)
+
+
+def _invalid_key(key : str, respond):
+    # the error response for a key that can not be stored , else None
+    if not key or len(key) > MAX_KEY_LENGTH:
+        return respond({"error": f"{IDEMPOTENCY_HEADER} must be 1 to {MAX_KEY_LENGTH} characters long"}, status.HTTP_400_BAD_REQUEST)
+    return None
+
+
+def _still_running(respond):
+    return respond({"error": f"A request with this {IDEMPOTENCY_HEADER} is still being processed"}, status.HTTP_409_CONFLICT)
+
+
+class IdempotentRequest:
+    """
+    One request carrying an Idempotency-Key , scoped to the endpoint it was sent to.
+    """
+
+    def __init__(self, scope : str, key : str, body : bytes):
+        self.key = f"{scope}:{key}"
+        self.fingerprint = hashlib.sha256(body).hexdigest()
+        self.token = uuid.uuid4().hex
+        self.response = None
+
+    def cached(self):
+        return _cache_call(cache.get, RESPONSE_KEY.format(self.key))
+
+    def stored(self):
+        """
+        The stored response as a dict of fingerprint , status and body , from the cache or else the database.
+        """
+        stored = self.cached()
+        if stored is not None:
+            return stored
+        record = IdempotencyRecord.objects.filter(pk=self.key).values('fingerprint', 'response_status', 'response_body').first()
+        if record is None:
+            return None
+        stored = {'fingerprint': record['fingerprint'], 'status': record['response_status'], 'body': record['response_body']}
+        _cache_call(cache.set, RESPONSE_KEY.format(self.key), stored, settings.IDEMPOTENCY_TTL_SECONDS)
+        return stored
+
+    def acquire(self) -> bool:
+        # without a cache every request goes ahead and the record's primary key decides
+        return _cache_call(cache.add, LOCK_KEY.format(self.key), self.token, settings.IDEMPOTENCY_LOCK_SECONDS, default=True)
+
+    def release(self) -> None:
+        # only our own lock , it may have expired and been taken by a retry
+        if _cache_call(cache.get, LOCK_KEY.format(self.key)) == self.token:
+            _cache_call(cache.delete, LOCK_KEY.format(self.key))
+
+    def record(self, status_code : int, body) -> None:
+        """
+        Stores the response. Call it inside the transaction that writes the request's rows.
+
+        Raises:
+            IdempotencyConflict: If a response is already stored under the key.
+        """
+        try:
+            IdempotencyRecord.objects.create(key=self.key, fingerprint=self.fingerprint, response_status=status_code, response_body=body)
+        except IntegrityError as exc:
+            raise IdempotencyConflict(self.key) from exc
+        self.response = {'fingerprint': self.fingerprint, 'status': status_code, 'body': body}
+
+    def publish(self) -> None:
+        """
+        Caches the recorded response once its transaction has committed.
+        """
+        if self.response is not None:
+            _cache_call(cache.set, RESPONSE_KEY.format(self.key), self.response, settings.IDEMPOTENCY_TTL_SECONDS)
+
+    def replay(self, stored, respond=_drf_response):
+        """
+        The stored response , built with `respond(data , status , headers)`.
+        """
+        if stored['fingerprint'] != self.fingerprint:
+            return respond(
+                {"error": f"This {IDEMPOTENCY_HEADER} was already used with a different request body"},
+                status.HTTP_422_UNPROCESSABLE_ENTITY,
+            )
+        return respond(stored['body'], stored['status'], {REPLAYED_HEADER: 'true'})
+
+
+def record_idempotent_response(request, status_code : int, body) -> None:
+    """
+    Stores the response of a view wrapped in `idempotent` , a no-op for requests without a key.
+    """
+    idempotent_request = getattr(request, 'idempotency', None)
+    if idempotent_request is not None:
+        idempotent_request.record(status_code, body)
+
+
+def idempotent(scope : str):
+    """
+    Makes an APIView handler idempotent for requests with an Idempotency-Key header. The handler calls
+    record_idempotent_response inside the transaction of its writes , responses it does not record (errors)
+    are not replayed , so a retry runs again.
+    """
+    def decorator(handler):
+        @wraps(handler)
+        def wrapper(view, request, *args, **kwargs):
+            key = request.headers.get(IDEMPOTENCY_HEADER)
+            if key is None:
+                return handler(view, request, *args, **kwargs)
+            invalid = _invalid_key(key, _drf_response)
+            if invalid is not None:
+                return invalid
+
+            idempotent_request = IdempotentRequest(scope, key, request.body)
+            deadline = time.monotonic() + settings.IDEMPOTENCY_WAIT_SECONDS
+            # completed requests are answered from the cache , duplicates of a running one wait for it
+            while True:
+                stored = idempotent_request.cached()
+                if stored is not None:
+                    return idempotent_request.replay(stored)
+                if idempotent_request.acquire():
+                    break
+                if time.monotonic() >= deadline:
+                    return _still_running(_drf_response)
+                time.sleep(settings.IDEMPOTENCY_POLL_SECONDS)
+
+            try:
+                # the response may only be in the database , or the lock holder finished before we took it
+                stored = idempotent_request.stored()
+                if stored is not None:
+                    return idempotent_request.replay(stored)
+
+                request.idempotency = idempotent_request
+                try:
+                    response = handler(view, request, *args, **kwargs)
+                except IdempotencyConflict:
+                    return idempotent_request.replay(idempotent_request.stored())
+                idempotent_request.publish()
+                return response
+            finally:
+                idempotent_request.release()
+        return wrapper
+    return decorator
+
+
+def aidempotent(scope : str, respond):
+    """
+    `idempotent` for the handlers of async Django views. Responses are built with `respond(data , status , headers)`.
+    The handler records its response with record_idempotent_response inside the transaction of its writes ,
+    which runs in sync code anyway since the async ORM has no transactions.
+    """
+    def decorator(handler):
+        @wraps(handler)
+        async def wrapper(view, request, *args, **kwargs):
+            key = request.headers.get(IDEMPOTENCY_HEADER)
+            if key is None:
+                return await handler(view, request, *args, **kwargs)
+            invalid = _invalid_key(key, respond)
+            if invalid is not None:
+                return invalid
+
+            idempotent_request = IdempotentRequest(scope, key, request.body)
+            deadline = time.monotonic() + settings.IDEMPOTENCY_WAIT_SECONDS
+            while True:
+                stored = await sync_to_async(idempotent_request.cached)()
+                if stored is not None:
+                    return idempotent_request.replay(stored, respond)
+                if await sync_to_async(idempotent_request.acquire)():
+                    break
+                if time.monotonic() >= deadline:
+                    return _still_running(respond)
+                await asyncio.sleep(settings.IDEMPOTENCY_POLL_SECONDS)
+
+            try:
+                stored = await sync_to_async(idempotent_request.stored)()
+                if stored is not None:
+                    return idempotent_request.replay(stored, respond)
+
+                request.idempotency = idempotent_request
+                try:
+                    response = await handler(view, request, *args, **kwargs)
+                except IdempotencyConflict:
+                    return idempotent_request.replay(await sync_to_async(idempotent_request.stored)(), respond)
+                await sync_to_async(idempotent_request.publish)()
+                return response
+            finally:
+                await sync_to_async(idempotent_request.release)()
+        return wrapper
+    return decorator
@@ -0,0 +1,502 @@
+"""
+Streaming ingestion of the customer and loan workbooks.
+
+Rows are read with openpyxl in read-only mode and handed on in fixed-size chunks, so
+the rows in memory stay bounded however large the workbook is. Each chunk is turned into model objects
+and inserted on its own , through COPY on PostgreSQL and bounded bulk_create elsewhere.
+Keeping the first row of a repeated key needs the keys seen so far , they are kept in a KeySet ,
+one bit per key of the id range (about 600 KB for 5M dense ids) instead of a Python set of ints.
+
+A workbook can not be read from the middle , openpyxl parses every row before the first one it returns.
+For the fan-out across workers split_workbook reads it once and deals the rows out to CSV partition files ,
+which the partition tasks read instead.
+"""
+import csv
+import datetime as dt
+import io
+import os
+import resource
+import time
+
+from django.conf import settings
+from django.core.management.color import no_style
+from django.db import connection, transaction
+from openpyxl import load_workbook
+
+from loan_credit.models import ArchivedLoan, Customer, IngestedRow, LoanAppllication
+from loan_credit.response_cache import invalidate_loan_views
+
+CUSTOMER_COLUMNS = {
+    'Customer ID': 'customer_id',
+    'First Name': 'first_name',
+    'Last Name': 'last_name',
+    'Age': 'age',
+    'Phone Number': 'phone_number',
+    'Monthly Salary': 'monthly_income',
+    'Approved Limit': 'approved_limit',
+}
+
+LOAN_COLUMNS = {
+    'Customer ID': 'customer_id',
+    'Loan ID': 'loan_id',
+    'Loan Amount': 'loan_amount',
+    'Tenure': 'tenure',
+    'Interest Rate': 'interest_rate',
+    'Monthly payment': 'monthly_installment',
+    'EMIs paid on Time': 'emis_paid_on_time',
+    'Date of Approval': 'date_of_approval',
+    'End Date': 'end_date',
+}
+
+# partition files written by split_workbook
+PARTITION_SUFFIX = '.csv'
+# keys per KeySet page , a page is 4 KB
+KEY_SET_PAGE_KEYS = 2 ** 15
+
+
+class IngestionMismatch(Exception):
+    """
+    The rows the partitions read , or the rows in the tables , do not add up to the rows split from the workbooks.
+    """
+
+    def __init__(self, report : dict):
+        super().__init__(f"Ingestion counts do not add up: {report}")
+        self.report = report
+
+
+class KeySet:
+    """
+    Set of integer keys as a bitmap , one bit per key. Pages of KEY_SET_PAGE_KEYS keys are allocated as keys
+    come in , so the ids of a workbook (dense , from 1 up) cost about one bit each where a set of ints costs
+    about 60 bytes each. Sparse keys cost up to a page each.
+    """
+
+    def __init__(self):
+        self._pages = {}
+        self._count = 0
+
+    def add(self, key : int) -> bool:
+        # True when the key was not in the set yet
+        page, bit = divmod(key, KEY_SET_PAGE_KEYS)
+        bits = self._pages.get(page)
+        if bits is None:
+            bits = self._pages[page] = bytearray(KEY_SET_PAGE_KEYS // 8)
+        mask = 1 << (bit & 7)
+        if bits[bit >> 3] & mask:
+            return False
+        bits[bit >> 3] |= mask
+        self._count += 1
+        return True
+
+    def __contains__(self, key : int) -> bool:
+        page, bit = divmod(key, KEY_SET_PAGE_KEYS)
+        bits = self._pages.get(page)
+        return bits is not None and bool(bits[bit >> 3] & (1 << (bit & 7)))
+
+    def __len__(self) -> int:
+        return self._count
+
+    @property
+    def nbytes(self) -> int:
+        return len(self._pages) * KEY_SET_PAGE_KEYS // 8
+
+
+def current_rss_mb() -> float:
+    """
+    Resident set size of this process right now , falls back to the peak where /proc is not available.
+    """
+    try:
+        with open('/proc/self/statm') as statm:
+            return int(statm.read().split()[1]) * resource.getpagesize() / (1024 * 1024)
+    except OSError:
+        return peak_rss_mb()
+
+
+def peak_rss_mb() -> float:
+    # ru_maxrss is in kilobytes on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def iter_sheet_rows(path, columns : dict, min_row=None, max_row=None):
+    """
+    Yields (row number , row) for the non empty rows of the first sheet , each row a dict keyed by model field name.
+    `min_row` / `max_row` are 1-based data row numbers (the header is row 0) and bound the rows read.
+
+    Raises:
+        KeyError: If one of the expected columns is missing from the header.
+    """
+    workbook = load_workbook(path, read_only=True, data_only=True)
+    try:
+        rows = workbook.active.iter_rows(values_only=True)
+        header = next(rows, ())
+        missing = [name for name in columns if name not in header]
+        if missing:
+            raise KeyError(missing[0])
+        positions = [(header.index(name), field) for name, field in columns.items()]
+
+        for row_number, row in enumerate(rows, start=1):
+            if min_row is not None and row_number < min_row:
+                continue
+            if max_row is not None and row_number > max_row:
+                break
+            if all(value is None for value in row):
+                continue
+            yield row_number, {field: row[position] for position, field in positions}
+    finally:
+        workbook.close()
+
+
+def iter_partition_rows(path, columns : dict):
+    """
+    Yields the rows of a partition file written by split_workbook , each row a dict keyed by model field name.
+    Empty cells come back as None , the other values as strings.
+    """
+    fields = list(columns.values())
+    with open(path, newline='') as partition:
+        for values in csv.reader(partition):
+            yield {field: value if value != '' else None for field, value in zip(fields, values)}
+
+
+def first_rows(rows, key_field : str, seen=None):
+    """
+    Leaves out every row whose key came before , so a key repeated in a workbook keeps its first row
+    like the plain insert does. The keys seen are kept in `seen` , a KeySet.
+    """
+    seen = KeySet() if seen is None else seen
+    for row in rows:
+        if seen.add(int(row[key_field])):
+            yield row
+
+
+def read_sheet_chunks(path, columns : dict, chunk_size : int, min_row=None, max_row=None, key_field=None, seen=None):
+    """
+    Yields the rows of the first sheet , or of a partition file , as lists of dicts keyed by model field name ,
+    see iter_sheet_rows. With `key_field` only the first row of every key is kept , see first_rows.
+    """
+    if str(path).endswith(PARTITION_SUFFIX):
+        rows = iter_partition_rows(path, columns)
+    else:
+        rows = (row for _, row in iter_sheet_rows(path, columns, min_row, max_row))
+    if key_field is not None:
+        rows = first_rows(rows, key_field, seen)
+
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) >= chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def split_workbook(path, columns : dict, key_field : str, partitions : int, directory) -> dict:
+    """
+    Reads a workbook once and deals its rows out in turn to up to `partitions` CSV files in `directory`.
+    A key repeated in the workbook keeps its first row , so every key lands in exactly one partition and the
+    upserts of the partitions can not overwrite each other.
+
+    Returns:
+        dict: the partition files (empty ones left out) , the rows written , the repeated rows left out and the
+        KB taken by the keys seen.
+    """
+    os.makedirs(directory, exist_ok=True)
+    fields = list(columns.values())
+    paths = [os.path.join(directory, f"part-{index:03d}{PARTITION_SUFFIX}") for index in range(max(1, partitions))]
+    counts = [0] * len(paths)
+    seen = KeySet()
+    duplicates = 0
+
+    files = [open(partition_path, 'w', newline='') for partition_path in paths]
+    try:
+        writers = [csv.writer(partition) for partition in files]
+        for _, row in iter_sheet_rows(path, columns):
+            if not seen.add(int(row[key_field])):
+                duplicates += 1
+                continue
+            index = (len(seen) - 1) % len(paths)
+            writers[index].writerow(['' if row[field] is None else row[field] for field in fields])
+            counts[index] += 1
+    finally:
+        for partition in files:
+            partition.close()
+
+    for partition_path, count in zip(paths, counts):
+        if not count:
+            os.remove(partition_path)
+    return {
+        'files': [partition_path for partition_path, count in zip(paths, counts) if count],
+        'rows': len(seen),
+        'duplicates': duplicates,
+        'key_set_kb': round(seen.nbytes / 1024, 1),
+    }
+
+
+def _as_number(value, cast):
+    # partition files hold every value as a string
+    if value is None or value == '':
+        return None
+    return cast(value)
+
+
+def _as_date(value):
+    if isinstance(value, dt.datetime):
+        return value.date()
+    if isinstance(value, str):
+        return dt.date.fromisoformat(value[:10])
+    return value
+
+
+def build_customer(row : dict) -> Customer:
+    return Customer(
+        customer_id=int(row['customer_id']),
+        first_name=row['first_name'],
+        last_name=row['last_name'],
+        age=int(row['age']),
+        phone_number=str(row['phone_number']),
+        monthly_income=int(row['monthly_income']),
+        approved_limit=int(row['approved_limit']),
+    )
+
+
+def build_loan(row : dict) -> LoanAppllication:
+    return LoanAppllication(
+        loan_id=int(row['loan_id']),
+        customer_id_id=int(row['customer_id']),
+        loan_amount=float(row['loan_amount']),
+        tenure=int(row['tenure']),
+        interest_rate=float(row['interest_rate']),
+        monthly_installment=_as_number(row['monthly_installment'], float),
+        emis_paid_on_time=_as_number(row['emis_paid_on_time'], int),
+        date_of_approval=_as_date(row['date_of_approval']),
+        end_date=_as_date(row['end_date']),
+        loan_approved=True,
+    )
+
+
+def _copy_from(cursor, sql : str, data : io.StringIO) -> None:
+    # psycopg2 and psycopg 3 expose COPY differently
+    if hasattr(cursor, 'copy_expert'):
+        cursor.copy_expert(sql, data)
+    else:
+        with cursor.copy(sql) as copy:
+            copy.write(data.getvalue())
+
+
+def upsert_fields(model) -> list:
+    """
+    Fields overwritten when an ingested row already exists , everything but the key and the creation time.
+    """
+    return [
+        field for field in model._meta.concrete_fields
+        if not field.primary_key and field.name != 'created_at'
+    ]
+
+
+def dedupe_by_pk(objects : list) -> list:
+    """
+    Keeps the first object for every primary key , one upsert statement cannot touch a row twice.
+    """
+    unique = {}
+    for obj in objects:
+        unique.setdefault(obj.pk, obj)
+    return list(unique.values())
+
+
+def copy_insert(model, objects : list, upsert=False) -> None:
+    """
+    Inserts the objects with COPY into a staging table followed by one INSERT .. SELECT. Rows already present
+    are skipped the same way bulk_create(ignore_conflicts=True) does , or overwritten when `upsert` is set.
+    """
+    quote = connection.ops.quote_name
+    fields = model._meta.concrete_fields
+    table = quote(model._meta.db_table)
+    staging = quote(f"{model._meta.db_table}_staging")
+    column_list = ", ".join(quote(field.column) for field in fields)
+    if upsert:
+        assignments = ", ".join(f"{quote(field.column)} = EXCLUDED.{quote(field.column)}" for field in upsert_fields(model))
+        on_conflict = f"ON CONFLICT ({quote(model._meta.pk.column)}) DO UPDATE SET {assignments}"
+    else:
+        on_conflict = "ON CONFLICT DO NOTHING"
+
+    data = io.StringIO()
+    writer = csv.writer(data)
+    for obj in objects:
+        values = []
+        for field in fields:
+            value = field.get_db_prep_save(field.pre_save(obj, True), connection)
+            values.append('' if value is None else value)
+        writer.writerow(values)
+    data.seek(0)
+
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(f"CREATE TEMP TABLE {staging} (LIKE {table} INCLUDING DEFAULTS) ON COMMIT DROP")
+        _copy_from(cursor, f"COPY {staging} ({column_list}) FROM STDIN WITH (FORMAT csv)", data)
+        cursor.execute(f"INSERT INTO {table} ({column_list}) SELECT {column_list} FROM {staging} {on_conflict}")
+        cursor.execute(f"DROP TABLE {staging}")
+
+
+def insert_chunk(model, objects : list, use_copy=None, upsert=False) -> None:
+    """
+    Inserts one chunk. Rows whose primary key already exists are skipped , or updated in place when `upsert` is set
+    so a re-run picks up changed rows and a retried partition is harmless.
+    """
+    if use_copy is None:
+        use_copy = settings.INGESTION_USE_COPY
+    if upsert:
+        objects = dedupe_by_pk(objects)
+
+    if use_copy and connection.vendor == 'postgresql':
+        copy_insert(model, objects, upsert=upsert)
+    elif upsert:
+        model.objects.bulk_create(
+            objects,
+            batch_size=settings.INGESTION_BATCH_SIZE,
+            update_conflicts=True,
+            unique_fields=[model._meta.pk.name],
+            update_fields=[field.name for field in upsert_fields(model)],
+        )
+    else:
+        model.objects.bulk_create(objects, batch_size=settings.INGESTION_BATCH_SIZE, ignore_conflicts=True)
+
+
+def ingested_row_key(model, pk) -> str:
+    # "<customers|loans>:<Customer ID / Loan ID>" , see IngestedRow
+    return f"{'loans' if model is LoanAppllication else 'customers'}:{pk}"
+
+
+def mark_ingested(model, objects : list, use_copy=None) -> None:
+    """
+    Records the objects as imported from a workbook , so the delta ingestion tells them apart from the rows
+    created through the API. Without a row hash , the next delta run writes them once more and stores it.
+    """
+    insert_chunk(IngestedRow, [IngestedRow(key=ingested_row_key(model, obj.pk), row_hash='') for obj in objects], use_copy, upsert=True)
+
+
+def evict_cached_views(model, objects : list) -> None:
+    """
+    Bulk inserts skip the model signals , so the cached loan views of the chunk are evicted here.
+    """
+    if model is LoanAppllication:
+        invalidate_loan_views(
+            loan_ids=[loan.loan_id for loan in objects],
+            customer_ids={loan.customer_id_id for loan in objects},
+        )
+    else:
+        customer_ids = [customer.pk for customer in objects]
+        loan_ids = (
+            LoanAppllication.objects.filter(customer_id__in=customer_ids).values_list('loan_id', flat=True)
+            .union(ArchivedLoan.objects.filter(customer_id__in=customer_ids).values_list('loan_id', flat=True), all=True)
+        )
+        invalidate_loan_views(loan_ids=list(loan_ids), customer_ids=customer_ids)
+
+
+def ingest_sheet(path, columns : dict, build, model, chunk_size=None, use_copy=None, upsert=False, on_chunk=None, keep=None, mark=False, **read_options) -> dict:
+    """
+    Streams one workbook into the database chunk by chunk. `keep` , when given , filters the built objects of a chunk.
+    An upsert keeps the first row of a repeated key , like the plain insert. With `mark` every chunk is recorded
+    in IngestedRow in the same transaction , see mark_ingested.
+
+    Returns:
+        dict: rows written , rows left out by `keep` , seconds taken , rows per second , the peak RSS of the process
+        in MB and for an upsert the KB taken by the keys seen.
+    """
+    chunk_size = chunk_size or settings.INGESTION_CHUNK_SIZE
+    started = time.perf_counter()
+    rows = 0
+    left_out = 0
+    rss_samples = []
+
+    key_field = model._meta.pk.name if upsert else None
+    seen = KeySet()
+    for chunk in read_sheet_chunks(path, columns, chunk_size, key_field=key_field, seen=seen, **read_options):
+        objects = [build(row) for row in chunk]
+        if keep is not None:
+            objects = keep(objects)
+            left_out += len(chunk) - len(objects)
+        with transaction.atomic():
+            insert_chunk(model, objects, use_copy, upsert)
+            if mark:
+                mark_ingested(model, objects, use_copy)
+        evict_cached_views(model, objects)
+        rows += len(objects)
+        rss_samples.append(current_rss_mb())
+        if on_chunk is not None:
+            on_chunk(objects)
+
+    seconds = time.perf_counter() - started
+    return {
+        'rows': rows,
+        'left_out': left_out,
+        'seconds': round(seconds, 3),
+        'rows_per_second': round(rows / seconds, 1) if seconds else 0.0,
+        'peak_rss_mb': round(peak_rss_mb(), 1),
+        'min_chunk_rss_mb': round(min(rss_samples), 1) if rss_samples else 0.0,
+        'max_chunk_rss_mb': round(max(rss_samples), 1) if rss_samples else 0.0,
+        'key_set_kb': round(seen.nbytes / 1024, 1),
+    }
+
+
+def drop_taken_phone_numbers(customers : list) -> list:
+    """
+    Leaves out the customers whose phone number belongs to another customer , stored or earlier in the list.
+    Phone numbers are unique , like /register/bulk/ the clashing rows are skipped and counted instead of
+    failing the whole chunk.
+    """
+    owners = dict(Customer.objects.filter(phone_number__in={customer.phone_number for customer in customers}).values_list('phone_number', 'customer_id'))
+    kept = []
+    for customer in customers:
+        if owners.setdefault(customer.phone_number, customer.customer_id) == customer.customer_id:
+            kept.append(customer)
+    return kept
+
+
+def ingest_customers(path, **options) -> dict:
+    stats = ingest_sheet(path, CUSTOMER_COLUMNS, build_customer, Customer, keep=drop_taken_phone_numbers, **options)
+    reset_customer_id_sequence()
+    return stats
+
+
+def drop_archived_loans(loans : list) -> list:
+    """
+    Leaves out the loans already moved to ArchivedLoan , importing them again would count them twice.
+    """
+    archived = set(ArchivedLoan.objects.filter(loan_id__in=[loan.loan_id for loan in loans]).values_list('loan_id', flat=True))
+    if not archived:
+        return loans
+    return [loan for loan in loans if loan.loan_id not in archived]
+
+
+def keep_loans(loans : list) -> list:
+    """
+    Drops the archived loans and the loans of customers that are not stored , such as a customer left out for
+    a taken phone number. Their foreign key would fail the whole chunk.
+    """
+    loans = drop_archived_loans(loans)
+    customers = set(Customer.objects.filter(customer_id__in={loan.customer_id_id for loan in loans}).values_list('customer_id', flat=True))
+    return [loan for loan in loans if loan.customer_id_id in customers]
+
+
+def ingest_loans(path, **options) -> dict:
+    return ingest_sheet(path, LOAN_COLUMNS, build_loan, LoanAppllication, keep=keep_loans, **options)
+
+
+def reset_customer_id_sequence() -> None:
+    """
+    Customers are imported with their own ids , so the auto increment has to move past them
+    before /register/ can insert again. Only PostgreSQL keeps a separate sequence.
+    """
+    statements = connection.ops.sequence_reset_sql(no_style(), [Customer])
+    if statements:
+        with connection.cursor() as cursor:
+            for statement in statements:
+                cursor.execute(statement)
+
+
+def format_stats(label : str, stats : dict) -> str:
+    left_out = f" , {stats['left_out']} left out" if stats.get('left_out') else ""
+    key_set = f" , repeated key check {stats['key_set_kb']} KB" if stats.get('key_set_kb') else ""
+    return (
+        f"{label}: {stats['rows']} rows{left_out} in {stats['seconds']}s "
+        f"({stats['rows_per_second']} rows/s), peak RSS {stats['peak_rss_mb']} MB{key_set}"
+    )
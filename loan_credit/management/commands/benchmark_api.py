@@ -0,0 +1,103 @@
+import asyncio
+import datetime as dt
+import json
+import os
+import random
+
+from django.core.management.base import BaseCommand, CommandError
+
+from loan_credit.benchmarks import API_REQUESTS, api_client, api_endpoint_names, compare_to_baseline, rolled_back, run_requests, sample_api_data
+from loan_credit.metrics import request_queries
+
+
+class Command(BaseCommand):
+    help = (
+        "Load tests every endpoint of loan_credit/urls.py on a running server and reports throughput , p50/p95/p99 "
+        "latency and queries per request. The results are compared with a JSON baseline and the command fails when "
+        "an endpoint got worse by more than --threshold. The write endpoints insert real rows , run it against a "
+        "load test database (see generate_synthetic_data)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--base-url', default='http://localhost:8000', help="Base URL of the server under test.")
+        parser.add_argument('--async-url', default=None, help="Base URL for the async/ endpoints (default --base-url).")
+        parser.add_argument('--endpoints', nargs='+', default=None, help="URL names to run (default every endpoint).")
+        parser.add_argument('--concurrency', type=int, default=50, help="Concurrent clients.")
+        parser.add_argument('--requests', type=int, default=1000, help="Requests per endpoint.")
+        parser.add_argument('--query-sample', type=int, default=20, help="Requests per endpoint run in-process to count queries.")
+        parser.add_argument('--baseline', default='benchmark_api_baseline.json', help="Baseline JSON file.")
+        parser.add_argument('--threshold', type=float, default=0.2, help="Allowed slowdown as a fraction before a run fails.")
+        parser.add_argument('--update-baseline', action='store_true', help="Store this run as the new baseline.")
+
+    def count_queries(self, name, requests):
+        """
+        Queries per request of an endpoint , measured by running requests in this process and rolling them back.
+        """
+        client = api_client()
+        before_count, before_sum = request_queries.count(name), request_queries.sum(name)
+        with rolled_back():
+            for method, path, payload in requests:
+                if method == 'GET':
+                    client.get(path)
+                else:
+                    client.post(path, json.dumps(payload), content_type='application/json')
+        count = request_queries.count(name) - before_count
+        return round((request_queries.sum(name) - before_sum) / count, 2) if count else 0.0
+
+    def handle(self, *args, **options):
+        names = options['endpoints'] or api_endpoint_names()
+        unknown = [name for name in names if name not in API_REQUESTS]
+        if unknown:
+            raise CommandError(f"No request builder for: {', '.join(unknown)}")
+
+        sample = sample_api_data()
+        if not sample.customer_ids or not sample.loan_ids:
+            raise CommandError("No customers or approved loans in the database , run generate_synthetic_data first.")
+
+        rng = random.Random(7)
+        base_url = options['base_url'].rstrip('/')
+        async_url = (options['async_url'] or options['base_url']).rstrip('/')
+
+        results = {}
+        self.stdout.write(f"{'endpoint':<34} {'req/s':>9} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'queries':>8} {'errors':>7}")
+        for name in names:
+            requests = [API_REQUESTS[name](sample, rng) for _ in range(min(options['requests'], 1000))]
+            url = async_url if name.startswith('async_') else base_url
+            result = asyncio.run(run_requests(
+                [(method, url + path, payload) for method, path, payload in requests],
+                options['concurrency'],
+                options['requests'],
+            ))
+            result['queries_per_request'] = self.count_queries(name, requests[:options['query_sample']])
+            results[name] = result
+            self.stdout.write(
+                f"{name:<34} {result['requests_per_second']:>9} {result['p50_ms']:>9} {result['p95_ms']:>9} "
+                f"{result['p99_ms']:>9} {result['queries_per_request']:>8} {result['errors']:>7}"
+            )
+
+        run = {
+            'recorded_at': dt.datetime.now().isoformat(timespec='seconds'),
+            'concurrency': options['concurrency'],
+            'requests': options['requests'],
+            'endpoints': results,
+        }
+        path = options['baseline']
+        if options['update_baseline'] or not os.path.exists(path):
+            with open(path, 'w') as baseline_file:
+                json.dump(run, baseline_file, indent=2)
+            self.stdout.write(f"Baseline written to {path}")
+            return
+
+        with open(path) as baseline_file:
+            baseline = json.load(baseline_file)
+        if (baseline.get('concurrency'), baseline.get('requests')) != (options['concurrency'], options['requests']):
+            self.stderr.write(
+                f"Baseline was recorded with {baseline.get('concurrency')} clients and {baseline.get('requests')} requests , "
+                "the comparison may not be meaningful."
+            )
+        regressions = compare_to_baseline(results, baseline.get('endpoints', {}), options['threshold'])
+        if regressions:
+            raise CommandError(
+                f"{len(regressions)} regression(s) beyond {options['threshold']:.0%} of {path}:\n  " + "\n  ".join(regressions)
+            )
+        self.stdout.write(f"No regressions beyond {options['threshold']:.0%} of {path}")
@@ -0,0 +1,48 @@
+import asyncio
+import random
+
+from django.core.management.base import BaseCommand, CommandError
+
+from loan_credit.benchmarks import run_load
+from loan_credit.models import Customer
+
+
+class Command(BaseCommand):
+    help = (
+        "Load tests /check-eligibility/ on the sync (WSGI) server against /async/check-eligibility/ on the ASGI server "
+        "at several client counts. Both servers must be running on the same database."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sync-url', default='http://localhost:8000', help="Base URL of the WSGI server.")
+        parser.add_argument('--async-url', default='http://localhost:8001', help="Base URL of the ASGI server.")
+        parser.add_argument('--concurrency', type=int, nargs='+', default=[50, 200, 1000], help="Concurrent clients per run.")
+        parser.add_argument('--requests', type=int, default=2000, help="Requests per run.")
+
+    def handle(self, *args, **options):
+        customer_ids = list(Customer.objects.order_by('?').values_list('pk', flat=True)[:1000])
+        if not customer_ids:
+            raise CommandError("No customers in the database , seed some first.")
+
+        rng = random.Random(5)
+        payloads = [
+            {
+                "customer_id": rng.choice(customer_ids),
+                "loan_amount": rng.randrange(10000, 300000, 1000),
+                "interest_rate": rng.choice([8.0, 10.0, 12.5]),
+                "tenure": rng.choice([6, 12, 24, 36]),
+            }
+            for _ in range(1000)
+        ]
+        targets = {
+            'sync': options['sync_url'].rstrip('/') + '/api/check-eligibility/',
+            'async': options['async_url'].rstrip('/') + '/api/async/check-eligibility/',
+        }
+
+        self.stdout.write(f"{'clients':>8} {'path':<6} {'req/s':>9} {'p50 ms':>9} {'p99 ms':>9} {'errors':>7}")
+        for concurrency in options['concurrency']:
+            for name, url in targets.items():
+                result = asyncio.run(run_load(url, payloads, concurrency, options['requests']))
+                self.stdout.write(
+                    f"{concurrency:>8} {name:<6} {result['requests_per_second']:>9} {result['p50_ms']:>9} {result['p99_ms']:>9} {result['errors']:>7}"
+                )
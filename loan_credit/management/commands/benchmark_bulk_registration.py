@@ -0,0 +1,47 @@
+import random
+
+from django.core.management.base import BaseCommand
+from django.urls import reverse
+
+from loan_credit.benchmarks import api_client, rolled_back, timer
+
+
+class Command(BaseCommand):
+    help = "Compares /register/bulk/ with one /register/ call per customer. Benchmark data is rolled back."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', type=int, nargs='+', default=[1, 100, 10000], help="Batch sizes to measure.")
+        parser.add_argument('--single-limit', type=int, default=1000, help="Most single-item calls made per size , throughput is measured on this sample.")
+
+    def handle(self, *args, **options):
+        client = api_client()
+        rng = random.Random(7)
+
+        self.stdout.write(f"{'customers':>10} {'single rows/s':>14} {'bulk rows/s':>12} {'speedup':>9}")
+        for size in options['sizes']:
+            payloads = [
+                {
+                    "first_name": "Bulk",
+                    "last_name": f"Customer{index}",
+                    "age": rng.randint(21, 65),
+                    "monthly_income": rng.randrange(20000, 200000, 1000),
+                    "phone_number": f"{7000000000 + index}",
+                }
+                for index in range(size)
+            ]
+            sample = payloads[:options['single_limit']]
+
+            with rolled_back():
+                with timer() as single:
+                    for payload in sample:
+                        client.post(reverse('register'), payload, content_type='application/json')
+
+            with rolled_back():
+                with timer() as bulk:
+                    response = client.post(reverse('register_bulk'), payloads, content_type='application/json')
+                assert response.status_code == 200, response.content
+                assert all(result['status'] == 'ok' for result in response.json()), response.content
+
+            single_rate = len(sample) / single.elapsed
+            bulk_rate = size / bulk.elapsed
+            self.stdout.write(f"{size:>10} {single_rate:>14.1f} {bulk_rate:>12.1f} {bulk_rate / single_rate:>8.1f}x")
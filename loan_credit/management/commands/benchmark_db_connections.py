@@ -0,0 +1,72 @@
+import asyncio
+import base64
+import random
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from loan_credit.benchmarks import fetch_json, latency_summary, run_load, timer
+from loan_credit.models import Customer
+
+
+class Command(BaseCommand):
+    help = (
+        "Shows the cost of opening a database connection , then load tests /check-eligibility/ on one or more running "
+        "servers (e.g. one per DB_CONNECTION_MODE) and reports latency with the connections each server opened."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--urls', nargs='*', default=['http://localhost:8000'], help="Base URLs of the servers to compare.")
+        parser.add_argument('--connects', type=int, default=50, help="Connections opened to time the connect and auth cost.")
+        parser.add_argument('--concurrency', type=int, default=20, help="Concurrent clients per server.")
+        parser.add_argument('--requests', type=int, default=2000, help="Requests per server.")
+        parser.add_argument('--staff', default='', help="username:password of a staff user , /db-pool-stats/ is staff only.")
+
+    def handle(self, *args, **options):
+        if not options['staff']:
+            raise CommandError("Pass --staff username:password , the connection stats are staff only.")
+        headers = {'Authorization': 'Basic ' + base64.b64encode(options['staff'].encode()).decode()}
+        self.time_connects(options['connects'])
+
+        customer_ids = list(Customer.objects.order_by('?').values_list('pk', flat=True)[:1000])
+        if not customer_ids:
+            raise CommandError("No customers in the database , seed some first.")
+        rng = random.Random(9)
+        payloads = [
+            {"customer_id": rng.choice(customer_ids), "loan_amount": rng.randrange(10000, 300000, 1000), "interest_rate": 10.0, "tenure": 12}
+            for _ in range(1000)
+        ]
+
+        self.stdout.write(f"{'server':<28} {'mode':<11} {'req/s':>9} {'p50 ms':>9} {'p99 ms':>9} {'new conns/req':>14}")
+        for base_url in options['urls']:
+            base_url = base_url.rstrip('/')
+            stats_url = base_url + '/api/db-pool-stats/'
+            # the stats come from whichever worker answers , run the servers with one worker for exact counts
+            before = fetch_json(stats_url, headers)
+            result = asyncio.run(run_load(base_url + '/api/check-eligibility/', payloads, options['concurrency'], options['requests']))
+            after = fetch_json(stats_url, headers)
+
+            opened = after['connections_opened'] - before['connections_opened']
+            if after['pool']:
+                opened = after['pool']['connections_opened'] - (before['pool'] or {}).get('connections_opened', 0)
+            per_request = opened / options['requests']
+            self.stdout.write(
+                f"{base_url:<28} {after['mode']:<11} {result['requests_per_second']:>9} {result['p50_ms']:>9} {result['p99_ms']:>9} {per_request:>14.3f}"
+            )
+            if result['errors']:
+                self.stdout.write(self.style.WARNING(f"  {result['errors']} failed requests"))
+
+    def time_connects(self, count):
+        if count <= 0:
+            return
+        if connection.settings_dict.get('OPTIONS', {}).get('pool'):
+            self.stdout.write("Connect cost not measured , this process takes its connections from a pool.")
+            return
+        samples = []
+        for _ in range(count):
+            connection.close()
+            with timer() as elapsed:
+                connection.ensure_connection()
+            samples.append(elapsed.elapsed)
+        summary = latency_summary(samples)
+        self.stdout.write(f"Opening a connection (connect + auth): mean {summary['mean_ms']} ms , p99 {summary['p99_ms']} ms")
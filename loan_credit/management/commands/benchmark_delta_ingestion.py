@@ -0,0 +1,75 @@
+import os
+import tempfile
+import time
+
+from django.core.management.base import BaseCommand
+from openpyxl import Workbook
+
+from loan_credit.benchmarks import rolled_back
+from loan_credit.delta_ingestion import format_delta_stats, ingest_delta
+from loan_credit.ingestion import LOAN_COLUMNS, format_stats, ingest_customers, ingest_loans, iter_sheet_rows
+from loan_credit.management.commands.benchmark_ingestion import write_workbooks
+
+
+def write_changed_copy(loans_path, path, every : int) -> int:
+    """
+    Copies the loan workbook with one EMI more on every `every`-th loan. Returns the number of changed rows.
+    """
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet()
+    sheet.append(list(LOAN_COLUMNS))
+    changed = 0
+    for row_number, row in iter_sheet_rows(loans_path, LOAN_COLUMNS):
+        if row_number % every == 0:
+            row['emis_paid_on_time'] += 1
+            changed += 1
+        sheet.append(list(row.values()))
+    workbook.save(path)
+    return changed
+
+
+class Command(BaseCommand):
+    help = "Compares a full re-ingestion of the loan workbook with delta runs on an unchanged and a slightly changed copy. Loaded rows are rolled back."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=100000, help="Loan rows in the synthetic workbook.")
+        parser.add_argument('--changed-every', type=int, default=100, help="Every n-th loan is changed in the second version of the workbook.")
+        parser.add_argument('--chunk-size', type=int, default=None, help="Rows per chunk , defaults to INGESTION_CHUNK_SIZE.")
+        parser.add_argument('--no-copy', action='store_true', help="Use bulk_create even on PostgreSQL.")
+        parser.add_argument('--workdir', default=None, help="Directory for the workbooks , reused when they already exist.")
+
+    def handle(self, *args, **options):
+        rows = options['rows']
+        workdir = options['workdir'] or tempfile.mkdtemp(prefix='delta-ingestion-bench-')
+        os.makedirs(workdir, exist_ok=True)
+        customers_path = os.path.join(workdir, 'customers.xlsx')
+        loans_path = os.path.join(workdir, 'loans.xlsx')
+        changed_path = os.path.join(workdir, 'loans-changed.xlsx')
+
+        if not (os.path.exists(customers_path) and os.path.exists(loans_path)):
+            self.stdout.write(f"Writing {rows} loans to {workdir} ...")
+            write_workbooks(workdir, rows, max(1, rows // 10))
+        changed = write_changed_copy(loans_path, changed_path, options['changed_every'])
+
+        ingest_options = {'chunk_size': options['chunk_size'], 'use_copy': not options['no_copy']}
+        with rolled_back():
+            # marked as imported , as the full ingestion does
+            ingest_customers(customers_path, mark=True, **ingest_options)
+            ingest_loans(loans_path, mark=True, **ingest_options)
+            # what a daily re-run costs today
+            full = ingest_loans(loans_path, upsert=True, **ingest_options)
+            self.stdout.write(format_stats('Full re-ingestion', full))
+
+            # the first delta run hashes every row
+            self.stdout.write(format_delta_stats('Delta , first run', ingest_delta('loans', loans_path, **ingest_options)))
+            self.stdout.write(format_delta_stats('Delta , same file', ingest_delta('loans', loans_path, **ingest_options)))
+
+            # the refreshed workbook lands on the same path
+            os.replace(changed_path, loans_path)
+            started = time.perf_counter()
+            stats = ingest_delta('loans', loans_path, **ingest_options)
+            self.stdout.write(format_delta_stats(f'Delta , {changed} rows changed', stats))
+            self.stdout.write(
+                f"Changed file: {time.perf_counter() - started:.1f}s against {full['seconds']}s for the full re-ingestion "
+                f"({full['seconds'] / stats['seconds']:.1f}x)"
+            )
@@ -0,0 +1,47 @@
+import random
+
+from django.core.management.base import BaseCommand
+from django.urls import reverse
+
+from loan_credit.benchmarks import api_client, rolled_back, seed_customers, timer
+
+
+class Command(BaseCommand):
+    help = "Compares /check-eligibility/batch/ with one /check-eligibility/ call per applicant. Benchmark data is rolled back."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', type=int, nargs='+', default=[1, 100, 10000], help="Batch sizes to measure.")
+        parser.add_argument('--single-limit', type=int, default=1000, help="Most single-item calls made per size , throughput is measured on this sample.")
+
+    def handle(self, *args, **options):
+        client = api_client()
+        rng = random.Random(7)
+
+        self.stdout.write(f"{'items':>8} {'single items/s':>16} {'batch items/s':>15} {'speedup':>9}")
+        for size in options['sizes']:
+            with rolled_back():
+                customer_ids = seed_customers(size)
+                payloads = [
+                    {
+                        "customer_id": rng.choice(customer_ids),
+                        "loan_amount": rng.randrange(10000, 300000, 1000),
+                        "interest_rate": rng.choice([8.0, 10.0, 12.5]),
+                        "tenure": rng.choice([6, 12, 24, 36]),
+                    }
+                    for _ in range(size)
+                ]
+                # build the credit summaries first so both paths are measured warm
+                client.post(reverse('check_eligibility_batch'), payloads, content_type='application/json')
+
+                sample = payloads[:options['single_limit']]
+                with timer() as single:
+                    for payload in sample:
+                        client.post(reverse('check_eligibility'), payload, content_type='application/json')
+
+                with timer() as batch:
+                    response = client.post(reverse('check_eligibility_batch'), payloads, content_type='application/json')
+                assert response.status_code == 200, response.content
+
+            single_rate = len(sample) / single.elapsed
+            batch_rate = size / batch.elapsed
+            self.stdout.write(f"{size:>8} {single_rate:>16.1f} {batch_rate:>15.1f} {batch_rate / single_rate:>8.1f}x")
@@ -0,0 +1,65 @@
+import json
+import random
+import secrets
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.test import override_settings
+from django.urls import reverse
+
+from loan_credit.benchmarks import api_client, rolled_back, seed_customers, timer
+from loan_credit.models import LoanAppllication
+from loan_credit.payments import sign_payment_batch
+
+
+class Command(BaseCommand):
+    help = (
+        "Measures /emi-payments/ throughput in events per second , in batches and one event per request. "
+        "A share of the events repeats an earlier payment id. Benchmark data is rolled back."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--customers', type=int, default=2000, help="Customers seeded , with three loans each.")
+        parser.add_argument('--events', type=int, default=100000, help="Payment events sent in batches.")
+        parser.add_argument('--batch-sizes', type=int, nargs='+', default=[1000, 10000], help="Events per request to measure.")
+        parser.add_argument('--duplicate-ratio', type=float, default=0.05, help="Share of events that redeliver an earlier payment id.")
+        parser.add_argument('--single-limit', type=int, default=1000, help="Events sent one per request , for comparison.")
+
+    def events(self, loan_ids, count, duplicate_ratio, rng, prefix):
+        events = []
+        for index in range(count):
+            if events and rng.random() < duplicate_ratio:
+                events.append(dict(rng.choice(events)))
+            else:
+                events.append({"payment_id": f"{prefix}-{index}", "loan_id": rng.choice(loan_ids), "paid_on_time": rng.random() < 0.9})
+        return events
+
+    def handle(self, *args, **options):
+        # batches are signed like the payment processor does , with a throwaway key when none is configured
+        with override_settings(EMI_PAYMENT_SIGNING_KEY=settings.EMI_PAYMENT_SIGNING_KEY or secrets.token_hex(16)):
+            self.run(options)
+
+    def run(self, options):
+        client = api_client()
+        rng = random.Random(7)
+
+        self.stdout.write(f"{'per request':>12} {'events':>8} {'applied':>8} {'duplicates':>11} {'seconds':>8} {'events/s':>10}")
+        for batch_size in [1] + options['batch_sizes']:
+            count = options['single_limit'] if batch_size == 1 else options['events']
+            with rolled_back():
+                seed_customers(options['customers'])
+                loan_ids = list(LoanAppllication.objects.values_list('loan_id', flat=True))
+                events = self.events(loan_ids, count, options['duplicate_ratio'], rng, f"bench-{batch_size}")
+
+                applied = duplicates = 0
+                with timer() as elapsed:
+                    for start in range(0, count, batch_size):
+                        body = json.dumps(events[start:start + batch_size]).encode()
+                        response = client.post(reverse('emi_payments'), body, content_type='application/json', HTTP_X_PAYMENT_SIGNATURE=sign_payment_batch(body))
+                        assert response.status_code == 200, response.content
+                        applied += response.json()['applied'] + response.json()['late']
+                        duplicates += response.json()['duplicates']
+
+            self.stdout.write(
+                f"{batch_size:>12} {count:>8} {applied:>8} {duplicates:>11} {elapsed.elapsed:>8.2f} {count / elapsed.elapsed:>10.0f}"
+            )
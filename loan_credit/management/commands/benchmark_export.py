@@ -0,0 +1,39 @@
+import os
+import tempfile
+
+from django.core.management.base import BaseCommand
+
+from loan_credit.benchmarks import rolled_back, timer
+from loan_credit.export import format_export_stats, write_export
+from loan_credit.ingestion import current_rss_mb
+from loan_credit.models import LoanAppllication
+from loan_credit.synthetic import generate_synthetic_data
+
+
+class Command(BaseCommand):
+    help = "Measures rows/sec and memory of the loan export as CSV and Parquet on a synthetic table. Benchmark data is rolled back."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--loans', type=int, default=10000000, help="Loans in the synthetic table.")
+        parser.add_argument('--customers', type=int, default=None, help="Customers , defaults to a tenth of the loans.")
+        parser.add_argument('--chunk-size', type=int, default=None, help="Rows per fetch and per batch , EXPORT_CHUNK_SIZE by default.")
+        parser.add_argument('--workdir', default=None, help="Directory for the exported files.")
+
+    def handle(self, *args, **options):
+        loans = options['loans']
+        workdir = options['workdir'] or tempfile.mkdtemp(prefix='export-bench-')
+        os.makedirs(workdir, exist_ok=True)
+
+        with rolled_back():
+            self.stdout.write(f"Generating {loans} loans ...")
+            with timer() as generated:
+                generate_synthetic_data(options['customers'] or max(1, loans // 10), loans)
+            self.stdout.write(f"{LoanAppllication.objects.count()} loans in the table after {generated.elapsed:.1f}s")
+
+            rss_before = current_rss_mb()
+            for output in ('csv', 'parquet'):
+                path = os.path.join(workdir, f'loans.{output}')
+                with open(path, 'wb' if output == 'parquet' else 'w', newline=None if output == 'parquet' else '') as stream:
+                    stats = write_export('loans', stream, output, options['chunk_size'])
+                self.stdout.write(format_export_stats(output.upper(), stats) + f" , {os.path.getsize(path) / (1024 * 1024):.1f} MB on disk")
+            self.stdout.write(f"RSS before the exports {rss_before:.1f} MB")
@@ -0,0 +1,88 @@
+import datetime as dt
+import os
+import random
+import shutil
+import tempfile
+import time
+
+from django.core.management.base import BaseCommand
+from openpyxl import Workbook
+
+from loan_credit.benchmarks import rolled_back
+from loan_credit.ingestion import (
+    CUSTOMER_COLUMNS, LOAN_COLUMNS, current_rss_mb, format_stats, ingest_customers, ingest_loans, peak_rss_mb, split_workbook,
+)
+
+
+def write_workbooks(directory, loans : int, customers : int, seed : int = 11):
+    """
+    Writes synthetic customer and loan workbooks in openpyxl's streaming write mode.
+    """
+    rng = random.Random(seed)
+    customers_path = os.path.join(directory, 'customers.xlsx')
+    loans_path = os.path.join(directory, 'loans.xlsx')
+
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet()
+    sheet.append(list(CUSTOMER_COLUMNS))
+    for customer_id in range(1, customers + 1):
+        salary = rng.randrange(20000, 200000, 1000)
+        sheet.append([customer_id, f"First{customer_id}", f"Last{customer_id}", rng.randint(21, 65), 9000000000 + customer_id, salary, 36 * salary])
+    workbook.save(customers_path)
+
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet()
+    sheet.append(list(LOAN_COLUMNS))
+    today = dt.datetime.now()
+    for loan_id in range(1, loans + 1):
+        tenure = rng.choice([6, 12, 24, 36, 60])
+        approved_on = today - dt.timedelta(days=rng.randint(0, 3650))
+        sheet.append([
+            rng.randint(1, customers), loan_id, rng.randrange(10000, 900000, 1000), tenure, rng.choice([8.5, 10.0, 12.2, 14.8]),
+            rng.randrange(1000, 40000, 10), rng.randint(0, tenure), approved_on, approved_on + dt.timedelta(days=30 * tenure),
+        ])
+    workbook.save(loans_path)
+    return customers_path, loans_path
+
+
+class Command(BaseCommand):
+    help = "Measures rows/sec and memory of the streaming workbook ingestion on synthetic workbooks. Loaded rows are rolled back."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=100000, help="Loan rows in the synthetic workbook (5000000 for the large run).")
+        parser.add_argument('--customers', type=int, default=None, help="Customer rows , defaults to a tenth of the loans.")
+        parser.add_argument('--chunk-size', type=int, default=None, help="Rows per chunk , defaults to INGESTION_CHUNK_SIZE.")
+        parser.add_argument('--no-copy', action='store_true', help="Use bulk_create even on PostgreSQL.")
+        parser.add_argument('--workdir', default=None, help="Directory for the workbooks , reused when they already exist.")
+
+    def handle(self, *args, **options):
+        rows = options['rows']
+        customers = options['customers'] or max(1, rows // 10)
+        workdir = options['workdir'] or tempfile.mkdtemp(prefix='ingestion-bench-')
+        customers_path = os.path.join(workdir, 'customers.xlsx')
+        loans_path = os.path.join(workdir, 'loans.xlsx')
+
+        if not (os.path.exists(customers_path) and os.path.exists(loans_path)):
+            self.stdout.write(f"Writing {rows} loans and {customers} customers to {workdir} ...")
+            customers_path, loans_path = write_workbooks(workdir, rows, customers)
+
+        ingest_options = {'chunk_size': options['chunk_size'], 'use_copy': not options['no_copy']}
+        rss_before = current_rss_mb()
+        with rolled_back():
+            customer_stats = ingest_customers(customers_path, **ingest_options)
+            loan_stats = ingest_loans(loans_path, **ingest_options)
+
+        self.stdout.write(format_stats('Customers', customer_stats))
+        self.stdout.write(format_stats('Loans', loan_stats))
+        self.stdout.write(
+            f"RSS before {rss_before:.1f} MB , across loan chunks {loan_stats['min_chunk_rss_mb']} - {loan_stats['max_chunk_rss_mb']} MB"
+        )
+
+        # the fan-out keeps every key of the workbook to leave out repeated ones , one bit per key of the id range
+        started = time.perf_counter()
+        split = split_workbook(loans_path, LOAN_COLUMNS, 'loan_id', 4, os.path.join(workdir, 'partitions'))
+        shutil.rmtree(os.path.join(workdir, 'partitions'), ignore_errors=True)
+        self.stdout.write(
+            f"Split into {len(split['files'])} partitions: {split['rows']} rows in {time.perf_counter() - started:.1f}s , "
+            f"repeated key check {split['key_set_kb']} KB , peak RSS {peak_rss_mb():.1f} MB"
+        )
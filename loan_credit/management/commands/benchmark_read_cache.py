@@ -0,0 +1,57 @@
+import random
+
+from django.core.cache import cache
+from django.core.management.base import BaseCommand
+from django.urls import reverse
+
+from loan_credit.benchmarks import api_client, latency_summary, rolled_back, seed_customers, timer
+from loan_credit.models import LoanAppllication
+from loan_credit.response_cache import cache_stats
+
+
+class Command(BaseCommand):
+    help = "Compares cold and warm latency of the cached view-loan and view-loans endpoints. Benchmark data is rolled back."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--customers', type=int, default=1000, help="Customers seeded , with their loans.")
+        parser.add_argument('--loans-per-customer', type=int, default=5, help="Loans seeded per customer.")
+        parser.add_argument('--requests', type=int, default=2000, help="Requests measured per endpoint and mode.")
+
+    def measure(self, client, urls, cold):
+        samples = []
+        for url in urls:
+            if cold:
+                cache.clear()
+            with timer() as elapsed:
+                response = client.get(url)
+            assert response.status_code == 200, response.content
+            samples.append(elapsed.elapsed)
+        return latency_summary(samples)
+
+    def handle(self, *args, **options):
+        client = api_client()
+        rng = random.Random(3)
+
+        with rolled_back():
+            customer_ids = seed_customers(options['customers'], options['loans_per_customer'])
+            loan_ids = list(LoanAppllication.objects.filter(customer_id__in=customer_ids).values_list('loan_id', flat=True))
+            endpoints = {
+                'view_loan': [reverse('view_loan_application', args=[rng.choice(loan_ids)]) for _ in range(options['requests'])],
+                'view_loans': [reverse('view_all_loan_application', args=[rng.choice(customer_ids)]) for _ in range(options['requests'])],
+            }
+
+            cache.clear()
+            cache_stats.reset()
+            self.stdout.write(f"{'endpoint':<12} {'mode':<6} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}")
+            for name, urls in endpoints.items():
+                cold = self.measure(client, urls, cold=True)
+                # prime every key once , then measure the same requests again
+                for url in set(urls):
+                    client.get(url)
+                warm = self.measure(client, urls, cold=False)
+                for mode, summary in (('cold', cold), ('warm', warm)):
+                    self.stdout.write(f"{name:<12} {mode:<6} {summary['p50_ms']:>9} {summary['p95_ms']:>9} {summary['p99_ms']:>9}")
+            cache.clear()
+
+        for name, counts in cache_stats.snapshot().items():
+            self.stdout.write(f"{name}: {counts['hits']} hits , {counts['misses']} misses")
@@ -0,0 +1,50 @@
+from django.core.management.base import BaseCommand
+
+from loan_credit.benchmarks import rolled_back, seed_customers, timer
+from loan_credit.fast_serializers import LOAN_LIST, loan_list_rows, render_loan_list, with_outstanding_principal
+from loan_credit.models import LoanAppllication
+from loan_credit.serializers import ViewAllLoanApplicationsResponse
+
+
+class Command(BaseCommand):
+    help = (
+        "Compares the DRF serializer path of /view-loans/ (model instances) with the .values() read path "
+        "at several listing sizes. Benchmark data is rolled back."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, nargs='+', default=[1000, 100000], help="Listing sizes to measure.")
+        parser.add_argument('--repeat', type=int, default=3, help="Runs per size , the fastest one is reported.")
+
+    def best(self, run, repeat):
+        timings = []
+        for _ in range(repeat):
+            with timer() as elapsed:
+                run()
+            timings.append(elapsed.elapsed)
+        return min(timings)
+
+    def handle(self, *args, **options):
+        with rolled_back():
+            customer_id = seed_customers(1, max(options['rows']))[0]
+            loans = LoanAppllication.objects.filter(customer_id=customer_id, loan_approved=True).order_by('loan_id')
+
+            self.stdout.write(f"{'rows':>8} {'path':<8} {'total ms':>10} {'render ms':>10} {'speedup':>8}")
+            for rows in options['rows']:
+                instances = list(loans[:rows])
+                values = list(loan_list_rows(loans)[:rows])
+                assert render_loan_list(values) == [dict(row) for row in ViewAllLoanApplicationsResponse(instances, many=True).data]
+
+                timings = {
+                    'drf': (
+                        self.best(lambda: ViewAllLoanApplicationsResponse(list(loans[:rows]), many=True).data, options['repeat']),
+                        self.best(lambda: ViewAllLoanApplicationsResponse(instances, many=True).data, options['repeat']),
+                    ),
+                    'values': (
+                        self.best(lambda: render_loan_list(loan_list_rows(loans)[:rows]), options['repeat']),
+                        self.best(lambda: LOAN_LIST.render(with_outstanding_principal(values)), options['repeat']),
+                    ),
+                }
+                drf_total = timings['drf'][0]
+                for path, (total, render) in timings.items():
+                    self.stdout.write(f"{rows:>8} {path:<8} {1000 * total:>10.1f} {1000 * render:>10.1f} {drf_total / total:>7.1f}x")
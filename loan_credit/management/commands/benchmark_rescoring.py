@@ -0,0 +1,53 @@
+import datetime as dt
+
+from django.core.management.base import BaseCommand
+
+from loan_credit.benchmarks import rolled_back, timer
+from loan_credit.models import Customer, CustomerCreditScore
+from loan_credit.rescoring import rescore_portfolio
+from loan_credit.summaries import compute_summaries
+from loan_credit.synthetic import generate_synthetic_data
+from loan_credit.utils import LoanEligibilityChecker
+
+
+class Command(BaseCommand):
+    help = (
+        "Compares the vectorized portfolio rescoring with one aggregate and one calculate_credit_score call per "
+        "customer , on a synthetic portfolio. Benchmark data is rolled back."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--customers', type=int, default=1000000, help="Customers in the synthetic portfolio.")
+        parser.add_argument('--loans', type=int, default=3000000, help="Loans spread over the customers.")
+        parser.add_argument('--chunk-size', type=int, default=None, help="Rows read per chunk , RESCORING_CHUNK_SIZE by default.")
+        parser.add_argument('--per-customer-sample', type=int, default=2000, help="Customers scored one by one , the full run is extrapolated from them.")
+
+    def handle(self, *args, **options):
+        today = dt.date.today()
+        with rolled_back():
+            self.stdout.write(f"Generating {options['customers']} customers and {options['loans']} loans ...")
+            generate_synthetic_data(options['customers'], options['loans'], today=today)
+            customers = Customer.objects.count()
+
+            report = rescore_portfolio(chunk_size=options['chunk_size'], today=today)
+            self.stdout.write(
+                f"vectorized    {report['customers']} customers in {report['seconds']:.2f}s "
+                f"(aggregate {report['aggregate_seconds']:.2f}s , score {report['score_seconds']:.2f}s , write {report['write_seconds']:.2f}s) "
+                f"{report['customers'] / report['seconds']:.0f} customers/s"
+            )
+
+            sample = list(Customer.objects.order_by('?')[:options['per_customer_sample']])
+            stored = dict(CustomerCreditScore.objects.filter(pk__in=[customer.pk for customer in sample]).values_list('pk', 'credit_score'))
+            with timer() as single:
+                for customer in sample:
+                    summary = compute_summaries([customer.pk], today)[customer.pk]
+                    summary.customer = customer
+                    score = LoanEligibilityChecker({'customer_id': customer.pk, 'loan_amount': 0}).calculate_credit_score(summary)
+                    assert score == stored[customer.pk], (customer.pk, score, stored[customer.pk])
+
+            per_customer = single.elapsed / len(sample)
+            self.stdout.write(
+                f"per customer  {len(sample)} customers in {single.elapsed:.2f}s , {customers * per_customer:.1f}s "
+                f"extrapolated to {customers} customers , {1 / per_customer:.0f} customers/s"
+            )
+            self.stdout.write(f"speedup       {customers * per_customer / report['seconds']:.1f}x , sampled scores match")
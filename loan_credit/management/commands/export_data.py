@@ -0,0 +1,43 @@
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from loan_credit.export import EXPORT_COLUMNS, format_export_stats, write_export
+from loan_credit.serializers import ExportRequestSerializer
+
+
+class Command(BaseCommand):
+    help = "Streams the loans or customers table to a CSV or Parquet file , in constant memory."
+
+    def add_arguments(self, parser):
+        parser.add_argument('table', choices=list(EXPORT_COLUMNS), help="Table to export.")
+        parser.add_argument('--output', default='csv', help="csv or parquet.")
+        parser.add_argument('--file', default='-', help="File to write , '-' for stdout.")
+        parser.add_argument('--approved-from', default=None, help="Only loans approved on or after this date (YYYY-MM-DD).")
+        parser.add_argument('--approved-to', default=None, help="Only loans approved on or before this date (YYYY-MM-DD).")
+        parser.add_argument('--customer-id', type=int, default=None, help="Only this customer , or this customer's loans.")
+        parser.add_argument('--include-archived', action='store_true', help="Add the archived loans after the live ones.")
+        parser.add_argument('--chunk-size', type=int, default=None, help="Rows per fetch and per batch , EXPORT_CHUNK_SIZE by default.")
+
+    def handle(self, *args, **options):
+        table = options['table']
+        request = {
+            key: options[key]
+            for key in ('output', 'approved_from', 'approved_to', 'customer_id', 'include_archived')
+            if options[key] is not None
+        }
+        # the same checks as /export/<table>/
+        serializer = ExportRequestSerializer(data=request, context={'table': table})
+        if not serializer.is_valid():
+            raise CommandError(serializer.errors)
+        filters = dict(serializer.validated_data)
+        output = filters.pop('output')
+
+        binary = output == 'parquet'
+        if options['file'] == '-':
+            stats = write_export(table, sys.stdout.buffer if binary else sys.stdout, output, options['chunk_size'], **filters)
+        else:
+            with open(options['file'], 'wb' if binary else 'w', newline=None if binary else '') as stream:
+                stats = write_export(table, stream, output, options['chunk_size'], **filters)
+        # stdout may be the export itself
+        self.stderr.write(format_export_stats(f"Exported {table}", stats))
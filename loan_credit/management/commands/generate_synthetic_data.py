@@ -0,0 +1,34 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from loan_credit.synthetic import generate_synthetic_data
+
+
+class Command(BaseCommand):
+    help = (
+        "Adds synthetic customers and loans with realistic distributions for load tests , bulk loaded through COPY "
+        "on PostgreSQL. The rows are committed , run it against a load test database."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--customers', type=int, default=10000, help="Customers to add.")
+        parser.add_argument('--loans', type=int, default=50000, help="Loans to add , spread over all customers.")
+        parser.add_argument('--seed', type=int, default=42, help="Random seed , the same seed on an empty database gives the same rows.")
+        parser.add_argument('--chunk-size', type=int, default=None, help="Rows per insert (default INGESTION_CHUNK_SIZE).")
+        parser.add_argument('--no-copy', action='store_true', help="Use bulk_create instead of COPY.")
+
+    def handle(self, *args, **options):
+        if options['customers'] < 0 or options['loans'] < 0:
+            raise CommandError("--customers and --loans must not be negative.")
+
+        report = generate_synthetic_data(
+            options['customers'],
+            options['loans'],
+            seed=options['seed'],
+            chunk_size=options['chunk_size'],
+            use_copy=not options['no_copy'],
+        )
+        for label, stats in report.items():
+            left_out = f" , {stats['left_out']} left out for a taken phone number" if stats.get('left_out') else ""
+            self.stdout.write(
+                f"{label}: {stats['rows']} rows{left_out} in {stats['seconds']}s ({stats['rows_per_second']} rows/s)"
+            )
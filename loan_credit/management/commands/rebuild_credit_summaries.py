@@ -0,0 +1,67 @@
+import datetime as dt
+import math
+
+from django.core.management.base import BaseCommand, CommandError
+
+from loan_credit.models import CustomerCreditSummary
+from loan_credit.summaries import SUMMARY_FIELDS, compute_summaries, rebuild_all_summaries
+
+
+class Command(BaseCommand):
+    help = "Rebuilds the per-customer credit summaries from the loan table, or verifies the stored ones against it."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--verify', action='store_true', help="Compare stored summaries with a fresh aggregate instead of rebuilding.")
+        parser.add_argument('--batch-size', type=int, default=1000, help="Number of customers aggregated per query.")
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        if options['verify']:
+            self.verify(batch_size)
+            return
+
+        processed = rebuild_all_summaries(batch_size=batch_size)
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt credit summaries for {processed} customers."))
+
+    def verify(self, batch_size):
+        today = dt.date.today()
+        checked = 0
+        mismatched = []
+
+        # stale rows are rebuilt on their next read anyway , only the ones that would be served are compared
+        stored_rows = CustomerCreditSummary.objects.filter(needs_refresh=False, activity_year=today.year).order_by('pk')
+        batch = []
+        for summary in stored_rows.iterator(chunk_size=batch_size):
+            if summary.is_stale(today):
+                continue
+            batch.append(summary)
+            if len(batch) >= batch_size:
+                mismatched += self.compare(batch, today)
+                checked += len(batch)
+                batch = []
+        if batch:
+            mismatched += self.compare(batch, today)
+            checked += len(batch)
+
+        for customer_id, field, stored, expected in mismatched:
+            self.stdout.write(f"customer {customer_id}: {field} stored={stored} expected={expected}")
+
+        if mismatched:
+            raise CommandError(f"{len(mismatched)} mismatched fields across {checked} summaries.")
+        self.stdout.write(self.style.SUCCESS(f"Verified {checked} credit summaries."))
+
+    def compare(self, stored_summaries, today):
+        expected = compute_summaries([summary.pk for summary in stored_summaries], today)
+        mismatched = []
+        for summary in stored_summaries:
+            fresh = expected[summary.pk]
+            for field in SUMMARY_FIELDS:
+                stored_value = getattr(summary, field)
+                expected_value = getattr(fresh, field)
+                if isinstance(expected_value, float) and isinstance(stored_value, float):
+                    equal = math.isclose(stored_value, expected_value, rel_tol=1e-9, abs_tol=1e-6)
+                else:
+                    equal = stored_value == expected_value
+                if not equal:
+                    mismatched.append((summary.pk, field, stored_value, expected_value))
+        return mismatched
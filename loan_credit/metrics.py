@@ -0,0 +1,370 @@
+"""
+Per-endpoint request metrics in the Prometheus text format , served at /metrics.
+
+MetricsMiddleware times every request and labels it with the URL name it resolved to. SQL queries are
+counted and timed by an execute wrapper installed on each database connection when it opens , and the
+response serializers add the time spent rendering them (less any lazy query they ran). Named spans time
+the steps of the eligibility check. Everything is kept in memory per process , an observation is one
+bisect and one locked increment.
+"""
+import threading
+import time
+from bisect import bisect_left
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.http import HttpResponse
+
+from loan_credit.db_pool import connection_stats
+from loan_credit.response_cache import cache_stats
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 8, 13, 21, 34, 55, 89)
+SPAN_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0)
+
+UNMATCHED_VIEW = 'unmatched'
+
+
+def _escape(value) -> str:
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _labels(names, values, extra=()) -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    pairs.extend(f'{name}="{_escape(value)}"' for name, value in extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _number(value) -> str:
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    """
+    A monotonically increasing value per label set.
+    """
+    kind = 'counter'
+
+    def __init__(self, name : str, documentation : str, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._values = {}
+
+    def inc(self, *labels, amount=1) -> None:
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def value(self, *labels):
+        with self._lock:
+            return self._values.get(labels, 0)
+
+    def reset(self) -> None:
+        with self._lock:
+            self._values.clear()
+
+    def samples(self):
+        with self._lock:
+            values = dict(self._values)
+        for labels, value in sorted(values.items()):
+            yield f'{self.name}{_labels(self.labelnames, labels)} {_number(value)}'
+
+
+class Histogram:
+    """
+    Observations counted into cumulative buckets per label set , with their sum and count.
+    """
+    kind = 'histogram'
+
+    def __init__(self, name : str, documentation : str, labelnames=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self._lock = threading.Lock()
+        self._series = {}
+
+    def observe(self, value, *labels) -> None:
+        # first bucket whose upper bound holds the value , the last slot is +Inf
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def count(self, *labels) -> int:
+        with self._lock:
+            series = self._series.get(labels)
+            return series[2] if series else 0
+
+    def sum(self, *labels) -> float:
+        with self._lock:
+            series = self._series.get(labels)
+            return series[1] if series else 0.0
+
+    def reset(self) -> None:
+        with self._lock:
+            self._series.clear()
+
+    def samples(self):
+        with self._lock:
+            series = {labels: (list(counts), total, count) for labels, (counts, total, count) in self._series.items()}
+        for labels, (counts, total, count) in sorted(series.items()):
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += bucket_count
+                yield f'{self.name}_bucket{_labels(self.labelnames, labels, [("le", _number(bound))])} {cumulative}'
+            yield f'{self.name}_sum{_labels(self.labelnames, labels)} {_number(total)}'
+            yield f'{self.name}_count{_labels(self.labelnames, labels)} {count}'
+
+
+class MetricsRegistry:
+    """
+    The metrics of this process. Collectors are called at scrape time and return (metric, samples) pairs
+    for values that are counted elsewhere.
+    """
+
+    def __init__(self):
+        self._metrics = []
+        self._collectors = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def register_collector(self, collector):
+        self._collectors.append(collector)
+        return collector
+
+    def reset(self) -> None:
+        for metric in self._metrics:
+            metric.reset()
+
+    def render(self) -> str:
+        lines = []
+        families = [(metric, metric.samples()) for metric in self._metrics]
+        for collector in self._collectors:
+            families.extend(collector())
+        for metric, samples in families:
+            lines.append(f'# HELP {metric.name} {metric.documentation}')
+            lines.append(f'# TYPE {metric.name} {metric.kind}')
+            lines.extend(samples)
+        return '\n'.join(lines) + '\n'
+
+
+registry = MetricsRegistry()
+
+request_seconds = registry.register(Histogram(
+    'loan_credit_http_request_duration_seconds', 'Request latency per URL name.', ('view', 'method', 'status'), LATENCY_BUCKETS,
+))
+request_queries = registry.register(Histogram(
+    'loan_credit_http_request_queries', 'SQL queries run per request.', ('view',), QUERY_COUNT_BUCKETS,
+))
+request_db_seconds = registry.register(Histogram(
+    'loan_credit_http_request_db_seconds', 'Time spent in SQL queries per request.', ('view',), LATENCY_BUCKETS,
+))
+request_serializer_seconds = registry.register(Histogram(
+    'loan_credit_http_request_serializer_seconds', 'Time spent rendering response serializers per request.', ('view',), SPAN_BUCKETS,
+))
+span_seconds = registry.register(Histogram(
+    'loan_credit_span_duration_seconds', 'Duration of named steps of the request handling.', ('span',), SPAN_BUCKETS,
+))
+exceptions_handled = registry.register(Counter(
+    'loan_credit_exceptions_total', 'Exceptions turned into error responses by the API exception handler.', ('exception',),
+))
+emi_payment_events = registry.register(Counter(
+    'loan_credit_emi_payment_events_total', 'EMI payment events by outcome (applied , late , duplicates , unknown_loans , invalid).', ('result',),
+))
+
+
+class _CollectedFamily:
+    def __init__(self, name, documentation, kind):
+        self.name = name
+        self.documentation = documentation
+        self.kind = kind
+
+
+CACHE_REQUESTS = _CollectedFamily('loan_credit_view_cache_requests_total', 'Cached view lookups per view and result.', 'counter')
+DB_CHECKOUTS = _CollectedFamily('loan_credit_db_checkouts_total', 'Requests and Celery tasks that used a database connection.', 'counter')
+DB_CONNECTIONS = _CollectedFamily('loan_credit_db_connections_opened_total', 'Database connections opened by this process.', 'counter')
+
+
+@registry.register_collector
+def collect_cache_stats():
+    samples = []
+    for view, counts in cache_stats.snapshot().items():
+        samples.append(f'{CACHE_REQUESTS.name}{_labels(("view", "result"), (view, "hit"))} {counts["hits"]}')
+        samples.append(f'{CACHE_REQUESTS.name}{_labels(("view", "result"), (view, "miss"))} {counts["misses"]}')
+    return [(CACHE_REQUESTS, samples)]
+
+
+@registry.register_collector
+def collect_connection_stats():
+    # counters only , a scrape must not open a database connection
+    checkouts, opened = connection_stats.counts()
+    return [
+        (DB_CHECKOUTS, [f'{DB_CHECKOUTS.name} {checkouts}']),
+        (DB_CONNECTIONS, [f'{DB_CONNECTIONS.name} {opened}']),
+    ]
+
+
+class RequestTimings:
+    """
+    Query count , DB time and serializer time of the request being handled.
+    """
+    __slots__ = ('queries', 'db_seconds', 'serializer_seconds')
+
+    def __init__(self):
+        self.queries = 0
+        self.db_seconds = 0.0
+        self.serializer_seconds = 0.0
+
+
+# a context variable , so queries the async ORM runs in a worker thread land on the right request
+_request_timings = ContextVar('loan_credit_request_timings', default=None)
+
+
+def current_timings():
+    return _request_timings.get()
+
+
+def query_timer(execute, sql, params, many, context):
+    """
+    Connection execute wrapper counting and timing the queries of the current request.
+    """
+    timings = _request_timings.get()
+    if timings is None:
+        return execute(sql, params, many, context)
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        timings.queries += 1
+        timings.db_seconds += time.perf_counter() - start
+
+
+def install_query_timer(connection, **kwargs) -> None:
+    """
+    connection_created receiver , the wrapper stays on the connection object across reconnects.
+    """
+    if query_timer not in connection.execute_wrappers:
+        connection.execute_wrappers.append(query_timer)
+
+
+class span:
+    """
+    Times a named step , e.g. `with span('credit_score'):`.
+    """
+    __slots__ = ('name', 'start')
+
+    def __init__(self, name : str):
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        span_seconds.observe(time.perf_counter() - self.start, self.name)
+        return False
+
+
+class serializer_timer:
+    """
+    Adds the time of a serializer's rendering to the current request , without the queries a lazy
+    queryset ran inside it since those are already counted as DB time.
+    """
+    __slots__ = ('timings', 'start', 'db_seconds')
+
+    def __enter__(self):
+        self.timings = _request_timings.get()
+        if self.timings is not None:
+            self.db_seconds = self.timings.db_seconds
+            self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        timings = self.timings
+        if timings is not None:
+            elapsed = time.perf_counter() - self.start - (timings.db_seconds - self.db_seconds)
+            timings.serializer_seconds += max(0.0, elapsed)
+        return False
+
+
+class TimedSerializerMixin:
+    """
+    Counts the rendering of `.data` as serializer time of the current request.
+    """
+
+    @property
+    def data(self):
+        with serializer_timer():
+            return super().data
+
+
+def view_name(request) -> str:
+    match = getattr(request, 'resolver_match', None)
+    return match.url_name if match is not None and match.url_name else UNMATCHED_VIEW
+
+
+def record_request(request, status_code, timings, elapsed) -> None:
+    view = view_name(request)
+    request_seconds.observe(elapsed, view, request.method, status_code)
+    request_queries.observe(timings.queries, view)
+    request_db_seconds.observe(timings.db_seconds, view)
+    request_serializer_seconds.observe(timings.serializer_seconds, view)
+
+
+class MetricsMiddleware:
+    """
+    Records latency , query count , DB time and serializer time of every request per URL name.
+    Works under WSGI and ASGI , so it should be listed first to time the other middleware too.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        timings = RequestTimings()
+        token = _request_timings.set(timings)
+        start = time.perf_counter()
+        status_code = 500
+        try:
+            response = self.get_response(request)
+            status_code = response.status_code
+            return response
+        finally:
+            _request_timings.reset(token)
+            record_request(request, status_code, timings, time.perf_counter() - start)
+
+    async def __acall__(self, request):
+        timings = RequestTimings()
+        token = _request_timings.set(timings)
+        start = time.perf_counter()
+        status_code = 500
+        try:
+            response = await self.get_response(request)
+            status_code = response.status_code
+            return response
+        finally:
+            _request_timings.reset(token)
+            record_request(request, status_code, timings, time.perf_counter() - start)
+
+
+def metrics_view(request):
+    return HttpResponse(registry.render(), content_type=CONTENT_TYPE)
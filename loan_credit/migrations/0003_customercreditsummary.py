@@ -0,0 +1,32 @@
+# Generated by Django 5.2.6 on 2026-10-18 18:20
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('loan_credit', '0002_alter_customer_phone_number'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CustomerCreditSummary',
+            fields=[
+                ('customer', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='credit_summary', serialize=False, to='loan_credit.customer')),
+                ('num_loans_taken', models.IntegerField(default=0)),
+                ('num_loans_fully_paid', models.IntegerField(default=0)),
+                ('total_emis_paid', models.IntegerField(default=0)),
+                ('total_tenure_months', models.IntegerField(default=0)),
+                ('loan_approved_volume', models.FloatField(default=0)),
+                ('current_loan_sum', models.FloatField(default=0)),
+                ('total_current_emis', models.FloatField(default=0)),
+                ('active_until', models.DateField(blank=True, null=True)),
+                ('activity_year', models.IntegerField()),
+                ('loan_activity_current_year', models.IntegerField(default=0)),
+                ('needs_refresh', models.BooleanField(default=False)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+    ]
@@ -0,0 +1,47 @@
+# Generated by Django 5.2.6 on 2026-10-18 18:20
+
+from django.db import migrations, models
+from django.db.models import Max
+
+LOAN_ID_SEQUENCE = 'loan_credit_loan_id_seq'
+FIRST_LOAN_ID = 1000
+
+
+def create_loan_id_source(apps, schema_editor):
+    """
+    Seeds the loan_id source past the loans that already exist.
+    """
+    LoanAppllication = apps.get_model('loan_credit', 'LoanAppllication')
+    LoanIdSequence = apps.get_model('loan_credit', 'LoanIdSequence')
+    db_alias = schema_editor.connection.alias
+
+    max_loan_id = LoanAppllication.objects.using(db_alias).aggregate(max_id=Max('loan_id'))['max_id']
+    next_id = max(max_loan_id + 1 if max_loan_id is not None else FIRST_LOAN_ID, FIRST_LOAN_ID)
+
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute(f"CREATE SEQUENCE IF NOT EXISTS {LOAN_ID_SEQUENCE} START WITH {next_id}")
+    else:
+        LoanIdSequence.objects.using(db_alias).update_or_create(name=LOAN_ID_SEQUENCE, defaults={'next_value': next_id})
+
+
+def drop_loan_id_source(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute(f"DROP SEQUENCE IF EXISTS {LOAN_ID_SEQUENCE}")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('loan_credit', '0003_customercreditsummary'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LoanIdSequence',
+            fields=[
+                ('name', models.CharField(max_length=50, primary_key=True, serialize=False)),
+                ('next_value', models.BigIntegerField()),
+            ],
+        ),
+        migrations.RunPython(create_loan_id_source, drop_loan_id_source),
+    ]
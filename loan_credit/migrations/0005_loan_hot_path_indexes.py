@@ -0,0 +1,29 @@
+# Generated by Django 5.2.6 on 2026-10-18 18:21
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('loan_credit', '0004_loanidsequence'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='loanappllication',
+            index=models.Index(condition=models.Q(('loan_approved', True)), fields=['customer_id', 'loan_id'], name='loan_customer_approved_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='loanappllication',
+            index=models.Index(condition=models.Q(('loan_approved', True)), fields=['customer_id', 'end_date'], name='loan_customer_active_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='loanappllication',
+            index=models.Index(condition=models.Q(('loan_approved', True)), fields=['customer_id', 'date_of_approval'], name='loan_customer_approval_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='loanappllication',
+            index=models.Index(condition=models.Q(('loan_approved', True)), fields=['end_date'], name='loan_approved_end_date_idx'),
+        ),
+    ]
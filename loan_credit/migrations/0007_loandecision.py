@@ -0,0 +1,34 @@
+# Generated by Django 5.2.6 on 2026-10-18 18:56
+
+import django.core.serializers.json
+import django.db.models.deletion
+import uuid
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('loan_credit', '0006_idempotencyrecord'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LoanDecision',
+            fields=[
+                ('decision_id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('customer_id', models.IntegerField()),
+                ('loan_amount', models.FloatField()),
+                ('interest_rate', models.FloatField()),
+                ('tenure', models.IntegerField()),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('completed', 'Completed'), ('failed', 'Failed')], default='pending', max_length=10)),
+                ('response', models.JSONField(blank=True, encoder=django.core.serializers.json.DjangoJSONEncoder, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('decided_at', models.DateTimeField(blank=True, null=True)),
+                ('loan', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='loan_credit.loanappllication')),
+            ],
+            options={
+                'indexes': [models.Index(condition=models.Q(('status', 'pending')), fields=['created_at'], name='loan_decision_pending_idx')],
+            },
+        ),
+    ]
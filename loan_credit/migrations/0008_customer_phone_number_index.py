@@ -0,0 +1,18 @@
+# Generated by Django 5.2.6 on 2026-10-18 18:58
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('loan_credit', '0007_loandecision'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='customer',
+            name='phone_number',
+            field=models.CharField(db_index=True, max_length=10),
+        ),
+    ]
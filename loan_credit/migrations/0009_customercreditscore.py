@@ -0,0 +1,22 @@
+# Generated by Django 5.2.6 on 2026-10-18 19:03
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('loan_credit', '0008_customer_phone_number_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CustomerCreditScore',
+            fields=[
+                ('customer', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='credit_score', serialize=False, to='loan_credit.customer')),
+                ('credit_score', models.IntegerField()),
+                ('scored_at', models.DateTimeField()),
+            ],
+        ),
+    ]
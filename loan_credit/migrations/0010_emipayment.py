@@ -0,0 +1,23 @@
+# Generated by Django 5.2.6 on 2026-10-18 19:32
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('loan_credit', '0009_customercreditscore'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EmiPayment',
+            fields=[
+                ('payment_id', models.CharField(max_length=100, primary_key=True, serialize=False)),
+                ('loan_id', models.IntegerField(db_index=True)),
+                ('paid_on_time', models.BooleanField(default=True)),
+                ('paid_at', models.DateTimeField(blank=True, null=True)),
+                ('received_at', models.DateTimeField()),
+            ],
+        ),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 5.2.6 on 2026-10-18 19:36
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('loan_credit', '0010_emipayment'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CustomerLoanHistory',
+            fields=[
+                ('customer', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='loan_history', serialize=False, to='loan_credit.customer')),
+                ('num_loans_taken', models.IntegerField(default=0)),
+                ('num_loans_fully_paid', models.IntegerField(default=0)),
+                ('total_emis_paid', models.IntegerField(default=0)),
+                ('total_tenure_months', models.IntegerField(default=0)),
+                ('loan_approved_volume', models.FloatField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='ArchivedLoan',
+            fields=[
+                ('loan_id', models.IntegerField(primary_key=True, serialize=False)),
+                ('loan_amount', models.FloatField()),
+                ('tenure', models.IntegerField()),
+                ('interest_rate', models.FloatField()),
+                ('monthly_installment', models.FloatField(blank=True, null=True)),
+                ('emis_paid_on_time', models.IntegerField(blank=True, null=True)),
+                ('date_of_approval', models.DateField(blank=True, null=True)),
+                ('end_date', models.DateField(blank=True, null=True)),
+                ('archived_at', models.DateTimeField()),
+                ('customer', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='archived_loans', to='loan_credit.customer')),
+            ],
+        ),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 5.2.6 on 2026-10-18 19:41
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('loan_credit', '0011_loan_archive'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='IngestedRow',
+            fields=[
+                ('key', models.CharField(max_length=40, primary_key=True, serialize=False)),
+                ('row_hash', models.CharField(max_length=32)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='IngestionCheckpoint',
+            fields=[
+                ('source', models.CharField(max_length=600, primary_key=True, serialize=False)),
+                ('file_hash', models.CharField(max_length=64)),
+                ('rows_done', models.IntegerField(default=0)),
+                ('completed_at', models.DateTimeField(blank=True, null=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.6 on 2026-10-18 20:31
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('loan_credit', '0012_ingestion_checkpoints'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='customer',
+            name='phone_number',
+            field=models.CharField(max_length=10, unique=True),
+        ),
+    ]
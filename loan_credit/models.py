@@ -1,3 +1,6 @@
+import uuid
+
+from django.core.serializers.json import DjangoJSONEncoder
 from django.db import models
 
 # Create your models here.
@@ -6,7 +9,8 @@ class Customer(models.Model) :
     customer_id = models.AutoField(primary_key=True)
     first_name  = models.CharField(max_length= 50)
     last_name = models.CharField(max_length= 50)
-    phone_number = models.CharField(max_length=10)
+    # unique , both registration endpoints report a taken number as an error of that customer
+    phone_number = models.CharField(max_length=10, unique=True)
     age = models.IntegerField()
     monthly_income = models.IntegerField()
     approved_limit = models.IntegerField(default=0)
@@ -21,15 +25,21 @@ class Customer(models.Model) :
 
 def generate_loan_id():
     """
-    Generates a new unique loan_id by finding the last one and adding 1.
+    Hands out the next loan_id from the process wide allocator, which reserves ids from the database in blocks.
     """
-    last_loan = LoanAppllication.objects.all().order_by('loan_id').last()
-    if not last_loan:
-        # If no loans exist yet, start from a base number like 1000
-        return 1000
-    
-    new_loan_id = last_loan.loan_id + 1
-    return new_loan_id
+    from loan_credit.sequences import loan_id_allocator
+    return loan_id_allocator.next_id()
+
+
+class LoanIdSequence(models.Model):
+    """
+    Counter row backing the loan_id allocator on databases without native sequences.
+    """
+    name = models.CharField(max_length=50, primary_key=True)
+    next_value = models.BigIntegerField()
+
+    def __str__(self):
+        return f"{self.name} -> {self.next_value}"
 
 
 class LoanAppllication(models.Model):
@@ -49,6 +59,215 @@ class LoanAppllication(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        indexes = [
+            # a customer's approved loans in loan_id order (/view-loans/ and the summary rebuild)
+            models.Index(fields=['customer_id', 'loan_id'], name='loan_customer_approved_idx', condition=models.Q(loan_approved=True)),
+            # a customer's running approved loans
+            models.Index(fields=['customer_id', 'end_date'], name='loan_customer_active_idx', condition=models.Q(loan_approved=True)),
+            # a customer's approved loans by approval date (current year activity)
+            models.Index(fields=['customer_id', 'date_of_approval'], name='loan_customer_approval_idx', condition=models.Q(loan_approved=True)),
+            # approved loans by end date across all customers
+            models.Index(fields=['end_date'], name='loan_approved_end_date_idx', condition=models.Q(loan_approved=True)),
+        ]
+
     def __str__(self):
         return f"Application {self.loan_id} for {self.customer_id.first_name} {self.customer_id.last_name}"
 
+
+
+class CustomerCreditSummary(models.Model):
+    """
+    Pre-aggregated loan history for a customer, kept in step with every
+    LoanAppllication write so eligibility checks read one row instead of
+    aggregating the whole loan history.
+    """
+    customer = models.OneToOneField(Customer, on_delete=models.CASCADE, primary_key=True, related_name='credit_summary')
+
+    # lifetime figures over approved loans
+    num_loans_taken = models.IntegerField(default=0)
+    num_loans_fully_paid = models.IntegerField(default=0)
+    total_emis_paid = models.IntegerField(default=0)
+    total_tenure_months = models.IntegerField(default=0)
+    loan_approved_volume = models.FloatField(default=0)
+
+    # figures over loans that are still running
+    current_loan_sum = models.FloatField(default=0)
+    total_current_emis = models.FloatField(default=0)
+    # earliest end_date among the running loans , after this day the active figures are stale
+    active_until = models.DateField(null=True, blank=True)
+
+    # loans approved during activity_year
+    activity_year = models.IntegerField()
+    loan_activity_current_year = models.IntegerField(default=0)
+
+    # set when a loan is changed or removed , the row is rebuilt on its next read
+    needs_refresh = models.BooleanField(default=False)
+
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Credit summary for customer {self.customer_id}"
+
+    # the eligibility checker reads these from the same object as the aggregates
+    @property
+    def approved_limit(self):
+        return self.customer.approved_limit
+
+    @property
+    def monthly_income(self):
+        return self.customer.monthly_income
+
+    def is_stale(self, today) -> bool:
+        """
+        The active and current-year figures depend on the date, so a summary built
+        on an earlier day is only valid until its earliest running loan ends or the year rolls over.
+        """
+        if self.needs_refresh or self.activity_year != today.year:
+            return True
+        return self.active_until is not None and self.active_until < today
+
+
+class ArchivedLoan(models.Model):
+    """
+    A closed loan moved out of LoanAppllication by the archival task , see loan_credit/archive.py.
+    Only the columns the read endpoints and the schedule need are kept.
+    """
+    loan_id = models.IntegerField(primary_key=True)
+    customer = models.ForeignKey(Customer, on_delete=models.CASCADE, related_name='archived_loans')
+    loan_amount = models.FloatField()
+    tenure = models.IntegerField()
+    interest_rate = models.FloatField()
+    monthly_installment = models.FloatField(null=True, blank=True)
+    emis_paid_on_time = models.IntegerField(null=True, blank=True)
+    date_of_approval = models.DateField(null=True, blank=True)
+    end_date = models.DateField(null=True, blank=True)
+    archived_at = models.DateTimeField()
+
+    def __str__(self):
+        return f"Archived loan {self.loan_id} of customer {self.customer_id}"
+
+
+class CustomerLoanHistory(models.Model):
+    """
+    Lifetime figures of a customer's archived loans , added to the live loans whenever a credit summary
+    is built so scores do not change when loans are archived.
+    """
+    customer = models.OneToOneField(Customer, on_delete=models.CASCADE, primary_key=True, related_name='loan_history')
+    num_loans_taken = models.IntegerField(default=0)
+    num_loans_fully_paid = models.IntegerField(default=0)
+    total_emis_paid = models.IntegerField(default=0)
+    total_tenure_months = models.IntegerField(default=0)
+    loan_approved_volume = models.FloatField(default=0)
+
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Archived loan history of customer {self.customer_id}"
+
+
+class CustomerCreditScore(models.Model):
+    """
+    Credit score of a customer from the nightly portfolio rescoring , see loan_credit/rescoring.py.
+    """
+    customer = models.OneToOneField(Customer, on_delete=models.CASCADE, primary_key=True, related_name='credit_score')
+    credit_score = models.IntegerField()
+    scored_at = models.DateTimeField()
+
+    def __str__(self):
+        return f"Credit score {self.credit_score} for customer {self.customer_id}"
+
+
+class EmiPayment(models.Model):
+    """
+    One EMI payment event from the payment processor , kept so a redelivered event is not counted twice.
+    """
+    payment_id = models.CharField(max_length=100, primary_key=True)
+    # a plain column rather than a foreign key , the dedupe record outlives an archived loan
+    loan_id = models.IntegerField(db_index=True)
+    paid_on_time = models.BooleanField(default=True)
+    paid_at = models.DateTimeField(null=True, blank=True)
+    received_at = models.DateTimeField()
+
+    def __str__(self):
+        return f"Payment {self.payment_id} for loan {self.loan_id}"
+
+
+class IngestionCheckpoint(models.Model):
+    """
+    Progress of the delta ingestion of one workbook , see loan_credit/delta_ingestion.py.
+    """
+    # "<customers|loans>:<workbook path>"
+    source = models.CharField(max_length=600, primary_key=True)
+    # sha256 of the workbook the checkpoint belongs to , a different file starts over from the first row
+    file_hash = models.CharField(max_length=64)
+    # last data row whose chunk is committed
+    rows_done = models.IntegerField(default=0)
+    completed_at = models.DateTimeField(null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.source} at row {self.rows_done}"
+
+
+class IngestedRow(models.Model):
+    """
+    Content hash of the last ingested version of a workbook row , rows whose hash is unchanged are not written again.
+    """
+    # "<customers|loans>:<Customer ID / Loan ID>"
+    key = models.CharField(max_length=40, primary_key=True)
+    row_hash = models.CharField(max_length=32)
+
+    def __str__(self):
+        return f"{self.key} -> {self.row_hash}"
+
+
+class IdempotencyRecord(models.Model):
+    """
+    Stored response of a request sent with an Idempotency-Key. It is written in the same transaction as the
+    request's own rows , so the primary key also stops a duplicate from being inserted when the cache lock is lost.
+    """
+    # "<scope>:<Idempotency-Key header>"
+    key = models.CharField(max_length=300, primary_key=True)
+    # sha256 of the request body , a key reused for a different body is rejected
+    fingerprint = models.CharField(max_length=64)
+    response_status = models.SmallIntegerField()
+    response_body = models.JSONField(encoder=DjangoJSONEncoder)
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    def __str__(self):
+        return f"{self.key} -> {self.response_status}"
+
+
+class LoanDecision(models.Model):
+    """
+    A loan application queued by /create-loan/ in async mode , decided later in a micro-batch by a Celery worker.
+    """
+    PENDING = 'pending'
+    COMPLETED = 'completed'
+    FAILED = 'failed'
+    STATUS_CHOICES = [(PENDING, 'Pending'), (COMPLETED, 'Completed'), (FAILED, 'Failed')]
+
+    decision_id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    # a plain id , the customer is only looked up when the application is decided
+    customer_id = models.IntegerField()
+    loan_amount = models.FloatField()
+    interest_rate = models.FloatField()
+    tenure = models.IntegerField()
+
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=PENDING)
+    loan = models.ForeignKey(LoanAppllication, null=True, blank=True, on_delete=models.SET_NULL, related_name='+')
+    # the /create-loan/ response once completed , the validation errors once failed
+    response = models.JSONField(null=True, blank=True, encoder=DjangoJSONEncoder)
+
+    created_at = models.DateTimeField(auto_now_add=True)
+    decided_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            # the queue : pending applications oldest first
+            models.Index(fields=['created_at'], name='loan_decision_pending_idx', condition=models.Q(status='pending')),
+        ]
+
+    def __str__(self):
+        return f"Decision {self.decision_id} for customer {self.customer_id} ({self.status})"
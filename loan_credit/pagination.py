@@ -0,0 +1,45 @@
+"""
+Keyset pagination and streamed JSON for the loan listing.
+"""
+from itertools import islice
+
+from django.conf import settings
+from rest_framework.pagination import CursorPagination
+from rest_framework.utils.encoders import JSONEncoder
+
+
+class LoanCursorPagination(CursorPagination):
+    """
+    Pages on loan_id , every page is one `loan_id > cursor ORDER BY loan_id LIMIT n` range read
+    however deep into the listing it is.
+    """
+    ordering = 'loan_id'
+    cursor_query_param = 'cursor'
+    page_size_query_param = 'limit'
+
+    def __init__(self):
+        self.page_size = settings.LOAN_PAGE_SIZE
+        self.max_page_size = settings.LOAN_PAGE_MAX_SIZE
+
+
+def iter_batches(iterable, size : int):
+    """
+    Groups an iterable into lists of at most `size` items.
+    """
+    iterator = iter(iterable)
+    while batch := list(islice(iterator, size)):
+        yield batch
+
+
+def stream_json_array(batches):
+    """
+    Yields a JSON array piece by piece from an iterable of row batches , so only one batch is held at a time.
+    """
+    encoder = JSONEncoder()
+    yield '['
+    separator = ''
+    for batch in batches:
+        if batch:
+            yield separator + ','.join(encoder.encode(row) for row in batch)
+            separator = ','
+    yield ']'
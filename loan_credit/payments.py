@@ -0,0 +1,242 @@
+"""
+EMI payment events from the payment processor.
+
+Events arrive in batches, either posted to /emi-payments/ or read from a Redis stream by consume_emi_payments.
+A batch is applied in a few statements:
+- One `INSERT .. ON CONFLICT DO NOTHING RETURNING` records the payment ids. Only the ids it returns are new, so an
+  event delivered twice, even to two workers at once, is counted once.
+- The new on-time payments are counted per loan in memory.
+- Loans with the same count are moved together by one `UPDATE .. SET emis_paid_on_time = emis_paid_on_time + n` ,
+  capped at the loan's tenure.
+- The credit summaries and cached views of the touched customers are invalidated.
+
+Batches posted over HTTP must be signed by the payment processor , see PaymentProcessorSignature.
+"""
+import hashlib
+import hmac
+import os
+import socket
+import time
+from collections import Counter, defaultdict
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import F, Value
+from django.db.models.functions import Coalesce, Least
+from django.utils import timezone
+from rest_framework.exceptions import ValidationError
+from rest_framework.permissions import BasePermission
+
+from loan_credit.metrics import emi_payment_events, span
+from loan_credit.models import EmiPayment, LoanAppllication
+from loan_credit.response_cache import invalidate_loan_views
+from loan_credit.serializers import EmiPaymentSerializer
+from loan_credit.summaries import invalidate_summaries
+
+# ids per IN list , well below the bind parameter limits of both backends
+IN_CHUNK_SIZE = 10000
+PAYMENT_COLUMNS = ['payment_id', 'loan_id', 'paid_on_time', 'paid_at', 'received_at']
+SIGNATURE_HEADER = 'X-Payment-Signature'
+
+
+def sign_payment_batch(body : bytes, key=None) -> str:
+    """
+    The X-Payment-Signature value of a request body , `sha256=` and the hex HMAC-SHA256 of the body.
+    """
+    key = settings.EMI_PAYMENT_SIGNING_KEY if key is None else key
+    return "sha256=" + hmac.new(key.encode(), body, hashlib.sha256).hexdigest()
+
+
+class PaymentProcessorSignature(BasePermission):
+    """
+    Lets a request through only when it is signed with EMI_PAYMENT_SIGNING_KEY. Payment events raise
+    emis_paid_on_time , which drives the credit score , so nobody else may post them.
+    """
+    message = "Missing or invalid payment processor signature."
+
+    def has_permission(self, request, view):
+        signature = request.headers.get(SIGNATURE_HEADER, '')
+        if not settings.EMI_PAYMENT_SIGNING_KEY or not signature:
+            return False
+        return hmac.compare_digest(signature, sign_payment_batch(request.body))
+
+
+def _chunks(items : list, size : int):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def loan_customers(loan_ids) -> dict:
+    """
+    Customer id of every existing loan among `loan_ids` , keyed by loan id.
+    """
+    customers = {}
+    for chunk in _chunks(list(loan_ids), IN_CHUNK_SIZE):
+        customers.update(LoanAppllication.objects.filter(loan_id__in=chunk).values_list('loan_id', 'customer_id'))
+    return customers
+
+
+def record_new_payments(events : list, received_at) -> set:
+    """
+    Inserts the payment records , skipping payment ids already stored.
+
+    Returns:
+        set: The payment ids inserted by this call.
+    """
+    quote = connection.ops.quote_name
+    fields = {field.name: field for field in EmiPayment._meta.concrete_fields}
+    columns = ", ".join(quote(fields[name].column) for name in PAYMENT_COLUMNS)
+    rows_per_statement = max(1, connection.features.max_query_params // len(PAYMENT_COLUMNS))
+
+    inserted = set()
+    with connection.cursor() as cursor:
+        for chunk in _chunks(events, rows_per_statement):
+            placeholders = ", ".join(["(" + ", ".join(["%s"] * len(PAYMENT_COLUMNS)) + ")"] * len(chunk))
+            params = []
+            for event in chunk:
+                values = dict(event, received_at=received_at)
+                params.extend(fields[name].get_db_prep_save(values[name], connection) for name in PAYMENT_COLUMNS)
+            cursor.execute(
+                f"INSERT INTO {quote(EmiPayment._meta.db_table)} ({columns}) VALUES {placeholders} "
+                f"ON CONFLICT ({quote(fields['payment_id'].column)}) DO NOTHING RETURNING {quote(fields['payment_id'].column)}",
+                params,
+            )
+            inserted.update(payment_id for payment_id, in cursor.fetchall())
+    return inserted
+
+
+def apply_emi_payments(events : list) -> dict:
+    """
+    Applies a batch of validated payment events.
+
+    Returns:
+        dict: events received , applied (new and on time) , late , duplicates , events for unknown loans ,
+        loans updated , seconds taken and events per second.
+    """
+    started = time.perf_counter()
+    # the first event of a payment id wins , a repeat inside the batch is a duplicate like any other
+    unique = {}
+    for event in events:
+        unique.setdefault(event['payment_id'], event)
+
+    loans = loan_customers({event['loan_id'] for event in unique.values()})
+    known = [event for event in unique.values() if event['loan_id'] in loans]
+
+    with transaction.atomic():
+        with span('emi_payment_insert'):
+            new_payment_ids = record_new_payments(known, timezone.now()) if known else set()
+        new_events = [event for event in known if event['payment_id'] in new_payment_ids]
+        increments = Counter(event['loan_id'] for event in new_events if event['paid_on_time'])
+
+        # loans with the same number of new payments share one UPDATE , a loan never has more EMIs paid than its tenure
+        loans_by_count = defaultdict(list)
+        for loan_id, count in increments.items():
+            loans_by_count[count].append(loan_id)
+        with span('emi_payment_update'):
+            for count, loan_ids in loans_by_count.items():
+                for chunk in _chunks(loan_ids, IN_CHUNK_SIZE):
+                    LoanAppllication.objects.filter(loan_id__in=chunk).update(
+                        emis_paid_on_time=Least(Coalesce(F('emis_paid_on_time'), Value(0)) + count, F('tenure')),
+                        updated_at=timezone.now(),
+                    )
+
+        # updates skip the model signals , the summaries are rebuilt on their next read
+        customer_ids = {loans[loan_id] for loan_id in increments}
+        if customer_ids:
+            invalidate_summaries(customer_ids)
+            invalidate_loan_views(loan_ids=list(increments), customer_ids=customer_ids)
+
+    seconds = time.perf_counter() - started
+    stats = {
+        'events': len(events),
+        'applied': sum(increments.values()),
+        'late': len(new_events) - sum(increments.values()),
+        'duplicates': len(known) - len(new_events) + len(events) - len(unique),
+        'unknown_loans': len(unique) - len(known),
+        'loans_updated': len(increments),
+        'seconds': round(seconds, 3),
+        'events_per_second': round(len(events) / seconds, 1) if seconds else 0.0,
+    }
+    for result in ('applied', 'late', 'duplicates', 'unknown_loans'):
+        if stats[result]:
+            emi_payment_events.inc(result, amount=stats[result])
+    return stats
+
+
+def validate_payment_events(items : list):
+    """
+    Validates every event on its own.
+
+    Returns:
+        tuple: The valid events , and the index and errors of every invalid one.
+    """
+    validator = EmiPaymentSerializer()
+    valid = []
+    rejected = []
+    for index, item in enumerate(items):
+        try:
+            valid.append(validator.run_validation(item))
+        except ValidationError as exc:
+            rejected.append({"index": index, "errors": exc.detail})
+    return valid, rejected
+
+
+def payment_stream_client():
+    import redis
+
+    return redis.Redis.from_url(settings.EMI_PAYMENT_STREAM_URL)
+
+
+def _decode(message : dict) -> dict:
+    return {key.decode(): value.decode() for key, value in message.items()}
+
+
+def consume_payment_stream(client=None, consumer=None, seconds=None, batch_size=None) -> dict:
+    """
+    Reads payment events from the Redis stream as a member of its consumer group and applies them batch by batch
+    for about `seconds`. A batch is acknowledged after its transaction commits , so a crash redelivers it and the
+    payment ids drop what was already applied. Messages another consumer left unacknowledged are claimed first.
+    Invalid messages are acknowledged and counted , retrying them cannot help.
+
+    Returns:
+        dict: The summed batch stats , the invalid messages and the events per second over the whole run.
+    """
+    client = client or payment_stream_client()
+    consumer = consumer or f"{socket.gethostname()}-{os.getpid()}"
+    seconds = settings.EMI_PAYMENT_CONSUMER_SECONDS if seconds is None else seconds
+    batch_size = batch_size or settings.EMI_PAYMENT_STREAM_BATCH_SIZE
+    stream, group = settings.EMI_PAYMENT_STREAM, settings.EMI_PAYMENT_CONSUMER_GROUP
+
+    try:
+        client.xgroup_create(stream, group, id='0', mkstream=True)
+    except Exception as exc:
+        # BUSYGROUP , the group exists already
+        if 'BUSYGROUP' not in str(exc):
+            raise
+
+    totals = Counter()
+    started = time.perf_counter()
+    deadline = started + seconds
+    while True:
+        claimed = client.xautoclaim(stream, group, consumer, settings.EMI_PAYMENT_CLAIM_IDLE_MS, count=batch_size)[1]
+        messages = [message for message in claimed if message[1]]
+        if not messages:
+            block = max(0, int((deadline - time.perf_counter()) * 1000))
+            response = client.xreadgroup(group, consumer, {stream: '>'}, count=batch_size, block=block or None)
+            messages = response[0][1] if response else []
+
+        if messages:
+            events, rejected = validate_payment_events([_decode(fields) for _, fields in messages])
+            stats = apply_emi_payments(events)
+            client.xack(stream, group, *[message_id for message_id, _ in messages])
+            totals.update({key: value for key, value in stats.items() if key not in ('seconds', 'events_per_second')})
+            totals['invalid'] += len(rejected)
+            emi_payment_events.inc('invalid', amount=len(rejected))
+        if time.perf_counter() >= deadline:
+            break
+
+    elapsed = time.perf_counter() - started
+    report = dict(totals)
+    report['seconds'] = round(elapsed, 3)
+    report['events_per_second'] = round(totals['events'] / elapsed, 1) if elapsed else 0.0
+    return report
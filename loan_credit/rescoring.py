@@ -0,0 +1,159 @@
+"""
+Portfolio-wide credit rescoring.
+
+Scoring every customer through LoanEligibilityChecker.calculate_credit_score costs one aggregate query and one
+Python call per customer. Here the approved loans are streamed once in columnar chunks:
+- Every chunk is reduced to per-customer partial sums with pandas.
+- The lifetime figures of archived loans (CustomerLoanHistory) are read as partials too.
+- The partials are summed per customer.
+- The scores of all customers are computed as array operations, with the same formula and the same order of
+  floating point operations as the scalar path.
+- The scores are upserted into CustomerCreditScore chunk by chunk (COPY on PostgreSQL).
+
+A nightly rescore has no requested loan amount, so the requested-amount-above-limit rule of the scalar path does
+not apply. A customer whose running loans exceed the approved limit still scores 0, and a customer without
+approved loans scores the neutral 75.
+"""
+import datetime as dt
+import time
+from itertools import islice
+
+import numpy as np
+import pandas as pd
+from django.conf import settings
+from django.utils import timezone
+
+from loan_credit.ingestion import insert_chunk
+from loan_credit.metrics import span
+from loan_credit.models import Customer, CustomerCreditScore, CustomerLoanHistory, LoanAppllication
+
+LOAN_COLUMNS = ['customer_id', 'loan_amount', 'tenure', 'emis_paid_on_time', 'end_date']
+TOTAL_COLUMNS = ['num_loans_taken', 'num_loans_fully_paid', 'total_emis_paid', 'total_tenure_months', 'current_loan_sum']
+HISTORY_COLUMNS = ['customer_id', 'num_loans_taken', 'num_loans_fully_paid', 'total_emis_paid', 'total_tenure_months']
+
+# score of a customer without any approved loan , see LoanEligibilityChecker.calculate_credit_score
+NO_HISTORY_SCORE = 75
+
+
+def iter_columns(queryset, columns : list, chunk_size : int):
+    """
+    Streams `columns` of a queryset as DataFrames of up to `chunk_size` rows , over a server side cursor on PostgreSQL.
+    """
+    rows = queryset.values_list(*columns).iterator(chunk_size=chunk_size)
+    while True:
+        chunk = list(islice(rows, chunk_size))
+        if not chunk:
+            return
+        yield pd.DataFrame.from_records(chunk, columns=columns)
+
+
+def loan_partials(loans : pd.DataFrame, today : dt.date) -> pd.DataFrame:
+    """
+    Per-customer sums of one chunk of approved loans , the same figures CustomerCreditSummary aggregates.
+    """
+    emis_paid = pd.to_numeric(loans['emis_paid_on_time'], errors='coerce')
+    tenure = loans['tenure'].astype(np.int64)
+    end_date = pd.to_datetime(loans['end_date'])
+    active = end_date.isna() | (end_date >= pd.Timestamp(today))
+
+    frame = pd.DataFrame({
+        'customer_id': loans['customer_id'],
+        'num_loans_taken': 1,
+        # an unknown EMI count is not a fully paid loan , and adds nothing to the paid EMIs
+        'num_loans_fully_paid': (emis_paid >= tenure).astype(np.int64),
+        'total_emis_paid': emis_paid.fillna(0).astype(np.int64),
+        'total_tenure_months': tenure,
+        'current_loan_sum': loans['loan_amount'].astype(np.float64).where(active, 0.0),
+    })
+    return frame.groupby('customer_id', sort=False).sum()
+
+
+def portfolio_totals(chunk_size=None, today=None) -> pd.DataFrame:
+    """
+    Loan totals of every customer with an approved loan , indexed by customer id.
+    """
+    chunk_size = chunk_size or settings.RESCORING_CHUNK_SIZE
+    today = today or dt.date.today()
+    loans = LoanAppllication.objects.filter(loan_approved=True).order_by()
+
+    partials = [loan_partials(chunk, today) for chunk in iter_columns(loans, LOAN_COLUMNS, chunk_size)]
+    # archived loans have ended , they add nothing to the running loans
+    histories = CustomerLoanHistory.objects.order_by()
+    partials += [chunk.set_index('customer_id').assign(current_loan_sum=0.0) for chunk in iter_columns(histories, HISTORY_COLUMNS, chunk_size)]
+    if not partials:
+        return pd.DataFrame(columns=TOTAL_COLUMNS, dtype=np.float64)
+    # a customer's loans may be spread over several chunks
+    return pd.concat(partials).groupby(level=0, sort=False).sum()
+
+
+def calculate_credit_scores(approved_limit, num_loans_taken, num_loans_fully_paid, total_emis_paid, total_tenure_months, current_loan_sum) -> np.ndarray:
+    """
+    Vectorized form of LoanEligibilityChecker.calculate_credit_score for many customers at once , one element per customer.
+
+    Returns:
+        np.ndarray: Integer scores out of 100.
+    """
+    approved_limit = np.asarray(approved_limit, dtype=np.float64)
+    total_loans = np.asarray(num_loans_taken, dtype=np.int64)
+    fully_paid_loans = np.asarray(num_loans_fully_paid, dtype=np.int64)
+    total_emis_paid = np.asarray(total_emis_paid, dtype=np.int64)
+    total_emis_due = np.asarray(total_tenure_months, dtype=np.int64)
+    current_loan_sum = np.asarray(current_loan_sum, dtype=np.float64)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        #  Payment Performance Score (70 points)
+        payment_ratio = np.where(total_emis_due > 0, total_emis_paid / total_emis_due, 1)
+        #  Loan Completion Score (30 points)
+        completion_ratio = fully_paid_loans / total_loans
+        final_score = payment_ratio * 70 + completion_ratio * 30
+
+    # truncation of the clipped score is int() of the scalar path
+    scores = np.clip(np.nan_to_num(final_score), 0, 100).astype(np.int64)
+    scores = np.where(total_loans == 0, NO_HISTORY_SCORE, scores)
+    return np.where(current_loan_sum > approved_limit, 0, scores)
+
+
+def rescore_portfolio(chunk_size=None, today=None, use_copy=None) -> dict:
+    """
+    Recomputes and stores the credit score of every customer.
+
+    Returns:
+        dict: customers scored , seconds spent reading and aggregating the loans , scoring and writing , in total.
+    """
+    chunk_size = chunk_size or settings.RESCORING_CHUNK_SIZE
+    today = today or dt.date.today()
+    scored_at = timezone.now()
+    started = time.perf_counter()
+
+    with span('rescoring_aggregate'):
+        totals = portfolio_totals(chunk_size, today)
+    aggregated = time.perf_counter()
+
+    customers = 0
+    scoring_seconds = 0.0
+    customer_chunks = iter_columns(Customer.objects.order_by('pk'), ['customer_id', 'approved_limit'], chunk_size)
+    for chunk in customer_chunks:
+        scoring_started = time.perf_counter()
+        customer_totals = totals.reindex(chunk['customer_id'], fill_value=0)
+        scores = calculate_credit_scores(chunk['approved_limit'], *(customer_totals[column] for column in TOTAL_COLUMNS))
+        scoring_seconds += time.perf_counter() - scoring_started
+
+        insert_chunk(
+            CustomerCreditScore,
+            [
+                CustomerCreditScore(customer_id=customer_id, credit_score=score, scored_at=scored_at)
+                for customer_id, score in zip(chunk['customer_id'].tolist(), scores.tolist())
+            ],
+            use_copy=use_copy,
+            upsert=True,
+        )
+        customers += len(chunk)
+
+    finished = time.perf_counter()
+    return {
+        'customers': customers,
+        'aggregate_seconds': round(aggregated - started, 3),
+        'score_seconds': round(scoring_seconds, 3),
+        'write_seconds': round(finished - aggregated - scoring_seconds, 3),
+        'seconds': round(finished - started, 3),
+    }
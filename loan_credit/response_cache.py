@@ -0,0 +1,253 @@
+"""
+Read-through cache of the serialized view-loan , view-loans and check-eligibility responses.
+
+Responses are stored per loan_id and per customer_id in the default cache (Redis outside of tests)
+and evicted by the model signals whenever a loan or a customer changes. Bulk writes that skip the
+signals call invalidate_loan_views themselves. Hits and misses are counted per process.
+
+Every client shares the cached responses , so a replica that has not caught up must not fill the cache.
+Misses are built from the replica like any other read. Invalidating a key also leaves a recent-write
+marker on it for REPLICA_STICKY_SECONDS , the time the replicas are given to catch up. While the marker
+is there the key is built from the primary. A marker that shows up while a replica build runs means a
+write committed in between , that response is returned but not cached.
+
+Eligibility decisions are keyed by the customer's cache version , the loan terms and the day. Changing
+the customer or any of its loans bumps the version , so every quote of that customer misses at once ,
+and the day in the key expires the quotes at midnight when loans stop counting as active.
+"""
+import datetime as dt
+import threading
+import uuid
+from collections import Counter
+from contextlib import nullcontext
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+from loan_credit.db_router import primary_reads
+
+LOAN_VIEW_KEY = 'loan-view:{}'
+CUSTOMER_LOANS_VIEW_KEY = 'customer-loans-view:{}'
+CUSTOMER_ALL_LOANS_VIEW_KEY = 'customer-loans-view:{}:archived'
+ELIGIBILITY_VERSION_KEY = 'eligibility-version:{}'
+ELIGIBILITY_KEY = 'eligibility:{}:{}:{}:{}:{}:{}'
+RECENT_WRITE_KEY = 'recent-write:{}'
+
+
+class CacheStats:
+    """
+    Hit / miss counters per cached view , local to this process.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counts = Counter()
+
+    def record(self, view : str, hit : bool) -> None:
+        with self._lock:
+            self._counts[(view, 'hit' if hit else 'miss')] += 1
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            counts = dict(self._counts)
+        views = sorted({view for view, _ in counts})
+        return {
+            view: {'hits': counts.get((view, 'hit'), 0), 'misses': counts.get((view, 'miss'), 0)}
+            for view in views
+        }
+
+    def reset(self) -> None:
+        with self._lock:
+            self._counts.clear()
+
+
+cache_stats = CacheStats()
+
+
+def loan_view_key(loan_id) -> str:
+    return LOAN_VIEW_KEY.format(loan_id)
+
+
+def customer_loans_view_key(customer_id, include_archived=False) -> str:
+    if include_archived:
+        return CUSTOMER_ALL_LOANS_VIEW_KEY.format(customer_id)
+    return CUSTOMER_LOANS_VIEW_KEY.format(customer_id)
+
+
+def recently_written(key : str) -> bool:
+    """
+    Whether the rows behind `key` changed too recently for the replicas to have them , see the module docstring.
+    """
+    return bool(settings.DATABASE_REPLICAS) and cache.get(RECENT_WRITE_KEY.format(key)) is not None
+
+
+async def arecently_written(key : str) -> bool:
+    return bool(settings.DATABASE_REPLICAS) and await cache.aget(RECENT_WRITE_KEY.format(key)) is not None
+
+
+def mark_recent_writes(keys : list) -> None:
+    """
+    Leaves a recent-write marker on the keys , now and again once the transaction commits.
+    """
+    if settings.DATABASE_REPLICAS and keys:
+        markers = {RECENT_WRITE_KEY.format(key): True for key in keys}
+        cache.set_many(markers, settings.REPLICA_STICKY_SECONDS)
+        transaction.on_commit(lambda: cache.set_many(markers, settings.REPLICA_STICKY_SECONDS))
+
+
+def build_and_cache(key : str, build, timeout : int, written_key=None):
+    """
+    Calls `build()` , from the primary while `written_key` (`key` by default) has a recent write , and caches
+    its result unless a write committed while it read a replica.
+    """
+    written_key = written_key or key
+    recent = recently_written(written_key)
+    with primary_reads() if recent else nullcontext():
+        data = build()
+    if data is not None and (recent or not recently_written(written_key)):
+        cache.set(key, data, timeout)
+    return data
+
+
+async def abuild_and_cache(key : str, build, timeout : int, written_key=None):
+    """
+    Async form of build_and_cache , `build` is a coroutine function.
+    """
+    written_key = written_key or key
+    recent = await arecently_written(written_key)
+    with primary_reads() if recent else nullcontext():
+        data = await build()
+    if data is not None and (recent or not await arecently_written(written_key)):
+        await cache.aset(key, data, timeout)
+    return data
+
+
+def cached_view(view : str, key : str, build):
+    """
+    Returns the cached serialized response under `key` , or calls `build()` and caches its result.
+    `build` returns the response data or None when there is nothing to cache (e.g. a 404).
+    """
+    data = cache.get(key)
+    if data is not None:
+        cache_stats.record(view, hit=True)
+        return data
+
+    cache_stats.record(view, hit=False)
+    return build_and_cache(key, build, settings.LOAN_VIEW_CACHE_TIMEOUT)
+
+
+async def acached_view(view : str, key : str, build):
+    """
+    Async form of cached_view , `build` is a coroutine function.
+    """
+    data = await cache.aget(key)
+    if data is not None:
+        cache_stats.record(view, hit=True)
+        return data
+
+    cache_stats.record(view, hit=False)
+    return await abuild_and_cache(key, build, settings.LOAN_VIEW_CACHE_TIMEOUT)
+
+
+def eligibility_version_key(customer_id) -> str:
+    return ELIGIBILITY_VERSION_KEY.format(customer_id)
+
+
+def _seconds_to_midnight(now=None) -> int:
+    now = now or dt.datetime.now()
+    midnight = dt.datetime.combine(now.date() + dt.timedelta(days=1), dt.time())
+    return max(1, int((midnight - now).total_seconds()))
+
+
+def _eligibility_version(customer_id):
+    """
+    Current cache version of a customer. A missing version starts as a random token rather than a counter ,
+    so a version key dropped by a bump (or evicted by Redis) never brings back the entries of an older one.
+    """
+    key = eligibility_version_key(customer_id)
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, uuid.uuid4().hex, None)
+        version = cache.get(key)
+    return version
+
+
+async def _aeligibility_version(customer_id):
+    key = eligibility_version_key(customer_id)
+    version = await cache.aget(key)
+    if version is None:
+        await cache.aadd(key, uuid.uuid4().hex, None)
+        version = await cache.aget(key)
+    return version
+
+
+def eligibility_key(terms : dict, version : str, today=None) -> str:
+    """
+    Cache key of an eligibility decision for validated loan terms.
+    """
+    today = today or dt.date.today()
+    return ELIGIBILITY_KEY.format(
+        terms["customer_id"], version, today.isoformat(),
+        terms["loan_amount"], terms["interest_rate"], terms["tenure"],
+    )
+
+
+def cached_eligibility(terms : dict, build):
+    """
+    Returns the cached eligibility response for the loan terms , or calls `build()` and caches its result
+    until the end of the day. `build` returns the response data or None when there is nothing to cache.
+    """
+    key = eligibility_key(terms, _eligibility_version(terms["customer_id"]))
+    data = cache.get(key)
+    if data is not None:
+        cache_stats.record('check_eligibility', hit=True)
+        return data
+
+    cache_stats.record('check_eligibility', hit=False)
+    # the recent-write marker of a customer's decisions sits on its version key
+    timeout = min(settings.ELIGIBILITY_CACHE_TIMEOUT, _seconds_to_midnight())
+    return build_and_cache(key, build, timeout, written_key=eligibility_version_key(terms["customer_id"]))
+
+
+async def acached_eligibility(terms : dict, build):
+    """
+    Async form of cached_eligibility , `build` is a coroutine function.
+    """
+    key = eligibility_key(terms, await _aeligibility_version(terms["customer_id"]))
+    data = await cache.aget(key)
+    if data is not None:
+        cache_stats.record('check_eligibility', hit=True)
+        return data
+
+    cache_stats.record('check_eligibility', hit=False)
+    timeout = min(settings.ELIGIBILITY_CACHE_TIMEOUT, _seconds_to_midnight())
+    return await abuild_and_cache(key, build, timeout, written_key=eligibility_version_key(terms["customer_id"]))
+
+
+def bump_eligibility_versions(customer_ids) -> None:
+    """
+    Drops the cache versions of the given customers , their cached decisions are never read again.
+    Done again once the transaction commits , a quote computed from the old rows in between is dropped too.
+    """
+    keys = [eligibility_version_key(customer_id) for customer_id in customer_ids]
+    if keys:
+        cache.delete_many(keys)
+        transaction.on_commit(lambda: cache.delete_many(keys))
+        mark_recent_writes(keys)
+
+
+def invalidate_loan_views(loan_ids=(), customer_ids=()) -> None:
+    """
+    Evicts the cached responses of the given loans and of the given customers' loan lists ,
+    and the cached eligibility decisions of those customers. Done again once the transaction commits ,
+    a response built from the old rows in between is dropped too.
+    """
+    keys = [loan_view_key(loan_id) for loan_id in loan_ids]
+    keys += [customer_loans_view_key(customer_id) for customer_id in customer_ids]
+    keys += [customer_loans_view_key(customer_id, include_archived=True) for customer_id in customer_ids]
+    if keys:
+        cache.delete_many(keys)
+        transaction.on_commit(lambda: cache.delete_many(keys))
+        mark_recent_writes(keys)
+    bump_eligibility_versions(customer_ids)
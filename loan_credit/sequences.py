@@ -0,0 +1,176 @@
+"""
+Block allocation of loan ids.
+
+Each process reserves a block of ids from the database in one round trip and hands them
+out from memory. On PostgreSQL the ids come from a native sequence , which is never rolled
+back , so two processes can never be handed the same id. Other databases use a counter row
+in LoanIdSequence instead.
+
+Reseeding after an import bumps a generation number , kept in LoanIdSequence and mirrored in
+the cache. Allocators check it before reserving a block and at most every
+LOAN_ID_GENERATION_CHECK_SECONDS while handing out ids , and drop blocks reserved in an older
+generation , which may overlap the imported ids. The allocator of the reseeding process drops its
+block at once , the others within that interval.
+"""
+import os
+import threading
+import time
+from collections import deque
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connections, transaction
+from django.db.models import F, Max
+from django.db.models.functions import Greatest
+
+from loan_credit.models import ArchivedLoan, LoanAppllication, LoanIdSequence
+
+LOAN_ID_SEQUENCE = 'loan_credit_loan_id_seq'
+LOAN_ID_GENERATION = 'loan_credit_loan_id_generation'
+GENERATION_CACHE_KEY = 'loan-ids:generation'
+FIRST_LOAN_ID = 1000
+DEFAULT_BLOCK_SIZE = 50
+DEFAULT_GENERATION_CHECK_SECONDS = 1
+
+
+def reserve_loan_ids(count : int, using='default') -> list:
+    """
+    Reserves `count` unused loan ids in a single round trip.
+    """
+    connection = connections[using]
+    if connection.vendor == 'postgresql':
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT nextval(%s) FROM generate_series(1, %s)", [LOAN_ID_SEQUENCE, count])
+            return [row[0] for row in cursor.fetchall()]
+
+    with transaction.atomic(using=using):
+        updated = LoanIdSequence.objects.using(using).filter(name=LOAN_ID_SEQUENCE).update(next_value=F('next_value') + count)
+        if not updated:
+            LoanIdSequence.objects.using(using).create(name=LOAN_ID_SEQUENCE, next_value=FIRST_LOAN_ID + count)
+        end = LoanIdSequence.objects.using(using).values_list('next_value', flat=True).get(name=LOAN_ID_SEQUENCE)
+    return list(range(end - count, end))
+
+
+def loan_id_generation(using='default') -> int:
+    """
+    Returns the current generation of the id source , from the cache when it has it.
+    """
+    try:
+        generation = cache.get(GENERATION_CACHE_KEY)
+    except Exception:
+        # without the cache every id costs a read of the counter row , loans can still be created
+        generation = None
+    if generation is None:
+        generation = LoanIdSequence.objects.using(using).filter(name=LOAN_ID_GENERATION).values_list('next_value', flat=True).first() or 0
+        try:
+            # add , so a value set by a concurrent reseed is not overwritten with the older one
+            cache.add(GENERATION_CACHE_KEY, generation, None)
+        except Exception:
+            pass
+    return generation
+
+
+def _next_generation(using='default') -> int:
+    with transaction.atomic(using=using):
+        updated = LoanIdSequence.objects.using(using).filter(name=LOAN_ID_GENERATION).update(next_value=F('next_value') + 1)
+        if not updated:
+            LoanIdSequence.objects.using(using).create(name=LOAN_ID_GENERATION, next_value=1)
+        generation = LoanIdSequence.objects.using(using).values_list('next_value', flat=True).get(name=LOAN_ID_GENERATION)
+    try:
+        cache.set(GENERATION_CACHE_KEY, generation, None)
+    except Exception:
+        pass
+    return generation
+
+
+def reseed_loan_ids(using='default') -> int:
+    """
+    Moves the id source past the highest loan_id in the table , used after loans are
+    imported with their own ids. Archived loans keep their ids , so they count too.
+    Blocks that allocators reserved before the reseed are discarded through the generation.
+    Returns the next id the source will hand out.
+    """
+    max_loan_id = max(
+        (
+            max_id for max_id in (
+                LoanAppllication.objects.using(using).aggregate(max_id=Max('loan_id'))['max_id'],
+                ArchivedLoan.objects.using(using).aggregate(max_id=Max('loan_id'))['max_id'],
+            ) if max_id is not None
+        ),
+        default=None,
+    )
+    next_id = max(max_loan_id + 1 if max_loan_id is not None else FIRST_LOAN_ID, FIRST_LOAN_ID)
+
+    connection = connections[using]
+    if connection.vendor == 'postgresql':
+        with connection.cursor() as cursor:
+            # setval(x) makes the following nextval return x + 1 , and the sequence is never moved backwards
+            cursor.execute(
+                f"SELECT setval(%s, GREATEST(%s, (SELECT last_value FROM {LOAN_ID_SEQUENCE})))",
+                [LOAN_ID_SEQUENCE, next_id - 1],
+            )
+            next_id = cursor.fetchone()[0] + 1
+    else:
+        with transaction.atomic(using=using):
+            updated = LoanIdSequence.objects.using(using).filter(name=LOAN_ID_SEQUENCE).update(next_value=Greatest(F('next_value'), next_id))
+            if not updated:
+                LoanIdSequence.objects.using(using).create(name=LOAN_ID_SEQUENCE, next_value=next_id)
+            next_id = LoanIdSequence.objects.using(using).values_list('next_value', flat=True).get(name=LOAN_ID_SEQUENCE)
+
+    _next_generation(using)
+    if using == loan_id_allocator.using:
+        loan_id_allocator.reset()
+    return next_id
+
+
+class LoanIdAllocator:
+    """
+    Thread safe, per process pool of reserved loan ids.
+    """
+
+    def __init__(self, block_size=None, using='default'):
+        self.block_size = block_size
+        self.using = using
+        self._ids = deque()
+        self._generation = None
+        self._generation_checked_at = None
+        self._lock = threading.Lock()
+
+    def _check_generation(self) -> None:
+        # read before reserving , so a reseed racing with the reservation retires the new block too
+        generation = loan_id_generation(self.using)
+        self._generation_checked_at = time.monotonic()
+        if generation != self._generation:
+            self._ids.clear()
+            self._generation = generation
+
+    def next_id(self) -> int:
+        with self._lock:
+            check_seconds = getattr(settings, 'LOAN_ID_GENERATION_CHECK_SECONDS', DEFAULT_GENERATION_CHECK_SECONDS)
+            if not self._ids or time.monotonic() - self._generation_checked_at >= check_seconds:
+                self._check_generation()
+            if not self._ids:
+                block_size = self.block_size or getattr(settings, 'LOAN_ID_BLOCK_SIZE', DEFAULT_BLOCK_SIZE)
+                self._ids.extend(reserve_loan_ids(block_size, using=self.using))
+            return self._ids.popleft()
+
+    def reset(self) -> None:
+        """
+        Drops the ids held in memory , the unused ones are simply skipped.
+        """
+        with self._lock:
+            self._ids.clear()
+
+    def _reset_after_fork(self) -> None:
+        # the parent's lock may have been held by another thread at fork time
+        self._ids = deque()
+        self._generation = None
+        self._generation_checked_at = None
+        self._lock = threading.Lock()
+
+
+loan_id_allocator = LoanIdAllocator()
+
+# a forked worker must not hand out the ids its parent already holds
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=loan_id_allocator._reset_after_fork)
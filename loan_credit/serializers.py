@@ -1,14 +1,23 @@
+from django.db.models import Manager
+from loan_credit.amortization import outstanding_principal
+from loan_credit.metrics import TimedSerializerMixin
 from loan_credit.models import Customer, LoanAppllication
 from rest_framework import serializers
 
+CUSTOMER_NOT_FOUND_MESSAGE = "Customer with this ID does not exist."
+PHONE_NUMBER_TAKEN_MESSAGE = "A customer with this phone number already exists."
+PHONE_NUMBER_REPEATED_MESSAGE = "This phone number is already used by an earlier customer of the batch."
+
 
 class RegistrationSerializer(serializers.ModelSerializer) :
     class Meta :
         model = Customer
         fields = '__all__'
+        # taken phone numbers are caught by the unique constraint on insert , not by a query per customer
+        extra_kwargs = {'phone_number': {'validators': []}}
 
 
-class CustomerDetailsSerializer(serializers.ModelSerializer) :
+class CustomerDetailsSerializer(TimedSerializerMixin, serializers.ModelSerializer) :
     name = serializers.SerializerMethodField()
     class Meta:
         model = Customer
@@ -25,22 +34,47 @@ class CustomerDetailsSerializer(serializers.ModelSerializer) :
         return f"{obj.first_name} {obj.last_name}".strip()
     
 
-class LoanEligibilityRequestSerializer(serializers.Serializer):
+class LoanTermsSerializer(serializers.Serializer):
+    """
+    Shape of a loan request without any database checks. The views load the customer with its credit summary
+    after validation , the batch path all customers in one query.
+    """
     customer_id = serializers.IntegerField(write_only=True)
     loan_amount = serializers.FloatField(min_value=1.0, write_only=True)
     interest_rate = serializers.FloatField(min_value=0.0, write_only=True)
     tenure = serializers.IntegerField(min_value=1, write_only=True)
 
-    def validate_customer_id(self, value):
-        """
-        Check that the customer exists in the database.
-        """
-        if not Customer.objects.filter(pk=value).exists():
-            raise serializers.ValidationError("Customer with this ID does not exist.")
-        return value
+
+class EmiPaymentSerializer(serializers.Serializer):
+    """
+    One EMI payment event. Only payments made on time count towards emis_paid_on_time.
+    """
+    payment_id = serializers.CharField(max_length=100)
+    loan_id = serializers.IntegerField(min_value=1)
+    paid_on_time = serializers.BooleanField(default=True)
+    paid_at = serializers.DateTimeField(required=False, allow_null=True, default=None)
+
+
+class ExportRequestSerializer(serializers.Serializer):
+    """
+    Options of a loans / customers export , shared by /export/<table>/ and the export_data command.
+    The exported table comes in the context as `table`.
+    """
+    output = serializers.ChoiceField(choices=['csv', 'parquet'], default='csv')
+    approved_from = serializers.DateField(required=False)
+    approved_to = serializers.DateField(required=False)
+    customer_id = serializers.IntegerField(min_value=1, required=False)
+    include_archived = serializers.BooleanField(default=False)
+
+    def validate(self, data):
+        if self.context.get("table") == "customers" and ("approved_from" in data or "approved_to" in data) :
+            raise serializers.ValidationError({"approved_from": ["Approval dates only filter the loans export."]})
+        if "approved_from" in data and "approved_to" in data and data["approved_from"] > data["approved_to"] :
+            raise serializers.ValidationError({"approved_to": ["Must not be before approved_from."]})
+        return data
 
 
-class LoanEligibilityResponseSerializer(serializers.Serializer):
+class LoanEligibilityResponseSerializer(TimedSerializerMixin, serializers.Serializer):
 
     customer_id = serializers.IntegerField(read_only=True)
     approval = serializers.BooleanField(read_only=True)
@@ -50,14 +84,7 @@ class LoanEligibilityResponseSerializer(serializers.Serializer):
     monthly_installment = serializers.FloatField(read_only=True)
 
 
-class LoanCreationRequestSerializer(serializers.ModelSerializer):
-    class Meta :
-        model = LoanAppllication
-        fields = '__all__'
-
-
-
-class LoanCreationResponseSerailizer(serializers.Serializer):
+class LoanCreationResponseSerailizer(TimedSerializerMixin, serializers.Serializer):
     
     loan_id = serializers.IntegerField(required=False, allow_null=True)
     customer_id = serializers.PrimaryKeyRelatedField(queryset=Customer.objects.all())
@@ -85,8 +112,41 @@ class CustomerDetailsResponse(serializers.ModelSerializer):
             'phone_number',
             'age',
         ]
-class ViewLoanApplicationResponse(serializers.ModelSerializer):
+class OutstandingPrincipalMixin:
+    """
+    Adds the principal still owed after the installments paid so far.
+    """
+    def get_outstanding_principal(self, obj):
+        # filled in for the whole page at once by OutstandingPrincipalListSerializer
+        if hasattr(obj, 'outstanding_principal'):
+            return obj.outstanding_principal
+        return outstanding_principal(
+            [obj.loan_amount], [obj.interest_rate], [obj.tenure], [obj.emis_paid_on_time or 0], [obj.monthly_installment]
+        ).tolist()[0]
+
+
+class OutstandingPrincipalListSerializer(TimedSerializerMixin, serializers.ListSerializer):
+    """
+    Computes the outstanding principal of every loan in one array operation before rendering the rows.
+    """
+    def to_representation(self, data):
+        loans = list(data.all() if isinstance(data, Manager) else data)
+        if loans:
+            balances = outstanding_principal(
+                [loan.loan_amount for loan in loans],
+                [loan.interest_rate for loan in loans],
+                [loan.tenure for loan in loans],
+                [loan.emis_paid_on_time or 0 for loan in loans],
+                [loan.monthly_installment for loan in loans],
+            )
+            for loan, balance in zip(loans, balances.tolist()):
+                loan.outstanding_principal = balance
+        return super().to_representation(loans)
+
+
+class ViewLoanApplicationResponse(TimedSerializerMixin, OutstandingPrincipalMixin, serializers.ModelSerializer):
     customer = CustomerDetailsResponse(source='customer_id', read_only=True)
+    outstanding_principal = serializers.SerializerMethodField()
 
     class Meta:
         model = LoanAppllication
@@ -96,13 +156,15 @@ class ViewLoanApplicationResponse(serializers.ModelSerializer):
             'loan_amount',
             'interest_rate',
             'monthly_installment',
-            'tenure'
+            'tenure',
+            'outstanding_principal',
         ]
         read_only_fields = fields
 
 
-class ViewAllLoanApplicationsResponse(serializers.ModelSerializer):
+class ViewAllLoanApplicationsResponse(OutstandingPrincipalMixin, serializers.ModelSerializer):
     repayments_left = serializers.SerializerMethodField()
+    outstanding_principal = serializers.SerializerMethodField()
     class Meta:
         model = LoanAppllication
         fields = [
@@ -111,10 +173,31 @@ class ViewAllLoanApplicationsResponse(serializers.ModelSerializer):
             'interest_rate',
             'monthly_installment',
             'repayments_left',
+            'outstanding_principal',
         ]
         read_only_fields = fields
+        list_serializer_class = OutstandingPrincipalListSerializer
 
     def get_repayments_left(self, obj):
         total_repayments = obj.tenure
         repayments_made = obj.emis_paid_on_time or 0
         return total_repayments - repayments_made
+
+
+class LoanScheduleInstallment(serializers.Serializer):
+    month = serializers.IntegerField(read_only=True)
+    payment = serializers.FloatField(read_only=True)
+    principal = serializers.FloatField(read_only=True)
+    interest = serializers.FloatField(read_only=True)
+    balance = serializers.FloatField(read_only=True)
+
+
+class LoanScheduleResponse(TimedSerializerMixin, serializers.Serializer):
+    loan_id = serializers.IntegerField(read_only=True)
+    loan_amount = serializers.FloatField(read_only=True)
+    interest_rate = serializers.FloatField(read_only=True)
+    tenure = serializers.IntegerField(read_only=True)
+    monthly_installment = serializers.FloatField(read_only=True)
+    installments_paid = serializers.IntegerField(read_only=True)
+    outstanding_principal = serializers.FloatField(read_only=True)
+    schedule = LoanScheduleInstallment(many=True, read_only=True)
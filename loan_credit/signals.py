@@ -0,0 +1,64 @@
+from celery.signals import task_prerun
+from django.core.signals import request_started
+from django.db.backends.signals import connection_created
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from loan_credit.archive import is_archiving
+from loan_credit.db_pool import connection_stats
+from loan_credit.db_router import reset_routing
+from loan_credit.metrics import install_query_timer
+from loan_credit.models import ArchivedLoan, Customer, LoanAppllication
+from loan_credit.response_cache import invalidate_loan_views
+from loan_credit.summaries import apply_new_loan, invalidate_summaries
+
+
+@receiver(post_save, sender=LoanAppllication)
+def update_credit_summary_on_save(sender, instance, created, **kwargs):
+    # new loans are folded into the summary , edits only mark it for a rebuild
+    if created:
+        apply_new_loan(instance)
+    else:
+        invalidate_summaries([instance.customer_id_id])
+
+
+@receiver(post_delete, sender=LoanAppllication)
+def update_credit_summary_on_delete(sender, instance, **kwargs):
+    # an archived loan moves to the customer's history , the summary stays as it is
+    if is_archiving():
+        return
+    invalidate_summaries([instance.customer_id_id])
+
+
+@receiver(post_save, sender=LoanAppllication)
+@receiver(post_delete, sender=LoanAppllication)
+def evict_loan_views(sender, instance, **kwargs):
+    # the archival evicts the views of a whole batch at once
+    if is_archiving():
+        return
+    invalidate_loan_views(loan_ids=[instance.loan_id], customer_ids=[instance.customer_id_id])
+
+
+@receiver(post_save, sender=Customer)
+@receiver(post_delete, sender=Customer)
+def evict_customer_loan_views(sender, instance, **kwargs):
+    # view-loan embeds the customer's details , so every loan of the customer goes. A new customer has no loans yet.
+    loan_ids = []
+    if not kwargs.get('created'):
+        loan_ids = list(
+            LoanAppllication.objects.filter(customer_id=instance.pk).values_list('loan_id', flat=True)
+            .union(ArchivedLoan.objects.filter(customer_id=instance.pk).values_list('loan_id', flat=True), all=True)
+        )
+    invalidate_loan_views(loan_ids=loan_ids, customer_ids=[instance.pk])
+
+
+# connection usage , see loan_credit/db_pool.py
+request_started.connect(connection_stats.record_checkout, dispatch_uid='loan_credit_request_checkout')
+task_prerun.connect(connection_stats.record_checkout, weak=False, dispatch_uid='loan_credit_task_checkout')
+connection_created.connect(connection_stats.record_connection, dispatch_uid='loan_credit_connection_opened')
+
+# a task starts on the replicas like a request does , whatever the previous task on this worker wrote
+task_prerun.connect(reset_routing, weak=False, dispatch_uid='loan_credit_task_routing')
+
+# per request query count and DB time , see loan_credit/metrics.py
+connection_created.connect(install_query_timer, dispatch_uid='loan_credit_query_timer')
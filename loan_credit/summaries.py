@@ -0,0 +1,250 @@
+"""
+Maintenance of the per-customer CustomerCreditSummary rows.
+
+A summary is rebuilt from the loan table with one grouped aggregate, and new approved
+loans are folded into it with a single UPDATE so the row stays current without rescanning history.
+The lifetime figures of archived loans come from CustomerLoanHistory and are added on every rebuild.
+"""
+import datetime as dt
+
+from asgiref.sync import sync_to_async
+from django.db import transaction
+from django.db.models import Case, Count, F, FloatField, IntegerField, Min, Q, Sum, Value, When
+from django.db.models.functions import Cast, Coalesce
+from django.utils import timezone
+
+from loan_credit.metrics import span
+from loan_credit.models import Customer, CustomerCreditSummary, CustomerLoanHistory, LoanAppllication
+
+SUMMARY_FIELDS = [
+    'num_loans_taken',
+    'num_loans_fully_paid',
+    'total_emis_paid',
+    'total_tenure_months',
+    'loan_approved_volume',
+    'current_loan_sum',
+    'total_current_emis',
+    'active_until',
+    'activity_year',
+    'loan_activity_current_year',
+    'needs_refresh',
+]
+
+# the summary fields archived loans still count towards , kept per customer in CustomerLoanHistory
+HISTORY_FIELDS = ['num_loans_taken', 'num_loans_fully_paid', 'total_emis_paid', 'total_tenure_months', 'loan_approved_volume']
+
+
+def _as_date(value):
+    if isinstance(value, dt.datetime):
+        return value.date()
+    return value
+
+
+def summary_aggregates(today) -> dict:
+    """
+    Aggregate expressions over approved loans, used grouped by customer.
+    """
+    active = Q(end_date__gte=today) | Q(end_date__isnull=True)
+    # a plain date range instead of an extracted year , so the approval date index stays usable
+    current_year = Q(date_of_approval__gte=dt.date(today.year, 1, 1), date_of_approval__lt=dt.date(today.year + 1, 1, 1))
+    return {
+        'num_loans_taken': Count('loan_id'),
+        'num_loans_fully_paid': Count('loan_id', filter=Q(emis_paid_on_time__gte=F('tenure'))),
+        'total_emis_paid': Coalesce(Sum(Cast('emis_paid_on_time', output_field=IntegerField())), Value(0)),
+        'total_tenure_months': Coalesce(Sum(Cast('tenure', output_field=IntegerField())), Value(0)),
+        'loan_approved_volume': Coalesce(Sum('loan_amount'), Value(0, output_field=FloatField())),
+        'current_loan_sum': Coalesce(Sum('loan_amount', filter=active), Value(0, output_field=FloatField())),
+        'total_current_emis': Coalesce(Sum('monthly_installment', filter=active), Value(0, output_field=FloatField())),
+        'active_until': Min('end_date', filter=Q(end_date__gte=today)),
+        'loan_activity_current_year': Count('loan_id', filter=current_year),
+    }
+
+
+def compute_summaries(customer_ids, today=None) -> dict:
+    """
+    Builds unsaved CustomerCreditSummary objects for the given customers from the loan table.
+    Customers without approved loans get an empty summary.
+    """
+    today = today or dt.date.today()
+    customer_ids = list(customer_ids)
+
+    rows = (
+        LoanAppllication.objects
+        .filter(customer_id__in=customer_ids, loan_approved=True)
+        .values('customer_id')
+        .annotate(**summary_aggregates(today))
+        .order_by()
+    )
+    histories = CustomerLoanHistory.objects.filter(customer_id__in=customer_ids).values('customer_id', *HISTORY_FIELDS)
+    with span('summary_aggregate'):
+        aggregated = {row.pop('customer_id'): row for row in rows}
+        histories = {row.pop('customer_id'): row for row in histories}
+
+    summaries = {}
+    for customer_id in customer_ids:
+        values = aggregated.get(customer_id, {})
+        history = histories.get(customer_id)
+        if history:
+            values = dict(values)
+            for field in HISTORY_FIELDS:
+                values[field] = values.get(field, 0) + history[field]
+        summaries[customer_id] = CustomerCreditSummary(
+            customer_id=customer_id,
+            activity_year=today.year,
+            **values,
+        )
+    return summaries
+
+
+def refresh_summaries(customer_ids, today=None) -> dict:
+    """
+    Recomputes and stores the summaries of the given (existing) customers.
+    The existing rows are locked first so a concurrent loan write cannot slip between the aggregate and the save.
+    """
+    today = today or dt.date.today()
+    customer_ids = list(customer_ids)
+    if not customer_ids:
+        return {}
+
+    with transaction.atomic():
+        list(CustomerCreditSummary.objects.select_for_update().filter(customer_id__in=customer_ids).values_list('pk', flat=True))
+        summaries = compute_summaries(customer_ids, today)
+        CustomerCreditSummary.objects.bulk_create(
+            summaries.values(),
+            update_conflicts=True,
+            unique_fields=['customer'],
+            update_fields=SUMMARY_FIELDS + ['updated_at'],
+        )
+    return summaries
+
+
+def rebuild_all_summaries(batch_size=1000, today=None) -> int:
+    """
+    Rebuilds the summary of every customer , batch by batch. Returns the number of customers processed.
+    """
+    today = today or dt.date.today()
+    customer_ids = Customer.objects.order_by('pk').values_list('pk', flat=True)
+    processed = 0
+    batch = []
+    for customer_id in customer_ids.iterator(chunk_size=batch_size):
+        batch.append(customer_id)
+        if len(batch) >= batch_size:
+            refresh_summaries(batch, today)
+            processed += len(batch)
+            batch = []
+    if batch:
+        refresh_summaries(batch, today)
+        processed += len(batch)
+    return processed
+
+
+def get_customer_summaries(customer_ids, today=None) -> dict:
+    """
+    Returns the up to date summaries of the given customers keyed by customer id , with the customer
+    rows attached. Unknown customers are left out. All rows are read in one query and the missing
+    or stale ones are rebuilt together with one grouped aggregate.
+    """
+    today = today or dt.date.today()
+    customers = Customer.objects.select_related('credit_summary').filter(pk__in=list(customer_ids))
+
+    summaries = {}
+    to_refresh = []
+    with span('summary_read'):
+        customers = list(customers)
+    for customer in customers:
+        try:
+            summary = customer.credit_summary
+        except CustomerCreditSummary.DoesNotExist:
+            summary = None
+        if summary is None or summary.is_stale(today):
+            to_refresh.append(customer)
+            continue
+        summary.customer = customer
+        summaries[customer.pk] = summary
+
+    if to_refresh:
+        refreshed = refresh_summaries([customer.pk for customer in to_refresh], today)
+        for customer in to_refresh:
+            summary = refreshed[customer.pk]
+            summary.customer = customer
+            summaries[customer.pk] = summary
+    return summaries
+
+
+def get_customer_summary(customer_id, today=None):
+    """
+    Returns the up to date summary of a customer with the customer row attached,
+    or None if the customer does not exist.
+    """
+    return get_customer_summaries([customer_id], today).get(customer_id)
+
+
+async def aget_customer_summary(customer_id, today=None):
+    """
+    Async form of get_customer_summary. The read goes through the async ORM , a missing or stale
+    summary is rebuilt by refresh_summaries in a worker thread since it needs a transaction and a row lock.
+    """
+    today = today or dt.date.today()
+    with span('summary_read'):
+        customer = await Customer.objects.select_related('credit_summary').filter(pk=customer_id).afirst()
+    if customer is None:
+        return None
+
+    try:
+        summary = customer.credit_summary
+    except CustomerCreditSummary.DoesNotExist:
+        summary = None
+    if summary is None or summary.is_stale(today):
+        summary = (await sync_to_async(refresh_summaries)([customer.pk], today))[customer.pk]
+    summary.customer = customer
+    return summary
+
+
+def apply_new_loan(loan, today=None) -> None:
+    """
+    Folds a newly inserted approved loan into its customer's summary with one UPDATE.
+    If the customer has no summary row yet nothing is written , the row is built from scratch on first read.
+    """
+    if not loan.loan_approved:
+        return
+
+    today = today or dt.date.today()
+    end_date = _as_date(loan.end_date)
+    date_of_approval = _as_date(loan.date_of_approval)
+    emis_paid = loan.emis_paid_on_time or 0
+
+    changes = {
+        'updated_at': timezone.now(),
+        'num_loans_taken': F('num_loans_taken') + 1,
+        'total_emis_paid': F('total_emis_paid') + emis_paid,
+        'total_tenure_months': F('total_tenure_months') + loan.tenure,
+        'loan_approved_volume': F('loan_approved_volume') + loan.loan_amount,
+    }
+    if emis_paid >= loan.tenure:
+        changes['num_loans_fully_paid'] = F('num_loans_fully_paid') + 1
+
+    if end_date is None or end_date >= today:
+        changes['current_loan_sum'] = F('current_loan_sum') + loan.loan_amount
+        changes['total_current_emis'] = F('total_current_emis') + (loan.monthly_installment or 0)
+    if end_date is not None and end_date >= today:
+        changes['active_until'] = Case(
+            When(active_until__isnull=True, then=Value(end_date)),
+            When(active_until__gt=end_date, then=Value(end_date)),
+            default=F('active_until'),
+        )
+
+    if date_of_approval is not None:
+        changes['loan_activity_current_year'] = Case(
+            When(activity_year=date_of_approval.year, then=F('loan_activity_current_year') + 1),
+            default=F('loan_activity_current_year'),
+        )
+
+    CustomerCreditSummary.objects.filter(customer_id=loan.customer_id_id).update(**changes)
+
+
+def invalidate_summaries(customer_ids) -> None:
+    """
+    Flags the summaries of the given customers for a rebuild on their next read.
+    Used when loans are changed or removed , where the old values needed for an incremental update are gone.
+    """
+    CustomerCreditSummary.objects.filter(customer_id__in=list(customer_ids)).update(needs_refresh=True, updated_at=timezone.now())
@@ -0,0 +1,144 @@
+"""
+Synthetic customers and loans for load tests.
+
+Incomes are log-normal, ages cluster around the late thirties, and a minority of customers hold most
+of the loans. Loan amounts scale with the borrower's income. Repayment follows the approval date, and
+most borrowers are fully paid up. The rows are generated chunk by chunk and loaded through
+ingestion.insert_chunk (COPY on PostgreSQL). After the load the id sequences are moved past the new
+rows and the credit summaries are rebuilt, the same as after a workbook import.
+"""
+import datetime as dt
+import math
+import random
+import time
+
+from django.conf import settings
+from django.db.models import Max
+
+from loan_credit.ingestion import drop_taken_phone_numbers, insert_chunk, reset_customer_id_sequence
+from loan_credit.models import Customer, LoanAppllication
+from loan_credit.sequences import reserve_loan_ids
+from loan_credit.summaries import rebuild_all_summaries
+from loan_credit.utils import calculate_monthly_installments
+
+FIRST_NAMES = ['Aarav', 'Ananya', 'Carlos', 'Chen', 'Fatima', 'Hana', 'Ivan', 'Kofi', 'Lena', 'Maya', 'Noah', 'Omar', 'Priya', 'Ravi', 'Sara', 'Yuki']
+LAST_NAMES = ['Ahmed', 'Bose', 'Costa', 'Das', 'Garcia', 'Iyer', 'Kim', 'Mehta', 'Nguyen', 'Okafor', 'Patel', 'Rossi', 'Singh', 'Smith', 'Tanaka', 'Verma']
+TENURES = [6, 12, 18, 24, 36, 48, 60]
+TENURE_WEIGHTS = [5, 20, 10, 25, 20, 10, 10]
+REJECTED_MESSAGE = "Credit Score is Too Low TO Approve The Loan , You may not paid your previous EMIs on time"
+
+
+def _clip(value, low, high):
+    return max(low, min(high, value))
+
+
+def synthetic_customers(count : int, first_id : int, rng : random.Random):
+    """
+    Yields `count` unsaved customers with ids from `first_id` on.
+    """
+    for customer_id in range(first_id, first_id + count):
+        monthly_income = int(round(_clip(rng.lognormvariate(math.log(50000), 0.6), 10000, 2000000), -3))
+        yield Customer(
+            customer_id=customer_id,
+            first_name=rng.choice(FIRST_NAMES),
+            last_name=rng.choice(LAST_NAMES),
+            phone_number=str(6000000000 + customer_id)[:10],
+            age=int(_clip(rng.gauss(38, 10), 21, 70)),
+            monthly_income=monthly_income,
+            approved_limit=36 * monthly_income,
+        )
+
+
+def synthetic_loans(loan_ids : list, customers : list, rng : random.Random, today : dt.date, rejected_ratio : float = 0.08) -> list:
+    """
+    Builds one unsaved loan per id for customers drawn from `customers` , a list of (customer_id, monthly_income).
+    Squaring the uniform draw skews the picks , so the first customers of the list borrow most often.
+    """
+    loans = []
+    for loan_id in loan_ids:
+        customer_id, monthly_income = customers[int(len(customers) * rng.random() ** 2)]
+        tenure = rng.choices(TENURES, TENURE_WEIGHTS)[0]
+        loan = LoanAppllication(
+            loan_id=loan_id,
+            customer_id_id=customer_id,
+            loan_amount=float(round(monthly_income * rng.uniform(1, 24), -3) or 1000),
+            tenure=tenure,
+            interest_rate=round(_clip(rng.gauss(12, 3), 6, 24), 2),
+            emis_paid_on_time=0,
+            loan_approved=rng.random() >= rejected_ratio,
+        )
+        if loan.loan_approved:
+            loan.date_of_approval = today - dt.timedelta(days=rng.randint(0, 8 * 365))
+            loan.end_date = loan.date_of_approval + dt.timedelta(days=30 * tenure)
+            months_elapsed = min(tenure, (today - loan.date_of_approval).days // 30)
+            # most borrowers are up to date , the rest missed a share of their installments
+            loan.emis_paid_on_time = months_elapsed if rng.random() < 0.8 else int(months_elapsed * rng.uniform(0.3, 1))
+        else:
+            loan.message = REJECTED_MESSAGE
+        loans.append(loan)
+
+    installments = calculate_monthly_installments(
+        [loan.loan_amount for loan in loans],
+        [loan.interest_rate for loan in loans],
+        [loan.tenure for loan in loans],
+    )
+    for loan, installment in zip(loans, installments.tolist()):
+        loan.monthly_installment = round(installment, 2)
+    return loans
+
+
+def _stats(rows : int, seconds : float) -> dict:
+    return {
+        'rows': rows,
+        'seconds': round(seconds, 3),
+        'rows_per_second': round(rows / seconds, 1) if seconds else 0.0,
+    }
+
+
+def generate_synthetic_data(customers : int, loans : int, seed : int = 42, chunk_size=None, use_copy=True, today=None) -> dict:
+    """
+    Adds `customers` customers and `loans` loans spread over them (new and existing customers alike).
+
+    Customers whose phone number is already taken are skipped and counted in `left_out` , like /register/bulk/.
+
+    Returns:
+        dict: rows , seconds and rows per second of the customer load , the loan load and the summary rebuild.
+    """
+    chunk_size = chunk_size or settings.INGESTION_CHUNK_SIZE
+    today = today or dt.date.today()
+    rng = random.Random(seed)
+    report = {}
+
+    started = time.perf_counter()
+    first_id = (Customer.objects.aggregate(max_id=Max('customer_id'))['max_id'] or 0) + 1
+    inserted = 0
+    chunk = []
+    for customer in synthetic_customers(customers, first_id, rng):
+        chunk.append(customer)
+        if len(chunk) >= chunk_size:
+            chunk = drop_taken_phone_numbers(chunk)
+            insert_chunk(Customer, chunk, use_copy)
+            inserted += len(chunk)
+            chunk = []
+    if chunk:
+        chunk = drop_taken_phone_numbers(chunk)
+        insert_chunk(Customer, chunk, use_copy)
+        inserted += len(chunk)
+    reset_customer_id_sequence()
+    report['customers'] = _stats(inserted, time.perf_counter() - started)
+    report['customers']['left_out'] = customers - inserted
+
+    started = time.perf_counter()
+    borrowers = list(Customer.objects.order_by('customer_id').values_list('customer_id', 'monthly_income'))
+    # shuffled with the seed , so the heavy borrowers are not simply the oldest customers
+    rng.shuffle(borrowers)
+    remaining = loans if borrowers else 0
+    while remaining > 0:
+        size = min(chunk_size, remaining)
+        insert_chunk(LoanAppllication, synthetic_loans(reserve_loan_ids(size), borrowers, rng, today), use_copy)
+        remaining -= size
+    report['loans'] = _stats(loans if borrowers else 0, time.perf_counter() - started)
+
+    started = time.perf_counter()
+    report['summaries'] = _stats(rebuild_all_summaries(today=today), time.perf_counter() - started)
+    return report
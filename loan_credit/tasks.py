@@ -1,12 +1,30 @@
 # In core/management/commands/ingest_data.py
 
+import datetime as dt
+import logging
 import os
-import pandas as pd
+import shutil
+import uuid
 
-from credit_approver import settings
-from celery import shared_task
+from django.conf import settings
+from celery import chord, shared_task
 from celery.signals import worker_ready
-from loan_credit.models import Customer, LoanAppllication # Make sure to import your models from your app
+from django.db import IntegrityError, OperationalError
+from django.utils import timezone
+from loan_credit.archive import archive_matured_loans as archive_loans
+from loan_credit.decisions import close_batch_window, decide_pending_loans
+from loan_credit.delta_ingestion import format_delta_stats, ingest_delta_workbooks
+from loan_credit.ingestion import (
+    CUSTOMER_COLUMNS, LOAN_COLUMNS, IngestionMismatch, format_stats, ingest_customers, ingest_loans, reset_customer_id_sequence,
+    split_workbook,
+)
+from loan_credit.models import Customer, IdempotencyRecord, LoanAppllication # Make sure to import your models from your app
+from loan_credit.payments import consume_payment_stream
+from loan_credit.rescoring import rescore_portfolio as rescore_all_customers
+from loan_credit.sequences import reseed_loan_ids
+from loan_credit.summaries import rebuild_all_summaries
+
+logger = logging.getLogger(__name__)
 
 """
 This module defines a Celery task to ingest customer and loan data from specified Excel files into the database.
@@ -17,64 +35,191 @@ This module defines a Celery task to ingest customer and loan data from specifie
 def injest_data(*args, **options):
     """
     The main logic of the command. This is where the data ingestion happens.
+
+    Works as a coordinator : both workbooks are read once and their rows dealt out to partition files under
+    INGESTION_PARTITION_DIR , and every partition is ingested by its own task , so the load spreads over all
+    workers. A Customer ID / Loan ID repeated in a workbook keeps its first row. Customers go first (loans
+    reference them) , then the loans , and finalize_ingestion reconciles the counts once every loan partition
+    is in. Partitions upsert , so re-running an ingestion that failed half way only rewrites what is already there.
+    Errors are raised , a missing file or column fails the task.
     """
-    customers_path = os.path.join(settings.BASE_DIR, 'customer_data.xlsx')
-    loans_path = os.path.join(settings.BASE_DIR, 'loan_data.xlsx')
-        
+    customers_path = options.get('customers_path') or os.path.join(settings.BASE_DIR, 'customer_data.xlsx')
+    loans_path = options.get('loans_path') or os.path.join(settings.BASE_DIR, 'loan_data.xlsx')
+    partitions = options.get('partitions') or settings.INGESTION_PARTITIONS
+    # every worker reads the partition files , the directory has to be on storage they share
+    run_directory = os.path.join(settings.INGESTION_PARTITION_DIR, uuid.uuid4().hex)
+
     print(f'Starting data ingestion from {customers_path} and {loans_path}')
 
+    # --- 1. Split the workbooks into partitions ---
     try:
-            # --- 1. Ingest Customer Data ---
-        print('Reading customer data...')
-        customer_df = pd.read_excel(customers_path)
-        customer_to_create = []
-        for _, row in customer_df.iterrows():
-                # This will find a customer by customer_id and update it,
-                # or create a new one if it doesn't exist.
-                
-            customer_to_create.append(Customer(
-                        first_name=row['First Name'],
-                        last_name=row['Last Name'],
-                        age=row['Age'],
-                        phone_number=row['Phone Number'],
-                        monthly_income=row['Monthly Salary'],
-                        approved_limit=row['Approved Limit']
-                ))
-
-        Customer.objects.bulk_create(customer_to_create, ignore_conflicts=True)
-        print(f'Bulk created {len(customer_to_create)} customer records.')
-        # --- 2. Ingest Loan Data ---
-        print('Reading loan data...')
-        loan_df = pd.read_excel(loans_path)
-            
-        loans_to_create = []
-        loan_ids  = []
-        for _, row in loan_df.iterrows():
-            loan_ids.append(row["Loan ID"])
-            loans_to_create.append(
-                    LoanAppllication(
-                        loan_id = row["Loan ID"] ,
-                        customer_id_id=row['Customer ID'],
-                        loan_amount=row['Loan Amount'],
-                        tenure=row['Tenure'],
-                        interest_rate=row['Interest Rate'],
-                        monthly_installment=row['Monthly payment'],
-                        emis_paid_on_time=row['EMIs paid on Time'],
-                        date_of_approval=row['Date of Approval'],
-                        end_date=row['End Date'],
-                        loan_approved=True
-                    )
-                )
-
-        LoanAppllication.objects.bulk_create(loans_to_create, ignore_conflicts=True)
-        print(f'Bulk created or ignored {len(loans_to_create)} loan records.')
-
-    except FileNotFoundError as e:
-            print(f'Error: A file was not found. Please check paths. {e}')
-    except KeyError as e:
-            print(f'Error: A column name in the Excel file is incorrect. Missing column: {e}')
-    except Exception as e:
-            print(f'An unexpected error occurred: {e}')
+        customers = split_workbook(customers_path, CUSTOMER_COLUMNS, 'customer_id', partitions, os.path.join(run_directory, 'customers'))
+        loans = split_workbook(loans_path, LOAN_COLUMNS, 'loan_id', partitions, os.path.join(run_directory, 'loans'))
+    except Exception:
+        shutil.rmtree(run_directory, ignore_errors=True)
+        raise
+    print(
+        f"Dispatching {len(customers['files'])} customer and {len(loans['files'])} loan partitions , "
+        f"{customers['duplicates']} repeated customer and {loans['duplicates']} repeated loan rows left out."
+    )
+
+    # --- 2. Ingest Customer Data , then the loans once every customer partition is in ---
+    expected = {
+        'customers': {'rows': customers['rows'], 'duplicates': customers['duplicates']},
+        'loans': {'rows': loans['rows'], 'duplicates': loans['duplicates']},
+    }
+    chord(
+        ingest_partition.si('customers', partition_path)
+        for partition_path in customers['files']
+    )(ingest_loan_partitions.s(loans['files'], expected, run_directory))
+
+    return {'customer_partitions': len(customers['files']), 'loan_partitions': len(loans['files'])}
+
+
+@shared_task(autoretry_for=(OperationalError,), retry_backoff=True, max_retries=3)
+def injest_delta_data(customers_path=None, loans_path=None):
+    """
+    Daily refresh from the workbooks : only rows that are new or changed since the last run are written , an
+    unchanged workbook is skipped by its file hash , and a retry resumes after the last committed chunk.
+    """
+    customers_path = customers_path or os.path.join(settings.BASE_DIR, 'customer_data.xlsx')
+    loans_path = loans_path or os.path.join(settings.BASE_DIR, 'loan_data.xlsx')
+
+    report = ingest_delta_workbooks(customers_path, loans_path)
+    print(format_delta_stats('Customers', report['customers']))
+    print(format_delta_stats('Loans', report['loans']))
+    return report
+
+
+# IntegrityError: two partitions committing the same phone number at once , the retry leaves out the later one
+@shared_task(autoretry_for=(OperationalError, IntegrityError), retry_backoff=True, max_retries=3)
+def ingest_partition(kind, path):
+    """
+    Upserts the rows of one partition file written by split_workbook. Safe to retry , rows already written are overwritten.
+    The rows are marked as imported , so a later delta run does not take them for rows created through the API.
+    Customers with a phone number taken by another customer , and their loans , are left out and counted.
+    """
+    ingest = ingest_customers if kind == 'customers' else ingest_loans
+    stats = ingest(path, upsert=True, mark=True)
+    print(format_stats(f'{kind.title()} {os.path.basename(path)}', stats))
+    return {'kind': kind, 'path': path, 'rows': stats['rows'], 'left_out': stats['left_out'], 'seconds': stats['seconds']}
+
+
+@shared_task
+def ingest_loan_partitions(customer_results, loan_files, expected, run_directory):
+    """
+    Chord callback of the customer partitions , fans the loan partitions out.
+    """
+    chord(
+        ingest_partition.si('loans', partition_path)
+        for partition_path in loan_files
+    )(finalize_ingestion.s(customer_results, expected, run_directory))
+
+
+@shared_task
+def finalize_ingestion(loan_results, customer_results, expected, run_directory):
+    """
+    Chord callback of the loan partitions. Reconciles the rows read against the partitioned rows and the
+    table counts , reseeds the id sequences , rebuilds the credit summaries and removes the partition files.
+
+    Every partition row has to be written or left out , and the table has to hold at least the rows written.
+    Otherwise the kind is flagged with `mismatch` , logged as an error and IngestionMismatch is raised once the
+    rest of the run is done , so the task fails.
+    """
+    report = {}
+    for kind, results, model in (('customers', customer_results, Customer), ('loans', loan_results, LoanAppllication)):
+        report[kind] = {
+            'expected_rows': expected[kind]['rows'],
+            'duplicates': expected[kind]['duplicates'],
+            'rows_read': sum(result['rows'] + result['left_out'] for result in results),
+            'left_out': sum(result['left_out'] for result in results),
+            'in_table': model.objects.count(),
+            'partitions': len(results),
+        }
+        written = report[kind]['rows_read'] - report[kind]['left_out']
+        report[kind]['mismatch'] = (
+            report[kind]['rows_read'] != report[kind]['expected_rows'] or report[kind]['in_table'] < written
+        )
+        left_out = (
+            f"{report[kind]['left_out']} rows left out for a taken phone number , an archived loan or a missing customer , "
+            if report[kind]['left_out'] else ""
+        )
+        print(
+            f"{kind.title()}: {report[kind]['rows_read']} of {report[kind]['expected_rows']} rows read "
+            f"over {report[kind]['partitions']} partitions , {report[kind]['duplicates']} repeated rows left out , "
+            f"{left_out}{report[kind]['in_table']} in the table."
+        )
+        if report[kind]['mismatch']:
+            logger.error(
+                "%s ingestion counts do not add up: %s rows read of %s partitioned , %s rows written , %s in the table",
+                kind.title(), report[kind]['rows_read'], report[kind]['expected_rows'], written, report[kind]['in_table'],
+            )
+
+    # imported rows carry their own ids , move the id sources past them
+    reset_customer_id_sequence()
+    next_loan_id = reseed_loan_ids()
+    print(f'Loan id sequence reseeded , next loan id is {next_loan_id}.')
+    report['next_loan_id'] = next_loan_id
+
+    # --- 3. Rebuild Credit Summaries ---
+    # bulk inserts skip the model signals , so the summaries are rebuilt from the loaded rows
+    report['summaries'] = rebuild_all_summaries()
+    print(f"Rebuilt credit summaries for {report['summaries']} customers.")
+
+    shutil.rmtree(run_directory, ignore_errors=True)
+    if report['customers']['mismatch'] or report['loans']['mismatch']:
+        raise IngestionMismatch(report)
+    return report
+
+@shared_task
+def purge_idempotency_records():
+    """
+    Deletes stored Idempotency-Key responses older than IDEMPOTENCY_TTL_SECONDS , the cache copies expire on their own.
+    """
+    cutoff = timezone.now() - dt.timedelta(seconds=settings.IDEMPOTENCY_TTL_SECONDS)
+    deleted, _ = IdempotencyRecord.objects.filter(created_at__lt=cutoff).delete()
+    return deleted
+
+@shared_task
+def decide_loan_applications():
+    """
+    Decides one micro-batch of the applications queued by /create-loan/ in async mode. A full batch starts
+    another task right away , so every free worker takes a batch , and the queue is drained to the end.
+    """
+    close_batch_window()
+    result = decide_pending_loans(on_full_batch=decide_loan_applications.delay)
+    # deferred applications belong to a customer decided in this batch , they go in the next one
+    if result['deferred'] and result['claimed'] < settings.LOAN_DECISION_BATCH_SIZE:
+        decide_loan_applications.delay()
+    return result
+
+@shared_task
+def consume_emi_payments():
+    """
+    Applies the EMI payment events of the Redis stream for EMI_PAYMENT_CONSUMER_SECONDS. Beat starts one run a
+    minute , several workers running at once share the stream through its consumer group.
+    """
+    report = consume_payment_stream()
+    print(f"Applied {report.get('applied', 0)} of {report.get('events', 0)} EMI payment events , {report['events_per_second']} events/s.")
+    return report
+
+@shared_task
+def rescore_portfolio():
+    """
+    Nightly credit score of every customer , computed for the whole portfolio at once and stored in CustomerCreditScore.
+    """
+    report = rescore_all_customers()
+    print(f"Rescored {report['customers']} customers in {report['seconds']}s.")
+    return report
+
+@shared_task
+def archive_matured_loans():
+    """
+    Nightly move of the matured , fully paid loans to ArchivedLoan , see loan_credit/archive.py.
+    """
+    report = archive_loans()
+    print(f"Archived {report['archived']} loans in {report['batches']} batches , {report['seconds']}s.")
+    return report
 
 @worker_ready.connect
 def run_initial_ingestion_on_startup(sender, **kwargs):
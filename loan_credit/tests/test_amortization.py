@@ -0,0 +1,130 @@
+import math
+
+import numpy as np
+from django.core.cache import cache
+from django.test import TestCase
+from django.urls import reverse
+from rest_framework import status
+
+from loan_credit.amortization import build_schedule, build_schedules, outstanding_principal
+from loan_credit.models import Customer, LoanAppllication
+from loan_credit.sequences import loan_id_allocator
+
+
+def looped_schedule(loan_amount, annual_interest_rate, tenure, installment):
+    """
+    Month by month reference implementation.
+    """
+    rate = annual_interest_rate / (12 * 100)
+    balance = loan_amount
+    rows = []
+    for _ in range(tenure):
+        interest = balance * rate
+        principal = installment - interest
+        balance -= principal
+        rows.append((installment, principal, interest, max(balance, 0)))
+    return rows
+
+
+class AmortizationTests(TestCase):
+    """Test cases for the array based amortization engine."""
+
+    def test_schedule_matches_month_by_month_loop(self):
+        schedules = build_schedules([100000, 50000, 7500], [10.5, 0, 16], [12, 24, 6])
+        for row, (amount, rate, tenure) in enumerate([(100000, 10.5, 12), (50000, 0, 24), (7500, 16, 6)]):
+            expected = looped_schedule(amount, rate, tenure, schedules['installment'][row])
+            for month, (payment, principal, interest, balance) in enumerate(expected):
+                self.assertTrue(math.isclose(schedules['payment'][row, month], payment, abs_tol=1e-6))
+                self.assertTrue(math.isclose(schedules['principal'][row, month], principal, abs_tol=1e-6))
+                self.assertTrue(math.isclose(schedules['interest'][row, month], interest, abs_tol=1e-6))
+                self.assertTrue(math.isclose(schedules['balance'][row, month], balance, abs_tol=1e-6))
+            # months after the tenure are padding
+            self.assertTrue(np.isnan(schedules['balance'][row, tenure:]).all())
+
+    def test_single_schedule_pays_off_principal(self):
+        schedule = build_schedule(250000, 12, 36)
+        self.assertEqual(len(schedule), 36)
+        self.assertEqual(schedule[-1]['balance'], 0)
+        self.assertAlmostEqual(sum(month['principal'] for month in schedule), 250000, delta=0.36)
+
+    def test_outstanding_principal_follows_schedule(self):
+        schedule = build_schedule(80000, 9, 24)
+        balances = outstanding_principal([80000] * 4, [9] * 4, [24] * 4, [0, 1, 10, 40])
+        self.assertEqual(balances.tolist(), [80000, schedule[0]['balance'], schedule[9]['balance'], 0])
+
+
+    def test_schedule_on_a_stored_installment(self):
+        computed = build_schedules([100000], [10.5], [12])['installment'][0]
+        schedules = build_schedules([100000, 100000], [10.5, 10.5], [12, 12], [9000, None])
+        self.assertEqual(schedules['installment'].tolist(), [9000, computed])
+
+        expected = looped_schedule(100000, 10.5, 12, 9000)
+        for month, (payment, principal, interest, balance) in enumerate(expected[:-1]):
+            self.assertTrue(math.isclose(schedules['payment'][0, month], payment, abs_tol=1e-6))
+            self.assertTrue(math.isclose(schedules['balance'][0, month], balance, abs_tol=1e-6))
+        # the installment is too small to repay the loan , the last one settles the rest
+        self.assertEqual(schedules['balance'][0, 11], 0)
+        self.assertTrue(math.isclose(schedules['payment'][0, 11], expected[-2][3] * (1 + 10.5 / 1200), abs_tol=1e-6))
+        self.assertEqual(outstanding_principal([100000], [10.5], [12], [12], [9000]).tolist(), [0])
+
+
+class LoanScheduleViewTests(TestCase):
+    """Test cases for /loan-schedule/<loan_id>/ and the outstanding principal on the view endpoints."""
+
+    def setUp(self):
+        loan_id_allocator.reset()
+        cache.clear()
+        self.customer = Customer.objects.create(
+            first_name="Amy",
+            last_name="Ortize",
+            phone_number="6667778888",
+            age=45,
+            monthly_income=120000
+        )
+        self.loan = LoanAppllication.objects.create(
+            customer_id=self.customer,
+            loan_amount=120000,
+            tenure=12,
+            interest_rate=11,
+            emis_paid_on_time=5,
+            loan_approved=True
+        )
+
+    def test_schedule_endpoint(self):
+        response = self.client.get(reverse('view_loan_schedule', args=[self.loan.loan_id]))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        data = response.json()
+        self.assertEqual(len(data['schedule']), 12)
+        self.assertEqual(data['installments_paid'], 5)
+        self.assertEqual(data['outstanding_principal'], data['schedule'][4]['balance'])
+
+    def test_schedule_is_cached(self):
+        url = reverse('view_loan_schedule', args=[self.loan.loan_id])
+        first = self.client.get(url).json()
+        with self.assertNumQueries(1):
+            second = self.client.get(url).json()
+        self.assertEqual(first, second)
+
+    def test_unapproved_loan_has_no_schedule(self):
+        self.loan.loan_approved = False
+        self.loan.save()
+        response = self.client.get(reverse('view_loan_schedule', args=[self.loan.loan_id]))
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_view_endpoints_report_outstanding_principal(self):
+        schedule = self.client.get(reverse('view_loan_schedule', args=[self.loan.loan_id])).json()
+        single = self.client.get(reverse('view_loan_application', args=[self.loan.loan_id])).json()
+        listing = self.client.get(reverse('view_all_loan_application', args=[self.customer.pk])).json()
+        self.assertEqual(single['outstanding_principal'], schedule['outstanding_principal'])
+        self.assertEqual(listing[0]['outstanding_principal'], schedule['outstanding_principal'])
+
+    def test_schedule_uses_the_stored_installment(self):
+        LoanAppllication.objects.filter(pk=self.loan.loan_id).update(monthly_installment=10500)
+        schedule = self.client.get(reverse('view_loan_schedule', args=[self.loan.loan_id])).json()
+        self.assertEqual(schedule['monthly_installment'], 10500)
+        self.assertEqual({month['payment'] for month in schedule['schedule'][:-1]}, {10500})
+        self.assertEqual(schedule['schedule'][-1]['balance'], 0)
+
+        single = self.client.get(reverse('view_loan_application', args=[self.loan.loan_id])).json()
+        self.assertEqual(single['outstanding_principal'], schedule['outstanding_principal'])
+        self.assertEqual(schedule['outstanding_principal'], schedule['schedule'][4]['balance'])
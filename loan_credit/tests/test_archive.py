@@ -0,0 +1,140 @@
+import datetime as dt
+from unittest import mock
+
+from django.core.cache import cache
+from django.test import TestCase
+from django.urls import reverse
+from rest_framework import status
+
+from loan_credit.archive import archive_matured_loans
+from loan_credit.ingestion import build_loan, drop_archived_loans
+from loan_credit.models import ArchivedLoan, Customer, CustomerCreditScore, CustomerCreditSummary, CustomerLoanHistory, LoanAppllication
+from loan_credit.rescoring import rescore_portfolio
+from loan_credit.sequences import loan_id_allocator
+from loan_credit.summaries import SUMMARY_FIELDS, get_customer_summary, refresh_summaries
+from loan_credit.tasks import archive_matured_loans as archive_matured_loans_task
+
+
+class LoanArchiveTests(TestCase):
+    """Test cases for moving matured loans out of the live loan table."""
+
+    def setUp(self):
+        loan_id_allocator.reset()
+        cache.clear()
+        self.today = dt.date.today()
+        self.customer = Customer.objects.create(
+            first_name="Omar",
+            last_name="Haddad",
+            phone_number="3334445555",
+            age=52,
+            monthly_income=60000,
+            approved_limit=2160000
+        )
+        # two matured and fully paid , one matured but short of EMIs , one running
+        self.matured = [self.loan(years_ago=4, tenure=12, emis_paid_on_time=12), self.loan(years_ago=3, tenure=24, emis_paid_on_time=25)]
+        self.unpaid = self.loan(years_ago=3, tenure=12, emis_paid_on_time=9)
+        self.running = self.loan(years_ago=0, tenure=36, emis_paid_on_time=2)
+        get_customer_summary(self.customer.pk)
+
+    def loan(self, years_ago, tenure, emis_paid_on_time):
+        approved = self.today.replace(month=1, day=1) - dt.timedelta(days=365 * years_ago) if years_ago else self.today
+        return LoanAppllication.objects.create(
+            customer_id=self.customer,
+            loan_amount=100000 * tenure / 12,
+            tenure=tenure,
+            interest_rate=11,
+            monthly_installment=9000,
+            emis_paid_on_time=emis_paid_on_time,
+            loan_approved=True,
+            date_of_approval=approved,
+            end_date=approved + dt.timedelta(days=30 * tenure),
+        )
+
+    def quote(self):
+        request = {"customer_id": self.customer.pk, "loan_amount": 200000, "interest_rate": 10, "tenure": 24}
+        return self.client.post(reverse('check_eligibility'), request, content_type='application/json').json()
+
+    def summary_values(self):
+        summary = CustomerCreditSummary.objects.get(pk=self.customer.pk)
+        return {field: getattr(summary, field) for field in SUMMARY_FIELDS}
+
+    def test_moves_only_matured_fully_paid_loans(self):
+        report = archive_matured_loans(today=self.today)
+
+        self.assertEqual(report['archived'], 2)
+        self.assertEqual(set(ArchivedLoan.objects.values_list('loan_id', flat=True)), {loan.loan_id for loan in self.matured})
+        self.assertEqual(set(LoanAppllication.objects.values_list('loan_id', flat=True)), {self.unpaid.loan_id, self.running.loan_id})
+
+        history = CustomerLoanHistory.objects.get(pk=self.customer.pk)
+        self.assertEqual(
+            (history.num_loans_taken, history.num_loans_fully_paid, history.total_emis_paid, history.total_tenure_months, history.loan_approved_volume),
+            (2, 2, 37, 36, 300000),
+        )
+
+    def test_scores_are_unchanged(self):
+        before = self.summary_values()
+        quote = self.quote()
+
+        archive_matured_loans(today=self.today)
+        # the archival leaves the summary as it is , and a rebuild from the live loans and the history agrees with it
+        self.assertEqual(self.summary_values(), before)
+        refresh_summaries([self.customer.pk])
+        self.assertEqual(self.summary_values(), before)
+        self.assertEqual(self.quote(), quote)
+
+    def test_rescoring_is_unchanged(self):
+        rescore_portfolio(today=self.today, use_copy=False)
+        before = CustomerCreditScore.objects.get(pk=self.customer.pk).credit_score
+        archive_matured_loans(today=self.today)
+        rescore_portfolio(today=self.today, use_copy=False)
+        self.assertEqual(CustomerCreditScore.objects.get(pk=self.customer.pk).credit_score, before)
+
+    def test_archived_loans_are_still_served(self):
+        loan_id = self.matured[0].loan_id
+        detail = self.client.get(reverse('view_loan_application', args=[loan_id])).json()
+        schedule = self.client.get(reverse('view_loan_schedule', args=[loan_id])).json()
+        archive_matured_loans(today=self.today)
+
+        self.assertEqual(self.client.get(reverse('view_loan_application', args=[loan_id])).json(), detail)
+        self.assertEqual(self.client.get(reverse('view_loan_schedule', args=[loan_id])).json(), schedule)
+
+    def test_loan_list_leaves_out_archived_loans_unless_asked(self):
+        url = reverse('view_all_loan_application', args=[self.customer.pk])
+        everything = sorted(loan['loan_id'] for loan in self.client.get(url).json())
+        archive_matured_loans(today=self.today)
+
+        live = [loan['loan_id'] for loan in self.client.get(url).json()]
+        self.assertEqual(sorted(live), sorted([self.unpaid.loan_id, self.running.loan_id]))
+        self.assertEqual(sorted(loan['loan_id'] for loan in self.client.get(url + '?include_archived=true').json()), everything)
+        streamed = self.client.get(url + '?include_archived=true&stream=1')
+        self.assertEqual(len(b''.join(streamed.streaming_content).split(b'"loan_id"')) - 1, len(everything))
+        self.assertEqual(self.client.get(url + '?include_archived=true&limit=2').status_code, status.HTTP_400_BAD_REQUEST)
+
+        async_url = reverse('async_view_all_loan_application', args=[self.customer.pk])
+        self.assertEqual(len(self.client.get(async_url).json()), len(live))
+        self.assertEqual(len(self.client.get(async_url + '?include_archived=1').json()), len(everything))
+
+    def test_batches_and_reruns(self):
+        report = archive_matured_loans(batch_size=1, today=self.today)
+        self.assertEqual((report['archived'], report['batches']), (2, 2))
+        self.assertEqual(archive_matured_loans(today=self.today)['archived'], 0)
+        self.assertEqual(CustomerLoanHistory.objects.get(pk=self.customer.pk).num_loans_taken, 2)
+
+    def test_recent_loans_stay_live(self):
+        # the first loan ended exactly LOAN_ARCHIVE_AFTER_DAYS ago , the second is still running
+        self.assertEqual(archive_matured_loans(today=self.matured[0].end_date + dt.timedelta(days=365))['archived'], 0)
+
+    def test_reimport_skips_archived_loans(self):
+        archive_matured_loans(today=self.today)
+        rows = [
+            {'loan_id': loan.loan_id, 'customer_id': self.customer.pk, 'loan_amount': 1000, 'tenure': 12, 'interest_rate': 10,
+             'monthly_installment': 90, 'emis_paid_on_time': 12, 'date_of_approval': None, 'end_date': None}
+            for loan in self.matured + [self.running]
+        ]
+        kept = drop_archived_loans([build_loan(row) for row in rows])
+        self.assertEqual([loan.loan_id for loan in kept], [self.running.loan_id])
+
+    def test_nightly_task(self):
+        with mock.patch('builtins.print'):
+            report = archive_matured_loans_task()
+        self.assertEqual(report['archived'], 2)
@@ -0,0 +1,97 @@
+from django.core.cache import cache
+from django.test import TestCase
+from django.urls import reverse
+from rest_framework import status
+
+from loan_credit.models import Customer, CustomerCreditSummary, LoanAppllication
+from loan_credit.response_cache import cache_stats
+from loan_credit.sequences import loan_id_allocator
+from loan_credit.serializers import CUSTOMER_NOT_FOUND_MESSAGE
+
+
+class AsyncViewTests(TestCase):
+    """Test cases for the async endpoints , which must answer exactly like their sync counterparts."""
+
+    def setUp(self):
+        loan_id_allocator.reset()
+        cache.clear()
+        self.customer = Customer.objects.create(
+            first_name="Omar",
+            last_name="Haddad",
+            phone_number="2223334444",
+            age=41,
+            monthly_income=90000,
+            approved_limit=3240000
+        )
+        self.loan = LoanAppllication.objects.create(
+            customer_id=self.customer,
+            loan_amount=150000,
+            tenure=24,
+            interest_rate=11,
+            monthly_installment=6991,
+            emis_paid_on_time=9,
+            loan_approved=True
+        )
+        self.loan_request = {"customer_id": self.customer.pk, "loan_amount": 60000, "interest_rate": 9, "tenure": 18}
+
+    async def test_check_eligibility_matches_sync(self):
+        sync_response = await self.async_client.post(reverse('check_eligibility'), self.loan_request, content_type='application/json')
+        # computed again , not read from the decision cache the sync call filled
+        await cache.aclear()
+        async_response = await self.async_client.post(reverse('async_check_eligibility'), self.loan_request, content_type='application/json')
+        self.assertEqual(async_response.status_code, status.HTTP_200_OK)
+        self.assertEqual(async_response.json(), sync_response.json())
+
+    async def test_check_eligibility_shares_the_decision_cache(self):
+        cache_stats.reset()
+        first = await self.async_client.post(reverse('async_check_eligibility'), self.loan_request, content_type='application/json')
+        second = await self.async_client.post(reverse('check_eligibility'), self.loan_request, content_type='application/json')
+        self.assertEqual(second.json(), first.json())
+        self.assertEqual(cache_stats.snapshot()['check_eligibility'], {'hits': 1, 'misses': 1})
+
+    async def test_check_eligibility_builds_missing_summary(self):
+        await CustomerCreditSummary.objects.all().adelete()
+        response = await self.async_client.post(reverse('async_check_eligibility'), self.loan_request, content_type='application/json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(await CustomerCreditSummary.objects.filter(customer_id=self.customer.pk).aexists())
+
+    async def test_unknown_customer_and_bad_body(self):
+        url = reverse('async_check_eligibility')
+        response = await self.async_client.post(url, dict(self.loan_request, customer_id=self.customer.pk + 1), content_type='application/json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.json(), {"customer_id": [CUSTOMER_NOT_FOUND_MESSAGE]})
+
+        response = await self.async_client.post(url, dict(self.loan_request, tenure=0), content_type='application/json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('tenure', response.json())
+
+        response = await self.async_client.post(url, 'not json', content_type='application/json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    async def test_create_loan(self):
+        response = await self.async_client.post(reverse('async_create_loan_application'), self.loan_request, content_type='application/json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        data = response.json()
+        self.assertTrue(data['loan_approved'])
+        self.assertEqual(data['customer_id'], self.customer.pk)
+
+        loan = await LoanAppllication.objects.aget(pk=data['loan_id'])
+        self.assertEqual(loan.loan_amount, 60000)
+        self.assertEqual(loan.monthly_installment, data['monthly_installment'])
+        summary = await CustomerCreditSummary.objects.aget(customer_id=self.customer.pk)
+        self.assertEqual(summary.num_loans_taken, 2)
+
+    async def test_view_endpoints_match_sync(self):
+        for sync_name, async_name, pk in (
+            ('view_loan_application', 'async_view_loan_application', self.loan.loan_id),
+            ('view_all_loan_application', 'async_view_all_loan_application', self.customer.pk),
+        ):
+            await cache.aclear()
+            sync_response = await self.async_client.get(reverse(sync_name, args=[pk]))
+            await cache.aclear()
+            async_response = await self.async_client.get(reverse(async_name, args=[pk]))
+            self.assertEqual(async_response.status_code, status.HTTP_200_OK)
+            self.assertEqual(async_response.json(), sync_response.json())
+
+        response = await self.async_client.get(reverse('async_view_loan_application', args=[self.loan.loan_id + 1]))
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
@@ -0,0 +1,107 @@
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from rest_framework import status
+
+from loan_credit.models import Customer
+from loan_credit.serializers import PHONE_NUMBER_REPEATED_MESSAGE, PHONE_NUMBER_TAKEN_MESSAGE
+from loan_credit.views import CustomerBulkRegistration
+
+
+class BulkRegistrationTests(TestCase):
+    """Test cases for /register/bulk/ and the single /register/ it batches."""
+
+    def setUp(self):
+        cache.clear()
+        Customer.objects.create(
+            first_name="Omar",
+            last_name="Haddad",
+            phone_number="9990001111",
+            age=41,
+            monthly_income=70000,
+            approved_limit=2520000
+        )
+
+    def customer(self, index, **fields):
+        data = {"first_name": f"Bulk{index}", "last_name": "Signup", "age": 25 + index, "monthly_income": 30000 + index * 1000, "phone_number": f"{7000000000 + index}"}
+        return dict(data, **fields)
+
+    def post(self, items):
+        return self.client.post(reverse('register_bulk'), items, content_type='application/json')
+
+    def test_registers_every_customer_in_order(self):
+        items = [self.customer(index) for index in range(3)]
+        response = self.post(items)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        results = response.json()
+        self.assertEqual([result['index'] for result in results], [0, 1, 2])
+        self.assertEqual({result['status'] for result in results}, {'ok'})
+        for item, result in zip(items, results):
+            customer = Customer.objects.get(pk=result['result']['customer_id'])
+            self.assertEqual(customer.phone_number, item['phone_number'])
+            self.assertEqual(customer.approved_limit, 36 * item['monthly_income'])
+            self.assertEqual(result['result']['approved_limit'], 36 * item['monthly_income'])
+            self.assertEqual(result['result']['name'], f"{item['first_name']} Signup")
+
+    def test_matches_single_registration(self):
+        single = self.client.post(reverse('register'), self.customer(0), content_type='application/json').json()
+        bulk = self.post([self.customer(1, phone_number="7100000000", first_name="Bulk0", age=25, monthly_income=30000)]).json()[0]['result']
+        single.pop('customer_id'), bulk.pop('customer_id'), single.pop('phone_number'), bulk.pop('phone_number')
+        self.assertEqual(bulk, single)
+
+    def test_bad_rows_do_not_fail_the_batch(self):
+        response = self.post([
+            self.customer(0),
+            self.customer(1, monthly_income="lots"),
+            self.customer(2, phone_number="9990001111"),
+            self.customer(3, phone_number=f"{7000000000}"),
+            "not a customer",
+        ])
+        results = response.json()
+        self.assertEqual([result['status'] for result in results], ['ok', 'error', 'error', 'error', 'error'])
+        self.assertIn('monthly_income', results[1]['errors'])
+        self.assertEqual(results[2]['errors'], {"phone_number": [PHONE_NUMBER_TAKEN_MESSAGE]})
+        self.assertEqual(results[3]['errors'], {"phone_number": [PHONE_NUMBER_REPEATED_MESSAGE]})
+        self.assertEqual(Customer.objects.count(), 2)
+
+    def test_queries_do_not_grow_with_the_batch(self):
+        # duplicate check and insert , the insert in a savepoint
+        with self.assertNumQueries(4):
+            self.post([self.customer(index) for index in range(3)])
+        with self.assertNumQueries(4):
+            self.post([self.customer(index) for index in range(3, 100)])
+        self.assertEqual(Customer.objects.count(), 101)
+
+    def test_rejects_a_body_that_is_not_a_list(self):
+        response = self.post(self.customer(0))
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    @override_settings(REGISTRATION_BULK_MAX_ITEMS=2)
+    def test_rejects_oversized_batches(self):
+        response = self.post([self.customer(index) for index in range(3)])
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(Customer.objects.count(), 1)
+
+    def test_single_registration_takes_form_data(self):
+        # the immutable QueryDict of a form post used to fail on the approved_limit assignment
+        response = self.client.post(reverse('register'), self.customer(0))
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.json()['approved_limit'], 36 * 30000)
+
+    def test_single_registration_rejects_a_taken_phone_number(self):
+        response = self.client.post(reverse('register'), self.customer(0, phone_number="9990001111"), content_type='application/json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.json(), {"phone_number": [PHONE_NUMBER_TAKEN_MESSAGE]})
+        self.assertEqual(Customer.objects.count(), 1)
+
+    def test_number_registered_after_the_check_fails_only_its_row(self):
+        # a concurrent registration took the number between the duplicate check and the insert
+        customers = [Customer(**dict(self.customer(index), approved_limit=0)) for index in range(3)]
+        customers[1].phone_number = "9990001111"
+        inserted = CustomerBulkRegistration.insert(customers)
+
+        self.assertEqual([customer.first_name for customer in inserted], ["Bulk0", "Bulk2"])
+        self.assertIsNone(customers[1].pk)
+        self.assertEqual(Customer.objects.filter(phone_number="9990001111").count(), 1)
+        self.assertEqual(Customer.objects.count(), 3)
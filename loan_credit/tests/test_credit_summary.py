@@ -0,0 +1,123 @@
+import datetime as dt
+from io import StringIO
+
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.test import TestCase
+
+from loan_credit.models import Customer, CustomerCreditSummary, LoanAppllication
+from loan_credit.summaries import compute_summaries, get_customer_summary, refresh_summaries
+from loan_credit.utils import LoanEligibilityChecker
+
+
+class CustomerCreditSummaryTests(TestCase):
+    """Test cases for the incrementally maintained credit summary."""
+
+    def setUp(self):
+        self.today = dt.date.today()
+        self.customer = Customer.objects.create(
+            first_name="Sam",
+            last_name="Summary",
+            phone_number="1231231234",
+            age=33,
+            monthly_income=100000,
+            approved_limit=3600000
+        )
+
+    def create_loan(self, **kwargs):
+        data = {
+            "customer_id": self.customer,
+            "loan_amount": 100000,
+            "tenure": 12,
+            "interest_rate": 10,
+            "monthly_installment": 8792,
+            "emis_paid_on_time": 3,
+            "date_of_approval": self.today,
+            "end_date": self.today + dt.timedelta(days=360),
+            "loan_approved": True,
+        }
+        data.update(kwargs)
+        return LoanAppllication.objects.create(**data)
+
+    def assertMatchesAggregate(self, summary):
+        """
+        Tests that a stored summary equals a fresh aggregate over the loan table.
+        """
+        expected = compute_summaries([self.customer.pk], self.today)[self.customer.pk]
+        for field in ['num_loans_taken', 'num_loans_fully_paid', 'total_emis_paid', 'total_tenure_months',
+                      'current_loan_sum', 'total_current_emis', 'active_until', 'loan_activity_current_year']:
+            self.assertEqual(getattr(summary, field), getattr(expected, field), field)
+
+    def test_summary_built_on_first_read(self):
+        """
+        Tests that a customer without a summary row gets one built on first read.
+        """
+        self.create_loan()
+        summary = get_customer_summary(self.customer.pk, self.today)
+        self.assertEqual(summary.num_loans_taken, 1)
+        self.assertEqual(summary.approved_limit, 3600000)
+        self.assertTrue(CustomerCreditSummary.objects.filter(pk=self.customer.pk).exists())
+
+    def test_new_loans_are_folded_in(self):
+        """
+        Tests that loans created after the summary exists are applied incrementally.
+        """
+        refresh_summaries([self.customer.pk], self.today)
+        self.create_loan()
+        self.create_loan(loan_amount=50000, emis_paid_on_time=12, end_date=self.today + dt.timedelta(days=30))
+        self.create_loan(loan_amount=70000, end_date=self.today - dt.timedelta(days=5), date_of_approval=self.today.replace(year=self.today.year - 2))
+        self.create_loan(loan_amount=999999, loan_approved=False)
+
+        summary = CustomerCreditSummary.objects.get(pk=self.customer.pk)
+        self.assertEqual(summary.num_loans_taken, 3)
+        self.assertEqual(summary.current_loan_sum, 150000)
+        self.assertEqual(summary.active_until, self.today + dt.timedelta(days=30))
+        self.assertFalse(summary.is_stale(self.today))
+        self.assertMatchesAggregate(summary)
+
+    def test_changed_loan_marks_summary_for_rebuild(self):
+        """
+        Tests that editing a loan flags the summary and the next read rebuilds it.
+        """
+        loan = self.create_loan()
+        refresh_summaries([self.customer.pk], self.today)
+        loan.emis_paid_on_time = 12
+        loan.save()
+        self.assertTrue(CustomerCreditSummary.objects.get(pk=self.customer.pk).needs_refresh)
+
+        summary = get_customer_summary(self.customer.pk, self.today)
+        self.assertFalse(summary.needs_refresh)
+        self.assertEqual(summary.num_loans_fully_paid, 1)
+
+    def test_summary_expires_when_a_loan_ends(self):
+        """
+        Tests that the active figures are recomputed once the earliest running loan has ended.
+        """
+        self.create_loan(end_date=self.today + dt.timedelta(days=1))
+        refresh_summaries([self.customer.pk], self.today)
+        later = self.today + dt.timedelta(days=2)
+        self.assertTrue(CustomerCreditSummary.objects.get(pk=self.customer.pk).is_stale(later))
+        self.assertEqual(get_customer_summary(self.customer.pk, later).current_loan_sum, 0)
+
+    def test_eligibility_check_reads_one_row(self):
+        """
+        Tests that an eligibility check with a current summary costs a single query.
+        """
+        self.create_loan()
+        refresh_summaries([self.customer.pk], self.today)
+        checker = LoanEligibilityChecker({"customer_id": self.customer.pk, "loan_amount": 10000, "tenure": 12, "interest_rate": 10})
+        with self.assertNumQueries(1):
+            response_data = checker.check_loan_eligibility()
+        self.assertTrue(response_data["approval"])
+
+    def test_verify_command_detects_drift(self):
+        """
+        Tests the rebuild_credit_summaries command in verify and rebuild modes.
+        """
+        self.create_loan()
+        call_command('rebuild_credit_summaries', stdout=StringIO())
+        call_command('rebuild_credit_summaries', '--verify', stdout=StringIO())
+
+        CustomerCreditSummary.objects.filter(pk=self.customer.pk).update(current_loan_sum=1)
+        with self.assertRaises(CommandError):
+            call_command('rebuild_credit_summaries', '--verify', stdout=StringIO())
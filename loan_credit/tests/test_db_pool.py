@@ -0,0 +1,67 @@
+from django.core.exceptions import ImproperlyConfigured
+from django.contrib.auth.models import User
+from django.db import connection
+from django.db.backends.signals import connection_created
+from django.test import TestCase
+from django.urls import reverse
+from rest_framework import status
+
+from credit_approver.db_connections import connection_mode_settings
+from loan_credit.db_pool import connection_stats
+
+
+class ConnectionModeSettingsTests(TestCase):
+    """Test cases for the DB_CONNECTION_MODE settings."""
+
+    def test_persistent_mode(self):
+        self.assertEqual(
+            connection_mode_settings('persistent', {'DB_CONN_MAX_AGE': '120'}),
+            {'CONN_MAX_AGE': 120, 'CONN_HEALTH_CHECKS': True},
+        )
+
+    def test_pool_mode(self):
+        options = connection_mode_settings('pool', {'DB_POOL_MAX_SIZE': '20'})
+        self.assertEqual(options['CONN_MAX_AGE'], 0)
+        self.assertEqual(options['OPTIONS']['pool'], {'min_size': 2, 'max_size': 20, 'timeout': 10.0})
+
+    def test_default_mode_connects_per_request(self):
+        self.assertEqual(connection_mode_settings('none', {})['CONN_MAX_AGE'], 0)
+
+    def test_unknown_mode(self):
+        with self.assertRaises(ImproperlyConfigured):
+            connection_mode_settings('pgbouncer', {})
+
+
+class ConnectionStatsTests(TestCase):
+    """Test cases for /db-pool-stats/."""
+
+    def setUp(self):
+        connection_stats.reset()
+        self.addCleanup(connection_stats.reset)
+        self.staff = User.objects.create_user(username='ops', password='ops-password', is_staff=True)
+
+    def test_staff_only(self):
+        url = reverse('db_pool_stats')
+        self.assertEqual(self.client.get(url).status_code, status.HTTP_403_FORBIDDEN)
+        User.objects.create_user(username='clerk', password='clerk-password')
+        self.client.login(username='clerk', password='clerk-password')
+        self.assertEqual(self.client.get(url).status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_requests_are_counted_as_checkouts(self):
+        url = reverse('db_pool_stats')
+        self.client.force_login(self.staff)
+        self.client.get(url)
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        data = response.json()
+        self.assertEqual(data['mode'], 'none')
+        self.assertEqual(data['checkouts'], 2)
+        self.assertIsNone(data['pool'])
+
+    def test_new_connections_are_counted(self):
+        connection_stats.record_checkout()
+        connection_stats.record_checkout()
+        connection_created.send(sender=connection.__class__, connection=connection)
+        snapshot = connection_stats.snapshot()
+        self.assertEqual(snapshot['connections_opened'], 1)
+        self.assertEqual(snapshot['reused'], 1)
@@ -0,0 +1,133 @@
+import time
+from unittest import mock
+
+from django.core.cache import cache
+from django.db import router, transaction
+from django.test import TransactionTestCase, override_settings
+from django.urls import reverse
+from rest_framework import status
+
+from loan_credit.db_router import PRIMARY_COOKIE, primary_reads, reset_routing
+from loan_credit.models import Customer, LoanAppllication
+from loan_credit.response_cache import cached_view, invalidate_loan_views, loan_view_key
+from loan_credit.sequences import loan_id_allocator
+
+
+@override_settings(DATABASE_REPLICAS=['replica'])
+class ReplicaRoutingTests(TransactionTestCase):
+    """
+    Test cases for the primary / replica router , with a second SQLite database as the replica.
+    Reads inside a transaction stay on the primary , so the tests run outside of the TestCase one.
+    """
+
+    databases = {'default', 'replica'}
+
+    def setUp(self):
+        loan_id_allocator.reset()
+        cache.clear()
+        # the replica is in sync with the primary for the customer , not for loans written by the tests
+        for database in ('default', 'replica'):
+            Customer.objects.using(database).create(
+                customer_id=1,
+                first_name="Rita",
+                last_name="Lopez",
+                phone_number="3334445555",
+                age=36,
+                monthly_income=70000,
+                approved_limit=2520000
+            )
+        # the writes above pin this thread to the primary , a request starts unpinned
+        reset_routing()
+
+    def loans_page(self, client=None):
+        # paged listings are not cached , they read wherever the router sends them
+        return (client or self.client).get(reverse('view_all_loan_application', args=[1]), {"limit": 10})
+
+    def test_reads_go_to_the_replica(self):
+        self.assertEqual(router.db_for_read(LoanAppllication), 'replica')
+        self.assertEqual(router.db_for_write(LoanAppllication), 'default')
+        reset_routing()
+
+        replica_loan = LoanAppllication.objects.using('replica').create(
+            loan_id=5000, customer_id_id=1, loan_amount=25000, tenure=6, interest_rate=9, loan_approved=True
+        )
+        reset_routing()
+        response = self.loans_page()
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([loan['loan_id'] for loan in response.json()['results']], [replica_loan.loan_id])
+        self.assertFalse(LoanAppllication.objects.using('default').filter(pk=replica_loan.loan_id).exists())
+
+    def test_reads_in_a_transaction_stay_on_the_primary(self):
+        with transaction.atomic():
+            self.assertEqual(router.db_for_read(Customer), 'default')
+        self.assertEqual(router.db_for_read(Customer), 'replica')
+
+    def test_primary_reads(self):
+        with primary_reads():
+            self.assertEqual(router.db_for_read(Customer), 'default')
+        self.assertEqual(router.db_for_read(Customer), 'replica')
+
+        # a write inside the block keeps the request on the primary
+        with primary_reads():
+            router.db_for_write(Customer)
+        self.assertEqual(router.db_for_read(Customer), 'default')
+
+    def test_client_reads_its_own_writes(self):
+        data = {"customer_id": 1, "loan_amount": 40000, "interest_rate": 10, "tenure": 12}
+        response = self.client.post(reverse('create_loan_application'), data, content_type='application/json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertIn(PRIMARY_COOKIE, response.cookies)
+
+        # the same client is pinned to the primary , which has the loan
+        self.assertEqual(self.loans_page().status_code, status.HTTP_200_OK)
+
+        # another client reads the replica , which has not caught up yet
+        self.assertEqual(self.loans_page(self.client_class()).status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_cached_views_read_the_replica_until_a_write(self):
+        LoanAppllication.objects.using('replica').create(loan_id=7000, customer_id_id=1, loan_amount=1000, tenure=6, interest_rate=9, loan_approved=True)
+        # replication fires no signals , so no recent-write markers either
+        cache.clear()
+        reset_routing()
+        other = self.client_class()
+        self.assertEqual(other.get(reverse('view_loan_application', args=[7000])).status_code, status.HTTP_200_OK)
+
+        data = {"customer_id": 1, "loan_amount": 40000, "interest_rate": 10, "tenure": 12}
+        loan_id = self.client.post(reverse('create_loan_application'), data, content_type='application/json').json()['loan_id']
+        loans_url = reverse('view_all_loan_application', args=[1])
+
+        # a client that is not pinned misses the cache first , the customer was just written so the list comes
+        # from the primary and the lagging replica does not end up in the cache
+        self.assertEqual([loan['loan_id'] for loan in other.get(loans_url).json()], [loan_id])
+        # the writer is served the cached response , with its loan
+        self.assertEqual([loan['loan_id'] for loan in self.client.get(loans_url).json()], [loan_id])
+
+    def test_response_read_while_a_write_commits_is_not_cached(self):
+        def build_during_a_write():
+            # another request commits a change of the loan while this one reads the replica
+            invalidate_loan_views(loan_ids=[7000])
+            return {"loan_id": 7000}
+
+        self.assertEqual(cached_view('view_loan', loan_view_key(7000), build_during_a_write), {"loan_id": 7000})
+        self.assertIsNone(cache.get(loan_view_key(7000)))
+
+        # until the replicas caught up , the next miss reads the primary and may be cached
+        with mock.patch('loan_credit.response_cache.primary_reads', wraps=primary_reads) as primary:
+            cached_view('view_loan', loan_view_key(7000), lambda: {"loan_id": 7000})
+        primary.assert_called_once()
+        self.assertEqual(cache.get(loan_view_key(7000)), {"loan_id": 7000})
+
+    def test_pin_expires(self):
+        LoanAppllication.objects.using('default').create(loan_id=6000, customer_id_id=1, loan_amount=1000, tenure=6, interest_rate=9, loan_approved=True)
+
+        self.client.cookies[PRIMARY_COOKIE] = str(time.time() + 60)
+        self.assertEqual(self.loans_page().status_code, status.HTTP_200_OK)
+
+        self.client.cookies[PRIMARY_COOKIE] = str(time.time() - 1)
+        self.assertEqual(self.loans_page().status_code, status.HTTP_404_NOT_FOUND)
+
+    @override_settings(DATABASE_REPLICAS=[])
+    def test_without_replicas_everything_uses_default(self):
+        self.assertEqual(router.db_for_read(Customer), 'default')
+        response = self.client.post(reverse('check_eligibility'), {"customer_id": 1, "loan_amount": 1000, "interest_rate": 10, "tenure": 6}, content_type='application/json')
+        self.assertNotIn(PRIMARY_COOKIE, response.cookies)
@@ -0,0 +1,223 @@
+import datetime as dt
+import os
+import shutil
+import tempfile
+from unittest import mock
+
+from django.core.cache import cache
+from django.test import TestCase
+from django.urls import reverse
+from rest_framework import status
+
+from loan_credit.delta_ingestion import ingest_delta, ingest_delta_workbooks
+from loan_credit.ingestion import CUSTOMER_COLUMNS, LOAN_COLUMNS, ingest_customers, ingest_loans, insert_chunk
+from loan_credit.models import Customer, CustomerCreditSummary, IngestedRow, IngestionCheckpoint, LoanAppllication
+from loan_credit.sequences import loan_id_allocator
+from loan_credit.summaries import get_customer_summary
+from loan_credit.tasks import injest_delta_data
+from loan_credit.tests.test_ingestion import write_workbook
+
+APPROVED = dt.datetime(2020, 1, 15)
+
+
+class DeltaIngestionTests(TestCase):
+    """Test cases for the incremental , resumable workbook ingestion."""
+
+    def setUp(self):
+        loan_id_allocator.reset()
+        cache.clear()
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        self.customers_path = os.path.join(self.directory, 'customers.xlsx')
+        self.loans_path = os.path.join(self.directory, 'loans.xlsx')
+
+        write_workbook(self.customers_path, list(CUSTOMER_COLUMNS), [
+            [customer_id, f"First{customer_id}", f"Last{customer_id}", 30, 9800000000 + customer_id, 50000, 1800000]
+            for customer_id in range(1, 6)
+        ])
+        self.loan_rows = [self.loan_row(loan_id) for loan_id in range(4000, 4010)]
+        self.write_loans()
+
+    def loan_row(self, loan_id, loan_amount=100000, emis_paid_on_time=6):
+        return [loan_id % 5 + 1, loan_id, loan_amount, 12, 10.5, 8800, emis_paid_on_time, APPROVED, APPROVED + dt.timedelta(days=360)]
+
+    def write_loans(self):
+        write_workbook(self.loans_path, list(LOAN_COLUMNS), self.loan_rows)
+
+    def ingest_loans(self, **options):
+        return ingest_delta('loans', self.loans_path, chunk_size=4, use_copy=False, **options)
+
+    def test_first_run_writes_every_row(self):
+        report = ingest_delta_workbooks(self.customers_path, self.loans_path, chunk_size=4, use_copy=False)
+
+        self.assertEqual((report['customers']['written'], report['loans']['written']), (5, 10))
+        self.assertEqual(Customer.objects.count(), 5)
+        self.assertEqual(LoanAppllication.objects.count(), 10)
+        self.assertEqual(IngestedRow.objects.count(), 15)
+        self.assertIsNotNone(IngestionCheckpoint.objects.get(source__startswith='loans:').completed_at)
+        # the loan id source moved past the imported ids
+        self.assertGreater(LoanAppllication.objects.create(customer_id_id=1, loan_amount=1000, tenure=6, interest_rate=10).loan_id, 4009)
+
+    def test_unchanged_file_is_skipped(self):
+        ingest_delta_workbooks(self.customers_path, self.loans_path, use_copy=False)
+        # checkpoint read and nothing else
+        with self.assertNumQueries(1):
+            report = self.ingest_loans()
+        self.assertTrue(report['skipped'])
+        self.assertEqual(report['rows'], 0)
+
+    def test_only_changed_rows_are_written(self):
+        ingest_delta_workbooks(self.customers_path, self.loans_path, use_copy=False)
+        LoanAppllication.objects.filter(pk=4001).update(tenure=99)
+        self.loan_rows[2] = self.loan_row(4002, loan_amount=50000)
+        self.loan_rows.append(self.loan_row(4010))
+        self.write_loans()
+
+        report = self.ingest_loans()
+        self.assertEqual((report['rows'], report['written'], report['unchanged']), (11, 2, 9))
+        self.assertEqual(LoanAppllication.objects.get(pk=4002).loan_amount, 50000)
+        self.assertTrue(LoanAppllication.objects.filter(pk=4010).exists())
+        # an unchanged row is not written again , even when the table was edited since
+        self.assertEqual(LoanAppllication.objects.get(pk=4001).tenure, 99)
+
+    def test_changed_loans_invalidate_the_summaries(self):
+        ingest_delta_workbooks(self.customers_path, self.loans_path, use_copy=False)
+        customer_id = self.loan_rows[3][0]
+        self.assertEqual(get_customer_summary(customer_id).total_emis_paid, 12)
+
+        self.loan_rows[3] = self.loan_row(4003, emis_paid_on_time=12)
+        self.write_loans()
+        self.ingest_loans()
+        self.assertTrue(CustomerCreditSummary.objects.get(pk=customer_id).needs_refresh)
+        self.assertEqual(get_customer_summary(customer_id).total_emis_paid, 18)
+
+    def test_failed_run_resumes_after_the_last_committed_chunk(self):
+        ingest_delta('customers', self.customers_path, use_copy=False)
+        calls = []
+
+        def fail_on_second_loan_chunk(model, objects, *args, **kwargs):
+            if model is LoanAppllication:
+                calls.append(len(objects))
+                if len(calls) == 2:
+                    raise RuntimeError("worker lost")
+            return insert_chunk(model, objects, *args, **kwargs)
+
+        with mock.patch('loan_credit.delta_ingestion.insert_chunk', side_effect=fail_on_second_loan_chunk):
+            with self.assertRaises(RuntimeError):
+                self.ingest_loans()
+        self.assertEqual(LoanAppllication.objects.count(), 4)
+        self.assertEqual(IngestedRow.objects.filter(key__startswith='loans:').count(), 4)
+
+        report = self.ingest_loans()
+        self.assertEqual((report['resumed_after'], report['rows'], report['written']), (4, 6, 6))
+        self.assertEqual(LoanAppllication.objects.count(), 10)
+
+    def test_repeated_key_keeps_its_first_row(self):
+        ingest_delta('customers', self.customers_path, use_copy=False)
+        # repeats in the same chunk and in later chunks , the first row wins as in the full ingestion
+        self.loan_rows[1] = self.loan_row(4000, loan_amount=2)
+        self.loan_rows.append(self.loan_row(4000, loan_amount=3))
+        self.write_loans()
+
+        report = self.ingest_loans()
+        self.assertEqual((report['rows'], report['written'], report['repeated']), (11, 9, 2))
+        self.assertEqual(LoanAppllication.objects.get(pk=4000).loan_amount, 100000)
+
+    def test_resumed_run_keeps_the_first_row_of_a_repeated_key(self):
+        ingest_delta('customers', self.customers_path, use_copy=False)
+        self.loan_rows.append(self.loan_row(4000, loan_amount=3))
+        self.write_loans()
+
+        def fail_on_second_loan_chunk(model, objects, *args, **kwargs):
+            if model is LoanAppllication and LoanAppllication.objects.exists():
+                raise RuntimeError("worker lost")
+            return insert_chunk(model, objects, *args, **kwargs)
+
+        with mock.patch('loan_credit.delta_ingestion.insert_chunk', side_effect=fail_on_second_loan_chunk):
+            with self.assertRaises(RuntimeError):
+                self.ingest_loans()
+
+        report = self.ingest_loans()
+        self.assertEqual((report['resumed_after'], report['written'], report['repeated']), (4, 6, 1))
+        self.assertEqual(LoanAppllication.objects.get(pk=4000).loan_amount, 100000)
+
+    def test_new_file_version_restarts_from_the_first_row(self):
+        ingest_delta('customers', self.customers_path, use_copy=False)
+        self.ingest_loans()
+        self.loan_rows[0] = self.loan_row(4000, loan_amount=1)
+        self.write_loans()
+
+        report = self.ingest_loans()
+        self.assertEqual((report['resumed_after'], report['rows'], report['written']), (0, 10, 1))
+
+    def test_workbook_row_does_not_overwrite_a_loan_created_through_the_api(self):
+        ingest_delta_workbooks(self.customers_path, self.loans_path, use_copy=False)
+        response = self.client.post(
+            reverse('create_loan_application'),
+            {"customer_id": 1, "loan_amount": 1000, "interest_rate": 10, "tenure": 6},
+            content_type='application/json'
+        )
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        loan_id = response.json()['loan_id']
+        # the next workbook brings the same Loan ID for another customer
+        self.loan_rows.append(self.loan_row(loan_id, loan_amount=777))
+        self.write_loans()
+
+        report = self.ingest_loans()
+        self.assertEqual((report['written'], report['taken'], report['taken_keys']), (0, 1, [loan_id]))
+        loan = LoanAppllication.objects.get(pk=loan_id)
+        self.assertEqual((loan.customer_id_id, loan.loan_amount), (1, 1000))
+        self.assertFalse(IngestedRow.objects.filter(key=f"loans:{loan_id}").exists())
+
+    def test_rows_of_the_full_ingestion_are_not_taken(self):
+        ingest_customers(self.customers_path, use_copy=False, mark=True)
+        ingest_loans(self.loans_path, use_copy=False, mark=True)
+        self.loan_rows[0] = self.loan_row(4000, loan_amount=1)
+        self.write_loans()
+
+        report = self.ingest_loans()
+        self.assertEqual(report['taken'], 0)
+        self.assertEqual(LoanAppllication.objects.get(pk=4000).loan_amount, 1)
+
+    def test_moved_loan_invalidates_the_previous_owner(self):
+        ingest_delta_workbooks(self.customers_path, self.loans_path, use_copy=False)
+        previous, new = self.loan_rows[3][0], self.loan_rows[4][0]
+        get_customer_summary(previous)
+        get_customer_summary(new)
+
+        self.loan_rows[3][0] = new
+        self.write_loans()
+        self.ingest_loans()
+        self.assertEqual(LoanAppllication.objects.get(pk=4003).customer_id_id, new)
+        self.assertTrue(CustomerCreditSummary.objects.get(pk=previous).needs_refresh)
+        self.assertTrue(CustomerCreditSummary.objects.get(pk=new).needs_refresh)
+
+    def test_taken_phone_number_is_left_out_and_retried(self):
+        ingest_delta_workbooks(self.customers_path, self.loans_path, use_copy=False)
+        registered = Customer.objects.create(first_name="Ana", last_name="Lima", age=40, phone_number="9811111111", monthly_income=1, approved_limit=36)
+        write_workbook(self.customers_path, list(CUSTOMER_COLUMNS), [
+            [customer_id, f"First{customer_id}", f"Last{customer_id}", 31, 9811111111 if customer_id == 2 else 9800000000 + customer_id, 50000, 1800000]
+            for customer_id in range(1, 6)
+        ])
+
+        report = ingest_delta('customers', self.customers_path, chunk_size=2, use_copy=False)
+        self.assertEqual((report['written'], report['left_out']), (4, 1))
+        self.assertEqual(Customer.objects.get(pk=2).phone_number, "9800000002")
+        self.assertIsNotNone(IngestionCheckpoint.objects.get(source__startswith='customers:').completed_at)
+
+        # the row left out kept its old hash , once the phone number is free the next version of the file writes it
+        registered.delete()
+        write_workbook(self.customers_path, list(CUSTOMER_COLUMNS), [
+            [customer_id, f"First{customer_id}", f"Last{customer_id}", 31, 9811111111 if customer_id == 2 else 9800000000 + customer_id, 50000 + (customer_id == 1), 1800000]
+            for customer_id in range(1, 6)
+        ])
+        report = ingest_delta('customers', self.customers_path, chunk_size=2, use_copy=False)
+        self.assertEqual((report['written'], report['left_out']), (2, 0))
+        self.assertEqual(Customer.objects.get(pk=2).phone_number, "9811111111")
+
+    def test_daily_task(self):
+        with mock.patch('builtins.print'):
+            report = injest_delta_data(customers_path=self.customers_path, loans_path=self.loans_path)
+            again = injest_delta_data(customers_path=self.customers_path, loans_path=self.loans_path)
+        self.assertEqual(report['loans']['written'], 10)
+        self.assertTrue(again['customers']['skipped'] and again['loans']['skipped'])
@@ -0,0 +1,117 @@
+import datetime as dt
+import itertools
+
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from rest_framework import status
+
+from loan_credit.models import Customer, LoanAppllication
+from loan_credit.sequences import loan_id_allocator
+from loan_credit.utils import LoanEligibilityChecker, calculate_monthly_installments
+
+
+class MonthlyInstallmentsTests(TestCase):
+    """Test cases for the vectorized EMI formula."""
+
+    def test_matches_scalar_formula(self):
+        """
+        Tests that the array formula gives the same installment as the per-loan one.
+        """
+        cases = list(itertools.product([1, 999.99, 50000, 1234567], [0, 0.5, 8.12, 12, 16, 33.3], [1, 6, 12, 37, 360]))
+        installments = calculate_monthly_installments(*zip(*cases))
+        for (loan_amount, interest_rate, tenure), installment in zip(cases, installments.tolist()):
+            checker = LoanEligibilityChecker({"customer_id": 1, "loan_amount": loan_amount, "tenure": tenure, "interest_rate": interest_rate})
+            self.assertEqual(round(installment, 2), checker.calculate_monthly_installment(interest_rate))
+
+    def test_rejects_invalid_tenure(self):
+        with self.assertRaises(ValueError):
+            calculate_monthly_installments([1000, 1000], [10, 10], [12, 0])
+
+
+class BatchEligibilityTests(TestCase):
+    """Test cases for the /check-eligibility/batch/ endpoint."""
+
+    def setUp(self):
+        loan_id_allocator.reset()
+        today = dt.date.today()
+        self.customers = []
+        for i in range(3):
+            customer = Customer.objects.create(
+                first_name=f"Batch{i}",
+                last_name="Applicant",
+                phone_number=f"55500000{i:02d}",
+                age=30,
+                monthly_income=50000 * (i + 1),
+                approved_limit=1800000 * (i + 1)
+            )
+            LoanAppllication.objects.create(
+                customer_id=customer,
+                loan_amount=200000,
+                tenure=24,
+                interest_rate=11,
+                monthly_installment=9321,
+                emis_paid_on_time=4 * i,
+                date_of_approval=today,
+                end_date=today + dt.timedelta(days=720),
+                loan_approved=True
+            )
+            self.customers.append(customer)
+        self.url = reverse('check_eligibility_batch')
+
+    def payload(self, customer, **kwargs):
+        data = {"customer_id": customer.pk, "loan_amount": 100000, "interest_rate": 9.5, "tenure": 12}
+        data.update(kwargs)
+        return data
+
+    def test_results_match_single_endpoint_in_input_order(self):
+        """
+        Tests that every batch item equals the response of the single-item endpoint.
+        """
+        payloads = [
+            self.payload(self.customers[2], tenure=36),
+            self.payload(self.customers[0]),
+            self.payload(self.customers[1], loan_amount=9999999),
+            self.payload(self.customers[0], interest_rate=0),
+        ]
+        response = self.client.post(self.url, payloads, content_type='application/json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        for index, (payload, item) in enumerate(zip(payloads, response.json())):
+            single = self.client.post(reverse('check_eligibility'), payload, content_type='application/json')
+            self.assertEqual(item, {"index": index, "status": "ok", "result": single.json()})
+
+    def test_errors_are_reported_per_item(self):
+        """
+        Tests that invalid items and unknown customers do not fail the rest of the batch.
+        """
+        payloads = [
+            self.payload(self.customers[0]),
+            {"customer_id": self.customers[0].pk, "loan_amount": 0, "interest_rate": 9.5, "tenure": 12},
+            self.payload(self.customers[0], customer_id=987654),
+            "not an object",
+        ]
+        response = self.client.post(self.url, payloads, content_type='application/json')
+        results = response.json()
+        self.assertEqual([item["status"] for item in results], ["ok", "error", "error", "error"])
+        self.assertIn("loan_amount", results[1]["errors"])
+        self.assertIn("customer_id", results[2]["errors"])
+        self.assertEqual([item["index"] for item in results], [0, 1, 2, 3])
+
+    def test_query_count_does_not_grow_with_batch(self):
+        """
+        Tests that the customer metrics of a batch are read with one query.
+        """
+        payloads = [self.payload(self.customers[i % 3]) for i in range(30)]
+        # the first call builds the summaries
+        self.client.post(self.url, payloads, content_type='application/json')
+        with self.assertNumQueries(1):
+            self.client.post(self.url, payloads, content_type='application/json')
+
+    @override_settings(ELIGIBILITY_BATCH_MAX_ITEMS=2)
+    def test_rejects_oversized_and_malformed_batches(self):
+        payloads = [self.payload(self.customers[0])] * 3
+        response = self.client.post(self.url, payloads, content_type='application/json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+        response = self.client.post(self.url, self.payload(self.customers[0]), content_type='application/json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
@@ -0,0 +1,182 @@
+import json
+import os
+import unittest
+import uuid
+
+from django.conf import settings
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from rest_framework import status
+
+from loan_credit.metrics import emi_payment_events
+from loan_credit.models import Customer, CustomerCreditSummary, EmiPayment, LoanAppllication
+from loan_credit.payments import apply_emi_payments, consume_payment_stream, payment_stream_client, sign_payment_batch, validate_payment_events
+from loan_credit.sequences import loan_id_allocator
+from loan_credit.summaries import get_customer_summary
+
+EMI_PAYMENT_STREAM_URL = os.environ.get('EMI_PAYMENT_STREAM_URL')
+
+
+class PaymentFixtures:
+    """A customer with three running loans."""
+
+    def setUp(self):
+        loan_id_allocator.reset()
+        cache.clear()
+        emi_payment_events.reset()
+        self.customer = Customer.objects.create(
+            first_name="Rosa",
+            last_name="Delgado",
+            phone_number="4441112222",
+            age=39,
+            monthly_income=80000,
+            approved_limit=2880000
+        )
+        self.loans = [
+            LoanAppllication.objects.create(customer_id=self.customer, loan_amount=120000, tenure=12, interest_rate=10, emis_paid_on_time=emis, loan_approved=True)
+            for emis in (0, 5, None)
+        ]
+        get_customer_summary(self.customer.pk)
+
+    def payment(self, loan, payment_id=None, **fields):
+        return dict({"payment_id": payment_id or uuid.uuid4().hex, "loan_id": loan.loan_id}, **fields)
+
+    def emis_paid(self):
+        return [LoanAppllication.objects.get(pk=loan.pk).emis_paid_on_time for loan in self.loans]
+
+
+@override_settings(EMI_PAYMENT_SIGNING_KEY='processor-secret')
+class EmiPaymentTests(PaymentFixtures, TestCase):
+    """Test cases for the batched EMI payment events."""
+
+    def post(self, events, signature=None):
+        body = json.dumps(events).encode()
+        signature = sign_payment_batch(body) if signature is None else signature
+        return self.client.post(reverse('emi_payments'), body, content_type='application/json', HTTP_X_PAYMENT_SIGNATURE=signature)
+
+    def test_batches_must_be_signed_by_the_processor(self):
+        events = [self.payment(self.loans[0])]
+        self.assertEqual(self.post(events, signature='').status_code, status.HTTP_403_FORBIDDEN)
+        self.assertEqual(self.post(events, signature=sign_payment_batch(json.dumps(events).encode(), 'guessed')).status_code, status.HTTP_403_FORBIDDEN)
+        # a valid signature over a different body
+        self.assertEqual(self.post(events, signature=sign_payment_batch(b'[]')).status_code, status.HTTP_403_FORBIDDEN)
+        with override_settings(EMI_PAYMENT_SIGNING_KEY=''):
+            self.assertEqual(self.post(events, signature=sign_payment_batch(json.dumps(events).encode(), '')).status_code, status.HTTP_403_FORBIDDEN)
+        self.assertEqual(self.emis_paid()[0], 0)
+        self.assertFalse(EmiPayment.objects.exists())
+
+    def test_emis_paid_stop_at_the_tenure(self):
+        first, second, _ = self.loans
+        stats = self.post([self.payment(second) for _ in range(10)] + [self.payment(first) for _ in range(3)]).json()
+        self.assertEqual(stats['applied'], 13)
+        self.assertEqual(self.emis_paid()[:2], [3, 12])
+        self.assertEqual(get_customer_summary(self.customer.pk).total_emis_paid, 15)
+
+    def test_payments_are_counted_per_loan(self):
+        first, second, unpaid = self.loans
+        response = self.post([self.payment(first), self.payment(first), self.payment(second), self.payment(unpaid)])
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.json()['applied'], 4)
+        self.assertEqual(response.json()['loans_updated'], 3)
+        self.assertEqual(self.emis_paid(), [2, 6, 1])
+
+    def test_duplicates_are_dropped_by_payment_id(self):
+        first = self.loans[0]
+        stats = self.post([self.payment(first, 'pay-1'), self.payment(first, 'pay-1'), self.payment(first, 'pay-2')]).json()
+        self.assertEqual((stats['applied'], stats['duplicates']), (2, 1))
+
+        # the processor redelivers the whole batch
+        stats = self.post([self.payment(first, 'pay-1'), self.payment(first, 'pay-2')]).json()
+        self.assertEqual((stats['applied'], stats['duplicates']), (0, 2))
+        self.assertEqual(self.emis_paid()[0], 2)
+        self.assertEqual(EmiPayment.objects.count(), 2)
+
+    def test_late_payments_are_recorded_but_not_counted(self):
+        stats = self.post([self.payment(self.loans[0], 'late-1', paid_on_time=False)]).json()
+        self.assertEqual((stats['applied'], stats['late']), (0, 1))
+        self.assertEqual(self.emis_paid()[0], 0)
+        self.assertFalse(EmiPayment.objects.get(pk='late-1').paid_on_time)
+
+    def test_unknown_loans_and_invalid_events(self):
+        response = self.post([
+            self.payment(self.loans[0]),
+            {"payment_id": "orphan", "loan_id": 999999},
+            {"payment_id": "no-loan"},
+            "not an event",
+        ])
+        stats = response.json()
+        self.assertEqual((stats['applied'], stats['unknown_loans']), (1, 1))
+        self.assertEqual([rejected['index'] for rejected in stats['rejected']], [2, 3])
+        self.assertIn('loan_id', stats['rejected'][0]['errors'])
+        self.assertFalse(EmiPayment.objects.filter(pk='orphan').exists())
+        self.assertEqual(emi_payment_events.value('unknown_loans'), 1)
+
+    def test_statements_do_not_grow_with_the_batch(self):
+        def apply(count):
+            events, _ = validate_payment_events([self.payment(self.loans[index % 3]) for index in range(count)])
+            # loans , savepoint , payment insert , one update (every loan gets the same count) , summaries , release
+            with self.assertNumQueries(6):
+                return apply_emi_payments(events)
+
+        self.assertEqual(apply(3)['applied'], 3)
+        self.assertEqual(apply(30)['applied'], 30)
+        # the second loan stops at its tenure of 12
+        self.assertEqual(self.emis_paid(), [11, 12, 11])
+
+    def test_scores_see_the_payments(self):
+        self.post([self.payment(self.loans[0]) for _ in range(4)])
+        self.assertTrue(CustomerCreditSummary.objects.get(pk=self.customer.pk).needs_refresh)
+        self.assertEqual(get_customer_summary(self.customer.pk).total_emis_paid, 9)
+
+    def test_eligibility_cache_is_evicted(self):
+        request = {"customer_id": self.customer.pk, "loan_amount": 50000, "interest_rate": 10, "tenure": 12}
+        before = self.client.post(reverse('check_eligibility'), request, content_type='application/json').json()
+        self.post([self.payment(loan) for loan in self.loans for _ in range(12)])
+        after = self.client.post(reverse('check_eligibility'), request, content_type='application/json').json()
+        self.assertEqual((before['approval'], after['approval']), (False, True))
+
+    @override_settings(EMI_PAYMENT_BATCH_MAX_ITEMS=2)
+    def test_rejects_oversized_batches(self):
+        response = self.post([self.payment(self.loans[0]) for _ in range(3)])
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertFalse(EmiPayment.objects.exists())
+
+    def test_rejects_a_body_that_is_not_a_list(self):
+        self.assertEqual(self.post(self.payment(self.loans[0])).status_code, status.HTTP_400_BAD_REQUEST)
+
+
+@unittest.skipUnless(EMI_PAYMENT_STREAM_URL, "set EMI_PAYMENT_STREAM_URL to run the payment stream tests against Redis")
+@override_settings(EMI_PAYMENT_STREAM_URL=EMI_PAYMENT_STREAM_URL, EMI_PAYMENT_STREAM=f"emi-payments-test-{uuid.uuid4().hex}")
+class EmiPaymentStreamTests(PaymentFixtures, TestCase):
+    """The payment stream consumer against a real Redis."""
+
+    def setUp(self):
+        super().setUp()
+        self.redis = payment_stream_client()
+        self.addCleanup(self.redis.delete, settings.EMI_PAYMENT_STREAM)
+
+    def publish(self, events):
+        for event in events:
+            self.redis.xadd(settings.EMI_PAYMENT_STREAM, {key: str(value) for key, value in event.items()})
+
+    def test_consumer_applies_and_acknowledges(self):
+        first = self.loans[0]
+        self.publish([self.payment(first, 'stream-1'), self.payment(first, 'stream-1'), self.payment(first, 'stream-2', paid_on_time=False), {"payment_id": "bad"}])
+        report = consume_payment_stream(self.redis, 'test-consumer', seconds=0)
+
+        self.assertEqual((report['applied'], report['late'], report['duplicates'], report['invalid']), (1, 1, 1, 1))
+        self.assertEqual(self.emis_paid()[0], 1)
+        self.assertEqual(self.redis.xpending(settings.EMI_PAYMENT_STREAM, settings.EMI_PAYMENT_CONSUMER_GROUP)['pending'], 0)
+
+    @override_settings(EMI_PAYMENT_CLAIM_IDLE_MS=0)
+    def test_unacknowledged_messages_are_taken_over(self):
+        self.publish([self.payment(self.loans[0], 'stream-3')])
+        # a consumer reads the message and dies before acknowledging it
+        self.redis.xgroup_create(settings.EMI_PAYMENT_STREAM, settings.EMI_PAYMENT_CONSUMER_GROUP, id='0', mkstream=True)
+        self.redis.xreadgroup(settings.EMI_PAYMENT_CONSUMER_GROUP, 'dead-consumer', {settings.EMI_PAYMENT_STREAM: '>'}, count=10)
+
+        report = consume_payment_stream(self.redis, 'test-consumer', seconds=0)
+        self.assertEqual(report['applied'], 1)
+        self.assertEqual(self.emis_paid()[0], 1)
@@ -0,0 +1,125 @@
+import csv
+import datetime as dt
+import io
+import os
+import shutil
+import tempfile
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework import status
+
+from loan_credit.export import export_chunks, write_export
+from loan_credit.models import ArchivedLoan, Customer, LoanAppllication
+from loan_credit.sequences import loan_id_allocator
+
+
+class ExportTests(TestCase):
+    """Test cases for the streaming export of the loan and customer tables."""
+
+    def setUp(self):
+        loan_id_allocator.reset()
+        self.customers = [
+            Customer.objects.create(first_name=f"Export{index}", last_name="Analyst", phone_number=f"{7100000000 + index}", age=40, monthly_income=70000, approved_limit=2520000)
+            for index in range(2)
+        ]
+        self.loans = [
+            LoanAppllication.objects.create(
+                customer_id=self.customers[index % 2], loan_amount=10000 * (index + 1), tenure=12, interest_rate=10.5,
+                monthly_installment=900, emis_paid_on_time=None if index == 4 else index, loan_approved=index != 3,
+                date_of_approval=dt.date(2024, index + 1, 10), end_date=dt.date(2025, index + 1, 10),
+            )
+            for index in range(5)
+        ]
+        self.archived = ArchivedLoan.objects.create(
+            loan_id=10, customer=self.customers[0], loan_amount=5000, tenure=6, interest_rate=9, monthly_installment=850,
+            emis_paid_on_time=6, date_of_approval=dt.date(2019, 5, 1), end_date=dt.date(2019, 11, 1), archived_at=timezone.now(),
+        )
+        self.admin = User.objects.create_user("analyst", is_staff=True)
+
+    def export(self, table='loans', **params):
+        self.client.force_login(self.admin)
+        return self.client.get(reverse('export_table', args=[table]), params)
+
+    def csv_rows(self, response):
+        return list(csv.reader(io.StringIO(b''.join(response.streaming_content).decode())))
+
+    def test_requires_an_admin(self):
+        self.assertEqual(self.client.get(reverse('export_table', args=['loans'])).status_code, status.HTTP_403_FORBIDDEN)
+        self.client.force_login(User.objects.create_user("teller"))
+        self.assertEqual(self.client.get(reverse('export_table', args=['loans'])).status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_csv_of_every_loan_in_loan_id_order(self):
+        response = self.export()
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response['Content-Type'], 'text/csv')
+        self.assertIn('loans.csv', response['Content-Disposition'])
+
+        rows = self.csv_rows(response)
+        self.assertEqual(rows[0][:3], ['loan_id', 'customer_id', 'loan_amount'])
+        self.assertEqual([int(row[0]) for row in rows[1:]], [loan.loan_id for loan in self.loans])
+        self.assertEqual(rows[1][7], '2024-01-10')
+        # an unknown EMI count is an empty cell
+        self.assertEqual(rows[5][6], '')
+
+    def test_filters(self):
+        rows = self.csv_rows(self.export(approved_from='2024-02-01', approved_to='2024-04-30'))
+        self.assertEqual([int(row[0]) for row in rows[1:]], [loan.loan_id for loan in self.loans[1:4]])
+
+        rows = self.csv_rows(self.export(customer_id=self.customers[1].pk, include_archived='true'))
+        self.assertEqual([int(row[0]) for row in rows[1:]], [self.loans[1].loan_id, self.loans[3].loan_id])
+
+        rows = self.csv_rows(self.export(customer_id=self.customers[0].pk, include_archived='true'))
+        self.assertEqual(rows[-1][0], '10')
+        self.assertEqual(rows[-1][-1], 'True')
+
+        rows = self.csv_rows(self.export('customers', customer_id=self.customers[1].pk))
+        self.assertEqual(rows[1][1], 'Export1')
+
+    def test_parquet(self):
+        response = self.export(output='parquet', include_archived='1')
+        self.assertEqual(response['Content-Type'], 'application/vnd.apache.parquet')
+        table = pq.read_table(io.BytesIO(b''.join(response.streaming_content)))
+
+        self.assertEqual(table.num_rows, 6)
+        self.assertEqual(table.schema.field('date_of_approval').type, pa.date32())
+        self.assertEqual(table.column('loan_id').to_pylist(), [loan.loan_id for loan in self.loans] + [10])
+        self.assertEqual(table.column('emis_paid_on_time').to_pylist()[4], None)
+
+    def test_batches_are_written_one_at_a_time(self):
+        stats = {}
+        chunks = list(export_chunks('loans', 'parquet', chunk_size=2, stats=stats))
+        # one row group per batch and the footer
+        self.assertEqual((stats['rows'], stats['batches'], len(chunks)), (5, 3, 4))
+        self.assertEqual(pq.ParquetFile(io.BytesIO(b''.join(chunks))).metadata.num_row_groups, 3)
+
+    def test_empty_export(self):
+        LoanAppllication.objects.all().delete()
+        self.assertEqual(len(self.csv_rows(self.export())), 1)
+        self.assertEqual(pq.read_table(io.BytesIO(b''.join(self.export(output='parquet').streaming_content))).num_rows, 0)
+
+    def test_invalid_requests(self):
+        self.assertEqual(self.export('payments').status_code, status.HTTP_404_NOT_FOUND)
+        self.assertEqual(self.export(output='xml').status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(self.export(approved_from='2024-05-01', approved_to='2024-01-01').status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(self.export('customers', approved_from='2024-01-01').status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_command_writes_a_file(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        path = os.path.join(directory, 'loans.parquet')
+        stderr = io.StringIO()
+        call_command('export_data', 'loans', '--output', 'parquet', '--file', path, '--approved-from', '2024-03-01', stderr=stderr)
+
+        self.assertEqual(pq.read_table(path).num_rows, 3)
+        self.assertIn('3 rows', stderr.getvalue())
+
+    def test_write_export_reports_throughput(self):
+        stats = write_export('customers', io.StringIO())
+        self.assertEqual(stats['rows'], 2)
+        self.assertGreater(stats['bytes'], 0)
@@ -0,0 +1,52 @@
+import json
+
+from django.test import TestCase
+from rest_framework.utils.encoders import JSONEncoder
+
+from loan_credit.fast_serializers import loan_detail_rows, loan_list_rows, render_loan_detail, render_loan_list
+from loan_credit.models import Customer, LoanAppllication
+from loan_credit.serializers import ViewAllLoanApplicationsResponse, ViewLoanApplicationResponse
+
+
+class FastSerializerParityTests(TestCase):
+    """The .values() read path must render exactly what the DRF serializers render."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.customer = Customer.objects.create(
+            first_name="Ines",
+            last_name="Duarte",
+            phone_number="3334445555",
+            age=47,
+            monthly_income=65000,
+            approved_limit=2340000
+        )
+        LoanAppllication.objects.bulk_create([
+            LoanAppllication(loan_id=5001, customer_id=cls.customer, loan_amount=250000, tenure=36, interest_rate=11.5, monthly_installment=8243.5, emis_paid_on_time=12, loan_approved=True),
+            # never paid and no installment stored
+            LoanAppllication(loan_id=5002, customer_id=cls.customer, loan_amount=40000, tenure=6, interest_rate=0, monthly_installment=None, emis_paid_on_time=None, loan_approved=True),
+            # fully repaid
+            LoanAppllication(loan_id=5003, customer_id=cls.customer, loan_amount=90000.75, tenure=12, interest_rate=9, monthly_installment=7870.9, emis_paid_on_time=12, loan_approved=True),
+        ])
+        cls.loans = LoanAppllication.objects.filter(customer_id=cls.customer).order_by('loan_id')
+
+    def assertSameJson(self, fast, reference):
+        self.assertEqual(json.dumps(fast, cls=JSONEncoder), json.dumps(reference, cls=JSONEncoder))
+
+    def test_detail_matches(self):
+        for loan in self.loans.select_related('customer_id'):
+            row = loan_detail_rows(LoanAppllication.objects.filter(pk=loan.pk)).get()
+            self.assertSameJson(render_loan_detail(row), ViewLoanApplicationResponse(loan).data)
+
+    def test_list_matches(self):
+        fast = render_loan_list(loan_list_rows(self.loans))
+        self.assertSameJson(fast, ViewAllLoanApplicationsResponse(list(self.loans), many=True).data)
+
+    def test_repayments_left_is_computed_by_the_database(self):
+        rows = {row['loan_id']: row['repayments_left'] for row in loan_list_rows(self.loans)}
+        self.assertEqual(rows, {5001: 24, 5002: 6, 5003: 0})
+
+    def test_detail_is_one_query(self):
+        with self.assertNumQueries(1):
+            row = loan_detail_rows(LoanAppllication.objects.filter(pk=5001)).get()
+        self.assertEqual(render_loan_detail(row)['customer']['first_name'], "Ines")
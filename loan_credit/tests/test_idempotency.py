@@ -0,0 +1,263 @@
+import asyncio
+import datetime as dt
+import json
+import threading
+from unittest import mock
+
+from django.core.cache import cache
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connection
+from django.test import Client, TestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework import status
+
+from loan_credit.idempotency import IDEMPOTENCY_HEADER, REPLAYED_HEADER, IdempotentRequest
+from loan_credit.models import Customer, CustomerCreditSummary, IdempotencyRecord, LoanAppllication, LoanIdSequence
+from loan_credit.sequences import LOAN_ID_SEQUENCE, loan_id_allocator
+from loan_credit.summaries import get_customer_summary
+from loan_credit.tasks import purge_idempotency_records
+
+
+@override_settings(IDEMPOTENCY_WAIT_SECONDS=1, IDEMPOTENCY_POLL_SECONDS=0.01)
+class CreateLoanIdempotencyTests(TestCase):
+    """Test cases for Idempotency-Key retries of /create-loan/."""
+
+    def setUp(self):
+        loan_id_allocator.reset()
+        cache.clear()
+        self.customer = Customer.objects.create(
+            first_name="Tomas",
+            last_name="Reyes",
+            phone_number="5556667777",
+            age=35,
+            monthly_income=100000,
+            approved_limit=3600000
+        )
+        get_customer_summary(self.customer.pk)
+        self.loan_request = {"customer_id": self.customer.pk, "loan_amount": 80000, "interest_rate": 10, "tenure": 12}
+        self.url = reverse('create_loan_application')
+
+    def post(self, key, data=None):
+        headers = {IDEMPOTENCY_HEADER: key} if key is not None else {}
+        return self.client.post(self.url, data or self.loan_request, content_type='application/json', headers=headers)
+
+    def loans(self):
+        return LoanAppllication.objects.filter(customer_id=self.customer).count()
+
+    def test_retry_storm_creates_one_loan(self):
+        responses = [self.post('retry-1') for _ in range(25)]
+
+        self.assertEqual(self.loans(), 1)
+        self.assertEqual(CustomerCreditSummary.objects.get(pk=self.customer.pk).num_loans_taken, 1)
+        self.assertEqual({response.status_code for response in responses}, {status.HTTP_201_CREATED})
+        self.assertEqual({response.json()['loan_id'] for response in responses}, {responses[0].json()['loan_id']})
+        self.assertNotIn(REPLAYED_HEADER, responses[0])
+        self.assertTrue(all(response[REPLAYED_HEADER] == 'true' for response in responses[1:]))
+
+    def test_replay_skips_the_eligibility_path(self):
+        self.post('retry-2')
+        with mock.patch('loan_credit.views.LoanEligibilityChecker') as checker, self.assertNumQueries(0):
+            response = self.post('retry-2')
+        checker.assert_not_called()
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+
+    def test_replay_from_the_database_when_the_cache_lost_it(self):
+        first = self.post('retry-3')
+        cache.clear()
+        with self.assertNumQueries(1):
+            second = self.post('retry-3')
+        self.assertEqual(second.json(), first.json())
+        self.assertEqual(self.loans(), 1)
+
+    def test_duplicates_without_a_cache_still_create_one_loan(self):
+        # every cache call fails and both requests miss the stored response as if they ran at the same time ,
+        # the record's primary key keeps only the first one
+        stored = IdempotentRequest.stored
+        lookups = []
+
+        def racing_lookup(idempotent_request):
+            lookups.append(idempotent_request.key)
+            return None if len(lookups) <= 2 else stored(idempotent_request)
+
+        with mock.patch.object(cache, 'add', side_effect=ConnectionError), mock.patch.object(cache, 'get', side_effect=ConnectionError), \
+                mock.patch.object(IdempotentRequest, 'stored', autospec=True, side_effect=racing_lookup):
+            first = self.post('retry-4')
+            second = self.post('retry-4')
+        self.assertEqual(first.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(second.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(second[REPLAYED_HEADER], 'true')
+        self.assertEqual(second.json(), first.json())
+        self.assertEqual(self.loans(), 1)
+        self.assertEqual(CustomerCreditSummary.objects.get(pk=self.customer.pk).num_loans_taken, 1)
+
+    def test_duplicate_waits_for_the_running_request(self):
+        running = IdempotentRequest('create_loan', 'retry-5', json.dumps(self.loan_request, cls=DjangoJSONEncoder).encode())
+        self.assertTrue(running.acquire())
+
+        def finish_running_request(seconds):
+            # the first request completes while the duplicate is polling
+            body = self.post(None).json()
+            IdempotencyRecord.objects.create(key=running.key, fingerprint=running.fingerprint, response_status=201, response_body=body)
+            running.release()
+
+        with mock.patch('loan_credit.idempotency.time.sleep', side_effect=finish_running_request) as sleep:
+            response = self.post('retry-5')
+        self.assertEqual(sleep.call_count, 1)
+        self.assertEqual(response[REPLAYED_HEADER], 'true')
+        self.assertEqual(self.loans(), 1)
+
+    def test_running_request_past_the_wait_is_a_conflict(self):
+        IdempotentRequest('create_loan', 'retry-6', b'').acquire()
+        response = self.post('retry-6')
+        self.assertEqual(response.status_code, status.HTTP_409_CONFLICT)
+        self.assertEqual(self.loans(), 0)
+
+    def test_key_reused_for_another_body(self):
+        self.post('retry-7')
+        response = self.post('retry-7', dict(self.loan_request, loan_amount=90000))
+        self.assertEqual(response.status_code, status.HTTP_422_UNPROCESSABLE_ENTITY)
+        self.assertEqual(self.loans(), 1)
+
+    def test_errors_are_not_stored(self):
+        response = self.post('retry-8', dict(self.loan_request, tenure=0))
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        response = self.post('retry-8', dict(self.loan_request, tenure=0))
+        self.assertNotIn(REPLAYED_HEADER, response)
+        self.assertFalse(IdempotencyRecord.objects.exists())
+
+    def test_without_a_key_every_request_creates_a_loan(self):
+        self.post(None)
+        self.post(None)
+        self.assertEqual(self.loans(), 2)
+
+    def test_invalid_key(self):
+        self.assertEqual(self.post('x' * 256).status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_purge_removes_expired_records(self):
+        self.post('retry-9')
+        self.post('retry-10')
+        IdempotencyRecord.objects.filter(pk='create_loan:retry-9').update(created_at=timezone.now() - dt.timedelta(days=2))
+        self.assertEqual(purge_idempotency_records(), 1)
+        self.assertEqual(list(IdempotencyRecord.objects.values_list('pk', flat=True)), ['create_loan:retry-10'])
+
+
+@override_settings(IDEMPOTENCY_WAIT_SECONDS=5, IDEMPOTENCY_POLL_SECONDS=0.01)
+class AsyncCreateLoanIdempotencyTests(TestCase):
+    """Test cases for Idempotency-Key retries of /async/create-loan/."""
+
+    def setUp(self):
+        loan_id_allocator.reset()
+        cache.clear()
+        self.customer = Customer.objects.create(
+            first_name="Tomas",
+            last_name="Reyes",
+            phone_number="5556667777",
+            age=35,
+            monthly_income=100000,
+            approved_limit=3600000
+        )
+        get_customer_summary(self.customer.pk)
+        self.loan_request = {"customer_id": self.customer.pk, "loan_amount": 80000, "interest_rate": 10, "tenure": 12}
+
+    async def post(self, key, data=None, url_name='async_create_loan_application'):
+        headers = {IDEMPOTENCY_HEADER: key} if key is not None else {}
+        return await self.async_client.post(reverse(url_name), data or self.loan_request, content_type='application/json', headers=headers)
+
+    async def loans(self):
+        return await LoanAppllication.objects.filter(customer_id=self.customer).acount()
+
+    async def test_retry_storm_creates_one_loan(self):
+        # retries one after the other , then a burst in flight together
+        responses = [await self.post('async-1') for _ in range(5)]
+        responses += await asyncio.gather(*(self.post('async-1') for _ in range(20)))
+
+        self.assertEqual(await self.loans(), 1)
+        summary = await CustomerCreditSummary.objects.aget(pk=self.customer.pk)
+        self.assertEqual(summary.num_loans_taken, 1)
+        self.assertEqual({response.status_code for response in responses}, {status.HTTP_201_CREATED})
+        self.assertEqual({response.json()['loan_id'] for response in responses}, {responses[0].json()['loan_id']})
+        self.assertNotIn(REPLAYED_HEADER, responses[0])
+        self.assertTrue(all(response[REPLAYED_HEADER] == 'true' for response in responses[1:]))
+
+    async def test_burst_before_the_first_response(self):
+        responses = await asyncio.gather(*(self.post('async-2') for _ in range(10)))
+        self.assertEqual(await self.loans(), 1)
+        self.assertEqual({response.json()['loan_id'] for response in responses}, {responses[0].json()['loan_id']})
+        self.assertEqual(sum(REPLAYED_HEADER not in response for response in responses), 1)
+
+    async def test_key_is_shared_with_the_sync_route(self):
+        first = await self.post('async-3', url_name='create_loan_application')
+        second = await self.post('async-3')
+        self.assertEqual(second[REPLAYED_HEADER], 'true')
+        self.assertEqual(second.json(), first.json())
+        self.assertEqual(await self.loans(), 1)
+
+    async def test_key_reused_for_another_body(self):
+        await self.post('async-4')
+        response = await self.post('async-4', dict(self.loan_request, loan_amount=90000))
+        self.assertEqual(response.status_code, status.HTTP_422_UNPROCESSABLE_ENTITY)
+        self.assertEqual((await self.post('x' * 256)).status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(await self.loans(), 1)
+
+
+@override_settings(IDEMPOTENCY_WAIT_SECONDS=5, IDEMPOTENCY_POLL_SECONDS=0.01)
+class ConcurrentIdempotencyTests(TransactionTestCase):
+    """Test cases for duplicates of /create-loan/ that arrive at the same time , from several threads."""
+
+    def setUp(self):
+        loan_id_allocator.reset()
+        cache.clear()
+        # TransactionTestCase flushes tables , so the counter row is recreated here
+        LoanIdSequence.objects.update_or_create(name=LOAN_ID_SEQUENCE, defaults={'next_value': 1000})
+        self.customer = Customer.objects.create(
+            first_name="Tomas",
+            last_name="Reyes",
+            phone_number="5556667777",
+            age=35,
+            monthly_income=100000,
+            approved_limit=3600000
+        )
+        get_customer_summary(self.customer.pk)
+
+    def test_concurrent_duplicates_create_one_loan(self):
+        loan_request = {"customer_id": self.customer.pk, "loan_amount": 80000, "interest_rate": 10, "tenure": 12}
+        clients = 8
+        start = threading.Barrier(clients)
+        responses = []
+        responses_lock = threading.Lock()
+
+        def send():
+            try:
+                start.wait()
+                response = Client().post(
+                    reverse('create_loan_application'), loan_request, content_type='application/json',
+                    headers={IDEMPOTENCY_HEADER: 'storm-1'},
+                )
+                with responses_lock:
+                    responses.append(response)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=send) for _ in range(clients)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(len(responses), clients)
+        self.assertEqual(LoanAppllication.objects.filter(customer_id=self.customer).count(), 1)
+        self.assertEqual(CustomerCreditSummary.objects.get(pk=self.customer.pk).num_loans_taken, 1)
+
+        created = [response for response in responses if response.status_code == status.HTTP_201_CREATED]
+        originals = [response for response in created if REPLAYED_HEADER not in response]
+        self.assertEqual(len(originals), 1)
+        # the others are replays of the same loan , or conflicts when they gave up waiting
+        for response in responses:
+            if response in originals:
+                continue
+            if response.status_code == status.HTTP_201_CREATED:
+                self.assertEqual(response[REPLAYED_HEADER], 'true')
+                self.assertEqual(response.json(), originals[0].json())
+            else:
+                self.assertEqual(response.status_code, status.HTTP_409_CONFLICT)
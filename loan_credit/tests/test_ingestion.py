@@ -0,0 +1,249 @@
+import datetime as dt
+import os
+import shutil
+import tempfile
+from unittest import mock
+
+from django.test import TestCase, override_settings
+from openpyxl import Workbook
+
+from credit_approver.celery import app
+from loan_credit.ingestion import (
+    CUSTOMER_COLUMNS, LOAN_COLUMNS, IngestionMismatch, KeySet, ingest_customers, ingest_loans, read_sheet_chunks, split_workbook,
+)
+from loan_credit.models import Customer, CustomerCreditSummary, LoanAppllication
+from loan_credit.sequences import loan_id_allocator
+from loan_credit.tasks import finalize_ingestion, injest_data
+
+
+def write_workbook(path, header, rows):
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet()
+    sheet.append(header)
+    for row in rows:
+        sheet.append(row)
+    workbook.save(path)
+
+
+class StreamingIngestionTests(TestCase):
+    """Test cases for the chunked workbook ingestion."""
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        self.customers_path = os.path.join(self.directory, 'customers.xlsx')
+        self.loans_path = os.path.join(self.directory, 'loans.xlsx')
+
+        write_workbook(self.customers_path, list(CUSTOMER_COLUMNS), [
+            [customer_id, f"First{customer_id}", f"Last{customer_id}", 30, 9800000000 + customer_id, 50000, 1800000]
+            for customer_id in range(1, 6)
+        ])
+        approved = dt.datetime(2020, 1, 15)
+        write_workbook(self.loans_path, list(LOAN_COLUMNS), [
+            [loan_id % 5 + 1, loan_id, 100000, 12, 10.5, 8800, 6, approved, approved + dt.timedelta(days=360)]
+            for loan_id in range(4000, 4011)
+        ] + [
+            # the seed workbook repeats some loan ids , the first row wins
+            [1, 4000, 999, 12, 10.5, 8800, 6, approved, approved],
+        ])
+
+    def test_reads_in_fixed_size_chunks(self):
+        chunks = list(read_sheet_chunks(self.loans_path, LOAN_COLUMNS, chunk_size=4))
+        self.assertEqual([len(chunk) for chunk in chunks], [4, 4, 4])
+        self.assertEqual(chunks[0][0]['loan_id'], 4000)
+
+    def test_reads_row_range(self):
+        chunks = list(read_sheet_chunks(self.loans_path, LOAN_COLUMNS, chunk_size=100, min_row=3, max_row=5))
+        self.assertEqual([row['loan_id'] for row in chunks[0]], [4002, 4003, 4004])
+
+    def test_ingests_workbooks_chunk_by_chunk(self):
+        customer_stats = ingest_customers(self.customers_path, chunk_size=2)
+        loan_stats = ingest_loans(self.loans_path, chunk_size=3)
+
+        self.assertEqual(customer_stats['rows'], 5)
+        self.assertEqual(loan_stats['rows'], 12)
+        self.assertGreater(loan_stats['peak_rss_mb'], 0)
+        self.assertEqual(Customer.objects.count(), 5)
+        self.assertEqual(LoanAppllication.objects.count(), 11)
+
+        loan = LoanAppllication.objects.get(pk=4000)
+        self.assertEqual(loan.loan_amount, 100000)
+        self.assertEqual(loan.date_of_approval, dt.date(2020, 1, 15))
+        self.assertEqual(loan.customer_id_id, 1)
+        self.assertTrue(loan.loan_approved)
+        self.assertEqual(Customer.objects.get(pk=3).phone_number, "9800000003")
+
+    def test_rerun_does_not_duplicate_rows(self):
+        ingest_customers(self.customers_path)
+        ingest_customers(self.customers_path)
+        self.assertEqual(Customer.objects.count(), 5)
+
+    def test_missing_column_raises_key_error(self):
+        write_workbook(self.loans_path, ['Customer ID', 'Loan ID'], [[1, 1]])
+        with self.assertRaises(KeyError):
+            ingest_loans(self.loans_path)
+
+    def test_upsert_overwrites_changed_rows(self):
+        ingest_customers(self.customers_path)
+        ingest_loans(self.loans_path)
+        LoanAppllication.objects.filter(pk=4001).update(loan_amount=1)
+
+        stats = ingest_loans(self.loans_path, upsert=True, chunk_size=4)
+        self.assertEqual(LoanAppllication.objects.get(pk=4001).loan_amount, 100000)
+        # the first row for a repeated id wins , as with the plain insert , whatever chunk the repeat falls in
+        self.assertEqual(LoanAppllication.objects.get(pk=4000).loan_amount, 100000)
+        self.assertEqual(stats['rows'], 11)
+        self.assertEqual(LoanAppllication.objects.count(), 11)
+
+    def test_taken_phone_numbers_are_left_out(self):
+        Customer.objects.create(customer_id=99, first_name="Ana", last_name="Lima", age=40, phone_number="9800000003", monthly_income=1, approved_limit=36)
+        write_workbook(self.customers_path, list(CUSTOMER_COLUMNS), [
+            # customer 3 has the phone number of a stored customer , customer 5 the one of customer 4
+            [customer_id, f"First{customer_id}", f"Last{customer_id}", 30, 9800000000 + min(customer_id, 4), 50000, 1800000]
+            for customer_id in range(1, 6)
+        ])
+
+        customer_stats = ingest_customers(self.customers_path, upsert=True, chunk_size=2)
+        loan_stats = ingest_loans(self.loans_path, upsert=True)
+        self.assertEqual((customer_stats['rows'], customer_stats['left_out']), (3, 2))
+        self.assertEqual(sorted(Customer.objects.values_list('pk', flat=True)), [1, 2, 4, 99])
+        # the loans of the customers left out have no customer to belong to
+        self.assertEqual((loan_stats['rows'], loan_stats['left_out']), (7, 4))
+        self.assertFalse(LoanAppllication.objects.filter(customer_id__in=[3, 5]).exists())
+
+    def test_key_set_takes_a_bit_per_key(self):
+        keys = KeySet()
+        self.assertEqual([keys.add(key) for key in (5, 70000, 5)], [True, True, False])
+        self.assertIn(70000, keys)
+        self.assertNotIn(6, keys)
+        self.assertEqual(len(keys), 2)
+        # two pages of 2**15 keys
+        self.assertEqual(keys.nbytes, 8192)
+
+        for key in range(100000):
+            keys.add(key)
+        self.assertEqual((len(keys), keys.nbytes), (100000, 16384))
+
+    def test_split_workbook_reads_it_once_into_partition_files(self):
+        directory = os.path.join(self.directory, 'partitions')
+        split = split_workbook(self.loans_path, LOAN_COLUMNS, 'loan_id', 3, directory)
+
+        self.assertEqual((split['rows'], split['duplicates']), (11, 1))
+        self.assertEqual(len(split['files']), 3)
+        partitions = [[row for chunk in read_sheet_chunks(path, LOAN_COLUMNS, chunk_size=100) for row in chunk] for path in split['files']]
+        self.assertEqual([len(rows) for rows in partitions], [4, 4, 3])
+        self.assertEqual(sorted(int(row['loan_id']) for rows in partitions for row in rows), list(range(4000, 4011)))
+
+        # the partition files load the same rows as the workbook
+        ingest_customers(self.customers_path)
+        for path in split['files']:
+            ingest_loans(path, upsert=True)
+        loan = LoanAppllication.objects.get(pk=4000)
+        self.assertEqual((loan.loan_amount, loan.customer_id_id, loan.emis_paid_on_time), (100000, 1, 6))
+        self.assertEqual((loan.date_of_approval, loan.end_date), (dt.date(2020, 1, 15), dt.date(2021, 1, 9)))
+        self.assertEqual(LoanAppllication.objects.get(pk=4003).interest_rate, 10.5)
+
+
+class PartitionedIngestionTests(TestCase):
+    """Test cases for the fan-out of the ingestion across celery tasks."""
+
+    def setUp(self):
+        loan_id_allocator.reset()
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        self.customers_path = os.path.join(self.directory, 'customers.xlsx')
+        self.loans_path = os.path.join(self.directory, 'loans.xlsx')
+        write_workbook(self.customers_path, list(CUSTOMER_COLUMNS), [
+            [customer_id, f"First{customer_id}", f"Last{customer_id}", 30, 9800000000 + customer_id, 50000, 1800000]
+            for customer_id in range(1, 8)
+        ])
+        approved = dt.datetime(2020, 1, 15)
+        write_workbook(self.loans_path, list(LOAN_COLUMNS), [
+            [loan_id % 7 + 1, loan_id, 100000, 12, 10.5, 8800, 6, approved, approved + dt.timedelta(days=360)]
+            for loan_id in range(4000, 4023)
+        ] + [
+            # a loan id repeated for other customers , the first row keeps the loan
+            [customer_id, 4005, 5000, 6, 9, 850, 1, approved, approved]
+            for customer_id in (1, 2, 3)
+        ])
+
+        # partitions run in process , one after the other
+        previous = app.conf.task_always_eager
+        app.conf.task_always_eager = True
+        self.addCleanup(setattr, app.conf, 'task_always_eager', previous)
+        partition_dir = os.path.join(self.directory, 'partitions')
+        settings_override = override_settings(INGESTION_PARTITION_DIR=partition_dir)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.partition_dir = partition_dir
+
+    def test_fan_out_loads_every_partition(self):
+        planned = injest_data(customers_path=self.customers_path, loans_path=self.loans_path, partitions=4)
+
+        self.assertEqual(planned, {'customer_partitions': 4, 'loan_partitions': 4})
+        self.assertEqual(Customer.objects.count(), 7)
+        self.assertEqual(LoanAppllication.objects.count(), 23)
+        self.assertEqual(CustomerCreditSummary.objects.count(), 7)
+        loan = LoanAppllication.objects.get(pk=4005)
+        self.assertEqual((loan.customer_id_id, loan.loan_amount), (4005 % 7 + 1, 100000))
+        # the partition files are removed once the ingestion is finalized
+        self.assertEqual(os.listdir(self.partition_dir), [])
+        self.assertGreater(LoanAppllication.objects.create(
+            customer_id_id=1, loan_amount=1000, tenure=6, interest_rate=10, loan_approved=True,
+        ).loan_id, 4022)
+
+    def test_rerun_after_partial_failure_is_safe(self):
+        # an earlier run got as far as some of the loans
+        ingest_customers(self.customers_path, min_row=1, max_row=7)
+        ingest_loans(self.loans_path, min_row=1, max_row=10)
+        LoanAppllication.objects.filter(pk=4001).update(loan_amount=1)
+
+        injest_data(customers_path=self.customers_path, loans_path=self.loans_path, partitions=3)
+
+        self.assertEqual(Customer.objects.count(), 7)
+        self.assertEqual(LoanAppllication.objects.count(), 23)
+        self.assertEqual(LoanAppllication.objects.get(pk=4001).loan_amount, 100000)
+
+    def test_taken_phone_number_does_not_fail_the_run(self):
+        Customer.objects.create(customer_id=99, first_name="Ana", last_name="Lima", age=40, phone_number="9800000007", monthly_income=1, approved_limit=36)
+
+        with mock.patch('builtins.print'):
+            injest_data(customers_path=self.customers_path, loans_path=self.loans_path, partitions=3)
+
+        # customer 7 and its loans are left out , the other partitions and the finalize step still run
+        self.assertFalse(Customer.objects.filter(pk=7).exists())
+        self.assertEqual(LoanAppllication.objects.count(), 20)
+        self.assertEqual(CustomerCreditSummary.objects.count(), 7)
+        self.assertEqual(os.listdir(self.partition_dir), [])
+
+    def test_finalize_flags_counts_that_do_not_add_up(self):
+        ingest_customers(self.customers_path)
+        run_directory = os.path.join(self.partition_dir, 'run')
+        os.makedirs(run_directory)
+        expected = {'customers': {'rows': 7, 'duplicates': 0}, 'loans': {'rows': 4, 'duplicates': 0}}
+        customer_results = [{'kind': 'customers', 'path': 'part-000.csv', 'rows': 7, 'left_out': 0, 'seconds': 0.1}]
+        # a loan partition lost on the way , two of the four loan rows were never read
+        loan_results = [{'kind': 'loans', 'path': 'part-000.csv', 'rows': 1, 'left_out': 1, 'seconds': 0.1}]
+
+        with mock.patch('builtins.print'), self.assertLogs('loan_credit.tasks', level='ERROR') as logs:
+            with self.assertRaises(IngestionMismatch) as raised:
+                finalize_ingestion(loan_results, customer_results, expected, run_directory)
+
+        report = raised.exception.report
+        self.assertFalse(report['customers']['mismatch'])
+        self.assertTrue(report['loans']['mismatch'])
+        self.assertEqual((report['loans']['rows_read'], report['loans']['in_table']), (2, 0))
+        self.assertIn("Loans ingestion counts do not add up", logs.output[0])
+        self.assertEqual(len(logs.output), 1)
+        # the rest of the run still happened
+        self.assertEqual(report['summaries'], 7)
+        self.assertFalse(os.path.exists(run_directory))
+
+    def test_errors_fail_the_task(self):
+        with self.assertRaises(FileNotFoundError):
+            injest_data(customers_path=os.path.join(self.directory, 'missing.xlsx'), loans_path=self.loans_path)
+        write_workbook(self.loans_path, ['Customer ID', 'Loan ID'], [[1, 1]])
+        with self.assertRaises(KeyError):
+            injest_data(customers_path=self.customers_path, loans_path=self.loans_path)
+        self.assertFalse(Customer.objects.exists())
+        self.assertEqual(os.listdir(self.partition_dir), [])
@@ -0,0 +1,152 @@
+from unittest import mock
+
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework import status
+
+from credit_approver.celery import app
+from loan_credit.decisions import SCHEDULED_KEY, decide_pending_loans, schedule_loan_decisions
+from loan_credit.idempotency import IDEMPOTENCY_HEADER
+from loan_credit.models import Customer, CustomerCreditSummary, LoanAppllication, LoanDecision
+from loan_credit.sequences import loan_id_allocator
+from loan_credit.tasks import decide_loan_applications
+from loan_credit.serializers import CUSTOMER_NOT_FOUND_MESSAGE
+
+ASYNC_HEADERS = {'Prefer': 'respond-async'}
+
+
+class AsyncLoanDecisionTests(TestCase):
+    """Test cases for the async mode of /create-loan/ and the micro-batched decisions."""
+
+    def setUp(self):
+        loan_id_allocator.reset()
+        cache.clear()
+        previous = app.conf.task_always_eager
+        app.conf.task_always_eager = True
+        self.addCleanup(setattr, app.conf, 'task_always_eager', previous)
+        self.customer = self.create_customer(0)
+        self.loan_request = {"customer_id": self.customer.pk, "loan_amount": 70000, "interest_rate": 10, "tenure": 12}
+
+    def create_customer(self, index):
+        return Customer.objects.create(
+            first_name=f"Queue{index}",
+            last_name="Borrower",
+            phone_number=f"{8000000000 + index}",
+            age=30 + index,
+            monthly_income=90000,
+            approved_limit=3240000
+        )
+
+    def queue(self, data, headers=None):
+        # queued without running the decision task , as if the workers were busy
+        with mock.patch('loan_credit.views.schedule_loan_decisions'):
+            return self.client.post(reverse('create_loan_application'), data, content_type='application/json', headers=dict(ASYNC_HEADERS, **(headers or {})))
+
+    def poll(self, response):
+        return self.client.get(response.json()['poll_url'])
+
+    def test_queued_request_returns_a_decision_to_poll(self):
+        # savepoint , insert , release
+        with self.assertNumQueries(3):
+            response = self.queue(self.loan_request)
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+        self.assertEqual(response['Location'], response.json()['poll_url'])
+        self.assertEqual(response.json()['status'], LoanDecision.PENDING)
+        self.assertFalse(LoanAppllication.objects.exists())
+
+        poll = self.poll(response)
+        self.assertEqual(poll.status_code, status.HTTP_202_ACCEPTED)
+        self.assertEqual(poll['Retry-After'], '1')
+
+    def test_decision_matches_the_inline_check(self):
+        expected = self.client.post(reverse('check_eligibility'), self.loan_request, content_type='application/json').json()
+        response = self.queue(self.loan_request)
+        decide_pending_loans()
+
+        poll = self.poll(response)
+        self.assertEqual(poll.status_code, status.HTTP_200_OK)
+        result = poll.json()['result']
+        self.assertEqual(poll.json()['status'], LoanDecision.COMPLETED)
+        self.assertEqual(result['loan_approved'], expected['approval'])
+        self.assertEqual(result['monthly_installment'], expected['monthly_installment'])
+
+        loan = LoanAppllication.objects.get(pk=result['loan_id'])
+        self.assertEqual(loan.customer_id_id, self.customer.pk)
+        self.assertEqual(CustomerCreditSummary.objects.get(pk=self.customer.pk).num_loans_taken, 1)
+
+    def test_batch_queries_do_not_grow_with_its_size(self):
+        def decide_batch(customers):
+            for customer in customers:
+                self.queue(dict(self.loan_request, customer_id=customer.pk))
+            with CaptureQueriesContext(connection) as queries:
+                self.assertEqual(decide_pending_loans()['decided'], len(customers))
+            return len(queries)
+
+        small = decide_batch([self.create_customer(index) for index in range(1, 4)])
+        large = decide_batch([self.create_customer(index) for index in range(4, 24)])
+        self.assertEqual(small, large)
+
+    def test_unknown_customer_fails(self):
+        response = self.queue(dict(self.loan_request, customer_id=self.customer.pk + 100))
+        decide_pending_loans()
+        poll = self.poll(response).json()
+        self.assertEqual(poll['status'], LoanDecision.FAILED)
+        self.assertEqual(poll['errors'], {"customer_id": [CUSTOMER_NOT_FOUND_MESSAGE]})
+
+    def test_second_application_of_a_customer_waits_for_the_next_batch(self):
+        first = self.queue(self.loan_request)
+        second = self.queue(self.loan_request)
+
+        self.assertEqual(decide_pending_loans(), {'claimed': 2, 'decided': 1, 'deferred': 1})
+        self.assertEqual(decide_pending_loans(), {'claimed': 1, 'decided': 1, 'deferred': 0})
+        self.assertEqual(LoanAppllication.objects.filter(customer_id=self.customer).count(), 2)
+        # the second check sees the first loan , which has no installment paid yet
+        self.assertTrue(self.poll(first).json()['result']['loan_approved'])
+        self.assertFalse(self.poll(second).json()['result']['loan_approved'])
+
+    def test_full_batch_starts_the_next_one(self):
+        for index in range(1, 4):
+            self.queue(dict(self.loan_request, customer_id=self.create_customer(index).pk))
+        next_batch = mock.Mock()
+        decide_pending_loans(batch_size=2, on_full_batch=next_batch)
+        decide_pending_loans(batch_size=2, on_full_batch=next_batch)
+        self.assertEqual(next_batch.call_count, 1)
+
+    def test_celery_decides_the_queue(self):
+        response = self.client.post(reverse('create_loan_application'), self.loan_request, content_type='application/json', headers=ASYNC_HEADERS)
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+        self.assertEqual(self.poll(response).json()['status'], LoanDecision.COMPLETED)
+
+    def test_requests_in_a_window_share_one_task(self):
+        with mock.patch.object(decide_loan_applications, 'apply_async') as apply_async, mock.patch.object(cache, 'add', wraps=cache.add) as add:
+            for _ in range(3):
+                schedule_loan_decisions()
+            self.assertEqual(apply_async.call_count, 1)
+            # whole seconds , Redis turns a fraction into a key that expires at once
+            timeout = add.call_args.args[2]
+            self.assertIsInstance(timeout, int)
+            self.assertGreaterEqual(timeout, 1)
+
+            # the task reopens the window when it starts
+            decide_loan_applications.run()
+            self.assertIsNone(cache.get(SCHEDULED_KEY))
+            schedule_loan_decisions()
+            self.assertEqual(apply_async.call_count, 2)
+
+    def test_invalid_payload_is_rejected_before_queueing(self):
+        response = self.queue(dict(self.loan_request, tenure=0))
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertFalse(LoanDecision.objects.exists())
+
+    def test_retried_async_request_is_queued_once(self):
+        first = self.queue(self.loan_request, {IDEMPOTENCY_HEADER: 'campaign-1'})
+        second = self.queue(self.loan_request, {IDEMPOTENCY_HEADER: 'campaign-1'})
+        self.assertEqual(second.json()['decision_id'], first.json()['decision_id'])
+        self.assertEqual(LoanDecision.objects.count(), 1)
+
+    def test_unknown_decision(self):
+        response = self.client.get(reverse('loan_decision', args=['00000000-0000-0000-0000-000000000000']))
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
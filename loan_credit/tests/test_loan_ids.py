@@ -0,0 +1,146 @@
+import threading
+from unittest import mock
+
+from django.core.cache import cache
+from django.test import TestCase, TransactionTestCase, override_settings
+
+from loan_credit.models import Customer, LoanAppllication, LoanIdSequence
+from loan_credit.sequences import LOAN_ID_SEQUENCE, LoanIdAllocator, loan_id_allocator, reseed_loan_ids
+
+
+class LoanIdAllocatorTests(TestCase):
+    """Test cases for the block allocating loan id source."""
+
+    def setUp(self):
+        loan_id_allocator.reset()
+        cache.clear()
+        self.customer = Customer.objects.create(
+            first_name="Ida",
+            last_name="Allocator",
+            phone_number="2223334444",
+            age=41,
+            monthly_income=90000
+        )
+
+    def test_allocators_never_share_ids(self):
+        """
+        Tests that allocators standing in for separate processes get disjoint blocks.
+        """
+        allocators = [LoanIdAllocator(block_size=7) for _ in range(4)]
+        issued = []
+        for _ in range(50):
+            for allocator in allocators:
+                issued.append(allocator.next_id())
+        self.assertEqual(len(issued), len(set(issued)))
+
+    def test_loan_creation_skips_id_lookup(self):
+        """
+        Tests that creating a loan with a warm allocator costs only the insert.
+        """
+        LoanAppllication.objects.create(customer_id=self.customer, loan_amount=1000, tenure=6, interest_rate=9)
+        with self.assertNumQueries(1):
+            LoanAppllication.objects.create(customer_id=self.customer, loan_amount=2000, tenure=6, interest_rate=9)
+
+    def test_reseed_moves_past_imported_ids(self):
+        """
+        Tests that reseeding after an import hands out ids above the imported ones.
+        """
+        LoanAppllication.objects.bulk_create([
+            LoanAppllication(loan_id=7000, customer_id=self.customer, loan_amount=1000, tenure=6, interest_rate=9),
+        ])
+        self.assertEqual(reseed_loan_ids(), 7001)
+        loan_id_allocator.reset()
+        loan = LoanAppllication.objects.create(customer_id=self.customer, loan_amount=1000, tenure=6, interest_rate=9)
+        self.assertEqual(loan.loan_id, 7001)
+
+    def test_reseed_never_moves_backwards(self):
+        """
+        Tests that reseeding keeps ids that were already reserved out of circulation.
+        """
+        LoanIdAllocator(block_size=500).next_id()
+        self.assertEqual(reseed_loan_ids(), 1500)
+
+    @override_settings(LOAN_ID_GENERATION_CHECK_SECONDS=0)
+    def test_reseed_retires_reserved_blocks(self):
+        """
+        Tests that an allocator holding a block from before the reseed does not hand out imported ids.
+        """
+        allocator = LoanIdAllocator(block_size=50)
+        self.assertEqual(allocator.next_id(), 1000)
+        LoanAppllication.objects.bulk_create([
+            LoanAppllication(loan_id=1001, customer_id=self.customer, loan_amount=1000, tenure=6, interest_rate=9),
+        ])
+        self.assertEqual(reseed_loan_ids(), 1050)
+        self.assertEqual(allocator.next_id(), 1050)
+
+        # the generation is kept in the database as well , for when the cache loses it
+        cache.clear()
+        self.assertEqual(allocator.next_id(), 1051)
+
+    def test_reseed_retires_the_block_of_its_own_process(self):
+        self.assertEqual(loan_id_allocator.next_id(), 1000)
+        LoanAppllication.objects.bulk_create([
+            LoanAppllication(loan_id=1001, customer_id=self.customer, loan_amount=1000, tenure=6, interest_rate=9),
+        ])
+        reseed_loan_ids()
+        self.assertEqual(loan_id_allocator.next_id(), 1050)
+
+    def test_generation_is_checked_once_per_interval(self):
+        allocator = LoanIdAllocator(block_size=50)
+        with mock.patch('loan_credit.sequences.time.monotonic', return_value=100.0), \
+                mock.patch('loan_credit.sequences.loan_id_generation', return_value=0) as generation:
+            ids = [allocator.next_id() for _ in range(20)]
+        self.assertEqual(ids, list(range(1000, 1020)))
+        # once , before the block was reserved
+        self.assertEqual(generation.call_count, 1)
+
+        with mock.patch('loan_credit.sequences.time.monotonic', return_value=101.0), \
+                mock.patch('loan_credit.sequences.loan_id_generation', return_value=1) as generation:
+            self.assertEqual(allocator.next_id(), 1050)
+            self.assertEqual(allocator.next_id(), 1051)
+        # the interval passed , the new generation retired the old block
+        self.assertEqual(generation.call_count, 1)
+
+
+class ConcurrentLoanIdTests(TransactionTestCase):
+    """Test cases for loan creation from several threads at once."""
+
+    def setUp(self):
+        loan_id_allocator.reset()
+        # TransactionTestCase flushes tables , so the counter row is recreated here
+        LoanIdSequence.objects.update_or_create(name=LOAN_ID_SEQUENCE, defaults={'next_value': 1000})
+        self.customer = Customer.objects.create(
+            first_name="Con",
+            last_name="Current",
+            phone_number="3334445555",
+            age=29,
+            monthly_income=70000
+        )
+
+    def test_concurrent_creation_has_no_collisions(self):
+        """
+        Tests that threads sharing one allocator never hand out the same id.
+        """
+        allocator = LoanIdAllocator(block_size=5)
+        issued = []
+        issued_lock = threading.Lock()
+
+        def allocate():
+            ids = [allocator.next_id() for _ in range(40)]
+            with issued_lock:
+                issued.extend(ids)
+
+        threads = [threading.Thread(target=allocate) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(len(issued), 320)
+        self.assertEqual(len(set(issued)), 320)
+
+        LoanAppllication.objects.bulk_create([
+            LoanAppllication(loan_id=loan_id, customer_id=self.customer, loan_amount=1000, tenure=6, interest_rate=9)
+            for loan_id in issued
+        ])
+        self.assertEqual(LoanAppllication.objects.count(), 320)
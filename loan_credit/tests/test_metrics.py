@@ -0,0 +1,98 @@
+from django.core.cache import cache
+from django.test import SimpleTestCase, TestCase
+from django.urls import reverse
+from rest_framework import status
+
+from loan_credit.metrics import CONTENT_TYPE, Histogram, registry, request_db_seconds, request_queries, request_seconds, request_serializer_seconds, span_seconds
+from loan_credit.models import Customer, LoanAppllication
+from loan_credit.sequences import loan_id_allocator
+
+
+class HistogramTests(SimpleTestCase):
+    """Test cases for the bucket counting and text format of a histogram."""
+
+    def test_buckets_are_cumulative(self):
+        histogram = Histogram('test_seconds', 'Test.', ('view',), buckets=(0.1, 1.0))
+        for value in (0.05, 0.1, 0.5, 3.0):
+            histogram.observe(value, 'home')
+
+        self.assertEqual(list(histogram.samples()), [
+            'test_seconds_bucket{view="home",le="0.1"} 2',
+            'test_seconds_bucket{view="home",le="1.0"} 3',
+            'test_seconds_bucket{view="home",le="+Inf"} 4',
+            'test_seconds_sum{view="home"} 3.65',
+            'test_seconds_count{view="home"} 4',
+        ])
+
+    def test_label_values_are_escaped(self):
+        histogram = Histogram('test_seconds', 'Test.', ('view',), buckets=(1.0,))
+        histogram.observe(0.5, 'a"b\\c')
+        self.assertIn('view="a\\"b\\\\c"', next(histogram.samples()))
+
+
+class RequestMetricsTests(TestCase):
+    """Test cases for the per URL name request metrics and the /metrics endpoint."""
+
+    def setUp(self):
+        loan_id_allocator.reset()
+        cache.clear()
+        registry.reset()
+        self.customer = Customer.objects.create(
+            first_name="Lena",
+            last_name="Okafor",
+            phone_number="6667778888",
+            age=36,
+            monthly_income=70000,
+            approved_limit=2520000
+        )
+        self.loan = LoanAppllication.objects.create(
+            customer_id=self.customer,
+            loan_amount=120000,
+            tenure=12,
+            interest_rate=10,
+            monthly_installment=10550,
+            emis_paid_on_time=3,
+            loan_approved=True
+        )
+        self.loan_request = {"customer_id": self.customer.pk, "loan_amount": 50000, "interest_rate": 10, "tenure": 12}
+
+    def test_request_is_recorded_under_its_url_name(self):
+        url = reverse('view_loan_application', args=[self.loan.loan_id])
+        self.client.get(url)
+        self.client.get(url)
+
+        self.assertEqual(request_seconds.count('view_loan_application', 'GET', 200), 2)
+        # the loan is read once , the second response comes from the cache
+        self.assertEqual(request_queries.count('view_loan_application'), 2)
+        self.assertEqual(request_queries.sum('view_loan_application'), 1)
+        self.assertGreater(request_db_seconds.sum('view_loan_application'), 0)
+        self.assertGreater(request_serializer_seconds.sum('view_loan_application'), 0)
+
+    def test_eligibility_spans(self):
+        self.client.post(reverse('check_eligibility'), self.loan_request, content_type='application/json')
+        for name in ('summary_read', 'summary_aggregate', 'credit_score', 'monthly_installment'):
+            self.assertEqual(span_seconds.count(name), 1, name)
+
+    def test_error_responses_keep_their_status(self):
+        self.client.get(reverse('view_loan_application', args=[self.loan.loan_id + 1]))
+        self.client.post(reverse('check_eligibility'), dict(self.loan_request, tenure=0), content_type='application/json')
+
+        self.assertEqual(request_seconds.count('view_loan_application', 'GET', 404), 1)
+        self.assertEqual(request_seconds.count('check_eligibility', 'POST', 400), 1)
+
+    async def test_async_view_queries_are_counted(self):
+        await self.async_client.get(reverse('async_view_loan_application', args=[self.loan.loan_id]))
+        self.assertEqual(request_seconds.count('async_view_loan_application', 'GET', 200), 1)
+        self.assertEqual(request_queries.sum('async_view_loan_application'), 1)
+
+    def test_metrics_endpoint(self):
+        self.client.get(reverse('view_loan_application', args=[self.loan.loan_id]))
+        response = self.client.get(reverse('metrics'))
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response['Content-Type'], CONTENT_TYPE)
+        body = response.content.decode()
+        self.assertIn('# TYPE loan_credit_http_request_duration_seconds histogram', body)
+        self.assertIn('loan_credit_http_request_queries_count{view="view_loan_application"} 1', body)
+        self.assertIn('loan_credit_view_cache_requests_total{view="view_loan",result="miss"}', body)
+        self.assertIn('# TYPE loan_credit_db_connections_opened_total counter', body)
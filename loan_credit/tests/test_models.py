@@ -2,6 +2,7 @@
 
 from django.test import TestCase
 from loan_credit.models import Customer, LoanAppllication
+from loan_credit.sequences import loan_id_allocator
 
 class CustomerModelTests(TestCase):
     """Test cases for the Customer model."""
@@ -43,6 +44,8 @@ class LoanApplicationModelTests(TestCase):
         The setUp method runs before every single test in this class.
         It's the perfect place to create objects that are needed by multiple tests.
         """
+        # ids held in memory belong to the rolled back state of the previous test
+        loan_id_allocator.reset()
         self.customer = Customer.objects.create(
             first_name="Peter",
             last_name="Jones",
@@ -0,0 +1,84 @@
+import json
+
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from rest_framework import status
+
+from loan_credit.models import Customer, LoanAppllication
+
+
+class LoanListingPaginationTests(TestCase):
+    """Test cases for the keyset pages and the streamed listing of /view-loans/<customer_id>/."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.customer = Customer.objects.create(
+            first_name="Corp",
+            last_name="Borrower",
+            phone_number="9990001111",
+            age=50,
+            monthly_income=900000
+        )
+        LoanAppllication.objects.bulk_create([
+            LoanAppllication(
+                loan_id=7000 + i,
+                customer_id=cls.customer,
+                loan_amount=10000 + i,
+                tenure=12,
+                interest_rate=10,
+                emis_paid_on_time=i % 12,
+                loan_approved=i % 4 != 0,
+            )
+            for i in range(40)
+        ])
+        cls.approved_ids = list(
+            LoanAppllication.objects.filter(customer_id=cls.customer, loan_approved=True).order_by('loan_id').values_list('loan_id', flat=True)
+        )
+        cls.url = reverse('view_all_loan_application', args=[cls.customer.pk])
+
+    def setUp(self):
+        cache.clear()
+
+    def test_listing_without_parameters_is_one_query(self):
+        with self.assertNumQueries(1):
+            response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(sorted(loan['loan_id'] for loan in response.json()), self.approved_ids)
+
+    def test_pages_follow_the_cursor(self):
+        seen = []
+        url = self.url + '?limit=7'
+        while url:
+            with self.assertNumQueries(1):
+                page = self.client.get(url).json()
+            self.assertLessEqual(len(page['results']), 7)
+            seen.extend(loan['loan_id'] for loan in page['results'])
+            url = page['next']
+        self.assertEqual(seen, self.approved_ids)
+
+    @override_settings(LOAN_PAGE_MAX_SIZE=5)
+    def test_limit_is_capped(self):
+        page = self.client.get(self.url + '?limit=500').json()
+        self.assertEqual(len(page['results']), 5)
+
+    def test_page_rows_match_the_listing(self):
+        listing = {loan['loan_id']: loan for loan in self.client.get(self.url).json()}
+        page = self.client.get(self.url + '?limit=3').json()
+        for loan in page['results']:
+            self.assertEqual(loan, listing[loan['loan_id']])
+
+    @override_settings(LOAN_STREAM_CHUNK_SIZE=4)
+    def test_stream_writes_the_whole_listing(self):
+        response = self.client.get(self.url + '?stream=1')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response.streaming)
+        streamed = json.loads(b''.join(response.streaming_content))
+
+        listing = sorted(self.client.get(self.url).json(), key=lambda loan: loan['loan_id'])
+        self.assertEqual(streamed, listing)
+
+    def test_unknown_customer_is_not_found_in_every_mode(self):
+        url = reverse('view_all_loan_application', args=[self.customer.pk + 1])
+        for query in ('', '?limit=5', '?stream=1'):
+            self.assertEqual(self.client.get(url + query).status_code, status.HTTP_404_NOT_FOUND, query)
@@ -0,0 +1,140 @@
+import datetime as dt
+import json
+import re
+
+from django.db import connection, transaction
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from loan_credit.models import Customer, LoanAppllication
+from loan_credit.sequences import loan_id_allocator
+
+EXPLAINED_STATEMENTS = ('SELECT', 'UPDATE', 'DELETE')
+APP_TABLE_PREFIX = 'loan_credit_'
+
+
+def explain(sql : str) -> list:
+    """
+    Returns the plan of a captured statement as a list of lines (SQLite) or plan nodes (PostgreSQL).
+    """
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            # small test tables make a sequential scan the cheapest plan , so only report one if no index can serve the query
+            with transaction.atomic():
+                cursor.execute("SET LOCAL enable_seqscan = off")
+                cursor.execute("EXPLAIN (FORMAT JSON) " + sql)
+                plan = cursor.fetchone()[0]
+            plan = json.loads(plan) if isinstance(plan, str) else plan
+            nodes = []
+            pending = [plan[0]['Plan']]
+            while pending:
+                node = pending.pop()
+                nodes.append(node)
+                pending.extend(node.get('Plans', []))
+            return nodes
+
+        cursor.execute("EXPLAIN QUERY PLAN " + sql)
+        return [row[-1] for row in cursor.fetchall()]
+
+
+def sequential_scans(sql : str) -> list:
+    """
+    Returns the app tables a statement reads with a full table scan.
+    """
+    if connection.vendor == 'postgresql':
+        return [
+            node['Relation Name'] for node in explain(sql)
+            if node['Node Type'] == 'Seq Scan' and node.get('Relation Name', '').startswith(APP_TABLE_PREFIX)
+        ]
+
+    scans = []
+    for detail in explain(sql):
+        match = re.match(r'SCAN (\w+)', detail)
+        if match and match.group(1).startswith(APP_TABLE_PREFIX):
+            scans.append(match.group(1))
+    return scans
+
+
+class QueryPlanTests(TestCase):
+    """Fails when a query of an endpoint falls back to a sequential scan on the seeded dataset."""
+
+    @classmethod
+    def setUpTestData(cls):
+        today = dt.date.today()
+        cls.customers = Customer.objects.bulk_create([
+            Customer(first_name=f"Plan{i}", last_name="Seed", phone_number=f"90000000{i:02d}", age=30 + i, monthly_income=90000, approved_limit=3240000)
+            for i in range(20)
+        ])
+        loans = []
+        loan_id = 50000
+        for customer in cls.customers:
+            for i in range(25):
+                loans.append(LoanAppllication(
+                    loan_id=loan_id,
+                    customer_id=customer,
+                    loan_amount=10000 + i,
+                    tenure=12,
+                    interest_rate=10,
+                    monthly_installment=880,
+                    emis_paid_on_time=i % 13,
+                    date_of_approval=today - dt.timedelta(days=40 * i),
+                    end_date=today + dt.timedelta(days=365 - 40 * i),
+                    loan_approved=i % 5 != 0,
+                ))
+                loan_id += 1
+        LoanAppllication.objects.bulk_create(loans)
+        cls.customer = cls.customers[7]
+        cls.loan = LoanAppllication.objects.filter(customer_id=cls.customer, loan_approved=True).first()
+
+    def setUp(self):
+        loan_id_allocator.reset()
+
+    def assertNoSequentialScans(self, method, url, data=None):
+        with CaptureQueriesContext(connection) as captured:
+            if method == 'post':
+                response = self.client.post(url, data, content_type='application/json')
+            else:
+                response = self.client.get(url)
+        self.assertLess(response.status_code, 500)
+
+        explained = 0
+        for query in captured.captured_queries:
+            sql = query['sql']
+            if not sql.lstrip().upper().startswith(EXPLAINED_STATEMENTS):
+                continue
+            explained += 1
+            self.assertEqual(sequential_scans(sql), [], sql)
+        return explained
+
+    def test_check_eligibility_plans(self):
+        data = {"customer_id": self.customer.pk, "loan_amount": 50000, "interest_rate": 10, "tenure": 12}
+        self.assertGreater(self.assertNoSequentialScans('post', reverse('check_eligibility'), data), 0)
+
+    def test_create_loan_plans(self):
+        data = {"customer_id": self.customer.pk, "loan_amount": 50000, "interest_rate": 10, "tenure": 12}
+        self.assertGreater(self.assertNoSequentialScans('post', reverse('create_loan_application'), data), 0)
+
+    def test_view_loan_plans(self):
+        url = reverse('view_loan_application', args=[self.loan.loan_id])
+        self.assertGreater(self.assertNoSequentialScans('get', url), 0)
+
+    def test_view_loans_plans(self):
+        url = reverse('view_all_loan_application', args=[self.customer.pk])
+        self.assertGreater(self.assertNoSequentialScans('get', url), 0)
+
+    def test_view_loans_page_plans(self):
+        url = reverse('view_all_loan_application', args=[self.customer.pk])
+        first_page = self.client.get(url + '?limit=5').json()
+        self.assertGreater(self.assertNoSequentialScans('get', first_page['next']), 0)
+
+    def test_loan_schedule_plans(self):
+        url = reverse('view_loan_schedule', args=[self.loan.loan_id])
+        self.assertGreater(self.assertNoSequentialScans('get', url), 0)
+
+    def test_harness_detects_sequential_scan(self):
+        """
+        Tests that an unindexed filter is reported.
+        """
+        sql = str(LoanAppllication.objects.filter(loan_amount__gt=1).query)
+        self.assertEqual(sequential_scans(sql), [LoanAppllication._meta.db_table])
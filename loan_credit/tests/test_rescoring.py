@@ -0,0 +1,110 @@
+import datetime as dt
+from unittest import mock
+
+from django.test import TestCase
+
+from loan_credit.models import Customer, CustomerCreditScore, LoanAppllication
+from loan_credit.rescoring import rescore_portfolio
+from loan_credit.sequences import loan_id_allocator
+from loan_credit.summaries import compute_summaries
+from loan_credit.synthetic import generate_synthetic_data
+from loan_credit.tasks import rescore_portfolio as rescore_portfolio_task
+from loan_credit.utils import LoanEligibilityChecker
+
+
+class PortfolioRescoringTests(TestCase):
+    """The vectorized rescoring must score every customer exactly like LoanEligibilityChecker.calculate_credit_score."""
+
+    def setUp(self):
+        loan_id_allocator.reset()
+        self.today = dt.date.today()
+
+    def customer(self, index, monthly_income=50000):
+        return Customer.objects.create(
+            first_name=f"Score{index}",
+            last_name="Parity",
+            phone_number=f"{5000000000 + index}",
+            age=30 + index,
+            monthly_income=monthly_income,
+            approved_limit=36 * monthly_income
+        )
+
+    def loan(self, customer, loan_amount=100000, tenure=12, emis_paid_on_time=6, end_in_days=90, approved=True):
+        LoanAppllication.objects.create(
+            customer_id=customer,
+            loan_amount=loan_amount,
+            tenure=tenure,
+            interest_rate=10,
+            monthly_installment=round(loan_amount / tenure, 2),
+            emis_paid_on_time=emis_paid_on_time,
+            loan_approved=approved,
+            date_of_approval=self.today - dt.timedelta(days=30 * tenure) if end_in_days is not None else None,
+            end_date=self.today + dt.timedelta(days=end_in_days) if end_in_days is not None else None,
+        )
+
+    def per_customer_scores(self):
+        # the per-customer path : one aggregate and one scoring call per customer , without a requested amount
+        scores = {}
+        for customer in Customer.objects.all():
+            summary = compute_summaries([customer.pk], self.today)[customer.pk]
+            summary.customer = customer
+            scores[customer.pk] = LoanEligibilityChecker({'customer_id': customer.pk, 'loan_amount': 0}).calculate_credit_score(summary)
+        return scores
+
+    def stored_scores(self):
+        return dict(CustomerCreditScore.objects.values_list('customer_id', 'credit_score'))
+
+    def customer_pk(self, index):
+        return Customer.objects.get(first_name=f"Score{index}").pk
+
+    def assertParity(self, chunk_size=2):
+        report = rescore_portfolio(chunk_size=chunk_size, today=self.today, use_copy=False)
+        self.assertEqual(report['customers'], Customer.objects.count())
+        self.assertEqual(self.stored_scores(), self.per_customer_scores())
+
+    def test_edge_cases_match(self):
+        # no history , only rejected applications , running loans above the limit
+        self.customer(0)
+        self.loan(self.customer(1), approved=False)
+        self.loan(self.customer(2, monthly_income=1000), loan_amount=50000)
+        # fully paid , partly paid , unknown and overpaid EMIs , ended and open ended loans
+        paid = self.customer(3)
+        self.loan(paid, emis_paid_on_time=12, end_in_days=-10)
+        self.loan(paid, emis_paid_on_time=3, tenure=24)
+        mixed = self.customer(4)
+        self.loan(mixed, emis_paid_on_time=None)
+        self.loan(mixed, emis_paid_on_time=30, end_in_days=None)
+        self.loan(mixed, emis_paid_on_time=0, end_in_days=0)
+
+        self.assertParity()
+        self.assertEqual(self.stored_scores()[self.customer_pk(0)], 75)
+
+    def test_synthetic_portfolio_matches(self):
+        generate_synthetic_data(customers=150, loans=900, seed=7, chunk_size=128, use_copy=False, today=self.today)
+        self.assertParity(chunk_size=97)
+
+    def test_rerun_overwrites_the_scores(self):
+        customer = self.customer(0)
+        rescore_portfolio(today=self.today, use_copy=False)
+        first = CustomerCreditScore.objects.get(pk=customer.pk)
+        self.loan(customer, emis_paid_on_time=0)
+
+        rescore_portfolio(today=self.today, use_copy=False)
+        second = CustomerCreditScore.objects.get(pk=customer.pk)
+        self.assertEqual(CustomerCreditScore.objects.count(), 1)
+        self.assertEqual((first.credit_score, second.credit_score), (75, 0))
+        self.assertGreater(second.scored_at, first.scored_at)
+
+    def test_one_read_of_each_table_per_chunk(self):
+        for index in range(3):
+            self.loan(self.customer(index))
+        # loans , archived loan totals , customers and the upsert of the one chunk
+        with self.assertNumQueries(4):
+            rescore_portfolio(today=self.today, use_copy=False)
+
+    def test_nightly_task(self):
+        self.customer(0)
+        with mock.patch('builtins.print'):
+            report = rescore_portfolio_task()
+        self.assertEqual(report['customers'], 1)
+        self.assertEqual(CustomerCreditScore.objects.count(), 1)
@@ -0,0 +1,202 @@
+import datetime as dt
+import os
+import unittest
+from unittest import mock
+
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from rest_framework import status
+
+from loan_credit.ingestion import evict_cached_views
+from loan_credit.models import Customer, LoanAppllication
+from loan_credit.response_cache import cache_stats
+from loan_credit.sequences import loan_id_allocator
+from loan_credit.summaries import refresh_summaries
+
+REDIS_CACHE_URL = os.environ.get('REDIS_CACHE_URL')
+
+
+class LoanViewCacheTests(TestCase):
+    """Test cases for the cached view-loan and view-loans responses."""
+
+    def setUp(self):
+        loan_id_allocator.reset()
+        cache.clear()
+        cache_stats.reset()
+        self.customer = Customer.objects.create(
+            first_name="Cara",
+            last_name="Mendes",
+            phone_number="7778889999",
+            age=33,
+            monthly_income=80000
+        )
+        self.loan = LoanAppllication.objects.create(
+            customer_id=self.customer,
+            loan_amount=90000,
+            tenure=12,
+            interest_rate=10,
+            emis_paid_on_time=2,
+            loan_approved=True
+        )
+        self.loan_url = reverse('view_loan_application', args=[self.loan.loan_id])
+        self.loans_url = reverse('view_all_loan_application', args=[self.customer.pk])
+
+    def test_second_read_is_served_from_cache(self):
+        first = self.client.get(self.loan_url).json()
+        self.client.get(self.loans_url)
+        with self.assertNumQueries(0):
+            second = self.client.get(self.loan_url).json()
+            listing = self.client.get(self.loans_url).json()
+
+        self.assertEqual(first, second)
+        self.assertEqual(listing[0]['loan_id'], self.loan.loan_id)
+        self.assertEqual(cache_stats.snapshot(), {
+            'view_loan': {'hits': 1, 'misses': 1},
+            'view_loans': {'hits': 1, 'misses': 1},
+        })
+
+    def test_loan_save_evicts_both_views(self):
+        self.client.get(self.loan_url)
+        self.client.get(self.loans_url)
+
+        self.loan.loan_amount = 45000
+        self.loan.save()
+
+        self.assertEqual(float(self.client.get(self.loan_url).json()['loan_amount']), 45000)
+        self.assertEqual(float(self.client.get(self.loans_url).json()[0]['loan_amount']), 45000)
+
+    def test_new_loan_evicts_customer_list(self):
+        self.client.get(self.loans_url)
+        LoanAppllication.objects.create(customer_id=self.customer, loan_amount=1000, tenure=6, interest_rate=10, loan_approved=True)
+        self.assertEqual(len(self.client.get(self.loans_url).json()), 2)
+
+    def test_views_are_evicted_again_on_commit(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.loan.loan_amount = 45000
+            self.loan.save()
+            # a read before the commit caches the rows it saw
+            self.client.get(self.loan_url)
+        self.assertEqual(cache_stats.snapshot()['view_loan'], {'hits': 0, 'misses': 1})
+        self.client.get(self.loan_url)
+        self.assertEqual(cache_stats.snapshot()['view_loan'], {'hits': 0, 'misses': 2})
+
+    def test_customer_save_evicts_loan_view(self):
+        self.client.get(self.loan_url)
+        self.customer.first_name = "Carla"
+        self.customer.save()
+        self.assertEqual(self.client.get(self.loan_url).json()['customer']['first_name'], "Carla")
+
+    def test_loan_delete_evicts_views(self):
+        self.client.get(self.loan_url)
+        self.client.get(self.loans_url)
+        self.loan.delete()
+        self.assertEqual(self.client.get(self.loan_url).status_code, status.HTTP_404_NOT_FOUND)
+        self.assertEqual(self.client.get(self.loans_url).status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_not_found_is_not_cached(self):
+        url = reverse('view_all_loan_application', args=[self.customer.pk + 1])
+        self.assertEqual(self.client.get(url).status_code, status.HTTP_404_NOT_FOUND)
+        self.assertEqual(cache_stats.snapshot()['view_loans'], {'hits': 0, 'misses': 1})
+        self.client.get(url)
+        self.assertEqual(cache_stats.snapshot()['view_loans'], {'hits': 0, 'misses': 2})
+
+    def test_bulk_writes_evict_views(self):
+        self.client.get(self.loans_url)
+        loans = [LoanAppllication(loan_id=9000, customer_id=self.customer, loan_amount=500, tenure=6, interest_rate=10, loan_approved=True)]
+        LoanAppllication.objects.bulk_create(loans)
+        evict_cached_views(LoanAppllication, loans)
+        self.assertEqual(len(self.client.get(self.loans_url).json()), 2)
+
+
+class EligibilityCacheTests(TestCase):
+    """Test cases for the versioned cache of /check-eligibility/ decisions."""
+
+    def setUp(self):
+        loan_id_allocator.reset()
+        cache.clear()
+        cache_stats.reset()
+        self.customer = Customer.objects.create(
+            first_name="Lena",
+            last_name="Fischer",
+            phone_number="6667778888",
+            age=36,
+            monthly_income=90000,
+            approved_limit=3240000
+        )
+        self.loan_request = {"customer_id": self.customer.pk, "loan_amount": 60000, "interest_rate": 10, "tenure": 12}
+
+    def quote(self, **changes):
+        return self.client.post(reverse('check_eligibility'), dict(self.loan_request, **changes), content_type='application/json')
+
+    def test_repeated_quote_is_served_from_cache(self):
+        first = self.quote().json()
+        with self.assertNumQueries(0):
+            second = self.quote().json()
+        self.assertEqual(first, second)
+        self.assertEqual(cache_stats.snapshot()['check_eligibility'], {'hits': 1, 'misses': 1})
+
+    def test_other_terms_are_cached_apart(self):
+        self.quote()
+        self.assertNotEqual(self.quote(tenure=24).json()['monthly_installment'], self.quote().json()['monthly_installment'])
+        self.assertEqual(cache_stats.snapshot()['check_eligibility'], {'hits': 1, 'misses': 2})
+
+    def test_new_loan_bumps_the_version(self):
+        self.assertTrue(self.quote().json()['approval'])
+        # a loan with no installment paid yet brings the score down to 0
+        LoanAppllication.objects.create(customer_id=self.customer, loan_amount=60000, tenure=12, interest_rate=10, emis_paid_on_time=0, loan_approved=True)
+        self.assertFalse(self.quote().json()['approval'])
+
+    def test_bulk_loan_writes_bump_the_version(self):
+        self.assertTrue(self.quote().json()['approval'])
+        loans = [LoanAppllication(loan_id=9100, customer_id=self.customer, loan_amount=60000, tenure=12, interest_rate=10, emis_paid_on_time=0, loan_approved=True)]
+        LoanAppllication.objects.bulk_create(loans)
+        # as the ingestion does after a bulk load
+        refresh_summaries([self.customer.pk])
+        evict_cached_views(LoanAppllication, loans)
+        self.assertFalse(self.quote().json()['approval'])
+
+    def test_customer_change_bumps_the_version(self):
+        self.quote()
+        self.customer.approved_limit = 50000
+        self.customer.save()
+        self.assertFalse(self.quote().json()['approval'])
+
+    def test_other_customers_keep_their_quotes(self):
+        other = Customer.objects.create(first_name="Ada", last_name="Moss", phone_number="6667770000", age=50, monthly_income=50000, approved_limit=1800000)
+        self.quote(customer_id=other.pk)
+        self.customer.save()
+        with self.assertNumQueries(0):
+            self.quote(customer_id=other.pk)
+
+    def test_quotes_expire_at_midnight(self):
+        self.quote()
+        tomorrow = dt.date.today() + dt.timedelta(days=1)
+        with mock.patch('loan_credit.response_cache.dt.date') as date:
+            date.today.return_value = tomorrow
+            self.quote()
+        self.assertEqual(cache_stats.snapshot()['check_eligibility'], {'hits': 0, 'misses': 2})
+
+    def test_entries_never_outlive_the_day(self):
+        with mock.patch.object(cache, 'set', wraps=cache.set) as cache_set:
+            self.quote()
+        timeout = cache_set.call_args.args[2]
+        now = dt.datetime.now()
+        self.assertLessEqual(timeout, (dt.datetime.combine(now.date() + dt.timedelta(days=1), dt.time()) - now).total_seconds() + 1)
+
+    def test_errors_are_not_cached(self):
+        self.quote(customer_id=self.customer.pk + 100)
+        Customer.objects.create(pk=self.customer.pk + 100, first_name="Late", last_name="Comer", phone_number="6667771111", age=30, monthly_income=50000, approved_limit=1800000)
+        self.assertEqual(self.quote(customer_id=self.customer.pk + 100).status_code, status.HTTP_200_OK)
+
+
+@unittest.skipUnless(REDIS_CACHE_URL, "set REDIS_CACHE_URL to run the cache tests against Redis")
+@override_settings(CACHES={
+    'default': {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': REDIS_CACHE_URL,
+        'KEY_PREFIX': 'loan_credit_tests',
+    }
+})
+class RedisLoanViewCacheTests(LoanViewCacheTests):
+    """The same cases against a real Redis."""
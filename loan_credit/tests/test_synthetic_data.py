@@ -0,0 +1,90 @@
+from io import StringIO
+
+from django.core.management import call_command
+from django.test import SimpleTestCase, TestCase
+from django.urls import reverse
+
+from loan_credit.benchmarks import API_REQUESTS, api_endpoint_names, compare_to_baseline
+from loan_credit.models import Customer, CustomerCreditSummary, LoanAppllication
+from loan_credit.sequences import loan_id_allocator
+from loan_credit.utils import LoanEligibilityChecker
+
+
+class SyntheticDataTests(TestCase):
+    """Test cases for the generate_synthetic_data command."""
+
+    def setUp(self):
+        loan_id_allocator.reset()
+
+    def generate(self, customers=60, loans=300):
+        call_command('generate_synthetic_data', '--customers', str(customers), '--loans', str(loans), '--chunk-size', '64', '--no-copy', stdout=StringIO())
+
+    def test_generates_the_requested_rows(self):
+        self.generate()
+        self.assertEqual(Customer.objects.count(), 60)
+        self.assertEqual(LoanAppllication.objects.count(), 300)
+        self.assertEqual(CustomerCreditSummary.objects.count(), 60)
+
+    def test_rows_are_consistent(self):
+        self.generate()
+        for customer in Customer.objects.all():
+            self.assertEqual(customer.approved_limit, 36 * customer.monthly_income)
+            self.assertTrue(21 <= customer.age <= 70)
+
+        for loan in LoanAppllication.objects.all():
+            checker = LoanEligibilityChecker({'loan_amount': loan.loan_amount, 'tenure': loan.tenure})
+            self.assertAlmostEqual(loan.monthly_installment, checker.calculate_monthly_installment(loan.interest_rate), places=2)
+            if loan.loan_approved:
+                self.assertEqual((loan.end_date - loan.date_of_approval).days, 30 * loan.tenure)
+                self.assertLessEqual(loan.emis_paid_on_time, loan.tenure)
+            else:
+                self.assertIsNone(loan.date_of_approval)
+
+    def test_taken_phone_numbers_are_skipped(self):
+        # the generated customer 2 would get this phone number
+        Customer.objects.create(customer_id=1, first_name="Ana", last_name="Lima", age=40, phone_number="6000000002", monthly_income=1, approved_limit=36)
+        stdout = StringIO()
+        call_command('generate_synthetic_data', '--customers', '5', '--loans', '0', '--no-copy', stdout=stdout)
+
+        self.assertEqual(Customer.objects.count(), 5)
+        self.assertFalse(Customer.objects.filter(pk=2).exists())
+        self.assertIn("customers: 4 rows , 1 left out for a taken phone number", stdout.getvalue())
+
+    def test_later_runs_append_and_registration_still_works(self):
+        self.generate(customers=10, loans=20)
+        self.generate(customers=10, loans=20)
+        self.assertEqual(Customer.objects.count(), 20)
+        self.assertEqual(LoanAppllication.objects.count(), 40)
+
+        data = {"first_name": "Ivy", "last_name": "Park", "age": 29, "monthly_income": 40000, "phone_number": "1112223333"}
+        response = self.client.post(reverse('register'), data, content_type='application/json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.json()['customer_id'], 21)
+
+
+class BenchmarkApiTests(SimpleTestCase):
+    """Test cases for the request builders and the baseline comparison of benchmark_api."""
+
+    def test_every_endpoint_has_a_request_builder(self):
+        self.assertEqual(set(api_endpoint_names()), set(API_REQUESTS))
+
+    def test_regressions_beyond_the_threshold(self):
+        baseline = {
+            'view_loan_application': {'requests_per_second': 1000, 'p50_ms': 2.0, 'p95_ms': 5.0, 'p99_ms': 9.0, 'queries_per_request': 1, 'errors': 0},
+            'register': {'requests_per_second': 500, 'p50_ms': 4.0, 'p95_ms': 8.0, 'p99_ms': 12.0, 'queries_per_request': 1, 'errors': 0},
+        }
+        results = {
+            # within 20%
+            'view_loan_application': {'requests_per_second': 850, 'p50_ms': 2.3, 'p95_ms': 5.9, 'p99_ms': 10.0, 'queries_per_request': 1, 'errors': 0},
+            # slower , one more query and failing requests
+            'register': {'requests_per_second': 300, 'p50_ms': 4.0, 'p95_ms': 8.0, 'p99_ms': 12.0, 'queries_per_request': 2, 'errors': 3},
+            # not in the baseline yet
+            'db_pool_stats': {'requests_per_second': 10, 'p50_ms': 100.0, 'p95_ms': 100.0, 'p99_ms': 100.0, 'queries_per_request': 0, 'errors': 0},
+        }
+
+        self.assertEqual(compare_to_baseline(results, baseline, 0.2), [
+            "register requests_per_second: 500 -> 300",
+            "register queries_per_request: 1 -> 2",
+            "register errors: 0 -> 3",
+        ])
+        self.assertEqual(compare_to_baseline(results, baseline, 1.0), ["register errors: 0 -> 3"])
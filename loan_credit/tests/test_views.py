@@ -0,0 +1,118 @@
+from django.core.cache import cache
+from django.test import TestCase
+from django.urls import reverse
+from rest_framework import status
+
+from loan_credit.models import Customer, CustomerCreditSummary, LoanAppllication
+from loan_credit.sequences import loan_id_allocator
+from loan_credit.serializers import CUSTOMER_NOT_FOUND_MESSAGE
+from loan_credit.summaries import get_customer_summary
+
+
+class ViewQueryBudgetTests(TestCase):
+    """Query budgets of every endpoint , a new round trip on a hot path fails here first."""
+
+    def setUp(self):
+        # ids held in memory belong to the rolled back state of the previous test
+        loan_id_allocator.reset()
+        cache.clear()
+        self.customer = Customer.objects.create(
+            first_name="Nora",
+            last_name="Quinn",
+            phone_number="4445556666",
+            age=38,
+            monthly_income=100000,
+            approved_limit=3600000
+        )
+        self.loan = LoanAppllication.objects.create(
+            customer_id=self.customer,
+            loan_amount=200000,
+            tenure=24,
+            interest_rate=10,
+            monthly_installment=9229,
+            emis_paid_on_time=10,
+            loan_approved=True
+        )
+        # build the credit summary , the warm state of a returning customer
+        get_customer_summary(self.customer.pk)
+        self.loan_request = {"customer_id": self.customer.pk, "loan_amount": 50000, "interest_rate": 10, "tenure": 12}
+
+    def post(self, name, data):
+        return self.client.post(reverse(name), data, content_type='application/json')
+
+    def test_register_budget(self):
+        data = {"first_name": "Ivy", "last_name": "Park", "age": 29, "monthly_income": 40000, "phone_number": "1112223333"}
+        # the insert , in a savepoint that a taken phone number rolls back
+        with self.assertNumQueries(3):
+            response = self.post('register', data)
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+
+    def test_check_eligibility_budget(self):
+        # customer and credit summary in one query
+        with self.assertNumQueries(1):
+            response = self.post('check_eligibility', self.loan_request)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_check_eligibility_rebuilds_missing_summary_once(self):
+        CustomerCreditSummary.objects.all().delete()
+        # read , savepoint , lock , aggregate , archived loan totals , upsert , release
+        with self.assertNumQueries(7):
+            self.post('check_eligibility', self.loan_request)
+        # another quote , the same one would be served from the decision cache
+        with self.assertNumQueries(1):
+            self.post('check_eligibility', dict(self.loan_request, loan_amount=60000))
+
+    def test_create_loan_budget(self):
+        # read , savepoint , insert , summary delta , release
+        with self.assertNumQueries(5):
+            response = self.post('create_loan_application', self.loan_request)
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertTrue(response.json()['loan_approved'])
+
+        loan = LoanAppllication.objects.get(pk=response.json()['loan_id'])
+        self.assertEqual(loan.customer_id_id, self.customer.pk)
+        self.assertEqual(loan.loan_amount, 50000)
+        self.assertEqual(loan.monthly_installment, response.json()['monthly_installment'])
+        self.assertIsNotNone(loan.end_date)
+
+    def test_create_loan_for_unknown_customer(self):
+        with self.assertNumQueries(1):
+            response = self.post('create_loan_application', dict(self.loan_request, customer_id=self.customer.pk + 1))
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.json(), {"customer_id": [CUSTOMER_NOT_FOUND_MESSAGE]})
+        self.assertEqual(LoanAppllication.objects.count(), 1)
+
+    def test_invalid_request_does_not_touch_the_summary(self):
+        CustomerCreditSummary.objects.all().delete()
+        # the terms are validated without the database , the missing summary is not rebuilt for a rejected request
+        with self.assertNumQueries(0):
+            response = self.post('create_loan_application', dict(self.loan_request, tenure=0))
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertFalse(CustomerCreditSummary.objects.exists())
+
+    def test_eligibility_batch_budget(self):
+        with self.assertNumQueries(1):
+            response = self.post('check_eligibility_batch', [self.loan_request] * 3)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_view_loan_budget(self):
+        url = reverse('view_loan_application', args=[self.loan.loan_id])
+        # loan and customer in one query , then served from the cache
+        with self.assertNumQueries(1):
+            self.assertEqual(self.client.get(url).status_code, status.HTTP_200_OK)
+        with self.assertNumQueries(0):
+            self.client.get(url)
+
+    def test_view_loans_budget(self):
+        url = reverse('view_all_loan_application', args=[self.customer.pk])
+        for query in ('', '?limit=10', '?stream=1'):
+            with self.assertNumQueries(1):
+                response = self.client.get(url + query)
+                if response.streaming:
+                    b''.join(response.streaming_content)
+            self.assertEqual(response.status_code, status.HTTP_200_OK, query)
+
+    def test_loan_schedule_budget(self):
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse('view_loan_schedule', args=[self.loan.loan_id]))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
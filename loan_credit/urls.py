@@ -1,13 +1,27 @@
 
 from django.contrib import admin
 from django.urls import path 
-from loan_credit import views
+from django.views.decorators.csrf import csrf_exempt
+from loan_credit import async_views, views
 
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('register/' , views.CustomerRegistration.as_view() , name="register"),
+    path('register/bulk/' , views.CustomerBulkRegistration.as_view() , name="register_bulk"),
     path('check-eligibility/' , views.CheckLoanEligibility.as_view() , name="check_eligibility"),
+    path('check-eligibility/batch/' , views.CheckLoanEligibilityBatch.as_view() , name="check_eligibility_batch"),
     path('create-loan/' , views.CreateLoanApplications.as_view() , name="create_loan_application"),
+    path('loan-decisions/<uuid:decision_id>/' , views.ViewLoanDecision.as_view() , name="loan_decision"),
+    path('emi-payments/' , views.EmiPayments.as_view() , name="emi_payments"),
     path('view-loan/<int:loan_id>/' , views.ViewLoanApplications.as_view() , name="view_loan_application"),  
     path('view-loans/<int:customer_id>/' , views.ViewAllLoanApplications.as_view() , name="view_all_loan_application"), 
+    path('loan-schedule/<int:loan_id>/' , views.ViewLoanSchedule.as_view() , name="view_loan_schedule"),
+    path('export/<str:table>/' , views.ExportTable.as_view() , name="export_table"),
+    path('db-pool-stats/' , views.DatabasePoolStats.as_view() , name="db_pool_stats"),
+
+    # async versions for ASGI servers , same request and response bodies
+    path('async/check-eligibility/' , csrf_exempt(async_views.AsyncCheckLoanEligibility.as_view()) , name="async_check_eligibility"),
+    path('async/create-loan/' , csrf_exempt(async_views.AsyncCreateLoanApplications.as_view()) , name="async_create_loan_application"),
+    path('async/view-loan/<int:loan_id>/' , async_views.AsyncViewLoanApplications.as_view() , name="async_view_loan_application"),
+    path('async/view-loans/<int:customer_id>/' , async_views.AsyncViewAllLoanApplications.as_view() , name="async_view_all_loan_application"),
 ]
@@ -1,15 +1,17 @@
-from .models import Customer , LoanAppllication
 from rest_framework.response import Response
-from django.db.models import Count, Sum, Q, F, IntegerField, FloatField, Value
-from django.db.models.functions import Cast, Coalesce
+import numpy as np
 import datetime as dt
 from rest_framework import status
 from datetime import datetime
-from .models import Customer
+from .metrics import span
+from .models import LoanAppllication
+from .summaries import aget_customer_summary, get_customer_summaries, get_customer_summary
 
 class LoanEligibilityChecker :
-    def __init__(self , customer_data : dict) :
+    def __init__(self , customer_data : dict , customer_summary=None) :
         self.customer_data = customer_data
+        # summary already loaded by the view (load_customer_summary) , saves reading it again
+        self.customer_summary = customer_summary
         self.customer_id = customer_data.get('customer_id')
         self.loan_amount = customer_data.get('loan_amount') 
         self.tenure = customer_data.get('tenure')
@@ -31,63 +33,33 @@ class LoanEligibilityChecker :
         Returns:
             dict: A dictionary containing the eligibility status and other relevant details.
         """
-        filter_approved = Q(loanappllication__loan_approved=True)
-        customer_metrics = Customer.objects.filter(pk=self.customer_id).annotate(
-        # No of loans taken in past
-        num_loans_taken=Count('loanappllication', filter=filter_approved),
-
-        # current total loan amount
-        current_loan_sum=Coalesce(
-                Sum(
-                    'loanappllication__loan_amount',
-                    # Filter for loans that are currently active
-                    filter=(Q(loanappllication__end_date__gte=self.today) | Q(loanappllication__end_date__isnull=True)) & filter_approved
-                ),
-                Value(0, output_field=FloatField()) 
-            ),
-        # total emis currently paying 
-
-        total_current_emis=Coalesce(
-            Sum(
-                'loanappllication__monthly_installment',
-                # This filter is crucial: it ensures we only sum EMIs for active loans
-                filter=(Q(loanappllication__end_date__gte=self.today) | Q(loanappllication__end_date__isnull=True)) & filter_approved
-            ),
-            Value(0, output_field=FloatField())  # Default to 0 if there are no active loans
-        ),
-
-        # Loan activity in current year
-        loan_activity_current_year=Count(
-            'loanappllication',
-            filter=Q(loanappllication__date_of_approval__year=self.current_year) & filter_approved
-        ),
-
-        # How much Loan is approved 
-        loan_approved_volume=Sum('loanappllication__loan_amount', filter=filter_approved),
-
-        # Count number of  loans fully paid on time
-        num_loans_fully_paid=Count(
-            'loanappllication',
-            filter=Q(loanappllication__emis_paid_on_time__gte=F('loanappllication__tenure')) & filter_approved
-        ),
-
-        # Total EMIs paid on time across all loans
-        total_emis_paid=Sum(Cast('loanappllication__emis_paid_on_time', output_field=IntegerField()), filter=filter_approved),
-
-        # Total tenure in months across all loans
-        total_tenure_months=Sum(Cast('loanappllication__tenure', output_field=IntegerField()), filter=filter_approved),
-    )
-
-        result = customer_metrics.first()
+        # one indexed row holding the pre-aggregated loan history of the customer
+        result = self.customer_summary if self.customer_summary is not None else get_customer_summary(self.customer_id, self.today)
 
         if not result :
             return Response({"error": "Customer not found or No Loan Data Available For This Customer"}, status=status.HTTP_404_NOT_FOUND)
-        
+
+        eligibility_data, interest_rate = self.evaluate(result)
+
+        # calculate monthly installment
+        with span('monthly_installment') :
+            installment_amount = self.calculate_monthly_installment(interest_rate)
+
+        # create a valid respose data upon eligibility check , credit score and installment calculation
+        return self.create_response_data(eligibility_data , installment_amount)
+
+    def evaluate(self , customer_data) -> tuple:
+        """
+        Scores the customer and decides the loan without computing the installment.
+
+        Returns:
+            tuple: The eligibility data and the interest rate the installment should be computed at.
+        """
         # calculate credit score
-        credit_score = self.calculate_credit_score(result)
-        print(credit_score)
+        with span('credit_score') :
+            credit_score = self.calculate_credit_score(customer_data)
         # check eligibility upon credit score calculation
-        eligibility_data =  self.create_eligibiliy_data(credit_score , result)
+        eligibility_data =  self.create_eligibiliy_data(credit_score , customer_data)
 
         # determine final interest rate based on eligibility
         if eligibility_data["approved"] :
@@ -95,11 +67,7 @@ class LoanEligibilityChecker :
         else :
             interest_rate = self.current_interest_rate
 
-        # calculate monthly installment
-        installment_amount = self.calculate_monthly_installment(interest_rate)
-
-        # create a valid respose data upon eligibility check , credit score and installment calculation
-        return self.create_response_data(eligibility_data , installment_amount)
+        return eligibility_data, interest_rate
 
     def calculate_credit_score(self , customer_data) -> int:
         """
@@ -127,20 +95,14 @@ class LoanEligibilityChecker :
         fully_paid_loans = customer_data.num_loans_fully_paid or 0
         total_emis_paid = customer_data.total_emis_paid or 0
         total_emis_due = customer_data.total_tenure_months   or 0
-       
-
-        print(total_loans, fully_paid_loans, total_emis_due, total_emis_paid)
 
         #  Payment Performance Score (70 points)
         payment_ratio = (total_emis_paid / total_emis_due) if total_emis_due > 0 else 1
         payment_performance_score = payment_ratio * 70
-        print(payment_performance_score)
         #  Loan Completion Score (30 points)
         completion_ratio = fully_paid_loans / total_loans
         loan_completion_score = completion_ratio * 30
 
-        print(loan_completion_score)
-
         #  Final Score
         final_score = payment_performance_score + loan_completion_score
         return int(max(0, min(100, final_score)))
@@ -238,3 +200,121 @@ class LoanEligibilityChecker :
         return response_data
 
 
+def build_loan_application(validated_data : dict , customer , response_data : dict , **fields) :
+    """
+    Unsaved loan application for an eligibility decision. The application is kept even when it is not approved.
+    Extra `fields` (e.g. a reserved loan_id) are passed on to the model.
+    """
+    loan_application = LoanAppllication(
+        **fields,
+        customer_id = customer,
+        loan_amount = validated_data["loan_amount"],
+        tenure = validated_data["tenure"],
+        interest_rate = response_data["interest_rate"] if not response_data["corrected_interest_rate"] else response_data["corrected_interest_rate"],
+        monthly_installment = response_data["monthly_installment"],
+        loan_approved = response_data["approval"],
+        message = response_data.get("message", None),
+    )
+    if response_data["approval"] :
+        loan_application.date_of_approval = datetime.now().date()
+        loan_application.end_date = datetime.now().date() + dt.timedelta(days=30*validated_data["tenure"])
+    return loan_application
+
+
+class AsyncLoanEligibilityChecker(LoanEligibilityChecker) :
+    """
+    LoanEligibilityChecker for async views , only the summary read awaits the database.
+    """
+
+    async def check_loan_eligibility(self) -> dict:
+        # one indexed row holding the pre-aggregated loan history of the customer
+        result = self.customer_summary if self.customer_summary is not None else await aget_customer_summary(self.customer_id, self.today)
+
+        if not result :
+            return None
+
+        eligibility_data, interest_rate = self.evaluate(result)
+
+        # calculate monthly installment
+        with span('monthly_installment') :
+            installment_amount = self.calculate_monthly_installment(interest_rate)
+
+        # create a valid respose data upon eligibility check , credit score and installment calculation
+        return self.create_response_data(eligibility_data , installment_amount)
+
+
+def calculate_monthly_installments(loan_amounts, annual_interest_rates, tenures) -> np.ndarray:
+    """
+    Vectorized form of LoanEligibilityChecker.calculate_monthly_installment for many loans at once.
+
+    Args:
+        loan_amounts (array-like): Principal of each loan.
+        annual_interest_rates (array-like): Annual interest rate of each loan as a percentage.
+        tenures (array-like): Tenure of each loan in months.
+
+    Returns:
+        np.ndarray: The unrounded installment of each loan , same operation order as the scalar formula.
+
+    Raises:
+        ValueError: If any tenure is zero or negative or any principal is negative.
+    """
+    principal = np.asarray(loan_amounts, dtype=np.float64)
+    annual_rate = np.asarray(annual_interest_rates, dtype=np.float64)
+    tenure = np.asarray(tenures, dtype=np.float64)
+
+    if np.any(tenure <= 0):
+        raise ValueError("Loan tenure must be a positive number of months.")
+    if np.any(principal < 0):
+        raise ValueError("Principal amount cannot be negative.")
+
+    monthly_rate = annual_rate / (12 * 100)
+    growth = np.power(1 + monthly_rate, tenure)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        emi = principal * monthly_rate * growth / (growth - 1)
+
+    # a zero interest rate is a plain split of the principal
+    return np.where(annual_rate == 0, principal / tenure, emi)
+
+
+def check_loan_eligibility_batch(requests : list , today=None , summaries=None) -> list:
+    """
+    Checks many validated eligibility requests at once. The customer metrics of the whole batch are
+    read with one grouped query (unless the caller passes the `summaries` it already read) and the
+    installments are computed as one array operation.
+
+    Returns:
+        list: One response dict per request in input order , or None where the customer does not exist.
+    """
+    today = today or dt.date.today()
+    if summaries is None:
+        summaries = get_customer_summaries({data['customer_id'] for data in requests}, today)
+
+    decided = []
+    for data in requests:
+        summary = summaries.get(data['customer_id'])
+        if summary is None:
+            decided.append(None)
+            continue
+        checker = LoanEligibilityChecker(data)
+        checker.today = today
+        eligibility_data, interest_rate = checker.evaluate(summary)
+        decided.append((checker, eligibility_data, interest_rate))
+
+    found = [item for item in decided if item is not None]
+    with span('monthly_installment_batch'):
+        installments = calculate_monthly_installments(
+            [checker.loan_amount for checker, _, _ in found],
+            [interest_rate for _, _, interest_rate in found],
+            [checker.tenure for checker, _, _ in found],
+        )
+
+    results = []
+    installment_iter = iter(installments.tolist())
+    for item in decided:
+        if item is None:
+            results.append(None)
+            continue
+        checker, eligibility_data, _ = item
+        # rounded like the scalar formula so both endpoints quote the same installment
+        results.append(checker.create_response_data(eligibility_data, round(next(installment_iter), 2)))
+    return results
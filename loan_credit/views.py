@@ -1,88 +1,278 @@
-from datetime import datetime, timedelta
 from decimal import Decimal
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.http import StreamingHttpResponse
+from django.urls import reverse
+from itertools import chain
+from rest_framework.exceptions import ValidationError
 from rest_framework.response import Response
 from rest_framework.views import APIView
 from rest_framework import status
 from types import SimpleNamespace
-from rest_framework.permissions import AllowAny
-from loan_credit.models import LoanAppllication
-from loan_credit.serializers import CustomerDetailsSerializer, LoanCreationRequestSerializer, LoanCreationResponseSerailizer, LoanEligibilityRequestSerializer, LoanEligibilityResponseSerializer, RegistrationSerializer, ViewAllLoanApplicationsResponse, ViewLoanApplicationResponse
-from loan_credit.utils import LoanEligibilityChecker
+from rest_framework.permissions import AllowAny, IsAdminUser
+from loan_credit.amortization import get_loan_schedule
+from loan_credit.db_pool import connection_stats
+from loan_credit.decisions import decision_response, prefers_async, schedule_loan_decisions
+from loan_credit.export import CONTENT_TYPES, EXPORT_COLUMNS, export_chunks
+from loan_credit.fast_serializers import loan_detail_rows, loan_list_rows, render_loan_detail, render_loan_list
+from loan_credit.idempotency import idempotent, record_idempotent_response
+from loan_credit.models import ArchivedLoan, Customer, LoanAppllication, LoanDecision
+from loan_credit.pagination import LoanCursorPagination, iter_batches, stream_json_array
+from loan_credit.payments import PaymentProcessorSignature, apply_emi_payments, validate_payment_events
+from loan_credit.response_cache import cached_eligibility, cached_view, customer_loans_view_key, invalidate_loan_views, loan_view_key
+from loan_credit.serializers import CUSTOMER_NOT_FOUND_MESSAGE, PHONE_NUMBER_REPEATED_MESSAGE, PHONE_NUMBER_TAKEN_MESSAGE, CustomerDetailsSerializer, ExportRequestSerializer, LoanCreationResponseSerailizer, LoanEligibilityResponseSerializer, LoanScheduleResponse, LoanTermsSerializer, RegistrationSerializer
+from loan_credit.summaries import get_customer_summary
+from loan_credit.utils import LoanEligibilityChecker, build_loan_application, check_loan_eligibility_batch
+
+def load_customer_summary(customer_id) :
+    # customer and credit summary in one read , after validation since a missing or stale summary is rebuilt here
+    customer_summary = get_customer_summary(customer_id)
+    if customer_summary is None :
+        raise ValidationError({"customer_id" : [CUSTOMER_NOT_FOUND_MESSAGE]})
+    return customer_summary
+
 
 class CustomerRegistration(APIView) :
     permission_classes = [AllowAny ,]
     def post(self , request , *args, **kwargs) :
-        data = request.data
-
-        # Set approved_limit to 36 times the monthly_salary
-        data["approved_limit"] = 36 * data["monthly_income"]
-
         # serialize to save the data
-        serializer = RegistrationSerializer(data=data)
+        serializer = RegistrationSerializer(data=request.data)
         serializer.is_valid(raise_exception=True) 
-        saved_data = serializer.save()
+
+        # Set approved_limit to 36 times the monthly_salary , from the validated income so request.data stays untouched
+        try :
+            with transaction.atomic() :
+                saved_data = serializer.save(approved_limit=36 * serializer.validated_data["monthly_income"])
+        except IntegrityError :
+            # the unique constraint on phone_number , the only one a new customer can break
+            raise ValidationError({"phone_number" : [PHONE_NUMBER_TAKEN_MESSAGE]})
 
         # serialize the saved data to return as response
         response_data = CustomerDetailsSerializer(saved_data)
         return Response(response_data.data, status=status.HTTP_201_CREATED)
     
+class CustomerBulkRegistration(APIView) :
+    permission_classes = [AllowAny ,]
+    def post(self , request , *args, **kwargs) :
+        items = request.data
+        if not isinstance(items, list) :
+            return Response({"error" : "Expected a list of customers"} , status=status.HTTP_400_BAD_REQUEST)
+
+        max_items = settings.REGISTRATION_BULK_MAX_ITEMS
+        if len(items) > max_items :
+            return Response({"error" : f"A batch can hold at most {max_items} customers"} , status=status.HTTP_400_BAD_REQUEST)
+
+        # validate every item on its own , one bad item must not fail the batch
+        validator = RegistrationSerializer()
+        results = [None] * len(items)
+        valid_indexes = []
+        valid_customers = []
+        for index, item in enumerate(items) :
+            try :
+                valid_customers.append(validator.run_validation(item))
+                valid_indexes.append(index)
+            except ValidationError as exc :
+                results[index] = {"index" : index, "status" : "error", "errors" : exc.detail}
+
+        # duplicate phone numbers , against the stored customers with one IN query and within the batch
+        taken = set(Customer.objects.filter(phone_number__in={data["phone_number"] for data in valid_customers}).values_list('phone_number', flat=True))
+        seen = set()
+        new_indexes = []
+        customers = []
+        for index, data in zip(valid_indexes, valid_customers) :
+            phone_number = data["phone_number"]
+            if phone_number in taken or phone_number in seen :
+                message = PHONE_NUMBER_TAKEN_MESSAGE if phone_number in taken else PHONE_NUMBER_REPEATED_MESSAGE
+                results[index] = {"index" : index, "status" : "error", "errors" : {"phone_number" : [message]}}
+                continue
+            seen.add(phone_number)
+            new_indexes.append(index)
+            # Set approved_limit to 36 times the monthly_salary
+            customers.append(Customer(**dict(data, approved_limit=36 * data["monthly_income"])))
+
+        inserted = self.insert(customers) if customers else []
+        if inserted :
+            # bulk_create skips the model signals , evict what a cached view may hold for the new ids
+            invalidate_loan_views(customer_ids=[customer.pk for customer in inserted])
+
+        response_serializer = CustomerDetailsSerializer()
+        for index, customer in zip(new_indexes, customers) :
+            if customer.pk is None :
+                results[index] = {"index" : index, "status" : "error", "errors" : {"phone_number" : [PHONE_NUMBER_TAKEN_MESSAGE]}}
+                continue
+            results[index] = {"index" : index, "status" : "ok", "result" : response_serializer.to_representation(customer)}
+
+        return Response(results, status=status.HTTP_200_OK)
+
+    @staticmethod
+    def insert(customers) -> list :
+        """
+        Inserts the customers in one statement. When a phone number was registered after the duplicate check ,
+        they are inserted one by one and only the customers that hit the unique constraint are left out ,
+        with no primary key.
+        """
+        try :
+            with transaction.atomic() :
+                return Customer.objects.bulk_create(customers)
+        except IntegrityError :
+            pass
+        inserted = []
+        for customer in customers :
+            customer.pk = None
+            try :
+                with transaction.atomic() :
+                    customer.save(force_insert=True)
+            except IntegrityError :
+                customer.pk = None
+                continue
+            inserted.append(customer)
+        return inserted
+
+
 class CheckLoanEligibility(APIView) :
     permission_classes = [AllowAny ,]
     def post(self , request , *args, **kwargs) :
+        # validate the loan terms , a repeated quote is answered from the cache without reading the customer
+        terms_serializer = LoanTermsSerializer(data=request.data)
+        terms_serializer.is_valid(raise_exception=True)
+        response_data = cached_eligibility(terms_serializer.validated_data, lambda : self.check(request.data))
+
+        # return response
+        return Response(response_data, status=status.HTTP_200_OK)
+
+    @staticmethod
+    def check(data) -> dict :
         # validate incoming request data
-        request_serializer = LoanEligibilityRequestSerializer(data=request.data)
+        request_serializer = LoanTermsSerializer(data=data)
         request_serializer.is_valid(raise_exception=True)
         validated_data = request_serializer.validated_data
 
         # main buisness logic for checking loan eligibility
-        main_data = LoanEligibilityChecker(validated_data)
+        main_data = LoanEligibilityChecker(validated_data , load_customer_summary(validated_data["customer_id"]))
         response_data = main_data.check_loan_eligibility()
 
         # validate / serialize response data
         response_object = SimpleNamespace(**response_data)
         serializer = LoanEligibilityResponseSerializer(response_object)
-
-        # return response
-        return Response(serializer.data, status=status.HTTP_200_OK)
+        return dict(serializer.data)
     
 
+class CheckLoanEligibilityBatch(APIView) :
+    permission_classes = [AllowAny ,]
+    def post(self , request , *args, **kwargs) :
+        items = request.data
+        if not isinstance(items, list) :
+            return Response({"error" : "Expected a list of eligibility requests"} , status=status.HTTP_400_BAD_REQUEST)
+
+        max_items = settings.ELIGIBILITY_BATCH_MAX_ITEMS
+        if len(items) > max_items :
+            return Response({"error" : f"A batch can hold at most {max_items} requests"} , status=status.HTTP_400_BAD_REQUEST)
+
+        # validate every item on its own , one bad item must not fail the batch
+        validator = LoanTermsSerializer()
+        results = [None] * len(items)
+        valid_indexes = []
+        valid_requests = []
+        for index, item in enumerate(items) :
+            try :
+                valid_requests.append(validator.run_validation(item))
+                valid_indexes.append(index)
+            except ValidationError as exc :
+                results[index] = {"index" : index, "status" : "error", "errors" : exc.detail}
+
+        # main buisness logic for the whole batch , one grouped query and one array computation
+        responses = check_loan_eligibility_batch(valid_requests) if valid_requests else []
+
+        response_serializer = LoanEligibilityResponseSerializer()
+        for index, response in zip(valid_indexes, responses) :
+            if response is None :
+                results[index] = {"index" : index, "status" : "error", "errors" : {"customer_id" : [CUSTOMER_NOT_FOUND_MESSAGE]}}
+            else :
+                results[index] = {"index" : index, "status" : "ok", "result" : response_serializer.to_representation(SimpleNamespace(**response))}
+
+        return Response(results, status=status.HTTP_200_OK)
+
+
+class EmiPayments(APIView) :
+    # only the payment processor , batches are signed with EMI_PAYMENT_SIGNING_KEY
+    permission_classes = [PaymentProcessorSignature ,]
+    def post(self , request , *args, **kwargs) :
+        items = request.data
+        if not isinstance(items, list) :
+            return Response({"error" : "Expected a list of payment events"} , status=status.HTTP_400_BAD_REQUEST)
+
+        max_items = settings.EMI_PAYMENT_BATCH_MAX_ITEMS
+        if len(items) > max_items :
+            return Response({"error" : f"A batch can hold at most {max_items} payment events"} , status=status.HTTP_400_BAD_REQUEST)
+
+        # validate every event on its own , one bad event must not fail the batch
+        events, rejected = validate_payment_events(items)
+
+        # the whole batch in a few statements , repeated payment ids are dropped
+        stats = apply_emi_payments(events) if events else {}
+        return Response(dict(stats, rejected=rejected), status=status.HTTP_200_OK)
+
+
 class CreateLoanApplications(APIView) :
     permission_classes = [AllowAny ,]
+    # retries sent with the same Idempotency-Key get the first response back instead of a second loan
+    @idempotent("create_loan")
     def post(self, request , *args, **kwargs) :
+        # opt-in async decision , the application is queued and decided by a celery worker
+        if prefers_async(request) :
+            return self.queue_application(request)
+
         # validate incoming request data
-        request_serializer = LoanEligibilityRequestSerializer(data=request.data)
+        request_serializer = LoanTermsSerializer(data=request.data)
         request_serializer.is_valid(raise_exception=True)
         validated_data = request_serializer.validated_data
 
         # main buisness logic for checking loan eligibility
-        main_data = LoanEligibilityChecker(validated_data)
+        customer_summary = load_customer_summary(validated_data["customer_id"])
+        main_data = LoanEligibilityChecker(validated_data , customer_summary)
         response_data = main_data.check_loan_eligibility()
 
-        # save the application even though user is not eligble
-        data_to_save = request.data
-        data_to_save["loan_approved"] = response_data["approval"]
-        if response_data["approval"] :
-            data_to_save["date_of_approval"] = datetime.now().date()
-            data_to_save["end_date"] = datetime.now().date() + timedelta(days=30*validated_data["tenure"])
+        # save the application even though user is not eligble , on the customer row loaded with the summary
+        loan_application = build_loan_application(validated_data , customer_summary.customer , response_data)
 
-        data_to_save["interest_rate"] = response_data["interest_rate"] if not response_data["corrected_interest_rate"] else response_data["corrected_interest_rate"]
+        # the loan row , the customer's credit summary and the idempotency record are written together
+        with transaction.atomic():
+            loan_application.save(force_insert=True)
 
-        data_to_save["monthly_installment"] = response_data["monthly_installment"]
+            if not response_data["approval"]:
+                loan_application.loan_id = None
 
-        data_to_save["customer_id"] = validated_data["customer_id"]
+            response_data = LoanCreationResponseSerailizer(loan_application).data
+            record_idempotent_response(request , status.HTTP_201_CREATED , response_data)
 
-        data_to_save["message"] = response_data.get("message", None)
+        return Response(response_data, status=status.HTTP_201_CREATED)
 
-        serializer = LoanCreationRequestSerializer(data=data_to_save)
-        serializer.is_valid(raise_exception=True)
-        saved_data = serializer.save()
+    @staticmethod
+    def queue_application(request) :
+        # only the shape is checked here , the customer is looked up when the batch is decided
+        request_serializer = LoanTermsSerializer(data=request.data)
+        request_serializer.is_valid(raise_exception=True)
 
-        if not response_data["approval"]:
-            saved_data.loan_id = None
+        with transaction.atomic():
+            decision = LoanDecision.objects.create(**request_serializer.validated_data)
+            response_data = dict(decision_response(decision) , poll_url=reverse("loan_decision" , args=[decision.decision_id]))
+            record_idempotent_response(request , status.HTTP_202_ACCEPTED , response_data)
+        schedule_loan_decisions()
 
-        response_data = LoanCreationResponseSerailizer(saved_data)
+        return Response(response_data, status=status.HTTP_202_ACCEPTED, headers={"Location" : response_data["poll_url"]})
 
-        return Response(response_data.data, status=status.HTTP_201_CREATED)
+
+class ViewLoanDecision(APIView) :
+    permission_classes = [AllowAny ,]
+    def get(self, request , *args, **kwargs) :
+        decision = LoanDecision.objects.filter(decision_id = kwargs["decision_id"]).first()
+        if not decision :
+            return Response({"error" : "No Loan Decision Found with this ID"} , status=status.HTTP_404_NOT_FOUND)
+
+        # still queued , poll again
+        if decision.status == LoanDecision.PENDING :
+            return Response(decision_response(decision), status=status.HTTP_202_ACCEPTED, headers={"Retry-After" : "1"})
+        return Response(decision_response(decision), status=status.HTTP_200_OK)
     
 
 class ViewLoanApplications(APIView) :
@@ -92,12 +282,23 @@ class ViewLoanApplications(APIView) :
         if not loan_id :
             return Response({"error" : "loan_id is required"} , status=status.HTTP_400_BAD_REQUEST)
         
-        loan_application = LoanAppllication.objects.filter(loan_id = loan_id , loan_approved = True).first()
-        if not loan_application :
+        # serialized response , cached per loan_id until the loan or its customer changes
+        response_data = cached_view("view_loan" , loan_view_key(loan_id) , lambda : self.serialize_loan(loan_id))
+        if response_data is None :
             return Response({"error" : "No Loan Application Found with this ID"} , status=status.HTTP_404_NOT_FOUND)
-        
-        response_data = ViewLoanApplicationResponse(loan_application)
-        return Response(response_data.data, status=status.HTTP_200_OK)
+
+        return Response(response_data, status=status.HTTP_200_OK)
+
+    @staticmethod
+    def serialize_loan(loan_id) :
+        # only the response columns , the customer details come in the same query
+        loan_application = loan_detail_rows(LoanAppllication.objects.filter(loan_id = loan_id , loan_approved = True)).first()
+        # archived loans are only looked up when the live table has no such loan
+        if not loan_application :
+            loan_application = loan_detail_rows(ArchivedLoan.objects.filter(loan_id = loan_id)).first()
+        if not loan_application :
+            return None
+        return render_loan_detail(loan_application)
     
 
 class ViewAllLoanApplications(APIView) :
@@ -107,10 +308,111 @@ class ViewAllLoanApplications(APIView) :
         if not customer_id :
             return Response({"error" : "customer_id is required"} , status=status.HTTP_400_BAD_REQUEST)
         
-        loan_applications = LoanAppllication.objects.filter(customer_id = customer_id , loan_approved = True).all()
-        if not loan_applications.exists() :
+        loan_applications = loan_list_rows(LoanAppllication.objects.filter(customer_id = customer_id , loan_approved = True))
+
+        # archived loans are left out unless asked for
+        include_archived = request.query_params.get("include_archived") in ("1" , "true")
+        if include_archived :
+            if "limit" in request.query_params or "cursor" in request.query_params :
+                return Response({"error" : "include_archived can not be combined with limit / cursor"} , status=status.HTTP_400_BAD_REQUEST)
+            loan_applications = loan_applications.union(loan_list_rows(ArchivedLoan.objects.filter(customer_id = customer_id)) , all=True)
+
+        # opt-in streaming , rows are written out batch by batch from a server side cursor
+        if request.query_params.get("stream") in ("1" , "true") :
+            return self.stream_loans(loan_applications)
+
+        # keyset pages on loan_id when limit / cursor is given
+        if "limit" in request.query_params or "cursor" in request.query_params :
+            paginator = LoanCursorPagination()
+            page = paginator.paginate_queryset(loan_applications , request , view=self)
+            if not page and "cursor" not in request.query_params :
+                return Response({"error" : "No Loan Applications Found for this Customer ID"} , status=status.HTTP_404_NOT_FOUND)
+            return paginator.get_paginated_response(render_loan_list(page))
+
+        # serialized response , cached per customer_id until one of the customer's loans changes
+        response_data = cached_view("view_loans" , customer_loans_view_key(customer_id , include_archived) , lambda : self.serialize_loans(loan_applications))
+        if response_data is None :
+            return Response({"error" : "No Loan Applications Found for this Customer ID"} , status=status.HTTP_404_NOT_FOUND)
+
+        return Response(response_data, status=status.HTTP_200_OK)
+
+    @staticmethod
+    def serialize_loans(loan_applications) :
+        # one query , an empty result stands in for the exists() check
+        loan_applications = list(loan_applications)
+        if not loan_applications :
+            return None
+        return render_loan_list(loan_applications)
+
+    @staticmethod
+    def stream_loans(loan_applications) :
+        chunk_size = settings.LOAN_STREAM_CHUNK_SIZE
+        rows = loan_applications.order_by("loan_id").iterator(chunk_size=chunk_size)
+        batches = (render_loan_list(batch) for batch in iter_batches(rows , chunk_size))
+
+        # the first batch decides between a 404 and the stream
+        first_batch = next(batches , None)
+        if not first_batch :
             return Response({"error" : "No Loan Applications Found for this Customer ID"} , status=status.HTTP_404_NOT_FOUND)
-        response_data = ViewAllLoanApplicationsResponse(loan_applications , many=True)
+        return StreamingHttpResponse(stream_json_array(chain([first_batch] , batches)) , content_type="application/json")
+
+
+class ViewLoanSchedule(APIView) :
+    permission_classes = [AllowAny ,]
+    def get(self, request , *args, **kwargs) :
+        loan_id = kwargs.get("loan_id" , None)
+        if not loan_id :
+            return Response({"error" : "loan_id is required"} , status=status.HTTP_400_BAD_REQUEST)
+
+        loan_application = LoanAppllication.objects.filter(loan_id = loan_id , loan_approved = True).first()
+        if not loan_application :
+            loan_application = ArchivedLoan.objects.filter(loan_id = loan_id).first()
+        if not loan_application :
+            return Response({"error" : "No Loan Application Found with this ID"} , status=status.HTTP_404_NOT_FOUND)
+
+        # full schedule , cached per loan terms
+        schedule_data = get_loan_schedule(loan_application)
+        schedule = schedule_data["schedule"]
+
+        installments_paid = max(0, min(loan_application.emis_paid_on_time or 0, loan_application.tenure))
+        outstanding = schedule[installments_paid - 1]["balance"] if installments_paid else loan_application.loan_amount
 
+        response_object = SimpleNamespace(
+            loan_id=loan_application.loan_id,
+            loan_amount=loan_application.loan_amount,
+            interest_rate=loan_application.interest_rate,
+            tenure=loan_application.tenure,
+            monthly_installment=schedule_data["monthly_installment"],
+            installments_paid=installments_paid,
+            outstanding_principal=outstanding,
+            schedule=schedule,
+        )
+        response_data = LoanScheduleResponse(response_object)
         return Response(response_data.data, status=status.HTTP_200_OK)
-    
+
+
+class ExportTable(APIView) :
+    permission_classes = [IsAdminUser ,]
+    def get(self, request , *args, **kwargs) :
+        table = kwargs.get("table" , None)
+        if table not in EXPORT_COLUMNS :
+            return Response({"error" : f"Unknown table , one of {', '.join(EXPORT_COLUMNS)}"} , status=status.HTTP_404_NOT_FOUND)
+
+        # validate incoming request data
+        serializer = ExportRequestSerializer(data=request.query_params , context={"table" : table})
+        if not serializer.is_valid() :
+            return Response(serializer.errors , status=status.HTTP_400_BAD_REQUEST)
+        options = dict(serializer.validated_data)
+        output = options.pop("output")
+
+        # written out batch by batch from a server side cursor , the table is never held in memory
+        response = StreamingHttpResponse(export_chunks(table , output , **options) , content_type=CONTENT_TYPES[output])
+        response["Content-Disposition"] = f'attachment; filename="{table}.{output}"'
+        return response
+
+
+class DatabasePoolStats(APIView) :
+    permission_classes = [IsAdminUser ,]
+    def get(self, request , *args, **kwargs) :
+        # connection mode , checkouts and pool usage of the process serving this request
+        return Response(connection_stats.snapshot(), status=status.HTTP_200_OK)